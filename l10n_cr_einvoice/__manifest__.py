@@ -93,6 +93,7 @@ Requirements:
             'cryptography',
             'pyOpenSSL',
             'requests',
+            'urllib3',
             'qrcode',
         ],
     },
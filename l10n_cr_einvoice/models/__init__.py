@@ -17,6 +17,7 @@ from . import einvoice_document
 from . import einvoice_import_batch
 from . import einvoice_import_error
 from . import einvoice_analytics_dashboard
+from . import einvoice_daily_rollup
 from . import einvoice_xml_parser
 from . import einvoice_retry_queue
 
@@ -33,6 +34,7 @@ from . import tax_report_xml_generator
 
 # API and generators
 from . import hacienda_api
+from . import hacienda_token
 from . import hacienda_cedula_api
 from . import xml_generator
 from . import xsd_validator
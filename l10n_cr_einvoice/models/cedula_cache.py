@@ -9,15 +9,76 @@ Architecture: architecture-einvoice-validation-cedula-lookup.md
 Reference: DATA-MODEL-CEDULA-CACHE-IMPLEMENTATION.py
 """
 
+import copy
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta, timezone
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, SUPERUSER_ID, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.modules.registry import Registry
+
+from ..utils.refresh_queue import get_refresh_queue
+from ..utils.worker_pool import get_pool_size
 
 _logger = logging.getLogger(__name__)
 
+# Cache hits are served read-only. Each worker keeps a small LRU of parsed
+# entry values in front of the table ({(dbname, company_id, cedula):
+# (values, expires_at)}), filled once the reading transaction has committed,
+# so a hit does not touch the database. Each worker also buffers
+# access statistics per database until flush_access_counts() writes them with
+# a single UPDATE. Buffers are per process, so every worker also flushes its
+# own buffer once it grows old or large.
+LOOKUP_LRU_SIZE = 2048
+LOOKUP_LRU_TTL = 300  # seconds
+ACCESS_FLUSH_INTERVAL = 60  # seconds
+ACCESS_FLUSH_MAX_ENTRIES = 500
+ACCESS_FLUSH_CHUNK_SIZE = 1000
+
+# Stale and refresh-tier entries are revalidated by a per-process pool of
+# refresh workers (see utils/refresh_queue.py) instead of inline or through
+# one-off ir.cron records.
+REFRESH_WORKERS = 2
+REFRESH_TOKEN_TIMEOUT = 30  # seconds
+
+_LOOKUP_LRU = OrderedDict()
+_ACCESS_BUFFER = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_age(refreshed_at):
+    """
+    Elapsed time since an entry was refreshed.
+
+    Args:
+        refreshed_at (datetime): Last refresh (naive UTC, as stored by Odoo)
+
+    Returns:
+        tuple: (hours, days), (0.0, 0) if never refreshed
+    """
+    if not refreshed_at:
+        return 0.0, 0
+    refreshed = fields.Datetime.from_string(refreshed_at)
+    if not refreshed.tzinfo:
+        refreshed = refreshed.replace(tzinfo=timezone.utc)
+    delta = datetime.now(timezone.utc) - refreshed
+    return max(0.0, delta.total_seconds() / 3600.0), max(0, int(delta.days))
+
+
+def _cache_tier(age_days):
+    """Cache tier of an entry aged ``age_days`` (see _compute_cache_tier)."""
+    if age_days > 90:
+        return 'expired'
+    if age_days > 7:
+        return 'stale'
+    if age_days >= 5:
+        return 'refresh'
+    return 'fresh'
+
 
 class L10nCrCedulaCache(models.Model):
     """
@@ -233,27 +294,8 @@ class L10nCrCedulaCache(models.Model):
             0.0 if never refreshed
             float(hours) and int(days) otherwise
         """
-        now = datetime.now(timezone.utc)
-
         for cache in self:
-            if not cache.refreshed_at:
-                cache.cache_age_hours = 0.0
-                cache.cache_age_days = 0
-            else:
-                # Parse refreshed_at (Odoo stores as UTC)
-                refreshed = fields.Datetime.from_string(cache.refreshed_at)
-
-                # Make timezone-aware if naive
-                if not refreshed.tzinfo:
-                    refreshed = refreshed.replace(tzinfo=timezone.utc)
-
-                # Calculate delta
-                delta = now - refreshed
-                hours = delta.total_seconds() / 3600.0
-                days = int(delta.days)
-
-                cache.cache_age_hours = max(0.0, hours)
-                cache.cache_age_days = max(0, days)
+            cache.cache_age_hours, cache.cache_age_days = _cache_age(cache.refreshed_at)
 
     @api.depends('cache_age_days')
     def _compute_cache_tier(self):
@@ -267,16 +309,7 @@ class L10nCrCedulaCache(models.Model):
         - Expired (>90 days): Purge candidate
         """
         for cache in self:
-            age_days = cache.cache_age_days
-
-            if age_days > 90:
-                cache.cache_tier = 'expired'
-            elif age_days > 7:
-                cache.cache_tier = 'stale'
-            elif age_days >= 5:
-                cache.cache_tier = 'refresh'
-            else:
-                cache.cache_tier = 'fresh'
+            cache.cache_tier = _cache_tier(cache.cache_age_days)
 
     # =============================================================================
     # CACHE FRESHNESS CHECK METHODS
@@ -326,54 +359,326 @@ class L10nCrCedulaCache(models.Model):
     # CACHE ACCESS METHODS
     # =============================================================================
 
-    def increment_access_count(self):
+    def increment_access_count(self, refresh=False):
         """
-        Increment access counter when cache is hit.
-        Used to prioritize frequently-used entries for refresh.
+        Record a cache hit without writing to the database.
+
+        Hits are buffered in memory and written in bulk by
+        flush_access_counts(); access_count and last_access_at therefore
+        lag behind by at most one flush interval.
+
+        Args:
+            refresh (bool): Also schedule a background refresh of these
+                entries when the buffer is flushed
         """
-        for cache in self:
-            cache.write({
-                'access_count': cache.access_count + 1,
-                'last_access_at': fields.Datetime.now(),
+        if not self:
+            return
+        now = fields.Datetime.now()
+        with _CACHE_LOCK:
+            buffer = _ACCESS_BUFFER.setdefault(self.env.cr.dbname, {
+                'hits': {},
+                'refresh': set(),
+                'started_at': time.monotonic(),
             })
+            for cache in self:
+                entry = buffer['hits'].setdefault(cache.id, [0, now])
+                entry[0] += 1
+                entry[1] = now
+                if refresh:
+                    buffer['refresh'].add(cache.id)
+            flush_due = (
+                len(buffer['hits']) >= ACCESS_FLUSH_MAX_ENTRIES
+                or time.monotonic() - buffer['started_at'] >= ACCESS_FLUSH_INTERVAL
+            )
+
+        if flush_due:
+            self._flush_access_counts_in_new_cursor()
+
+    def _flush_access_counts_in_new_cursor(self):
+        """
+        Flush this worker's access buffer in its own transaction.
+
+        Called from the lookup path, which must stay read-only; failures are
+        logged and the buffered hits are put back for the next flush.
+        """
+        try:
+            with self.env.registry.cursor() as cr:
+                self.with_env(self.env(cr=cr)).sudo().flush_access_counts()
+        except Exception:
+            _logger.warning('Failed to flush cédula cache access counts', exc_info=True)
 
     @api.model
-    def get_cached(self, cedula, company=None):
+    def flush_access_counts(self):
         """
-        Retrieve cached entry for cédula.
+        Write buffered cache hits of this worker to the database.
+
+        Hit counts are added with one UPDATE ... FROM (VALUES ...) per chunk
+        instead of one ORM write per hit. Entries flagged for refresh while
+        in the refresh tier get their background refresh job enqueued here.
+
+        Returns:
+            int: Number of cache entries updated
+        """
+        dbname = self.env.cr.dbname
+        with _CACHE_LOCK:
+            buffer = _ACCESS_BUFFER.pop(dbname, None)
+        if not buffer or not (buffer['hits'] or buffer['refresh']):
+            return 0
+
+        rows = sorted(buffer['hits'].items())
+        updated = set()
+        try:
+            for start in range(0, len(rows), ACCESS_FLUSH_CHUNK_SIZE):
+                chunk = rows[start:start + ACCESS_FLUSH_CHUNK_SIZE]
+                values = ', '.join(['(%s, %s, %s::timestamp)'] * len(chunk))
+                params = []
+                for cache_id, (hits, last_access) in chunk:
+                    params.extend((cache_id, hits, last_access))
+                # Rows locked by a concurrent refresh are skipped and stay
+                # buffered, so a flush never waits on (or deadlocks with) a
+                # lookup transaction that is writing the same entry.
+                params.append([cache_id for cache_id, _hits in chunk])
+                self.env.cr.execute("""
+                    UPDATE l10n_cr_cedula_cache AS c
+                       SET access_count = COALESCE(c.access_count, 0) + v.hits,
+                           last_access_at = GREATEST(c.last_access_at, v.last_access)
+                      FROM (VALUES """ + values + """) AS v(id, hits, last_access)
+                     WHERE c.id = v.id
+                       AND c.id IN (
+                           SELECT id FROM l10n_cr_cedula_cache
+                            WHERE id = ANY(%s)
+                              FOR UPDATE SKIP LOCKED
+                       )
+                 RETURNING c.id
+                """, params)
+                updated.update(row[0] for row in self.env.cr.fetchall())
+        except Exception:
+            self._restore_access_buffer(dbname, buffer)
+            raise
+
+        existing = set(self.browse([cache_id for cache_id, _hits in rows]).exists().ids)
+        skipped = {
+            cache_id: hits for cache_id, hits in buffer['hits'].items()
+            if cache_id in existing and cache_id not in updated
+        }
+        if skipped:
+            self._restore_access_buffer(dbname, {
+                'hits': skipped,
+                'refresh': set(),
+                'started_at': buffer['started_at'],
+            })
+        self.invalidate_model(['access_count', 'last_access_at'])
+
+        to_refresh = self.browse(sorted(buffer['refresh'])).exists().filtered(
+            lambda c: c.cache_tier == 'refresh'
+        )
+        if to_refresh:
+            try:
+                to_refresh._enqueue_refresh_job()
+            except Exception:
+                _logger.debug('Failed to enqueue refresh for %s', to_refresh.mapped('cedula'))
+
+        _logger.debug(
+            'Flushed access counts for %d cédula cache entries', len(updated)
+        )
+        return len(updated)
+
+    @api.model
+    def _restore_access_buffer(self, dbname, buffer):
+        """Merge a buffer that could not be flushed back into the live one."""
+        with _CACHE_LOCK:
+            current = _ACCESS_BUFFER.setdefault(dbname, {
+                'hits': {},
+                'refresh': set(),
+                'started_at': buffer['started_at'],
+            })
+            for cache_id, (hits, last_access) in buffer['hits'].items():
+                entry = current['hits'].setdefault(cache_id, [0, last_access])
+                entry[0] += hits
+                entry[1] = max(entry[1], last_access)
+            current['refresh'] |= buffer['refresh']
+
+    @api.model
+    def _cron_flush_access_counts(self):
+        """Periodic flush of buffered cache hits (runs in the cron worker)."""
+        return self.flush_access_counts()
+
+    def _lru_key(self, cedula, company):
+        return (self.env.cr.dbname, company.id, cedula)
+
+    @api.model
+    def _lru_get(self, cedula, company):
+        """
+        Resolve a cédula through the in-process LRU.
+
+        Returns:
+            dict: Entry values (see _get_lru_values()), or None when the LRU
+                has no valid entry
+        """
+        key = self._lru_key(cedula, company)
+        with _CACHE_LOCK:
+            entry = _LOOKUP_LRU.get(key)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if expires_at <= time.monotonic():
+                del _LOOKUP_LRU[key]
+                return None
+            _LOOKUP_LRU.move_to_end(key)
+            return values
+
+    @api.model
+    def _lru_put(self, cedula, company, values):
+        """
+        Store entry values in the LRU once this transaction has committed.
+
+        Values read by a transaction that rolls back (e.g. an entry created
+        and discarded in the same request) never reach the LRU.
+        """
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.cedula_lru_ttl', LOOKUP_LRU_TTL
+        ))
+        if ttl <= 0:
+            return
+        key = self._lru_key(cedula, company)
+
+        @self.env.cr.postcommit.add
+        def put():
+            with _CACHE_LOCK:
+                _LOOKUP_LRU[key] = (values, time.monotonic() + ttl)
+                _LOOKUP_LRU.move_to_end(key)
+                while len(_LOOKUP_LRU) > LOOKUP_LRU_SIZE:
+                    _LOOKUP_LRU.popitem(last=False)
+
+    @api.model
+    def _lru_discard(self, cache_ids):
+        cache_ids = set(cache_ids)
+        with _CACHE_LOCK:
+            for key in [k for k, v in _LOOKUP_LRU.items() if v[0]['id'] in cache_ids]:
+                del _LOOKUP_LRU[key]
+
+    @api.model
+    def clear_lookup_cache(self):
+        """Drop the in-process lookup LRU (e.g. after bulk data changes)."""
+        with _CACHE_LOCK:
+            _LOOKUP_LRU.clear()
+
+    def _lru_invalidate(self):
+        """Drop these entries from the LRU now and again once the change commits."""
+        cache_ids = self.ids
+        self._lru_discard(cache_ids)
+        self.env.cr.postcommit.add(lambda: self._lru_discard(cache_ids))
+
+    def write(self, vals):
+        self._lru_invalidate()
+        return super().write(vals)
+
+    def unlink(self):
+        self._lru_invalidate()
+        return super().unlink()
+
+    def _parse_lookup_data(self):
+        """
+        Parse this entry into the lookup service data structure.
+
+        Returns:
+            dict: cedula, name, company_type, tax_regime, tax_status,
+                economic_activities (list), primary_activity and ciiu_code_id
+        """
+        self.ensure_one()
+        economic_activities = []
+        if self.economic_activities:
+            try:
+                economic_activities = json.loads(self.economic_activities)
+            except json.JSONDecodeError:
+                _logger.warning(f'Failed to parse activities JSON for cédula {self.cedula}')
+
+        return {
+            'cedula': self.cedula,
+            'name': self.name,
+            'company_type': self.company_type,
+            'tax_regime': self.tax_regime or '',
+            'tax_status': self.tax_status,
+            'economic_activities': economic_activities,
+            'primary_activity': self.primary_activity,
+            'ciiu_code_id': self.ciiu_code_id.id if self.ciiu_code_id else False,
+        }
+
+    @api.model
+    def get_cached_values(self, cedula, company=None):
+        """
+        Retrieve the parsed values of the cached entry for a cédula.
+
+        Hits are served from the in-process LRU without touching the
+        database: the entry is parsed once on a miss and kept for
+        l10n_cr_einvoice.cedula_lru_ttl seconds after the transaction commits
+        (write() and unlink() drop it in this worker). The access is only
+        buffered (see increment_access_count()).
 
         Args:
             cedula (str): Tax ID number (normalized, no hyphens)
             company (res.company): Company context (defaults to current)
 
         Returns:
-            l10n_cr.cedula.cache record or empty recordset
+            dict: {'id', 'refreshed_at', 'cache_age_days', 'cache_tier',
+                'data': parsed entry (see _parse_lookup_data())}, or None on a miss
         """
         company = company or self.env.company
+        self.check_access('read')
 
-        cache = self.search([
-            ('cedula', '=', cedula),
-            ('company_id', '=', company.id),
-        ], limit=1)
+        values = self._lru_get(cedula, company)
+        if values is None:
+            cache = self.search([
+                ('cedula', '=', cedula),
+                ('company_id', '=', company.id),
+            ], limit=1)
+            if not cache:
+                _logger.debug('Cache MISS for cédula %s', cedula)
+                return None
+            values = {
+                'id': cache.id,
+                'refreshed_at': cache.refreshed_at,
+                'data': cache._parse_lookup_data(),
+            }
+            self._lru_put(cedula, company, values)
 
-        if cache:
-            # Increment access counter
-            cache.increment_access_count()
+        _hours, age_days = _cache_age(values['refreshed_at'])
+        values = dict(copy.deepcopy(values), cache_age_days=age_days, cache_tier=_cache_tier(age_days))
 
-            # Trigger background refresh if entry is in refresh tier
-            if cache.cache_tier == 'refresh':
-                try:
-                    cache._enqueue_refresh_job()
-                except Exception:
-                    _logger.debug('Failed to enqueue refresh for %s', cedula)
+        # Buffer the hit; refresh-tier entries get their background refresh
+        # enqueued when the buffer is flushed
+        self.browse(values['id']).increment_access_count(refresh=values['cache_tier'] == 'refresh')
+        _logger.debug(
+            'Cache HIT for cédula %s (age: %d days, tier: %s)',
+            cedula, age_days, values['cache_tier'],
+        )
+        return values
 
-            _logger.debug(
-                'Cache HIT for cédula %s (age: %d days, tier: %s)',
-                cedula, cache.cache_age_days, cache.cache_tier
-            )
-        else:
-            _logger.debug('Cache MISS for cédula %s', cedula)
+    @api.model
+    def get_cached(self, cedula, company=None):
+        """
+        Retrieve cached entry for cédula.
+
+        Resolved through get_cached_values(), so the hit is buffered and the
+        entry id comes from the in-process LRU when possible; field reads on
+        the returned record go through the ORM.
 
+        Args:
+            cedula (str): Tax ID number (normalized, no hyphens)
+            company (res.company): Company context (defaults to current)
+
+        Returns:
+            l10n_cr.cedula.cache record or empty recordset
+        """
+        values = self.get_cached_values(cedula, company=company)
+        if not values:
+            return self.browse()
+
+        cache = self.browse(values['id']).exists()
+        if not cache:
+            # Deleted by another worker since it was cached here
+            self._lru_discard([values['id']])
+            return self.get_cached(cedula, company=company)
         return cache
 
     def refresh_if_needed(self):
@@ -403,78 +708,136 @@ class L10nCrCedulaCache(models.Model):
 
     def _enqueue_refresh_job(self):
         """
-        Enqueue background job to refresh this cache entry using ir.cron.
+        Queue these entries for revalidation by the background refresh workers.
 
-        Creates a one-time scheduled action that will call refresh_from_api()
-        on this specific record. The cron runs once after 1 minute and then
-        auto-deletes (numbercall=1).
+        Returns immediately: the lookup that found the entries keeps serving
+        the cached data (stale-while-revalidate). Entries already pending or
+        being refreshed are not queued twice (single-flight), and entries
+        queued close together are refreshed as one batch.
 
-        Deduplication: if an active cron already exists for this cédula,
-        skip creating a duplicate.
+        Returns:
+            int: Number of entries newly queued
         """
-        self.ensure_one()
-        existing_cron = self.env['ir.cron'].sudo().search([
-            ('name', '=', f'Refresh cédula cache: {self.cedula}'),
-            ('active', '=', True),
-        ], limit=1)
-        if existing_cron:
-            return  # Already scheduled
-        # Odoo 19 ir.cron no longer has 'numbercall' / 'doall'.
-        # Create a recurring cron that deactivates itself after first run
-        # (refresh_from_api handles self-deactivation).
-        self.env['ir.cron'].sudo().create({
-            'name': f'Refresh cédula cache: {self.cedula}',
-            'model_id': self.env['ir.model']._get_id('l10n_cr.cedula.cache'),
-            'state': 'code',
-            'code': f'model.browse({self.id}).refresh_from_api()',
-            'interval_type': 'minutes',
-            'interval_number': 1,
-        })
-        _logger.info('Enqueued refresh job for cédula %s', self.cedula)
+        queue = self._get_refresh_queue()
+        queued = 0
+        for cache in self:
+            if queue.submit((cache.company_id.id, cache.cedula)):
+                queued += 1
+        if queued:
+            _logger.debug('Queued %d cédula cache entries for refresh', queued)
+        return queued
+
+    @api.model
+    def _get_refresh_queue(self):
+        """Return the refresh queue of this database (created on first use)."""
+        dbname = self.env.cr.dbname
+
+        def refresh(keys):
+            # Refresh workers are plain threads: give them a cursor of their own
+            threading.current_thread().dbname = dbname
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['l10n_cr.cedula.cache']._refresh_entries(keys)
+
+        return get_refresh_queue(
+            (dbname, self._name),
+            refresh,
+            max_workers=get_pool_size(
+                self.env, 'l10n_cr_einvoice.cedula_refresh_workers', REFRESH_WORKERS,
+            ),
+            # Test cursors cannot be shared across threads
+            autostart=not self.env.registry.in_test_mode(),
+        )
+
+    @api.model
+    def _drain_refresh_queue(self):
+        """
+        Run every queued refresh synchronously in the current transaction.
+
+        Returns:
+            int: Number of entries processed
+        """
+        return self._get_refresh_queue().drain(handler=self._refresh_entries)
+
+    @api.model
+    def _refresh_entries(self, keys):
+        """
+        Revalidate cache entries against Hacienda (then GoMeta).
+
+        Entry point of the refresh workers. Lookups are paced by the shared
+        rate limiter and successful results are written with one bulk upsert
+        per company; failures are recorded on the entries, which keep serving
+        their previous data.
+
+        Args:
+            keys (list): (company_id, cedula) tuples
+
+        Returns:
+            int: Number of entries refreshed
+        """
+        by_company = {}
+        for company_id, cedula in keys:
+            by_company.setdefault(company_id, []).append(cedula)
+
+        token_timeout = float(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.cedula_refresh_token_timeout', REFRESH_TOKEN_TIMEOUT
+        ))
+
+        refreshed = 0
+        for company_id, cedulas in by_company.items():
+            # Entries purged since they were queued are not recreated
+            caches = {
+                cache.cedula: cache
+                for cache in self.search([
+                    ('cedula', 'in', cedulas),
+                    ('company_id', '=', company_id),
+                ])
+            }
+            company = self.env['res.company'].browse(company_id)
+            service = self.env['l10n_cr.cedula.lookup.service'].with_company(company)
+            fetched = {}
+            errors = {}
+            for cedula in caches:
+                try:
+                    source, hacienda_result, gometa_result = service._lookup_remote(
+                        cedula, token_timeout=token_timeout,
+                    )
+                except Exception as e:
+                    errors[cedula] = str(e)
+                    continue
+                if source:
+                    data = (hacienda_result if source == 'hacienda' else gometa_result)['data']
+                    fetched[cedula] = (service._prepare_cache_data(data), source)
+                else:
+                    errors[cedula] = service._build_error_message(hacienda_result, gometa_result)
+
+            if fetched:
+                self.with_company(company).update_cache_bulk(fetched, company=company)
+                refreshed += len(fetched)
+
+            if errors:
+                for cedula, error in errors.items():
+                    caches[cedula].error_message = error[:500]
+                _logger.warning(
+                    'Failed to refresh %d cédula cache entries: %s',
+                    len(errors), ', '.join(errors),
+                )
+
+        return refreshed
 
     def refresh_from_api(self):
         """
-        Refresh this cache entry by calling the Hacienda API.
+        Refresh this cache entry synchronously.
 
-        Called by the one-time ir.cron job created by _enqueue_refresh_job().
-        Updates the cache record with fresh data if the API call succeeds.
+        Kept for the one-off ir.cron records created by earlier versions,
+        which are deactivated once they have run.
         """
         self.ensure_one()
         _logger.info('Refreshing cache entry for cédula %s from API', self.cedula)
 
         try:
-            api = self.env['l10n_cr.hacienda.cedula.api']
-            result = api.lookup_cedula(self.cedula)
-
-            if result.get('success'):
-                self.env['l10n_cr.cedula.cache'].update_cache(
-                    cedula=self.cedula,
-                    data={
-                        'name': result.get('name'),
-                        'tax_regime': result.get('tax_regime'),
-                        'tax_status': 'inscrito',
-                        'economic_activities': result.get('economic_activities', []),
-                        'raw_response': json.dumps(result.get('raw_data', {})),
-                    },
-                    source='hacienda',
-                    company=self.company_id,
-                )
-                _logger.info('Successfully refreshed cédula %s from API', self.cedula)
-            else:
-                error_msg = result.get('error', 'Unknown error')
-                self.write({'error_message': error_msg[:500]})
-                _logger.warning(
-                    'Failed to refresh cédula %s from API: %s',
-                    self.cedula, error_msg
-                )
-        except Exception as e:
-            self.write({'error_message': str(e)[:500]})
-            _logger.error(
-                'Exception refreshing cédula %s from API: %s',
-                self.cedula, str(e), exc_info=True
-            )
+            self._refresh_entries([(self.company_id.id, self.cedula)])
         finally:
-            # Deactivate the one-shot cron so it doesn't run again
             cron = self.env['ir.cron'].sudo().search([
                 ('name', '=', f'Refresh cédula cache: {self.cedula}'),
                 ('active', '=', True),
@@ -514,27 +877,7 @@ class L10nCrCedulaCache(models.Model):
             ('company_id', '=', company.id),
         ], limit=1)
 
-        # Parse economic activities
-        activities_json = None
-        primary_activity = None
-        if data.get('economic_activities'):
-            import json
-            activities_json = json.dumps(data['economic_activities'])
-            primary_activity = data['economic_activities'][0].get('code') if data['economic_activities'] else None
-
-        # Prepare values
-        vals = {
-            'name': data.get('name', 'Unknown'),
-            'company_type': data.get('company_type', 'other'),
-            'tax_regime': data.get('tax_regime'),
-            'tax_status': data.get('tax_status', 'inscrito'),
-            'economic_activities': activities_json,
-            'primary_activity': primary_activity,
-            'source': source,
-            'raw_response': data.get('raw_response'),
-            'refreshed_at': fields.Datetime.now(),
-            'error_message': False,  # Clear any previous errors
-        }
+        vals = self._prepare_cache_vals(data, source)
 
         if cache:
             # Update existing cache
@@ -551,11 +894,128 @@ class L10nCrCedulaCache(models.Model):
             _logger.info('Cache CREATED for cédula %s (source: %s)', cedula, source)
 
         # Auto-assign CIIU if possible
-        if primary_activity:
+        if vals['primary_activity']:
             cache._auto_assign_ciiu()
 
         return cache
 
+    @api.model
+    def update_cache_bulk(self, entries, company=None):
+        """
+        Create or update many cache entries at once.
+
+        Existing entries are fetched with one query and new ones are created
+        with a single create() call; CIIU codes are matched with one search.
+
+        Args:
+            entries (dict): {cedula: (data, source)} with data as in update_cache()
+            company (res.company): Company context
+
+        Returns:
+            dict: {cedula: l10n_cr.cedula.cache record}
+        """
+        company = company or self.env.company
+        if not entries:
+            return {}
+
+        existing = {
+            cache.cedula: cache
+            for cache in self.search([
+                ('cedula', 'in', list(entries)),
+                ('company_id', '=', company.id),
+            ])
+        }
+
+        now = fields.Datetime.now()
+        create_vals = []
+        write_groups = defaultdict(list)
+        caches = {}
+        for cedula, (data, source) in entries.items():
+            vals = self._prepare_cache_vals(data, source, refreshed_at=now)
+            cache = existing.get(cedula)
+            if cache:
+                # Entries refreshed with identical values share one write()
+                write_groups[tuple(sorted(vals.items()))].append(cache.id)
+                caches[cedula] = cache
+            else:
+                vals.update({
+                    'cedula': cedula,
+                    'company_id': company.id,
+                    'fetched_at': now,
+                })
+                create_vals.append(vals)
+
+        for vals, cache_ids in write_groups.items():
+            self.browse(cache_ids).write(dict(vals))
+
+        if create_vals:
+            for cache in self.create(create_vals):
+                caches[cache.cedula] = cache
+
+        self.browse([cache.id for cache in caches.values()])._auto_assign_ciiu_bulk()
+        _logger.info(
+            'Cache bulk upsert: %d updated, %d created (company: %s)',
+            len(caches) - len(create_vals), len(create_vals), company.name,
+        )
+        return caches
+
+    @api.model
+    def _prepare_cache_vals(self, data, source, refreshed_at=None):
+        """
+        Build cache field values from parsed API data.
+
+        Args:
+            data (dict): Parsed API response, see update_cache()
+            source (str): 'hacienda' or 'gometa'
+            refreshed_at (datetime): Refresh timestamp (default: now)
+
+        Returns:
+            dict: Values for create() or write()
+        """
+        # Parse economic activities
+        activities_json = None
+        primary_activity = None
+        if data.get('economic_activities'):
+            activities_json = json.dumps(data['economic_activities'])
+            primary_activity = data['economic_activities'][0].get('code') if data['economic_activities'] else None
+
+        return {
+            'name': data.get('name', 'Unknown'),
+            'company_type': data.get('company_type', 'other'),
+            'tax_regime': data.get('tax_regime'),
+            'tax_status': data.get('tax_status', 'inscrito'),
+            'economic_activities': activities_json,
+            'primary_activity': primary_activity,
+            'source': source,
+            'raw_response': data.get('raw_response'),
+            'refreshed_at': refreshed_at or fields.Datetime.now(),
+            'error_message': False,  # Clear any previous errors
+        }
+
+    @staticmethod
+    def _ciiu_lookup_code(primary_activity):
+        """Map a Hacienda activity code (e.g. "931100", "4690.0") to the 4-digit CIIU code."""
+        code = primary_activity.split('.')[0]
+        if len(code) > 4:
+            code = code[:4]
+        return code
+
+    def _auto_assign_ciiu_bulk(self):
+        """
+        Match primary activities of many entries to the CIIU catalog at once.
+        """
+        pending = self.filtered('primary_activity')
+        if not pending:
+            return
+        codes = {cache.id: self._ciiu_lookup_code(cache.primary_activity) for cache in pending}
+        ciius = {}
+        for ciiu in self.env['l10n_cr.ciiu.code'].search([('code', 'in', list(set(codes.values())))]):
+            ciius.setdefault(ciiu.code, ciiu)
+        for cache in pending:
+            ciiu = ciius.get(codes[cache.id])
+            if ciiu and cache.ciiu_code_id != ciiu:
+                cache.ciiu_code_id = ciiu
+
     def _auto_assign_ciiu(self):
         """
         Attempt to match primary activity code to CIIU catalog.
@@ -571,9 +1031,7 @@ class L10nCrCedulaCache(models.Model):
             return
 
         # Strip decimal (e.g., "4690.0" → "4690"), then truncate to 4 digits if needed
-        code = self.primary_activity.split('.')[0]
-        if len(code) > 4:
-            code = code[:4]
+        code = self._ciiu_lookup_code(self.primary_activity)
 
         # Search CIIU catalog
         ciiu = self.env['l10n_cr.ciiu.code'].search([
@@ -603,6 +1061,9 @@ class L10nCrCedulaCache(models.Model):
         Returns:
             RecordSet of l10n_cr.cedula.cache in refresh/stale tier
         """
+        # Ordering relies on access_count: write pending hits first
+        self.flush_access_counts()
+
         # Search for entries older than 5 days but not expired (>90 days)
         stale_cutoff = fields.Datetime.now() - timedelta(days=5)
         expired_cutoff = fields.Datetime.now() - timedelta(days=90)
@@ -980,6 +1441,8 @@ class L10nCrCedulaCache(models.Model):
 
         _logger.info('Priority threshold: access_count > %d', priority_threshold)
 
+        self.flush_access_counts()
+
         # Find high-traffic cache entries
         domain = [
             ('access_count', '>', priority_threshold),
@@ -26,6 +26,8 @@ from datetime import datetime, timezone
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..utils.worker_pool import run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
 # API Configuration
@@ -80,7 +82,9 @@ class CedulaLookupService(models.AbstractModel):
         Main method: Look up cédula with waterfall retry strategy.
 
         Waterfall steps:
-        1. Check cache (if fresh, return immediately)
+        1. Check cache (if fresh, return immediately; if stale and
+           stale-while-revalidate is enabled, return it immediately and
+           refresh it in the background)
         2. Try Hacienda API (with rate limiting)
         3. Try GoMeta API fallback (if Hacienda fails)
         4. Return stale cache (if APIs fail)
@@ -109,6 +113,7 @@ class CedulaLookupService(models.AbstractModel):
                 'error': 'Human-readable error message (if failed)',
                 'error_type': 'not_found'|'timeout'|'rate_limit'|'network',
                 'manual_entry_required': True/False,
+                'revalidating': True,  # stale entry served, refresh queued
                 'user_message': 'Spanish message for UI display',
             }
         """
@@ -116,14 +121,7 @@ class CedulaLookupService(models.AbstractModel):
         cedula_clean = self._clean_cedula(cedula)
 
         if not cedula_clean:
-            return {
-                'success': False,
-                'source': 'failed',
-                'error': _('Formato de cédula inválido. Debe contener solo dígitos.'),
-                'error_type': 'validation',
-                'manual_entry_required': True,
-                'user_message': _('Por favor ingrese los datos manualmente.'),
-            }
+            return self._invalid_cedula_result()
 
         _logger.info(f'Cédula lookup request: {cedula_clean} (force_refresh={force_refresh})')
 
@@ -139,6 +137,28 @@ class CedulaLookupService(models.AbstractModel):
                 )
                 return cache_result
 
+            # Stale-while-revalidate: the cashier gets the stale entry now
+            # and the refresh workers revalidate it off the request path
+            stale_cache = cache_result.get('cache')
+            if stale_cache and self._is_stale_while_revalidate():
+                stale_result = self._stale_cache_result(stale_cache, cedula_clean)
+                if stale_result['success']:
+                    stale_cache._enqueue_refresh_job()
+                    response_time = time.time() - start_time
+                    stale_result.update({
+                        'revalidating': True,
+                        'response_time': round(response_time, 3),
+                        'user_message': _(
+                            'Datos de caché (última verificación hace %d días). '
+                            'Actualizando en segundo plano.'
+                        ) % stale_cache.cache_age_days,
+                    })
+                    _logger.info(
+                        f'Cédula lookup SUCCESS (stale, revalidating): {cedula_clean} '
+                        f'in {response_time:.3f}s (age: {stale_cache.cache_age_days} days)'
+                    )
+                    return stale_result
+
         # Step 2: Try Hacienda API (with rate limiting)
         hacienda_result = self._lookup_hacienda(cedula_clean)
         if hacienda_result['success']:
@@ -159,11 +179,8 @@ class CedulaLookupService(models.AbstractModel):
 
         # Step 3: Try GoMeta API Fallback (if enabled)
         # Check if GoMeta fallback is enabled (default: True for backward compatibility)
-        use_gometa = self.env['ir.config_parameter'].sudo().get_param(
-            'l10n_cr_einvoice.enable_gometa_fallback', 'True'
-        )
         gometa_result = {'success': False, 'error_type': 'disabled'}
-        if use_gometa.lower() in ('true', '1', 'yes'):
+        if self._is_gometa_enabled():
             _logger.warning(f'Hacienda API failed for {cedula_clean}, trying GoMeta fallback...')
             gometa_result = self._lookup_gometa(cedula_clean)
             if gometa_result['success']:
@@ -198,19 +215,34 @@ class CedulaLookupService(models.AbstractModel):
 
         # Step 5: All sources failed - return error with manual entry prompt
         response_time = time.time() - start_time
-        error_message = self._build_error_message(hacienda_result, gometa_result)
 
         _logger.error(
             f'Cédula lookup FAILED: {cedula_clean} after {response_time:.3f}s. '
             f'All sources exhausted.'
         )
 
+        result = self._failed_result(hacienda_result, gometa_result)
+        result['response_time'] = round(response_time, 3)
+        return result
+
+    def _invalid_cedula_result(self):
+        """Result returned for a cédula that fails format validation."""
+        return {
+            'success': False,
+            'source': 'failed',
+            'error': _('Formato de cédula inválido. Debe contener solo dígitos.'),
+            'error_type': 'validation',
+            'manual_entry_required': True,
+            'user_message': _('Por favor ingrese los datos manualmente.'),
+        }
+
+    def _failed_result(self, hacienda_result, gometa_result):
+        """Result returned when every source failed (manual entry prompt)."""
         return {
             'success': False,
             'source': 'failed',
-            'error': error_message,
+            'error': self._build_error_message(hacienda_result, gometa_result),
             'error_type': hacienda_result.get('error_type', ERROR_API_ERROR),
-            'response_time': round(response_time, 3),
             'manual_entry_required': True,
             'user_message': _(
                 'No se pudo obtener información de esta cédula. '
@@ -218,6 +250,20 @@ class CedulaLookupService(models.AbstractModel):
             ),
         }
 
+    def _is_stale_while_revalidate(self):
+        """Check if stale entries are served while refreshing in the background (default: True)."""
+        swr = self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.cedula_stale_while_revalidate', 'True'
+        )
+        return swr.lower() in ('true', '1', 'yes')
+
+    def _is_gometa_enabled(self):
+        """Check if GoMeta fallback is enabled (default: True for backward compatibility)."""
+        use_gometa = self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.enable_gometa_fallback', 'True'
+        )
+        return use_gometa.lower() in ('true', '1', 'yes')
+
     # =============================================================================
     # STEP 1: CACHE LOOKUP (Fresh Cache 0-7 days)
     # =============================================================================
@@ -227,38 +273,44 @@ class CedulaLookupService(models.AbstractModel):
         Look up cédula in fresh cache (0-7 days old).
 
         Returns immediately with cached data if available and fresh.
-        Triggers background refresh if in refresh zone (5-7 days).
+        Entries in the refresh zone (5-7 days) are refreshed in the background.
 
         Args:
             cedula (str): Clean cédula (digits only)
 
         Returns:
             dict: Cache result with success=True if found, False if miss
+                (a miss on a non-fresh entry carries it under 'cache')
         """
         cache_model = self.env['l10n_cr.cedula.cache']
-        cache = cache_model.get_cached(cedula)
+        # Served from the in-process LRU when possible: no query on a hit
+        cached = cache_model.get_cached_values(cedula)
 
-        if not cache:
+        if not cached:
             return {'success': False, 'source': 'cache_miss'}
 
         # Check if cache is fresh (0-7 days)
-        if not cache.is_fresh():
-            _logger.debug(f'Cache entry for {cedula} is stale ({cache.cache_age_days} days)')
-            return {'success': False, 'source': 'cache_stale'}
+        if cached['cache_age_days'] >= 7:
+            _logger.debug(f'Cache entry for {cedula} is stale ({cached["cache_age_days"]} days)')
+            return {
+                'success': False,
+                'source': 'cache_stale',
+                'cache': cache_model.browse(cached['id']).exists(),
+            }
 
-        # Trigger background refresh if in refresh zone (5-7 days)
-        if cache.needs_refresh():
-            _logger.info(f'Cache entry for {cedula} needs refresh, triggering background job')
-            cache.refresh_if_needed()
+        # Refresh-zone entries (5-7 days) are not refreshed inline:
+        # get_cached_values() flags them and the refresh job is enqueued when
+        # the buffered access counts are flushed, keeping cache hits read-only.
 
-        # Return cached data
-        data = self._parse_cache_record(cache)
+        return self._cache_hit_result(cached['data'], cached['cache_age_days'])
 
+    def _cache_hit_result(self, data, cache_age_days):
+        """Build the fresh-cache result for parsed cache data."""
         return {
             'success': True,
             'source': 'cache',
             'data': data,
-            'cache_age_days': cache.cache_age_days,
+            'cache_age_days': cache_age_days,
             'user_message': _('Datos obtenidos de caché (verificados recientemente).'),
         }
 
@@ -266,7 +318,7 @@ class CedulaLookupService(models.AbstractModel):
     # STEP 2: HACIENDA API LOOKUP
     # =============================================================================
 
-    def _lookup_hacienda(self, cedula):
+    def _lookup_hacienda(self, cedula, token_timeout=0.5):
         """
         Look up cédula using Hacienda API with rate limiting.
 
@@ -275,6 +327,7 @@ class CedulaLookupService(models.AbstractModel):
 
         Args:
             cedula (str): Clean cédula (digits only)
+            token_timeout (float): Seconds to wait for a rate limiter token
 
         Returns:
             dict: {
@@ -285,23 +338,14 @@ class CedulaLookupService(models.AbstractModel):
             }
         """
         try:
-            # Check rate limiter
-            rate_limiter = self.env['l10n_cr.hacienda.rate_limiter']
-
-            # Try to acquire token (non-blocking)
-            token_acquired = rate_limiter.try_acquire_token()
-
-            if not token_acquired:
-                # Wait briefly and retry once before giving up
-                time.sleep(0.5)
-                token_acquired = rate_limiter.try_acquire_token()
-                if not token_acquired:
-                    _logger.warning(f'Rate limit exceeded for Hacienda API (cédula: {cedula})')
-                    return {
-                        'success': False,
-                        'error': _('Límite de consultas excedido. Intente nuevamente en unos segundos.'),
-                        'error_type': ERROR_RATE_LIMIT,
-                    }
+            # Check rate limiter (waits briefly for the next token)
+            if not self._acquire_hacienda_token(token_timeout):
+                _logger.warning(f'Rate limit exceeded for Hacienda API (cédula: {cedula})')
+                return {
+                    'success': False,
+                    'error': _('Límite de consultas excedido. Intente nuevamente en unos segundos.'),
+                    'error_type': ERROR_RATE_LIMIT,
+                }
 
             # Call Hacienda API
             api = self.env['l10n_cr.hacienda.cedula.api']
@@ -330,6 +374,26 @@ class CedulaLookupService(models.AbstractModel):
                 'error_type': ERROR_NETWORK,
             }
 
+    def _acquire_hacienda_token(self, timeout):
+        """
+        Take a rate limiter token for a Hacienda lookup, waiting up to ``timeout``.
+
+        Between attempts the caller sleeps on the limiter's wake-up signal
+        rather than a fixed delay.
+
+        Returns:
+            bool: True if a token was acquired
+        """
+        rate_limiter = self.env['l10n_cr.hacienda.rate_limiter']
+        company = self.env.company
+        deadline = time.monotonic() + timeout
+        while not rate_limiter.try_acquire_token(endpoint='cedula', company=company):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            rate_limiter.wait_for_token(timeout=remaining, endpoint='cedula', company=company)
+        return True
+
     # =============================================================================
     # STEP 3: GOMETA API FALLBACK
     # =============================================================================
@@ -439,6 +503,19 @@ class CedulaLookupService(models.AbstractModel):
             ('company_id', '=', self.env.company.id),
         ], limit=1)
 
+        return self._stale_cache_result(cache, cedula)
+
+    def _stale_cache_result(self, cache, cedula):
+        """
+        Build the stale-cache fallback result for an already loaded entry.
+
+        Args:
+            cache (l10n_cr.cedula.cache): Cache record (may be empty)
+            cedula (str): Clean cédula
+
+        Returns:
+            dict: Stale cache result or failure
+        """
         if not cache:
             return {'success': False, 'source': 'no_cache'}
 
@@ -482,9 +559,14 @@ class CedulaLookupService(models.AbstractModel):
         Useful for bulk import operations or background processing.
         Returns results dict keyed by cédula.
 
+        Input cédulas are deduplicated after cleaning and every cache entry
+        is loaded with a single query. Only the misses go to Hacienda (and
+        GoMeta), up to ``max_concurrent`` at a time and paced by the shared
+        rate limiter; results are then written to the cache in bulk.
+
         Args:
             cedulas (list): List of cédula strings
-            max_concurrent (int): Not used (sequential processing for simplicity)
+            max_concurrent (int): Maximum concurrent API lookups
 
         Returns:
             dict: {
@@ -516,6 +598,83 @@ class CedulaLookupService(models.AbstractModel):
             }
 
         start_time = time.time()
+        company = self.env.company
+        cache_model = self.env['l10n_cr.cedula.cache']
+
+        clean_by_input = {cedula: self._clean_cedula(cedula) for cedula in cedulas}
+        unique = list(dict.fromkeys(clean for clean in clean_by_input.values() if clean))
+
+        _logger.info(
+            f'Starting batch lookup for {len(cedulas)} cédulas ({len(unique)} unique)'
+        )
+
+        # Step 1: Resolve every cache entry with one query
+        caches = {
+            cache.cedula: cache
+            for cache in cache_model.search([
+                ('cedula', 'in', unique),
+                ('company_id', '=', company.id),
+            ])
+        }
+        fresh = cache_model.browse([
+            cache.id for cache in caches.values() if cache.is_fresh()
+        ])
+        refresh_zone = fresh.filtered(lambda c: c.cache_tier == 'refresh')
+        refresh_zone.increment_access_count(refresh=True)
+        (fresh - refresh_zone).increment_access_count()
+
+        by_cedula = {
+            cache.cedula: self._cache_hit_result(self._parse_cache_record(cache), cache.cache_age_days)
+            for cache in fresh
+        }
+
+        # Steps 2-3: Hacienda / GoMeta for the misses, concurrently
+        misses = [cedula for cedula in unique if cedula not in by_cedula]
+        remote = self._lookup_remote_batch(misses, max_concurrent)
+
+        to_cache = {}
+        for cedula in misses:
+            success, value = remote[cedula]
+            if success:
+                source, hacienda_result, gometa_result = value
+            else:
+                source, gometa_result = False, {}
+                hacienda_result = {
+                    'success': False,
+                    'error': value,
+                    'error_type': ERROR_API_ERROR,
+                }
+
+            if source:
+                data = (hacienda_result if source == 'hacienda' else gometa_result)['data']
+                to_cache[cedula] = (self._prepare_cache_data(data), source)
+                by_cedula[cedula] = {
+                    'success': True,
+                    'source': source,
+                    'data': data,
+                    'cache_age_days': 0,
+                    'user_message': (
+                        _('Datos obtenidos de Hacienda.') if source == 'hacienda'
+                        else _('Datos obtenidos de fuente alternativa (GoMeta).')
+                    ),
+                }
+                continue
+
+            # Step 4: Stale cache from the prefetched entries
+            stale_result = self._stale_cache_result(caches.get(cedula, cache_model), cedula)
+            if stale_result['success']:
+                by_cedula[cedula] = stale_result
+            else:
+                by_cedula[cedula] = self._failed_result(hacienda_result, gometa_result)
+
+        # Write all API results to the cache at once
+        if to_cache:
+            try:
+                with self.env.cr.savepoint():
+                    cache_model.update_cache_bulk(to_cache, company=company)
+            except Exception as e:
+                _logger.error(f'Failed to cache batch lookup results: {str(e)}', exc_info=True)
+
         results = {}
         stats = {
             'cache_hits': 0,
@@ -523,52 +682,30 @@ class CedulaLookupService(models.AbstractModel):
             'success': 0,
             'failed': 0,
         }
-
-        _logger.info(f'Starting batch lookup for {len(cedulas)} cédulas')
-
-        for i, cedula in enumerate(cedulas):
-            try:
-                result = self.lookup_and_cache(cedula)
-                results[cedula] = result
-
-                # Update stats
-                if result['success']:
-                    stats['success'] += 1
-                    if result['source'] == 'cache':
-                        stats['cache_hits'] += 1
-                    elif result['source'] in ('hacienda', 'gometa'):
-                        stats['api_calls'] += 1
-                else:
-                    stats['failed'] += 1
-
-                # Progress logging
-                if (i + 1) % 10 == 0 or (i + 1) == len(cedulas):
-                    _logger.info(
-                        f'Batch lookup progress: {i + 1}/{len(cedulas)} '
-                        f'({stats["success"]} success, {stats["failed"]} failed)'
-                    )
-
-            except Exception as e:
-                _logger.error(f'Error in batch lookup for cédula {cedula}: {str(e)}')
-                results[cedula] = {
-                    'success': False,
-                    'error': str(e),
-                    'error_type': ERROR_API_ERROR,
-                }
+        for cedula, clean in clean_by_input.items():
+            result = by_cedula[clean] if clean else self._invalid_cedula_result()
+            results[cedula] = result
+            if result['success']:
+                stats['success'] += 1
+                if result['source'] == 'cache':
+                    stats['cache_hits'] += 1
+                elif result['source'] in ('hacienda', 'gometa'):
+                    stats['api_calls'] += 1
+            else:
                 stats['failed'] += 1
 
         elapsed_time = time.time() - start_time
 
         _logger.info(
-            f'Batch lookup complete: {len(cedulas)} cédulas in {elapsed_time:.2f}s. '
+            f'Batch lookup complete: {len(results)} cédulas in {elapsed_time:.2f}s. '
             f'Success: {stats["success"]}, Failed: {stats["failed"]}, '
-            f'Cache hit rate: {stats["cache_hits"] / len(cedulas) * 100:.1f}%'
+            f'Cache hit rate: {stats["cache_hits"] / len(results) * 100:.1f}%'
         )
 
         return {
             'results': results,
             'summary': {
-                'total': len(cedulas),
+                'total': len(results),
                 'success': stats['success'],
                 'failed': stats['failed'],
                 'cache_hits': stats['cache_hits'],
@@ -577,6 +714,61 @@ class CedulaLookupService(models.AbstractModel):
             'elapsed_time': round(elapsed_time, 2),
         }
 
+    @api.model
+    def _lookup_remote_batch(self, cedulas, max_concurrent=5):
+        """
+        Query Hacienda (then GoMeta) for many cédulas concurrently.
+
+        Each lookup runs in a worker thread with its own cursor and waits for
+        a shared rate limiter token, so the batch never exceeds the
+        application-wide Hacienda limit.
+
+        Args:
+            cedulas (list): Clean cédulas
+            max_concurrent (int): Maximum concurrent lookups
+
+        Returns:
+            dict: {cedula: (success, (source, hacienda_result, gometa_result) or error)}
+        """
+        if not cedulas:
+            return {}
+
+        company_id = self.env.company.id
+        token_timeout = float(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.cedula_batch_token_timeout', 30
+        ))
+
+        def lookup(worker_env, cedula):
+            service = worker_env['l10n_cr.cedula.lookup.service'].with_company(company_id)
+            return service._lookup_remote(cedula, token_timeout=token_timeout)
+
+        return run_in_worker_pool(self.env, cedulas, lookup, max_workers=max_concurrent)
+
+    def _lookup_remote(self, cedula, token_timeout=0.5):
+        """
+        Run the API steps of the waterfall (Hacienda, then GoMeta) for one cédula.
+
+        Does not touch the cache.
+
+        Args:
+            cedula (str): Clean cédula
+            token_timeout (float): Seconds to wait for a rate limiter token
+
+        Returns:
+            tuple: (source or False, hacienda_result, gometa_result)
+        """
+        hacienda_result = self._lookup_hacienda(cedula, token_timeout=token_timeout)
+        if hacienda_result['success']:
+            return 'hacienda', hacienda_result, {}
+
+        gometa_result = {'success': False, 'error_type': 'disabled'}
+        if self._is_gometa_enabled():
+            gometa_result = self._lookup_gometa(cedula)
+            if gometa_result['success']:
+                return 'gometa', hacienda_result, gometa_result
+
+        return False, hacienda_result, gometa_result
+
     # =============================================================================
     # HELPER METHODS - Data Normalization
     # =============================================================================
@@ -669,24 +861,7 @@ class CedulaLookupService(models.AbstractModel):
         Returns:
             dict: Normalized data structure
         """
-        # Parse economic activities from JSON
-        economic_activities = []
-        if cache.economic_activities:
-            try:
-                economic_activities = json.loads(cache.economic_activities)
-            except json.JSONDecodeError:
-                _logger.warning(f'Failed to parse activities JSON for cédula {cache.cedula}')
-
-        return {
-            'cedula': cache.cedula,
-            'name': cache.name,
-            'company_type': cache.company_type,
-            'tax_regime': cache.tax_regime or '',
-            'tax_status': cache.tax_status,
-            'economic_activities': economic_activities,
-            'primary_activity': cache.primary_activity,
-            'ciiu_code_id': cache.ciiu_code_id.id if cache.ciiu_code_id else False,
-        }
+        return cache._parse_lookup_data()
 
     # =============================================================================
     # HELPER METHODS - Cache Management
@@ -705,8 +880,13 @@ class CedulaLookupService(models.AbstractModel):
             l10n_cr.cedula.cache: Cache record (created or updated)
         """
         cache_model = self.env['l10n_cr.cedula.cache']
+        cache = cache_model.update_cache(cedula, self._prepare_cache_data(data), source=source)
+
+        return cache
 
-        cache_data = {
+    def _prepare_cache_data(self, data):
+        """Select the fields of normalized lookup data stored in the cache."""
+        return {
             'name': data.get('name'),
             'company_type': data.get('company_type'),
             'tax_regime': data.get('tax_regime'),
@@ -715,10 +895,6 @@ class CedulaLookupService(models.AbstractModel):
             'raw_response': data.get('raw_response'),
         }
 
-        cache = cache_model.update_cache(cedula, cache_data, source=source)
-
-        return cache
-
     # =============================================================================
     # HELPER METHODS - Utilities
     # =============================================================================
@@ -911,6 +1087,7 @@ class CedulaLookupService(models.AbstractModel):
             'is_fresh': is_fresh,
             'is_stale': is_stale,
             'cache_age_days': cache_age_days,
+            'revalidating': result.get('revalidating', False),
             'warning': result.get('warning'),
         }
 
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import base64
+import hashlib
 import logging
+import threading
 from datetime import datetime
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
@@ -12,6 +14,14 @@ from odoo.exceptions import UserError, ValidationError
 
 _logger = logging.getLogger(__name__)
 
+# Loaded certificates per worker process:
+# {company_id: {'fingerprint': tuple, 'certificate': x509.Certificate,
+#               'private_key': PrivateKey, 'not_before': datetime, 'not_after': datetime}}
+# Decoding a PKCS#12 file runs a full key derivation (PBKDF) and key parse,
+# so it is done once per certificate instead of once per signature.
+_CERT_CACHE = {}
+_CERT_CACHE_LOCK = threading.Lock()
+
 
 class CertificateManager(models.AbstractModel):
     """
@@ -28,8 +38,13 @@ class CertificateManager(models.AbstractModel):
         """
         Load and validate certificate from company configuration.
 
+        Loaded pairs are cached per worker, keyed by company and the checksum
+        of the certificate material; the cache entry is replaced when the
+        certificate, key or password changes and dropped when the
+        certificate expires.
+
         Args:
-            company: res.company record
+            company: res.company record (or ID)
 
         Returns:
             tuple: (certificate, private_key) as cryptography objects
@@ -37,12 +52,34 @@ class CertificateManager(models.AbstractModel):
         Raises:
             UserError: If certificate is missing or invalid
         """
+        if isinstance(company, int):
+            company = self.env['res.company'].browse(company)
+
+        fingerprint = self._get_certificate_fingerprint(company)
+        cached = self._get_cached_certificate(company.id, fingerprint)
+        if cached:
+            return cached
+
         if not company.l10n_cr_active_certificate:
             raise UserError(_(
                 'Digital certificate not configured for company %s. '
                 'Please upload your X.509 certificate in company settings.'
             ) % company.name)
 
+        certificate, private_key = self._load_certificate_uncached(company)
+
+        with _CERT_CACHE_LOCK:
+            _CERT_CACHE[company.id] = {
+                'fingerprint': fingerprint,
+                'certificate': certificate,
+                'private_key': private_key,
+                'not_before': certificate.not_valid_before,
+                'not_after': certificate.not_valid_after,
+            }
+        return certificate, private_key
+
+    def _load_certificate_uncached(self, company):
+        """Decode the company's certificate and private key (no caching)."""
         try:
             # Decode certificate data
             cert_data = base64.b64decode(company.l10n_cr_active_certificate)
@@ -83,6 +120,74 @@ class CertificateManager(models.AbstractModel):
                 'Please verify the certificate file and password are correct.'
             ) % str(e))
 
+    def _get_certificate_fingerprint(self, company):
+        """
+        Identify the certificate material currently configured on a company.
+
+        Uses the checksums of the attachments storing the certificate and
+        private key (no file read), plus a hash of the key password and the
+        file name, so any change to them yields a different fingerprint.
+
+        Args:
+            company: res.company record
+
+        Returns:
+            tuple: Hashable fingerprint
+        """
+        prefix = 'l10n_cr_prod_' if company.l10n_cr_hacienda_env == 'production' else 'l10n_cr_'
+        cert_field = prefix + 'certificate'
+        key_field = prefix + 'private_key'
+
+        attachments = self.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', 'res.company'),
+            ('res_id', '=', company.id),
+            ('res_field', 'in', [cert_field, key_field]),
+        ], ['res_field', 'checksum'])
+        checksums = {att['res_field']: att['checksum'] for att in attachments}
+
+        cert_checksum = checksums.get(cert_field)
+        if not cert_checksum:
+            # Not stored as an attachment: hash the value itself
+            cert_checksum = hashlib.sha1(company.l10n_cr_active_certificate or b'').hexdigest()
+
+        password = company.l10n_cr_active_key_password or ''
+        return (
+            cert_checksum,
+            checksums.get(key_field),
+            company.l10n_cr_active_certificate_filename or '',
+            hashlib.sha256(password.encode('utf-8')).hexdigest(),
+        )
+
+    def _get_cached_certificate(self, company_id, fingerprint):
+        """
+        Return the cached (certificate, private_key) pair, or None.
+
+        Entries for other certificate material, and certificates outside
+        their validity period, are dropped so the caller reloads (and
+        re-validates) them.
+        """
+        with _CERT_CACHE_LOCK:
+            entry = _CERT_CACHE.get(company_id)
+            if not entry:
+                return None
+            if entry['fingerprint'] != fingerprint:
+                _CERT_CACHE.pop(company_id, None)
+                return None
+            now = datetime.utcnow()
+            if not (entry['not_before'] <= now <= entry['not_after']):
+                _CERT_CACHE.pop(company_id, None)
+                return None
+            return entry['certificate'], entry['private_key']
+
+    @api.model
+    def invalidate_certificate_cache(self, company_id=None):
+        """Drop cached certificates of one company, or of all companies."""
+        with _CERT_CACHE_LOCK:
+            if company_id:
+                _CERT_CACHE.pop(company_id, None)
+            else:
+                _CERT_CACHE.clear()
+
     def _load_pkcs12_certificate(self, cert_data, password):
         """
         Load certificate and private key from PKCS#12 (.p12) format.
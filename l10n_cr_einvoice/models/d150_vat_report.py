@@ -1,8 +1,85 @@
 # -*- coding: utf-8 -*-
+import json
+import logging
+from datetime import timedelta
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 from dateutil.relativedelta import relativedelta
 
+_logger = logging.getLogger(__name__)
+
+SALES_MOVE_TYPES = ('out_invoice', 'out_refund')
+PURCHASE_MOVE_TYPES = ('in_invoice', 'in_refund')
+# Incremental recalculation rescans moves written this long before the last
+# calculation, for transactions that started before it but committed after
+RECALCULATION_OVERLAP = timedelta(minutes=10)
+# Rates (int(tax.amount)) reported in the sales section; other taxes are ignored
+SALES_RATES = (13, 4, 2, 1, 0)
+
+SALES_FIELDS = (
+    'sales_13_base', 'sales_13_tax', 'sales_4_base', 'sales_4_tax',
+    'sales_2_base', 'sales_2_tax', 'sales_1_base', 'sales_1_tax', 'sales_exempt',
+    'credit_notes_13_base', 'credit_notes_13_tax', 'credit_notes_4_base', 'credit_notes_4_tax',
+    'credit_notes_2_base', 'credit_notes_2_tax', 'credit_notes_1_base', 'credit_notes_1_tax',
+)
+PURCHASE_FIELDS = (
+    'purchases_goods_13_base', 'purchases_goods_13_tax',
+    'purchases_services_13_base', 'purchases_services_13_tax',
+    'purchases_4_base', 'purchases_4_tax', 'purchases_2_base', 'purchases_2_tax',
+    'purchases_1_base', 'purchases_1_tax', 'purchases_exempt',
+)
+
+# One row per (move, kind, rate bucket). 'base' rows carry the line subtotals
+# bucketed by the highest reported rate of each line (counted once), 'tax'
+# rows carry the subtotals once per non-zero tax of the line.
+_AGGREGATE_LINES_QUERY = """
+    WITH line AS (
+        SELECT aml.id, aml.move_id, move.move_type,
+               COALESCE(aml.price_subtotal, 0) AS subtotal,
+               COALESCE(tmpl.type = 'service', FALSE) AS is_service
+          FROM account_move_line aml
+          JOIN account_move move ON move.id = aml.move_id
+     LEFT JOIN product_product product ON product.id = aml.product_id
+     LEFT JOIN product_template tmpl ON tmpl.id = product.product_tmpl_id
+         WHERE move.company_id = %(company_id)s
+           AND move.move_type IN %(move_types)s
+           AND move.state = 'posted'
+           AND move.invoice_date >= %(date_from)s
+           AND move.invoice_date <= %(date_to)s
+           AND aml.display_type = 'product'
+           AND (%(all_moves)s OR move.id = ANY(%(move_ids)s))
+    ),
+    line_tax AS (
+        SELECT rel.account_move_line_id AS line_id,
+               TRUNC(tax.amount)::int AS rate
+          FROM line
+          JOIN account_move_line_account_tax_rel rel ON rel.account_move_line_id = line.id
+          JOIN account_tax tax ON tax.id = rel.account_tax_id
+    ),
+    line_rate AS (
+        SELECT line_id,
+               MAX(rate) FILTER (WHERE %(all_rates)s OR rate = ANY(%(rates)s)) AS rate
+          FROM line_tax
+         GROUP BY line_id
+    )
+    SELECT 'base', line.move_id, line.move_type, line.is_service,
+           line_rate.rate, line_rate.line_id IS NOT NULL,
+           SUM(line.subtotal), SUM(ABS(line.subtotal))
+      FROM line
+ LEFT JOIN line_rate ON line_rate.line_id = line.id
+  GROUP BY 2, 3, 4, 5, 6
+ UNION ALL
+    SELECT 'tax', line.move_id, line.move_type, line.is_service,
+           line_tax.rate, TRUE,
+           SUM(line.subtotal), SUM(ABS(line.subtotal))
+      FROM line
+      JOIN line_tax ON line_tax.line_id = line.id
+     WHERE line_tax.rate <> 0
+       AND (%(all_rates)s OR line_tax.rate = ANY(%(rates)s))
+  GROUP BY 2, 3, 4, 5
+"""
+
 
 class D150VATReport(models.Model):
     """
@@ -350,6 +427,21 @@ class D150VATReport(models.Model):
         help='Internal notes about this declaration'
     )
 
+    calculated_at = fields.Datetime(
+        string='Calculated At',
+        readonly=True,
+        copy=False,
+        help='Date/time of the last calculation (start point of incremental recalculation)'
+    )
+
+    move_contributions = fields.Text(
+        string='Move Contributions',
+        readonly=True,
+        copy=False,
+        help='JSON {move_id: {field: amount}} of the last calculation, '
+             'used to re-aggregate only the moves changed since then'
+    )
+
     # =====================================================
     # COMPUTED FIELDS
     # =====================================================
@@ -492,10 +584,12 @@ class D150VATReport(models.Model):
             raise UserError(_('Period is required to calculate the report.'))
 
         # Calculate sales from customer invoices
-        self._calculate_sales()
+        contributions = self._calculate_sales()
 
         # Calculate purchases from vendor bills
-        self._calculate_purchases()
+        contributions.update(self._calculate_purchases())
+
+        self._apply_contributions(contributions)
 
         # Get previous period balance if exists
         self._get_previous_balance()
@@ -505,196 +599,216 @@ class D150VATReport(models.Model):
 
         return True
 
-    def _calculate_sales(self):
-        """Calculate sales VAT from customer invoices"""
+    def action_recalculate_changes(self):
+        """
+        Incrementally recalculate the report.
+
+        Only invoices and bills created, modified, cancelled or deleted since
+        the last calculation are re-aggregated; the other moves keep the
+        contribution stored by that calculation. Changes that do not touch
+        the moves themselves (e.g. editing a tax rate) require a full
+        action_calculate().
+        """
         self.ensure_one()
 
-        AccountMove = self.env['account.move']
+        if not self.period_id:
+            raise UserError(_('Period is required to calculate the report.'))
 
-        # Get all customer invoices in period that are posted
-        invoices = AccountMove.search([
-            ('company_id', '=', self.company_id.id),
-            ('move_type', 'in', ['out_invoice', 'out_refund']),
-            ('state', '=', 'posted'),
-            ('invoice_date', '>=', self.period_id.date_from),
-            ('invoice_date', '<=', self.period_id.date_to),
-        ])
-
-        # Initialize totals by rate
-        sales_by_rate = {
-            13: {'base': 0.0, 'tax': 0.0},
-            4: {'base': 0.0, 'tax': 0.0},
-            2: {'base': 0.0, 'tax': 0.0},
-            1: {'base': 0.0, 'tax': 0.0},
-            0: {'base': 0.0},  # Exempt
-        }
+        if not self.calculated_at or not self.move_contributions:
+            return self.action_calculate()
 
-        credit_notes = {
-            13: {'base': 0.0, 'tax': 0.0},
-            4: {'base': 0.0, 'tax': 0.0},
-            2: {'base': 0.0, 'tax': 0.0},
-            1: {'base': 0.0, 'tax': 0.0},
+        contributions = {
+            int(move_id): values
+            for move_id, values in json.loads(self.move_contributions).items()
         }
+        changed_ids = self._get_changed_move_ids(list(contributions))
+        for move_id in changed_ids:
+            contributions.pop(move_id, None)
+        if changed_ids:
+            contributions.update(self._calculate_sales(move_ids=changed_ids))
+            contributions.update(self._calculate_purchases(move_ids=changed_ids))
+
+        self._apply_contributions(contributions)
+        self._get_previous_balance()
 
-        # Aggregate invoices by tax rate
-        for invoice in invoices:
-            is_refund = invoice.move_type == 'out_refund'
+        self.state = 'calculated'
+        self.message_post(body=_('Report recalculated (%d changed documents)') % len(changed_ids))
+        return True
 
-            for line in invoice.invoice_line_ids:
-                if not line.tax_ids:
-                    # No tax = exempt sale
-                    if is_refund:
-                        sales_by_rate[0]['base'] -= abs(line.price_subtotal)
-                    else:
-                        sales_by_rate[0]['base'] += line.price_subtotal
-                    continue
+    def _get_changed_move_ids(self, known_move_ids):
+        """
+        Find the moves to re-aggregate since the last calculation.
 
-                # Determine the primary tax rate for base categorization.
-                # In Costa Rica IVA, each invoice line typically has exactly
-                # one VAT tax. If a line has multiple taxes, we use the
-                # highest rate to categorize the base (counted once), and
-                # compute each tax's proportional amount individually.
-                vat_taxes = []
-                for tax in line.tax_ids:
-                    rate = int(tax.amount) if tax.amount else 0
-                    if rate in sales_by_rate:
-                        vat_taxes.append((rate, tax))
-
-                if not vat_taxes:
-                    continue
+        Args:
+            known_move_ids (list): Moves contributing to the last calculation
 
-                # Use the highest rate to categorize the base amount (once)
-                primary_rate = max(r for r, _ in vat_taxes)
-                base_amount = abs(line.price_subtotal)
+        Returns:
+            list: Moves written since the last calculation (minus
+                RECALCULATION_OVERLAP) that either contributed to it or now
+                fall in the period, plus contributing moves that no longer exist
+        """
+        self.env['account.move'].flush_model()
+        self.env.cr.execute("""
+            SELECT id
+              FROM account_move
+             WHERE company_id = %s
+               AND move_type IN %s
+               AND write_date >= %s
+               AND (id = ANY(%s)
+                    OR (state = 'posted' AND invoice_date >= %s AND invoice_date <= %s))
+        """, (
+            self.company_id.id,
+            SALES_MOVE_TYPES + PURCHASE_MOVE_TYPES,
+            self.calculated_at - RECALCULATION_OVERLAP,
+            known_move_ids,
+            self.period_id.date_from,
+            self.period_id.date_to,
+        ))
+        changed = {row[0] for row in self.env.cr.fetchall()}
+        existing = set(self.env['account.move'].browse(known_move_ids).exists().ids)
+        changed.update(set(known_move_ids) - existing)
+        return sorted(changed)
+
+    def _aggregate_move_lines(self, move_types, rates=None, move_ids=None):
+        """
+        Aggregate posted invoice lines of the period in one grouped query.
 
-                if is_refund:
-                    if primary_rate in credit_notes:
-                        credit_notes[primary_rate]['base'] += base_amount
-                elif primary_rate == 0:
-                    sales_by_rate[0]['base'] += line.price_subtotal
-                else:
-                    sales_by_rate[primary_rate]['base'] += line.price_subtotal
+        Args:
+            move_types (tuple): account.move move_type values
+            rates (tuple): Tax rates taken into account (None: all rates)
+            move_ids (list): Restrict to these moves (None: whole period)
+
+        Returns:
+            list: (kind, move_id, move_type, is_service, rate, has_tax,
+                subtotal, abs_subtotal) rows, see _AGGREGATE_LINES_QUERY
+        """
+        self.env['account.move'].flush_model()
+        self.env['account.move.line'].flush_model(['move_id', 'price_subtotal', 'display_type', 'product_id', 'tax_ids'])
+        self.env['account.tax'].flush_model(['amount'])
+        self.env['product.template'].flush_model(['type'])
+
+        self.env.cr.execute(_AGGREGATE_LINES_QUERY, {
+            'company_id': self.company_id.id,
+            'move_types': tuple(move_types),
+            'date_from': self.period_id.date_from,
+            'date_to': self.period_id.date_to,
+            'all_moves': move_ids is None,
+            'move_ids': list(move_ids or []),
+            'all_rates': rates is None,
+            'rates': list(rates or []),
+        })
+        return self.env.cr.fetchall()
+
+    def _calculate_sales(self, move_ids=None):
+        """
+        Calculate sales VAT from customer invoices and credit notes.
 
-                # Compute tax amount per tax (each tax contributes its own rate)
-                for rate, tax in vat_taxes:
+        Each line's base is counted once under its highest rate; every
+        reported tax of the line adds its own rate's VAT. Credit notes are
+        reported in absolute values, lines without tax as exempt.
+
+        Args:
+            move_ids (list): Restrict to these moves (None: whole period)
+
+        Returns:
+            dict: {move_id: {field: amount}}
+        """
+        self.ensure_one()
+
+        contributions = {}
+        for kind, move_id, move_type, _is_service, rate, has_tax, subtotal, abs_subtotal in \
+                self._aggregate_move_lines(SALES_MOVE_TYPES, SALES_RATES, move_ids):
+            subtotal, abs_subtotal = float(subtotal), float(abs_subtotal)
+            is_refund = move_type == 'out_refund'
+
+            if kind == 'base':
+                if not has_tax:
+                    # No tax = exempt sale
+                    field, amount = 'sales_exempt', -abs_subtotal if is_refund else subtotal
+                elif rate is None:
+                    # Only taxes outside the D-150 rates
+                    continue
+                elif is_refund:
                     if rate == 0:
                         continue
-                    tax_amount = line.price_subtotal * (rate / 100.0)
-                    if is_refund:
-                        if rate in credit_notes:
-                            credit_notes[rate]['tax'] += abs(tax_amount)
-                    else:
-                        sales_by_rate[rate]['tax'] += tax_amount
-
-        # Assign to fields
-        self.sales_13_base = sales_by_rate[13]['base']
-        self.sales_13_tax = sales_by_rate[13]['tax']
-        self.sales_4_base = sales_by_rate[4]['base']
-        self.sales_4_tax = sales_by_rate[4]['tax']
-        self.sales_2_base = sales_by_rate[2]['base']
-        self.sales_2_tax = sales_by_rate[2]['tax']
-        self.sales_1_base = sales_by_rate[1]['base']
-        self.sales_1_tax = sales_by_rate[1]['tax']
-        self.sales_exempt = sales_by_rate[0]['base']
-
-        self.credit_notes_13_base = credit_notes[13]['base']
-        self.credit_notes_13_tax = credit_notes[13]['tax']
-        self.credit_notes_4_base = credit_notes[4]['base']
-        self.credit_notes_4_tax = credit_notes[4]['tax']
-        self.credit_notes_2_base = credit_notes[2]['base']
-        self.credit_notes_2_tax = credit_notes[2]['tax']
-        self.credit_notes_1_base = credit_notes[1]['base']
-        self.credit_notes_1_tax = credit_notes[1]['tax']
-
-    def _calculate_purchases(self):
-        """Calculate purchase VAT credit from vendor bills and vendor refunds"""
-        self.ensure_one()
+                    field, amount = 'credit_notes_%d_base' % rate, abs_subtotal
+                elif rate == 0:
+                    field, amount = 'sales_exempt', subtotal
+                else:
+                    field, amount = 'sales_%d_base' % rate, subtotal
+            elif is_refund:
+                field, amount = 'credit_notes_%d_tax' % rate, abs_subtotal * (rate / 100.0)
+            else:
+                field, amount = 'sales_%d_tax' % rate, subtotal * (rate / 100.0)
 
-        AccountMove = self.env['account.move']
+            values = contributions.setdefault(move_id, {})
+            values[field] = values.get(field, 0.0) + amount
 
-        # Get all vendor bills and vendor refunds in period that are posted
-        bills = AccountMove.search([
-            ('company_id', '=', self.company_id.id),
-            ('move_type', 'in', ['in_invoice', 'in_refund']),
-            ('state', '=', 'posted'),
-            ('invoice_date', '>=', self.period_id.date_from),
-            ('invoice_date', '<=', self.period_id.date_to),
-        ])
-
-        # Initialize totals
-        purchases_by_rate = {
-            13: {'goods': 0.0, 'services': 0.0, 'goods_tax': 0.0, 'services_tax': 0.0},
-            4: {'base': 0.0, 'tax': 0.0},
-            2: {'base': 0.0, 'tax': 0.0},
-            1: {'base': 0.0, 'tax': 0.0},
-            0: {'base': 0.0},
-        }
+        return contributions
 
-        # Aggregate by tax rate
-        for bill in bills:
-            # Vendor refunds (in_refund) reduce purchase totals
-            sign = -1.0 if bill.move_type == 'in_refund' else 1.0
+    def _calculate_purchases(self, move_ids=None):
+        """
+        Calculate purchase VAT credit from vendor bills and vendor refunds.
 
-            for line in bill.invoice_line_ids:
-                if not line.tax_ids:
-                    # No tax = exempt
-                    purchases_by_rate[0]['base'] += line.price_subtotal * sign
-                    continue
+        13% purchases are split into goods and services by product type;
+        vendor refunds reduce the totals.
 
-                # Determine tax-specific amounts to avoid double-counting base
-                # when a line has multiple taxes
-                vat_taxes = []
-                for tax in line.tax_ids:
-                    rate = int(tax.amount) if tax.amount else 0
-                    vat_taxes.append((rate, tax))
+        Args:
+            move_ids (list): Restrict to these moves (None: whole period)
 
-                if not vat_taxes:
+        Returns:
+            dict: {move_id: {field: amount}}
+        """
+        self.ensure_one()
+
+        contributions = {}
+        for kind, move_id, move_type, is_service, rate, has_tax, subtotal, _abs_subtotal in \
+                self._aggregate_move_lines(PURCHASE_MOVE_TYPES, None, move_ids):
+            # Vendor refunds (in_refund) reduce purchase totals
+            sign = -1.0 if move_type == 'in_refund' else 1.0
+            subtotal = float(subtotal)
+
+            if kind == 'base':
+                if not has_tax or rate == 0:
+                    field = 'purchases_exempt'
+                elif rate == 13:
+                    field = 'purchases_services_13_base' if is_service else 'purchases_goods_13_base'
+                elif rate in (4, 2, 1):
+                    field = 'purchases_%d_base' % rate
+                else:
+                    continue
+                amount = subtotal * sign
+            else:
+                if rate == 13:
+                    field = 'purchases_services_13_tax' if is_service else 'purchases_goods_13_tax'
+                elif rate in (4, 2, 1):
+                    field = 'purchases_%d_tax' % rate
+                else:
                     continue
+                amount = subtotal * (rate / 100.0) * sign
 
-                # Use the highest rate to categorize the base amount (once)
-                primary_rate = max(r for r, _ in vat_taxes)
-                base_amount = line.price_subtotal * sign
-
-                if primary_rate == 13:
-                    # Classify as goods or services using product type
-                    if line.product_id and line.product_id.type == 'service':
-                        purchases_by_rate[13]['services'] += base_amount
-                    else:
-                        purchases_by_rate[13]['goods'] += base_amount
-                elif primary_rate in (4, 2, 1):
-                    purchases_by_rate[primary_rate]['base'] += base_amount
-                elif primary_rate == 0:
-                    purchases_by_rate[0]['base'] += base_amount
-
-                # Compute tax amount per tax rate
-                for rate, tax in vat_taxes:
-                    if rate == 0:
-                        continue
-                    tax_amount = line.price_subtotal * (rate / 100.0) * sign
-                    if rate == 13:
-                        if line.product_id and line.product_id.type == 'service':
-                            purchases_by_rate[13]['services_tax'] += tax_amount
-                        else:
-                            purchases_by_rate[13]['goods_tax'] += tax_amount
-                    elif rate in (4, 2, 1):
-                        purchases_by_rate[rate]['tax'] += tax_amount
-
-        # Update fields
-        self.purchases_goods_13_base = purchases_by_rate[13]['goods']
-        self.purchases_goods_13_tax = purchases_by_rate[13]['goods_tax']
-        self.purchases_services_13_base = purchases_by_rate[13]['services']
-        self.purchases_services_13_tax = purchases_by_rate[13]['services_tax']
-
-        self.purchases_4_base = purchases_by_rate[4]['base']
-        self.purchases_4_tax = purchases_by_rate[4]['tax']
-
-        self.purchases_2_base = purchases_by_rate[2]['base']
-        self.purchases_2_tax = purchases_by_rate[2]['tax']
-
-        self.purchases_1_base = purchases_by_rate[1]['base']
-        self.purchases_1_tax = purchases_by_rate[1]['tax']
-
-        self.purchases_exempt = purchases_by_rate[0]['base']
+            values = contributions.setdefault(move_id, {})
+            values[field] = values.get(field, 0.0) + amount
+
+        return contributions
+
+    def _apply_contributions(self, contributions):
+        """
+        Write the report totals from per-move contributions.
+
+        Args:
+            contributions (dict): {move_id: {field: amount}}
+        """
+        vals = dict.fromkeys(SALES_FIELDS + PURCHASE_FIELDS, 0.0)
+        for values in contributions.values():
+            for field, amount in values.items():
+                vals[field] += amount
+
+        vals.update({
+            'calculated_at': self.env.cr.now(),
+            'move_contributions': json.dumps(contributions),
+        })
+        self.write(vals)
 
     def _get_previous_balance(self):
         """Get VAT balance from previous month to carry forward"""
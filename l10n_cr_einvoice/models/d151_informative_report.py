@@ -6,6 +6,12 @@ from odoo.exceptions import UserError, ValidationError
 
 _logger = logging.getLogger(__name__)
 
+D151_LINE_MODELS = (
+    'l10n_cr.d151.customer.line',
+    'l10n_cr.d151.supplier.line',
+    'l10n_cr.d151.expense.line',
+)
+
 
 class D151InformativeReport(models.Model):
     """
@@ -225,9 +231,7 @@ class D151InformativeReport(models.Model):
             raise UserError(_('Period is required to calculate the report.'))
 
         # Clear existing lines
-        self.customer_line_ids.unlink()
-        self.supplier_line_ids.unlink()
-        self.expense_line_ids.unlink()
+        self._delete_report_lines()
 
         # Calculate customer lines (sales above threshold)
         self._calculate_customer_lines()
@@ -276,21 +280,17 @@ class D151InformativeReport(models.Model):
             self.threshold_amount,
         ))
 
-        CustomerLine = self.env['l10n_cr.d151.customer.line']
-
-        for row in self.env.cr.fetchall():
-            partner_id, total_sales, invoice_count = row
+        rows = self.env.cr.fetchall()
+        partners = self._read_partner_data([row[0] for row in rows])
 
-            partner = self.env['res.partner'].browse(partner_id)
-
-            CustomerLine.create({
-                'report_id': self.id,
-                'partner_id': partner_id,
-                'partner_vat': partner.vat or '',
-                'partner_name': partner.name,
-                'total_amount': total_sales,
-                'transaction_count': invoice_count,
-            })
+        self.env['l10n_cr.d151.customer.line'].create([{
+            'report_id': self.id,
+            'partner_id': partner_id,
+            'partner_vat': partners[partner_id]['vat'] or '',
+            'partner_name': partners[partner_id]['name'],
+            'total_amount': total_sales,
+            'transaction_count': invoice_count,
+        } for partner_id, total_sales, invoice_count in rows])
 
     def _calculate_supplier_lines(self):
         """
@@ -323,21 +323,17 @@ class D151InformativeReport(models.Model):
             self.threshold_amount,
         ))
 
-        SupplierLine = self.env['l10n_cr.d151.supplier.line']
-
-        for row in self.env.cr.fetchall():
-            partner_id, total_purchases, bill_count = row
-
-            partner = self.env['res.partner'].browse(partner_id)
+        rows = self.env.cr.fetchall()
+        partners = self._read_partner_data([row[0] for row in rows])
 
-            SupplierLine.create({
-                'report_id': self.id,
-                'partner_id': partner_id,
-                'partner_vat': partner.vat or '',
-                'partner_name': partner.name,
-                'total_amount': total_purchases,
-                'transaction_count': bill_count,
-            })
+        self.env['l10n_cr.d151.supplier.line'].create([{
+            'report_id': self.id,
+            'partner_id': partner_id,
+            'partner_vat': partners[partner_id]['vat'] or '',
+            'partner_name': partners[partner_id]['name'],
+            'total_amount': total_purchases,
+            'transaction_count': bill_count,
+        } for partner_id, total_purchases, bill_count in rows])
 
     def _calculate_expense_lines(self):
         """
@@ -399,8 +395,6 @@ class D151InformativeReport(models.Model):
             self.specific_expense_threshold,
         ))
 
-        ExpenseLine = self.env['l10n_cr.d151.expense.line']
-
         # Aggregate by partner and expense type
         partner_expenses = {}  # {(partner_id, expense_type): {amount, count}}
 
@@ -417,21 +411,56 @@ class D151InformativeReport(models.Model):
             partner_expenses[key]['count'] += transaction_count
 
         # Create expense lines for amounts above threshold
-        for (partner_id, expense_type), data in partner_expenses.items():
-            if abs(data['amount']) < self.specific_expense_threshold:
-                continue
-
-            partner = self.env['res.partner'].browse(partner_id)
-
-            ExpenseLine.create({
-                'report_id': self.id,
-                'partner_id': partner_id,
-                'partner_vat': partner.vat or '',
-                'partner_name': partner.name,
-                'expense_type': expense_type,
-                'total_amount': data['amount'],
-                'transaction_count': data['count'],
-            })
+        reported = {
+            key: data for key, data in partner_expenses.items()
+            if abs(data['amount']) >= self.specific_expense_threshold
+        }
+        partners = self._read_partner_data([partner_id for partner_id, _type in reported])
+
+        self.env['l10n_cr.d151.expense.line'].create([{
+            'report_id': self.id,
+            'partner_id': partner_id,
+            'partner_vat': partners[partner_id]['vat'] or '',
+            'partner_name': partners[partner_id]['name'],
+            'expense_type': expense_type,
+            'total_amount': data['amount'],
+            'transaction_count': data['count'],
+        } for (partner_id, expense_type), data in reported.items()])
+
+    def _read_partner_data(self, partner_ids):
+        """
+        Read VAT and name of the reported partners with one query.
+
+        Args:
+            partner_ids (list): res.partner IDs
+
+        Returns:
+            dict: {partner_id: {'vat': str|False, 'name': str}}
+        """
+        partners = self.env['res.partner'].browse(list(set(partner_ids)))
+        return {data['id']: data for data in partners.read(['vat', 'name'])}
+
+    def _delete_report_lines(self):
+        """
+        Delete all customer, supplier and expense lines of this report.
+
+        One DELETE per line table instead of loading the lines to unlink
+        them; the lines have no unlink logic of their own.
+        """
+        self.ensure_one()
+        for model_name in D151_LINE_MODELS:
+            Line = self.env[model_name]
+            Line.check_access('unlink')
+            Line.flush_model()
+            self.env.cr.execute(
+                f'DELETE FROM {Line._table} WHERE report_id = %s', (self.id,)
+            )
+            Line.invalidate_model()
+
+        line_fields = ['customer_line_ids', 'supplier_line_ids', 'expense_line_ids']
+        self.invalidate_recordset(line_fields)
+        # Stored statistics depend on the lines: recompute them
+        self.modified(line_fields)
 
     def _classify_expense_type(self, account_name):
         """
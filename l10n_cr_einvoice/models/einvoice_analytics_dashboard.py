@@ -20,6 +20,10 @@ class EInvoiceAnalyticsDashboard(models.Model):
         """
         Get real-time KPIs for the dashboard.
 
+        Document figures come from the daily rollup (kept current by its cron), so
+        the cost depends on the number of days, not of documents. The range
+        is applied per day: both bounds are inclusive dates.
+
         Args:
             date_from: Start date for filtering (default: 30 days ago)
             date_to: End date for filtering (default: today)
@@ -35,25 +39,45 @@ class EInvoiceAnalyticsDashboard(models.Model):
         if not date_to:
             date_to = fields.Datetime.to_string(datetime.now())
 
-        # Build domain for date filtering
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ]
-
-        # Get all documents in range
-        Document = self.env['l10n_cr.einvoice.document']
-        all_docs = Document.search(domain)
+        Rollup = self.env['l10n_cr.einvoice.daily.rollup']
+        Rollup._ensure_fresh()
+
+        self.env.cr.execute(f"""
+            SELECT state, document_type,
+                   SUM(document_count) AS count,
+                   SUM(amount_total) AS amount,
+                   SUM(email_sent_count) AS email_sent,
+                   SUM(processing_count) AS processing_count,
+                   SUM(processing_minutes) AS processing_minutes
+              FROM {Rollup._table}
+             WHERE date >= %s AND date <= %s
+               AND company_id IN %s
+          GROUP BY state, document_type
+        """, (
+            fields.Date.to_date(date_from),
+            fields.Date.to_date(date_to),
+            tuple(self.env.companies.ids),
+        ))
+
+        state_counts = {}
+        type_counts = {}
+        revenue = {}
+        email_sent_count = 0
+        processing_count = 0
+        processing_minutes = 0.0
+        for row in self.env.cr.dictfetchall():
+            state_counts[row['state']] = state_counts.get(row['state'], 0) + row['count']
+            type_counts[row['document_type']] = type_counts.get(row['document_type'], 0) + row['count']
+            revenue[row['document_type']] = revenue.get(row['document_type'], 0.0) + float(row['amount'] or 0)
+            email_sent_count += row['email_sent']
+            processing_count += row['processing_count']
+            processing_minutes += float(row['processing_minutes'] or 0)
 
         # Total counts by status
-        total_count = len(all_docs)
-        draft_count = len(all_docs.filtered(lambda x: x.state == 'draft'))
-        generated_count = len(all_docs.filtered(lambda x: x.state == 'generated'))
-        signed_count = len(all_docs.filtered(lambda x: x.state == 'signed'))
-        submitted_count = len(all_docs.filtered(lambda x: x.state == 'submitted'))
-        accepted_count = len(all_docs.filtered(lambda x: x.state == 'accepted'))
-        rejected_count = len(all_docs.filtered(lambda x: x.state == 'rejected'))
-        error_count = len(all_docs.filtered(lambda x: x.state == 'error'))
+        total_count = sum(state_counts.values())
+        submitted_count = state_counts.get('submitted', 0)
+        accepted_count = state_counts.get('accepted', 0)
+        rejected_count = state_counts.get('rejected', 0)
 
         # Acceptance rate calculation
         submitted_total = submitted_count + accepted_count + rejected_count
@@ -61,80 +85,22 @@ class EInvoiceAnalyticsDashboard(models.Model):
         rejection_rate = (rejected_count / submitted_total * 100) if submitted_total > 0 else 0
 
         # Revenue by document type
-        fe_docs = all_docs.filtered(lambda x: x.document_type == 'FE')
-        te_docs = all_docs.filtered(lambda x: x.document_type == 'TE')
-        nc_docs = all_docs.filtered(lambda x: x.document_type == 'NC')
-        nd_docs = all_docs.filtered(lambda x: x.document_type == 'ND')
-
-        revenue_fe = sum(fe_docs.mapped('amount_total'))
-        revenue_te = sum(te_docs.mapped('amount_total'))
-        revenue_nc = sum(nc_docs.mapped('amount_total'))
-        revenue_nd = sum(nd_docs.mapped('amount_total'))
+        revenue_fe = revenue.get('FE', 0.0)
+        revenue_te = revenue.get('TE', 0.0)
+        revenue_nc = revenue.get('NC', 0.0)
+        revenue_nd = revenue.get('ND', 0.0)
         total_revenue = revenue_fe + revenue_te + revenue_nd - revenue_nc
 
         # Average processing time (submission to acceptance)
-        accepted_docs = all_docs.filtered(
-            lambda x: x.state == 'accepted' and x.hacienda_submission_date and x.hacienda_acceptance_date
-        )
-        if accepted_docs:
-            processing_times = [
-                (doc.hacienda_acceptance_date - doc.hacienda_submission_date).total_seconds() / 60
-                for doc in accepted_docs
-            ]
-            avg_processing_time = sum(processing_times) / len(processing_times)
-        else:
-            avg_processing_time = 0
+        avg_processing_time = processing_minutes / processing_count if processing_count else 0
 
         # Email delivery rate
-        email_sent_count = len(all_docs.filtered(lambda x: x.email_sent))
-        email_eligible_count = len(all_docs.filtered(lambda x: x.state == 'accepted'))
+        email_eligible_count = accepted_count
         email_delivery_rate = (email_sent_count / email_eligible_count * 100) if email_eligible_count > 0 else 0
 
-        # Offline queue status (POS)
-        OfflineQueue = self.env['l10n_cr.pos.offline.queue']
-        offline_pending = OfflineQueue.search_count([
-            ('state', '=', 'pending'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        offline_processing = OfflineQueue.search_count([
-            ('state', '=', 'processing'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        offline_completed = OfflineQueue.search_count([
-            ('state', '=', 'completed'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        offline_failed = OfflineQueue.search_count([
-            ('state', '=', 'failed'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-
-        # Retry queue status
-        RetryQueue = self.env['l10n_cr.einvoice.retry.queue']
-        retry_pending = RetryQueue.search_count([
-            ('state', '=', 'pending'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        retry_processing = RetryQueue.search_count([
-            ('state', '=', 'processing'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        retry_completed = RetryQueue.search_count([
-            ('state', '=', 'completed'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
-        retry_failed = RetryQueue.search_count([
-            ('state', '=', 'failed'),
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-        ])
+        # Queue status (POS offline queue and retry queue)
+        offline = self._count_by_state('l10n_cr.pos.offline.queue', date_from, date_to)
+        retry = self._count_by_state('l10n_cr.einvoice.retry.queue', date_from, date_to)
 
         return {
             # Date range
@@ -143,13 +109,13 @@ class EInvoiceAnalyticsDashboard(models.Model):
 
             # Total counts
             'total_invoices': total_count,
-            'draft_count': draft_count,
-            'generated_count': generated_count,
-            'signed_count': signed_count,
+            'draft_count': state_counts.get('draft', 0),
+            'generated_count': state_counts.get('generated', 0),
+            'signed_count': state_counts.get('signed', 0),
             'submitted_count': submitted_count,
             'accepted_count': accepted_count,
             'rejected_count': rejected_count,
-            'error_count': error_count,
+            'error_count': state_counts.get('error', 0),
 
             # Rates
             'acceptance_rate': round(acceptance_rate, 2),
@@ -157,10 +123,10 @@ class EInvoiceAnalyticsDashboard(models.Model):
             'email_delivery_rate': round(email_delivery_rate, 2),
 
             # Document type counts
-            'fe_count': len(fe_docs),
-            'te_count': len(te_docs),
-            'nc_count': len(nc_docs),
-            'nd_count': len(nd_docs),
+            'fe_count': type_counts.get('FE', 0),
+            'te_count': type_counts.get('TE', 0),
+            'nc_count': type_counts.get('NC', 0),
+            'nd_count': type_counts.get('ND', 0),
 
             # Revenue
             'total_revenue': total_revenue,
@@ -175,16 +141,39 @@ class EInvoiceAnalyticsDashboard(models.Model):
             'email_eligible_count': email_eligible_count,
 
             # Queue status
-            'offline_pending': offline_pending,
-            'offline_processing': offline_processing,
-            'offline_completed': offline_completed,
-            'offline_failed': offline_failed,
-            'retry_pending': retry_pending,
-            'retry_processing': retry_processing,
-            'retry_completed': retry_completed,
-            'retry_failed': retry_failed,
+            'offline_pending': offline.get('pending', 0),
+            'offline_processing': offline.get('processing', 0),
+            'offline_completed': offline.get('completed', 0),
+            'offline_failed': offline.get('failed', 0),
+            'retry_pending': retry.get('pending', 0),
+            'retry_processing': retry.get('processing', 0),
+            'retry_completed': retry.get('completed', 0),
+            'retry_failed': retry.get('failed', 0),
         }
 
+    @api.model
+    def _count_by_state(self, model_name, date_from, date_to):
+        """
+        Count the records of a queue model created in a range, per state.
+
+        Args:
+            model_name: Queue model name
+            date_from: Start of the creation range
+            date_to: End of the creation range
+
+        Returns:
+            dict: {state: count}
+        """
+        Model = self.env[model_name]
+        Model.flush_model(['state', 'create_date'])
+        self.env.cr.execute(f"""
+            SELECT state, COUNT(*)
+              FROM {Model._table}
+             WHERE create_date >= %s AND create_date <= %s
+          GROUP BY state
+        """, (date_from, date_to))
+        return dict(self.env.cr.fetchall())
+
     @api.model
     def get_invoice_trend_data(self, date_from=None, date_to=None, group_by='day'):
         """
@@ -205,21 +194,25 @@ class EInvoiceAnalyticsDashboard(models.Model):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        # SQL query for efficient aggregation
-        query = """
+        # Aggregated from the daily rollup
+        Rollup = self.env['l10n_cr.einvoice.daily.rollup']
+        Rollup._ensure_fresh()
+        query = f"""
             SELECT
-                DATE(create_date) as date,
-                COUNT(*) as count,
+                date,
+                SUM(document_count) as count,
                 state,
                 document_type
-            FROM l10n_cr_einvoice_document
-            WHERE create_date >= %s AND create_date <= %s
+            FROM {Rollup._table}
+            WHERE date >= %s AND date <= %s
                 AND company_id = %s
-            GROUP BY DATE(create_date), state, document_type
+            GROUP BY date, state, document_type
             ORDER BY date
         """
 
-        self.env.cr.execute(query, (date_from, date_to, self.env.company.id))
+        self.env.cr.execute(query, (
+            fields.Date.to_date(date_from), fields.Date.to_date(date_to), self.env.company.id,
+        ))
         results = self.env.cr.dictfetchall()
 
         # Group data by date
@@ -278,21 +271,24 @@ class EInvoiceAnalyticsDashboard(models.Model):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        query = """
+        Rollup = self.env['l10n_cr.einvoice.daily.rollup']
+        Rollup._ensure_fresh()
+        query = f"""
             SELECT
-                DATE(d.create_date) as date,
-                d.document_type,
-                SUM(m.amount_total) as revenue
-            FROM l10n_cr_einvoice_document d
-            JOIN account_move m ON d.move_id = m.id
-            WHERE d.create_date >= %s AND d.create_date <= %s
-                AND d.state = 'accepted'
-                AND d.company_id = %s
-            GROUP BY DATE(d.create_date), d.document_type
+                date,
+                document_type,
+                SUM(amount_total) as revenue
+            FROM {Rollup._table}
+            WHERE date >= %s AND date <= %s
+                AND state = 'accepted'
+                AND company_id = %s
+            GROUP BY date, document_type
             ORDER BY date
         """
 
-        self.env.cr.execute(query, (date_from, date_to, self.env.company.id))
+        self.env.cr.execute(query, (
+            fields.Date.to_date(date_from), fields.Date.to_date(date_to), self.env.company.id,
+        ))
         results = self.env.cr.dictfetchall()
 
         # Group by date
@@ -392,29 +388,34 @@ class EInvoiceAnalyticsDashboard(models.Model):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        query = """
+        Rollup = self.env['l10n_cr.einvoice.daily.rollup']
+        Rollup._ensure_fresh()
+        query = f"""
             SELECT
-                pm.name as payment_method,
-                pm.code as payment_code,
-                COUNT(d.id) as count,
-                SUM(m.amount_total) as total_amount
-            FROM l10n_cr_einvoice_document d
-            JOIN account_move m ON d.move_id = m.id
-            LEFT JOIN account_move_payment_method_rel pmr ON m.id = pmr.move_id
-            LEFT JOIN l10n_cr_payment_method pm ON pmr.payment_method_id = pm.id
-            WHERE d.create_date >= %s AND d.create_date <= %s
-                AND d.state = 'accepted'
-                AND d.company_id = %s
-            GROUP BY pm.name, pm.code
+                payment_method_id,
+                SUM(document_count) as count,
+                SUM(amount_total) as total_amount
+            FROM {Rollup._table}
+            WHERE date >= %s AND date <= %s
+                AND state = 'accepted'
+                AND company_id = %s
+            GROUP BY payment_method_id
             ORDER BY total_amount DESC
         """
 
-        self.env.cr.execute(query, (date_from, date_to, self.env.company.id))
+        self.env.cr.execute(query, (
+            fields.Date.to_date(date_from), fields.Date.to_date(date_to), self.env.company.id,
+        ))
         results = self.env.cr.dictfetchall()
 
+        payment_methods = self.env['l10n_cr.payment.method'].browse(
+            [row['payment_method_id'] for row in results if row['payment_method_id']]
+        )
+        names = {method.id: (method.name, method.code) for method in payment_methods}
+
         return [{
-            'payment_method': row['payment_method'] or 'No especificado',
-            'payment_code': row['payment_code'] or 'N/A',
+            'payment_method': names.get(row['payment_method_id'], (None, None))[0] or 'No especificado',
+            'payment_code': names.get(row['payment_method_id'], (None, None))[1] or 'N/A',
             'count': row['count'],
             'total_amount': float(row['total_amount'] or 0),
         } for row in results]
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Daily E-Invoice Rollup for the Analytics Dashboard
+
+Pre-aggregated document counts and amounts per day, company, state,
+document type and payment method. The dashboard KPIs, trend charts and the
+scheduled summary emails read this table instead of scanning every document
+of the period.
+
+The rollup is maintained incrementally by a cron: a refresh rebuilds only
+the (company, day) slices touched by documents written since the last
+watermark. Slices are always rebuilt from the document table, so refreshes
+are idempotent and may safely overlap. Dashboard reads only refresh inline
+when the cron has fallen behind (see _ensure_fresh()).
+"""
+
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Rescan window behind the watermark, for transactions that committed late
+ROLLUP_OVERLAP = timedelta(minutes=10)
+# Dashboard reads refresh inline only when the rollup is older than this
+ROLLUP_MAX_AGE = timedelta(minutes=30)
+# Advisory lock key serializing refreshes
+ROLLUP_LOCK_KEY = 0x4C3130524F4C  # 'L10ROL'
+
+
+class EInvoiceDailyRollup(models.Model):
+    """One row per (day, company, state, document type, payment method)."""
+
+    _name = 'l10n_cr.einvoice.daily.rollup'
+    _description = 'E-Invoice Daily Rollup'
+    _order = 'date desc, company_id'
+
+    date = fields.Date(string='Date', required=True, index=True, readonly=True)
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        index=True,
+        readonly=True,
+        ondelete='cascade',
+    )
+    state = fields.Char(string='Document Status', readonly=True)
+    document_type = fields.Char(string='Document Type', readonly=True)
+    payment_method_id = fields.Many2one(
+        'l10n_cr.payment.method',
+        string='Payment Method',
+        readonly=True,
+        ondelete='set null',
+    )
+
+    document_count = fields.Integer(string='Documents', readonly=True)
+    amount_total = fields.Float(string='Total Amount', readonly=True)
+    email_sent_count = fields.Integer(string='Emails Sent', readonly=True)
+    processing_count = fields.Integer(
+        string='Timed Acceptances',
+        readonly=True,
+        help='Accepted documents with both submission and acceptance dates',
+    )
+    processing_minutes = fields.Float(
+        string='Processing Minutes',
+        readonly=True,
+        help='Sum of submission-to-acceptance minutes of the timed acceptances',
+    )
+
+    @api.model
+    def _refresh(self, full=False):
+        """
+        Bring the rollup up to date with the document table.
+
+        Args:
+            full (bool): Rebuild every slice instead of the changed ones
+
+        Returns:
+            int: Number of (company, day) slices rebuilt, or -1 when another
+                refresh holds the lock (readers then use the current rollup)
+        """
+        cr = self.env.cr
+        self.env['l10n_cr.einvoice.document'].flush_model()
+        self.env['account.move'].flush_model(['l10n_cr_payment_method_id'])
+
+        cr.execute('SELECT pg_try_advisory_xact_lock(%s)', (ROLLUP_LOCK_KEY,))
+        if not cr.fetchone()[0]:
+            return -1
+
+        watermark = self._get_watermark()
+        cr.execute("SELECT now() AT TIME ZONE 'UTC'")
+        refreshed_at = cr.fetchone()[0]
+
+        if full or not watermark.refreshed_at:
+            cr.execute(f'DELETE FROM {self._table}')
+            cr.execute("""
+                SELECT DISTINCT company_id, DATE(create_date)
+                  FROM l10n_cr_einvoice_document
+            """)
+        else:
+            cr.execute("""
+                SELECT DISTINCT company_id, DATE(create_date)
+                  FROM l10n_cr_einvoice_document
+                 WHERE write_date > %s
+            """, (watermark.refreshed_at - ROLLUP_OVERLAP,))
+        slices = cr.fetchall()
+
+        self._rebuild_slices(slices)
+        if watermark:
+            watermark.refreshed_at = refreshed_at
+        else:
+            watermark.create({'refreshed_at': refreshed_at})
+
+        if slices:
+            _logger.info(f'Refreshed e-invoice daily rollup: {len(slices)} company days rebuilt')
+        return len(slices)
+
+    @api.model
+    def _ensure_fresh(self):
+        """
+        Refresh the rollup before a read only when the cron has fallen behind.
+
+        Dashboard reads call this instead of _refresh(): while the cron keeps
+        the watermark younger than ROLLUP_MAX_AGE, reads stay read-only.
+
+        Returns:
+            int: Slices rebuilt (0 when the rollup is fresh, -1 when another
+                refresh holds the lock)
+        """
+        refreshed_at = self._get_watermark().refreshed_at
+        if refreshed_at and refreshed_at >= fields.Datetime.now() - ROLLUP_MAX_AGE:
+            return 0
+        return self._refresh()
+
+    @api.model
+    def _get_watermark(self):
+        """Return the watermark row (empty recordset before the first refresh)."""
+        return self.env['l10n_cr.einvoice.daily.rollup.watermark'].sudo().search([], limit=1)
+
+    @api.model
+    def _rebuild_slices(self, slices):
+        """
+        Recompute the rollup rows of some company days from the documents.
+
+        Args:
+            slices (list): (company_id, date) tuples
+        """
+        if not slices:
+            return
+
+        company_ids, dates = zip(*slices)
+        self.env.cr.execute(f"""
+            WITH slices AS (
+                SELECT * FROM unnest(%(company_ids)s::int[], %(dates)s::date[]) AS s(company_id, date)
+            ), cleared AS (
+                DELETE FROM {self._table} r
+                 USING slices s
+                 WHERE r.company_id = s.company_id AND r.date = s.date
+            )
+            INSERT INTO {self._table} (
+                date, company_id, state, document_type, payment_method_id,
+                document_count, amount_total, email_sent_count,
+                processing_count, processing_minutes,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT s.date, d.company_id, d.state, d.document_type, m.l10n_cr_payment_method_id,
+                   COUNT(*),
+                   COALESCE(SUM(d.amount_total), 0),
+                   COUNT(*) FILTER (WHERE d.email_sent),
+                   COUNT(*) FILTER (WHERE d.state = 'accepted'
+                                      AND d.hacienda_submission_date IS NOT NULL
+                                      AND d.hacienda_acceptance_date IS NOT NULL),
+                   COALESCE(SUM(
+                       EXTRACT(EPOCH FROM d.hacienda_acceptance_date - d.hacienda_submission_date) / 60
+                   ) FILTER (WHERE d.state = 'accepted'
+                               AND d.hacienda_submission_date IS NOT NULL
+                               AND d.hacienda_acceptance_date IS NOT NULL), 0),
+                   %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM slices s
+              JOIN l10n_cr_einvoice_document d
+                ON d.company_id = s.company_id
+               AND d.create_date >= s.date
+               AND d.create_date < s.date + 1
+         LEFT JOIN account_move m ON m.id = d.move_id
+          GROUP BY s.date, d.company_id, d.state, d.document_type, m.l10n_cr_payment_method_id
+        """, {'company_ids': list(company_ids), 'dates': list(dates), 'uid': self.env.uid})
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh(self):
+        """Cron job: Apply document changes since the last refresh."""
+        return self._refresh()
+
+
+class EInvoiceDailyRollupWatermark(models.Model):
+    """
+    Point in time up to which the rollup reflects the documents (one row).
+
+    Kept out of ir.config_parameter: writing a parameter clears the ormcache
+    of every worker, and the watermark moves on every refresh.
+    """
+
+    _name = 'l10n_cr.einvoice.daily.rollup.watermark'
+    _description = 'E-Invoice Daily Rollup Watermark'
+
+    refreshed_at = fields.Datetime(string='Refreshed At', readonly=True)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import base64
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from lxml import etree
 
 import psycopg2
@@ -9,6 +9,8 @@ import psycopg2
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..utils.worker_pool import get_pool_size, run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
 
@@ -27,6 +29,8 @@ class EInvoiceDocument(models.Model):
         "CHECK ((move_id IS NOT NULL OR pos_order_id IS NOT NULL) AND NOT (move_id IS NOT NULL AND pos_order_id IS NOT NULL))",
         'El documento electrónico debe estar vinculado a una Factura O a una Orden de POS (no ambos).',
     )
+    # Delta scans of the analytics rollup (l10n_cr.einvoice.daily.rollup)
+    _write_date_idx = models.Index('(write_date)')
 
     # Basic Information
     name = fields.Char(
@@ -158,6 +162,22 @@ class EInvoiceDocument(models.Model):
         readonly=True,
     )
 
+    # Status polling schedule (see _cron_poll_pending_documents)
+    next_status_check = fields.Datetime(
+        string='Next Status Check',
+        readonly=True,
+        copy=False,
+        index=True,
+        help='When the status poller should next query Hacienda for this document',
+    )
+
+    status_check_count = fields.Integer(
+        string='Status Checks',
+        default=0,
+        readonly=True,
+        copy=False,
+    )
+
     retry_button_visible = fields.Boolean(
         compute='_compute_retry_button_visible',
         string='Show Retry Button',
@@ -199,6 +219,20 @@ class EInvoiceDocument(models.Model):
         help='List of validation errors that were overridden',
     )
 
+    # QR code rendered once per clave and reused by PDFs, receipts and views
+    qr_code_image = fields.Binary(
+        string='QR Code',
+        attachment=True,
+        copy=False,
+        readonly=True,
+    )
+    qr_code_clave = fields.Char(
+        string='QR Code Clave',
+        copy=False,
+        readonly=True,
+        help='Clave the stored QR code was rendered for',
+    )
+
     # PDF and Email
     pdf_attachment_id = fields.Many2one(
         'ir.attachment',
@@ -363,6 +397,13 @@ class EInvoiceDocument(models.Model):
                 vals['name'] = self.env['ir.sequence'].next_by_code('l10n_cr.einvoice') or _('New')
         return super(EInvoiceDocument, self).create(vals_list)
 
+    def unlink(self):
+        """Override unlink to drop the documents from the analytics rollup."""
+        slices = {(doc.company_id.id, doc.create_date.date()) for doc in self if doc.create_date}
+        result = super().unlink()
+        self.env['l10n_cr.einvoice.daily.rollup']._rebuild_slices(list(slices))
+        return result
+
     def action_generate_xml(self):
         """
         Generate the XML content for the electronic invoice.
@@ -434,6 +475,8 @@ class EInvoiceDocument(models.Model):
 
             # Generate XML content
             xml_content = self._build_xml_content(clave)
+            # Validate the tree the generator built instead of re-parsing the string
+            xml_tree = self.env['l10n_cr.xml.generator'].take_generated_tree(xml_content)
 
             # Add warning comment if validation override is active
             if self.validation_override:
@@ -459,7 +502,7 @@ class EInvoiceDocument(models.Model):
                     xml_content = parts[0] + '?>\n' + override_comment + parts[1]
 
             # Validate XML against XSD
-            self._validate_xml(xml_content)
+            self._validate_xml(xml_content, xml_tree=xml_tree)
 
             # Update document
             self.write({
@@ -963,6 +1006,9 @@ class EInvoiceDocument(models.Model):
         """
         Get QR code image for PDF report.
 
+        Uses the QR code stored for the current clave, falling back to the
+        generator (which caches rendered images per worker).
+
         Returns:
             str: Base64 encoded PNG image
         """
@@ -971,6 +1017,10 @@ class EInvoiceDocument(models.Model):
         if not self.clave:
             return False
 
+        if self.qr_code_image and self.qr_code_clave == self.clave:
+            qr_code = self.qr_code_image
+            return qr_code.decode() if isinstance(qr_code, bytes) else qr_code
+
         try:
             qr_generator = self.env['l10n_cr.qr.generator']
             qr_code = qr_generator.generate_qr_code(self.clave)
@@ -980,6 +1030,56 @@ class EInvoiceDocument(models.Model):
             _logger.error(f'Error generating QR code for {self.name}: {str(e)}')
             return False
 
+    def _store_qr_codes(self):
+        """
+        Render and store the QR code of documents that lack one for their clave.
+
+        Called when documents are accepted, so receipts and PDFs never render
+        the QR code themselves.
+
+        Returns:
+            int: Number of QR codes stored
+        """
+        qr_generator = self.env['l10n_cr.qr.generator']
+        stored = 0
+        for document in self.filtered(lambda d: d.clave and d.qr_code_clave != d.clave):
+            try:
+                qr_code = qr_generator.generate_qr_code(document.clave)
+            except Exception as e:
+                _logger.error(f'Error generating QR code for {document.name}: {str(e)}')
+                continue
+            document.write({
+                'qr_code_image': qr_code,
+                'qr_code_clave': document.clave,
+            })
+            stored += 1
+        return stored
+
+    @api.model
+    def _cron_store_qr_codes(self):
+        """
+        Cron job: Store QR codes of accepted documents that have none yet.
+
+        Catches documents accepted before QR codes were stored, or whose QR
+        code failed to render at acceptance.
+
+        System Parameters:
+            - l10n_cr_einvoice.qr_backfill_batch_size (default: 500)
+
+        Returns:
+            int: Number of QR codes stored
+        """
+        batch_size = get_pool_size(self.env, 'l10n_cr_einvoice.qr_backfill_batch_size', 500)
+        documents = self.search([
+            ('state', '=', 'accepted'),
+            ('clave', '!=', False),
+            ('qr_code_clave', '=', False),
+        ], limit=batch_size)
+        stored = documents._store_qr_codes()
+        if stored:
+            _logger.info(f'Stored QR codes for {stored} accepted documents')
+        return stored
+
     def _generate_clave(self):
         """
         Generate the 50-digit Hacienda key (clave).
@@ -1074,13 +1174,15 @@ class EInvoiceDocument(models.Model):
 
         return xml_content
 
-    def _validate_xml(self, xml_content):
-        """Validate XML against XSD schema."""
+    def _validate_xml(self, xml_content, xml_tree=None):
+        """Validate XML against XSD schema (xml_tree: already-parsed root, optional)."""
         self.ensure_one()
 
         # Use XSD validator
         validator = self.env['l10n_cr.xsd.validator']
-        is_valid, error_message = validator.validate_xml(xml_content, self.document_type)
+        is_valid, error_message = validator.validate_xml(
+            xml_content, self.document_type, xml_tree=xml_tree,
+        )
 
         if not is_valid:
             raise ValidationError(_('XML validation failed:\n%s') % error_message)
@@ -1116,17 +1218,99 @@ class EInvoiceDocument(models.Model):
         """Create an attachment with the XML content."""
         self.ensure_one()
 
-        filename = f'{self.clave}.xml'
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
+        attachment = self.env['ir.attachment'].create(
+            self._prepare_xml_attachment_vals(xml_content)
+        )
+
+        return attachment
+
+    def _prepare_xml_attachment_vals(self, xml_content):
+        """Values of the XML attachment of this document."""
+        self.ensure_one()
+        return {
+            'name': f'{self.clave}.xml',
             'type': 'binary',
             'datas': base64.b64encode(xml_content.encode('utf-8')),
             'res_model': self._name,
             'res_id': self.id,
             'mimetype': 'application/xml',
-        })
+        }
 
-        return attachment
+    def _sign_xml_batch(self):
+        """
+        Sign many generated documents at once (backfills, queue draining).
+
+        Documents are grouped by company so each certificate is loaded once.
+        Each group is handed to the signer as plain XML strings, which lets
+        l10n_cr.xml.signer spread the CPU work over worker processes
+        (System Parameter l10n_cr_einvoice.signing_processes). Results are
+        written back afterwards, with one attachment batch per company.
+        Documents locked by another transaction are skipped.
+
+        Returns:
+            dict: {document_id: (success, error_message or False)}
+        """
+        results = {}
+        documents = self.filtered(
+            lambda d: d.state in ('generated', 'signing_error') and d.xml_content
+        )
+        if not documents:
+            return results
+
+        self.env.cr.execute(
+            'SELECT id FROM l10n_cr_einvoice_document WHERE id IN %s FOR UPDATE SKIP LOCKED',
+            (tuple(documents.ids),)
+        )
+        locked_ids = {row[0] for row in self.env.cr.fetchall()}
+        documents = documents.filtered(lambda d: d.id in locked_ids)
+
+        cert_mgr = self.env['l10n_cr.certificate.manager']
+        xml_signer = self.env['l10n_cr.xml.signer']
+        processes = get_pool_size(self.env, 'l10n_cr_einvoice.signing_processes', 1)
+
+        for company in documents.company_id:
+            company_docs = documents.filtered(lambda d: d.company_id == company)
+            try:
+                certificate, private_key = cert_mgr.load_certificate_from_company(company)
+            except Exception as e:
+                error_msg = str(e)
+                _logger.error(f'Cannot batch sign for company {company.name}: {error_msg}')
+                company_docs.write({'state': 'signing_error', 'error_message': error_msg})
+                results.update({doc.id: (False, error_msg) for doc in company_docs})
+                continue
+
+            # Snapshot plain data: the signing itself never touches the ORM
+            signed = xml_signer.sign_xml_batch(
+                company_docs.mapped('xml_content'), certificate, private_key,
+                processes=processes,
+            )
+
+            succeeded = []
+            for doc, (success, value) in zip(company_docs, signed):
+                if success:
+                    succeeded.append((doc, value))
+                else:
+                    _logger.error(f'Error signing XML for {doc.name}: {value}')
+                    doc.write({'state': 'signing_error', 'error_message': value})
+                    results[doc.id] = (False, value)
+
+            attachments = self.env['ir.attachment'].create([
+                doc._prepare_xml_attachment_vals(signed_xml) for doc, signed_xml in succeeded
+            ])
+            for (doc, signed_xml), attachment in zip(succeeded, attachments):
+                doc.write({
+                    'signed_xml': signed_xml,
+                    'xml_attachment_id': attachment.id,
+                    'state': 'signed',
+                    'error_message': False,
+                })
+                results[doc.id] = (True, False)
+
+            _logger.info(
+                f'Batch signed {len(succeeded)}/{len(company_docs)} documents for company {company.name}'
+            )
+
+        return results
 
     def _parse_mensaje_hacienda_xml(self, xml_content):
         """Parse MensajeHacienda XML and extract key fields.
@@ -1188,13 +1372,23 @@ class EInvoiceDocument(models.Model):
         the entire transaction — erasing the error state we just wrote. This
         method uses a fresh cursor to persist the error state independently,
         so the document shows the correct error even after rollback.
+
+        Callers that catch the error and commit their own transaction (the
+        POS queue workers) set ``einvoice_error_in_transaction`` in the
+        context: the state is then written with this cursor, since a second
+        connection would wait forever on the row lock this one holds.
         """
         vals = {'state': state, 'error_message': error_msg}
         if extra_vals:
             vals.update(extra_vals)
+        if self.env.context.get('einvoice_error_in_transaction'):
+            self.write(vals)
+            return
         try:
             registry = self.env.registry
             with registry.cursor() as new_cr:
+                # Never wait on a row lock held by the calling transaction
+                new_cr.execute("SET LOCAL lock_timeout = '5s'")
                 new_cr.execute(
                     """UPDATE l10n_cr_einvoice_document
                        SET state = %s, error_message = %s, write_date = NOW()
@@ -1269,6 +1463,9 @@ class EInvoiceDocument(models.Model):
             # Update document first
             self.write(vals)
 
+            # Pre-render the QR code for receipts and PDFs
+            self._store_qr_codes()
+
             # Auto-send email if configured
             self._auto_send_email_on_acceptance()
 
@@ -1294,6 +1491,9 @@ class EInvoiceDocument(models.Model):
         elif status in ['procesando', 'recibido']:
             vals.update({
                 'state': 'submitted',
+                'next_status_check': self._get_next_status_check(
+                    vals['hacienda_submission_date'], self.status_check_count,
+                ),
             })
             _logger.info(f'Document {self.name} submitted, status: {status}')
 
@@ -1492,38 +1692,177 @@ class EInvoiceDocument(models.Model):
 
         return (is_valid, errors, can_downgrade)
 
+    # ===== STATUS POLLING =====
+
+    # Poll interval by submission age: (max age in minutes, delay in minutes).
+    # Fresh submissions are usually resolved by Hacienda within minutes;
+    # documents stuck for hours are polled sparingly.
+    _status_poll_schedule = [
+        (10, 1),
+        (60, 5),
+        (24 * 60, 30),
+    ]
+    _status_poll_max_delay = 240  # minutes, for documents older than a day
+
+    @api.model
+    def _get_next_status_check(self, submitted_at, check_count=0):
+        """
+        Compute when a submitted document should next be polled.
+
+        Args:
+            submitted_at (datetime): Submission date (falls back to now)
+            check_count (int): Status checks already made
+
+        Returns:
+            datetime: Next poll time
+        """
+        now = fields.Datetime.now()
+        age_minutes = (now - (submitted_at or now)).total_seconds() / 60.0
+
+        delay = self._status_poll_max_delay
+        for max_age, age_delay in self._status_poll_schedule:
+            if age_minutes < max_age:
+                delay = age_delay
+                break
+
+        # Documents that keep answering "procesando" back off further
+        if check_count > 10:
+            delay = min(delay * 2, self._status_poll_max_delay)
+
+        return now + timedelta(minutes=delay)
+
+    @api.model
+    def _get_poll_batch_size(self, backlog):
+        """
+        Adapt the poll batch size to the backlog depth.
+
+        Aims to drain the due backlog within a few cron runs while staying
+        inside the configured bounds.
+
+        System Parameters:
+            - l10n_cr_einvoice.poll_min_batch (default: 50)
+            - l10n_cr_einvoice.poll_max_batch (default: 500)
+            - l10n_cr_einvoice.poll_drain_runs (default: 4)
+        """
+        min_batch = get_pool_size(self.env, 'l10n_cr_einvoice.poll_min_batch', 50)
+        max_batch = get_pool_size(self.env, 'l10n_cr_einvoice.poll_max_batch', 500)
+        drain_runs = get_pool_size(self.env, 'l10n_cr_einvoice.poll_drain_runs', 4)
+        return max(min_batch, min(max_batch, -(-backlog // drain_runs)))
+
+    def _poll_status(self):
+        """
+        Poll Hacienda once for this document and reschedule the next poll.
+
+        Runs inside a status-poller worker. The document row is claimed with
+        ``SKIP LOCKED`` so a document being checked manually is skipped, and
+        the shared rate limiter token is taken in its own short transaction so
+        workers never hold its row lock during the HTTP round trip. Retries
+        are not slept on: a failed poll is simply rescheduled.
+
+        Returns:
+            str: Resulting state, 'failed' if the check failed, or 'skipped'
+                if the document was not claimed
+        """
+        self.ensure_one()
+
+        self.env.cr.execute("""
+            SELECT id FROM l10n_cr_einvoice_document
+            WHERE id = %s AND state = 'submitted'
+            FOR UPDATE SKIP LOCKED
+        """, (self.id,))
+        if not self.env.cr.fetchone():
+            return 'skipped'
+
+        result = 'failed'
+        try:
+            self.env['l10n_cr.hacienda.rate_limiter'].acquire_token(
+                timeout=30, endpoint='status', company=self.company_id,
+            )
+
+            self.with_context(cron=False).action_check_status()
+            result = self.state
+        except Exception as e:
+            _logger.warning('Failed to poll status for document %s: %s', self.name, str(e))
+
+        vals = {'status_check_count': self.status_check_count + 1}
+        if self.state == 'submitted':
+            vals['next_status_check'] = self._get_next_status_check(
+                self.hacienda_submission_date, self.status_check_count + 1,
+            )
+        else:
+            vals['next_status_check'] = False
+        self.write(vals)
+
+        return result
+
     # ===== CRON JOBS =====
 
     @api.model
     def _cron_poll_pending_documents(self):
         """
         Cron job: Poll Hacienda for status of submitted documents.
-        Called every 15 minutes by ir.cron.
-        """
-        pending_docs = self.search([
-            ('state', 'in', ['submitted']),
-        ], limit=50)
 
-        if not pending_docs:
+        Only documents whose next_status_check is due are polled. The batch
+        size adapts to the backlog and statuses are checked concurrently by a
+        bounded worker pool, each check sharing the Hacienda rate limiter.
+
+        System Parameters:
+            - l10n_cr_einvoice.poll_max_workers (default: 4)
+            - see _get_poll_batch_size for batch bounds
+
+        Returns:
+            dict: Poll statistics
+        """
+        due_domain = [
+            ('state', '=', 'submitted'),
+            '|',
+            ('next_status_check', '=', False),
+            ('next_status_check', '<=', fields.Datetime.now()),
+        ]
+        backlog = self.search_count(due_domain)
+
+        if not backlog:
             _logger.info('No pending documents to poll')
-            return
+            return {'backlog': 0, 'success': 0, 'failed': 0, 'skipped': 0}
 
-        _logger.info('Polling Hacienda for %d pending documents', len(pending_docs))
+        batch_size = self._get_poll_batch_size(backlog)
+        max_workers = get_pool_size(self.env, 'l10n_cr_einvoice.poll_max_workers', 4)
+        pending_docs = self.search(due_domain, limit=batch_size, order='next_status_check asc, id asc')
 
-        success = 0
-        failed = 0
-        for doc in pending_docs:
-            try:
-                doc.action_check_status()
-                success += 1
-            except Exception as e:
-                failed += 1
-                _logger.warning(
-                    'Failed to poll status for document %s: %s',
-                    doc.name, str(e)
-                )
+        _logger.info(
+            'Polling Hacienda for %d of %d due documents (%d workers)',
+            len(pending_docs), backlog, max_workers,
+        )
+
+        outcomes = run_in_worker_pool(
+            self.env,
+            pending_docs.ids,
+            lambda env, doc_id: env[self._name].browse(doc_id)._poll_status(),
+            max_workers=max_workers,
+        )
+
+        stats = {'backlog': backlog, 'success': 0, 'failed': 0, 'skipped': 0}
+        failed_ids = []
+        for doc_id, (success, result) in outcomes.items():
+            if not success:
+                stats['failed'] += 1
+                failed_ids.append(doc_id)
+            elif result == 'failed':
+                stats['failed'] += 1
+            elif result == 'skipped':
+                stats['skipped'] += 1
+            else:
+                stats['success'] += 1
+
+        # A crashed worker rolled back its reschedule: push those back so they
+        # don't monopolise the head of the queue
+        if failed_ids:
+            self.browse(failed_ids).write({
+                'next_status_check': fields.Datetime.now() + timedelta(minutes=5),
+            })
 
         _logger.info(
-            'Poll complete: %d success, %d failed out of %d total',
-            success, failed, len(pending_docs)
+            'Poll complete: %d success, %d failed, %d skipped out of %d polled',
+            stats['success'], stats['failed'], stats['skipped'], len(pending_docs)
         )
+        return stats
@@ -3,6 +3,8 @@ import logging
 import base64
 import io
 import csv
+import json
+import psycopg2
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
@@ -105,6 +107,27 @@ class EInvoiceImportBatch(models.Model):
         string='Notes',
     )
 
+    # Resumable import state
+    source_file = fields.Binary(
+        string='Source ZIP',
+        attachment=True,
+        copy=False,
+        help='Uploaded ZIP archive, kept so an interrupted import can be resumed',
+    )
+
+    checkpoint_entry = fields.Integer(
+        string='Checkpoint',
+        default=0,
+        copy=False,
+        help='Number of ZIP entries fully imported and committed',
+    )
+
+    import_options = fields.Text(
+        string='Import Options',
+        copy=False,
+        help='JSON options of the wizard that started the import',
+    )
+
     @api.depends('total_files', 'processed_files')
     def _compute_progress(self):
         for batch in self:
@@ -147,6 +170,42 @@ class EInvoiceImportBatch(models.Model):
 
         self.write(vals)
 
+    def _lock_for_import(self):
+        """
+        Lock the batch row for the running import (held until its commit).
+
+        Raises:
+            UserError: If another transaction is importing this batch
+        """
+        self.ensure_one()
+        try:
+            self.env.cr.execute(
+                f'SELECT id FROM {self._table} WHERE id = %s FOR UPDATE NOWAIT',
+                (self.id,)
+            )
+        except psycopg2.OperationalError:
+            raise UserError(_('This import is still running. Please try again once it has stopped.'))
+
+    def action_resume_import(self):
+        """Resume an interrupted import from its last committed checkpoint."""
+        self.ensure_one()
+
+        # A 'processing' batch may still be imported by another worker
+        self._lock_for_import()
+
+        if self.state not in ('processing', 'error') or not self.source_file:
+            raise UserError(_('Only interrupted imports with their ZIP file can be resumed.'))
+
+        options = json.loads(self.import_options or '{}')
+        try:
+            self.env['l10n_cr.einvoice.import.wizard']._run_import(self, options)
+            self.action_mark_done()
+        except Exception as e:
+            _logger.error('Resuming import batch %s failed: %s', self.id, e, exc_info=True)
+            self.action_mark_error(str(e))
+
+        return True
+
     def action_view_invoices(self):
         """Open view with imported invoices."""
         return {
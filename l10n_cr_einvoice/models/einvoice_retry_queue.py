@@ -6,18 +6,26 @@ Intelligent retry queue system for failed e-invoice operations with:
 - Automatic error classification (auth, network, validation, rate_limit, server, transient, unknown)
 - Exponential backoff (5min, 15min, 1hr, 4hr, 12hr)
 - Category-specific max retries and delay multipliers
-- Automatic retry via cron job
+- Automatic retry via cron job, drained by parallel claim-based workers
+  (FOR UPDATE SKIP LOCKED + lease timeouts, per-category concurrency caps)
 - Manual retry capability
 - 30-day retention policy for completed/failed entries
 """
 
 import logging
+import time
+import uuid
 from datetime import datetime, timedelta
 from odoo import api, fields, models
 from odoo.exceptions import UserError
 
+from ..utils.worker_pool import get_pool_size, run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
+# Advisory lock key serializing claimers (so category caps are exact)
+CLAIM_LOCK_KEY = 0x4C31304352  # 'L10CR'
+
 
 class EInvoiceRetryQueue(models.Model):
     """
@@ -82,6 +90,14 @@ class EInvoiceRetryQueue(models.Model):
         ('3', 'Urgent'),
     ], string='Priority', default='1')
 
+    # Claim-based processing
+    lease_until = fields.Datetime(
+        'Lease Until', index=True, copy=False,
+        help='While processing, other workers leave the entry alone until this time',
+    )
+    lease_token = fields.Char('Lease Token', copy=False)
+    finished_at = fields.Datetime('Finished At', copy=False)
+
     # Base delay configuration per category (in minutes)
     _base_delays = {
         0: 5,      # 5 minutes
@@ -113,6 +129,17 @@ class EInvoiceRetryQueue(models.Model):
         'unknown': 3,
     }
 
+    # Maximum entries of a category processed at the same time
+    _category_concurrency = {
+        'transient': 4,
+        'network': 4,
+        'server': 2,
+        'rate_limit': 1,
+        'auth': 1,
+        'validation': 2,
+        'unknown': 2,
+    }
+
     @api.model
     def add_to_queue(self, document, operation, error_message, error_category=None, priority='2'):
         """
@@ -243,6 +270,9 @@ class EInvoiceRetryQueue(models.Model):
             self.write({
                 'state': 'completed',
                 'last_error': False,
+                'lease_until': False,
+                'lease_token': False,
+                'finished_at': datetime.now(),
             })
             _logger.info(f"Retry queue entry {self.id} completed successfully")
 
@@ -259,18 +289,31 @@ class EInvoiceRetryQueue(models.Model):
                     'state': 'failed',
                     'retry_count': new_retry_count,
                     'last_error': error_msg,
+                    'lease_until': False,
+                    'lease_token': False,
+                    'finished_at': datetime.now(),
                 })
                 _logger.error(f"Retry queue entry {self.id} failed permanently after {new_retry_count} attempts")
             else:
+                # Back off according to what failed this time (e.g. a network
+                # error that turned into rate limiting), keeping the original
+                # retry budget
+                error_category = self.classify_error(error_msg)
+                if error_category == 'unknown':
+                    error_category = self.error_category
+
                 # Schedule next retry with exponential backoff
-                delay_minutes = self._get_retry_delay(new_retry_count, self.error_category)
+                delay_minutes = self._get_retry_delay(new_retry_count, error_category)
                 next_attempt = datetime.now() + timedelta(minutes=delay_minutes)
 
                 self.write({
                     'state': 'pending',
+                    'error_category': error_category,
                     'retry_count': new_retry_count,
                     'next_attempt': next_attempt,
                     'last_error': error_msg,
+                    'lease_until': False,
+                    'lease_token': False,
                 })
                 _logger.info(f"Retry queue entry {self.id} scheduled for retry {new_retry_count} at {next_attempt}")
 
@@ -279,24 +322,144 @@ class EInvoiceRetryQueue(models.Model):
         """
         Cron job to process pending retry queue entries.
 
-        Processes all pending entries where next_attempt is in the past,
-        ordered by priority and next_attempt time.
+        Claims due entries in batches (highest priority first) and processes
+        them in a bounded worker pool, one transaction per entry. Several cron
+        workers can run this at the same time: claimed rows are leased, so
+        they are never submitted twice, and entries whose worker died become
+        claimable again once their lease expires.
+
+        Returns:
+            dict: {'processed': int, 'completed': int, 'failed': int, 'rescheduled': int}
+        """
+        max_workers = get_pool_size(self.env, 'l10n_cr_einvoice.retry_queue_workers', 4)
+        batch_size = get_pool_size(self.env, 'l10n_cr_einvoice.retry_queue_batch_size', 50)
+        time_budget = get_pool_size(self.env, 'l10n_cr_einvoice.retry_queue_time_budget', 240)
+        deadline = time.monotonic() + time_budget
+
+        results = {'processed': 0, 'completed': 0, 'failed': 0, 'rescheduled': 0}
+        while time.monotonic() < deadline:
+            lease_token, entry_ids = self._claim_due_entries(batch_size)
+            if not entry_ids:
+                break
+
+            # Workers use their own cursors: they must see the claim
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
+
+            _logger.info(f"Processing {len(entry_ids)} retry queue entries")
+            outcomes = run_in_worker_pool(
+                self.env,
+                entry_ids,
+                lambda env, entry_id: env[self._name].browse(entry_id)._process_claimed(lease_token),
+                max_workers=max_workers,
+            )
+
+            for success, state in outcomes.values():
+                if not success or state is False:
+                    continue
+                results['processed'] += 1
+                if state == 'completed':
+                    results['completed'] += 1
+                elif state == 'failed':
+                    results['failed'] += 1
+                else:
+                    results['rescheduled'] += 1
+
+        metrics = self.get_queue_metrics()
+        _logger.info(
+            f"Retry queue run: {results['processed']} processed ({results['completed']} completed, "
+            f"{results['failed']} failed, {results['rescheduled']} rescheduled); "
+            f"depth {metrics['depth']}, due {metrics['due']}, "
+            f"drain rate {metrics['drain_rate']:.1f}/min"
+        )
+        return results
+
+    @api.model
+    def _claim_due_entries(self, limit):
+        """
+        Lease up to ``limit`` due entries to the calling worker.
+
+        Due entries are pending ones whose next attempt has passed, plus
+        processing ones whose lease expired (their worker died). Rows locked
+        by another transaction are skipped. Per-category caps count entries
+        already leased by other workers.
+
+        Args:
+            limit (int): Maximum number of entries to claim
+
+        Returns:
+            tuple: (lease token, list of claimed entry IDs in processing order)
         """
         now = datetime.now()
+        lease_seconds = get_pool_size(self.env, 'l10n_cr_einvoice.retry_queue_lease_seconds', 300)
+        lease_token = uuid.uuid4().hex
+        cr = self.env.cr
+
+        self.flush_model()
+        # One claimer at a time, so concurrent claimers cannot both fill a category
+        cr.execute('SELECT pg_advisory_xact_lock(%s)', (CLAIM_LOCK_KEY,))
+
+        cr.execute(f"""
+            SELECT error_category, COUNT(*)
+              FROM {self._table}
+             WHERE state = 'processing' AND lease_until >= %s
+          GROUP BY error_category
+        """, (now,))
+        in_flight = dict(cr.fetchall())
+
+        # Over-fetch so a saturated category does not starve the others
+        cr.execute(f"""
+            SELECT id, error_category
+              FROM {self._table}
+             WHERE (state = 'pending' AND next_attempt <= %(now)s)
+                OR (state = 'processing' AND lease_until < %(now)s)
+          ORDER BY priority DESC, next_attempt ASC, id ASC
+             LIMIT %(scan)s
+               FOR UPDATE SKIP LOCKED
+        """, {'now': now, 'scan': limit * 4})
+
+        entry_ids = []
+        for entry_id, category in cr.fetchall():
+            cap = self._category_concurrency.get(category, 1)
+            if in_flight.get(category, 0) >= cap:
+                continue
+            in_flight[category] = in_flight.get(category, 0) + 1
+            entry_ids.append(entry_id)
+            if len(entry_ids) >= limit:
+                break
+
+        if entry_ids:
+            cr.execute(f"""
+                UPDATE {self._table}
+                   SET state = 'processing', lease_until = %s, lease_token = %s
+                 WHERE id IN %s
+            """, (now + timedelta(seconds=lease_seconds), lease_token, tuple(entry_ids)))
+            self.invalidate_model(['state', 'lease_until', 'lease_token'])
+
+        return lease_token, entry_ids
+
+    def _process_claimed(self, lease_token):
+        """
+        Process an entry claimed with ``lease_token``.
 
-        # Find all pending entries due for retry
-        entries = self.search([
-            ('state', '=', 'pending'),
-            ('next_attempt', '<=', now),
-        ], order='priority desc, next_attempt asc')
+        The row stays locked for the whole attempt, so a worker that outlives
+        its lease still cannot race the one that reclaims the entry.
 
-        _logger.info(f"Processing {len(entries)} retry queue entries")
+        Returns:
+            str or bool: Resulting state, or False if the lease was lost
+        """
+        self.ensure_one()
+        self.env.cr.execute(f"""
+            SELECT id FROM {self._table}
+             WHERE id = %s AND state = 'processing' AND lease_token = %s
+               FOR UPDATE SKIP LOCKED
+        """, (self.id, lease_token))
+        if not self.env.cr.fetchone():
+            _logger.info(f"Retry queue entry {self.id} lease lost, skipping")
+            return False
 
-        for entry in entries:
-            try:
-                entry._process_retry()
-            except Exception as e:
-                _logger.error(f"Error processing retry queue entry {entry.id}: {e}")
+        self._process_retry()
+        return self.state
 
     def action_retry_now(self):
         """
@@ -306,6 +469,16 @@ class EInvoiceRetryQueue(models.Model):
         if self.state not in ('pending', 'failed'):
             raise UserError("Can only retry pending or failed entries")
 
+        # Never run alongside a worker that is processing this entry
+        self.flush_recordset()
+        self.env.cr.execute(f"""
+            SELECT id FROM {self._table}
+             WHERE id = %s AND state IN ('pending', 'failed')
+               FOR UPDATE SKIP LOCKED
+        """, (self.id,))
+        if not self.env.cr.fetchone():
+            raise UserError("This entry is being processed by another worker")
+
         self._process_retry()
 
     def action_cancel_retry(self):
@@ -379,3 +552,63 @@ class EInvoiceRetryQueue(models.Model):
             stats['by_category'][cat] = len(all_entries.filtered(lambda r: r.error_category == cat))
 
         return stats
+
+    @api.model
+    def get_queue_metrics(self, window_minutes=15):
+        """
+        Queue depth and drain rate, for monitoring the retry workers.
+
+        Args:
+            window_minutes: int - Window used for the drain rate
+
+        Returns:
+            dict - depth (pending), due, in_flight, expired_leases,
+                drain_rate (entries finished per minute over the window),
+                oldest_due_seconds and per-category counts with their caps
+        """
+        now = datetime.now()
+        window_start = now - timedelta(minutes=window_minutes)
+        self.flush_model()
+        self.env.cr.execute(f"""
+            SELECT error_category,
+                   COUNT(*) FILTER (WHERE state = 'pending'),
+                   COUNT(*) FILTER (WHERE state = 'pending' AND next_attempt <= %(now)s),
+                   COUNT(*) FILTER (WHERE state = 'processing' AND lease_until >= %(now)s),
+                   COUNT(*) FILTER (WHERE state = 'processing' AND lease_until < %(now)s),
+                   COUNT(*) FILTER (WHERE state IN ('completed', 'failed') AND finished_at >= %(start)s),
+                   MIN(next_attempt) FILTER (WHERE state = 'pending' AND next_attempt <= %(now)s)
+              FROM {self._table}
+             WHERE state IN ('pending', 'processing')
+                OR (state IN ('completed', 'failed') AND finished_at >= %(start)s)
+          GROUP BY error_category
+        """, {'now': now, 'start': window_start})
+
+        metrics = {
+            'depth': 0,
+            'due': 0,
+            'in_flight': 0,
+            'expired_leases': 0,
+            'drain_rate': 0.0,
+            'oldest_due_seconds': 0,
+            'by_category': {},
+        }
+        finished = 0
+        oldest_due = None
+        for category, pending, due, in_flight, expired, done, category_oldest in self.env.cr.fetchall():
+            metrics['depth'] += pending
+            metrics['due'] += due
+            metrics['in_flight'] += in_flight
+            metrics['expired_leases'] += expired
+            finished += done
+            if category_oldest and (oldest_due is None or category_oldest < oldest_due):
+                oldest_due = category_oldest
+            metrics['by_category'][category] = {
+                'pending': pending,
+                'in_flight': in_flight,
+                'cap': self._category_concurrency.get(category, 1),
+            }
+
+        metrics['drain_rate'] = finished / float(window_minutes)
+        if oldest_due:
+            metrics['oldest_due_seconds'] = int((now - oldest_due).total_seconds())
+        return metrics
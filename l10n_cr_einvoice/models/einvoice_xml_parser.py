@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 import base64
+import io
 import re
 from datetime import datetime
 from lxml import etree
@@ -10,6 +11,258 @@ from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
 
+CLAVE_RE = re.compile(r'^\d{50}$')
+CONSECUTIVE_RE = re.compile(r'^\d{3}-\d{5}-\d{2}-\d{10}$')
+
+# Returned when a document has no ResumenFactura
+EMPTY_SUMMARY = {
+    'total_merchandise': 0.0,
+    'total_discount': 0.0,
+    'subtotal': 0.0,
+    'total_tax': 0.0,
+    'total': 0.0,
+}
+
+
+def _read_child(child, fields, data, seen):
+    """
+    Read one element against a {tag: (key, convert)} table.
+
+    Only the first occurrence of a tag is read, like Element.find(). When key
+    is None, convert is a section reader called as convert(child, data);
+    otherwise the stripped text is converted and stored under key.
+    """
+    tag = child.tag
+    spec = fields.get(tag)
+    if spec is None or tag in seen:
+        return
+    seen.add(tag)
+    key, convert = spec
+    if key is None:
+        convert(child, data)
+    elif child.text:
+        data[key] = convert(child.text.strip())
+
+
+def _read_fields(elem, fields, data):
+    """Fill data from the children of elem in a single pass; returns the tags seen."""
+    seen = set()
+    for child in elem:
+        _read_child(child, fields, data, seen)
+    return seen
+
+
+def _read_record(elem, fields):
+    """Read the children of elem into a new dict."""
+    data = {}
+    _read_fields(elem, fields, data)
+    return data
+
+
+class _ExtractionPlan(object):
+    """
+    Extraction tables for one document namespace, compiled once per process.
+
+    The namespace identifies both the document type and the schema version,
+    so the Clark-notation tag tables built here ('{ns}Clave' -> 'clave') are
+    reused for every document of that kind. Each table is applied in one pass
+    over the children of its element instead of one find() per field.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+        def q(name):
+            return f'{{{namespace}}}{name}'
+
+        self.detalle = q('DetalleServicio')
+        self.linea = q('LineaDetalle')
+        self.tipo = q('Tipo')
+        self.numero = q('Numero')
+
+        # Direct children of the document root
+        self.document_fields = {
+            q('Clave'): ('clave', str),
+            q('NumeroConsecutivo'): ('consecutive', str),
+            q('FechaEmision'): ('date', str),
+            q('CodigoActividad'): ('activity_code', str),
+            q('CondicionVenta'): ('payment_condition', str),
+            q('MedioPago'): ('payment_method', str),
+            q('Emisor'): (None, self._store('emisor', self.read_party)),
+            q('Receptor'): (None, self._store('receptor', self.read_party)),
+            self.detalle: (None, self.read_lines),
+            q('ResumenFactura'): (None, self._store('summary', self.read_summary)),
+            q('InformacionReferencia'): (None, self._store('reference', self.read_reference)),
+        }
+
+        self.party_fields = {
+            q('Identificacion'): (None, self._read_identification),
+            q('Nombre'): ('name', str),
+            q('NombreComercial'): ('commercial_name', str),
+            q('Ubicacion'): (None, self._store('location', self.read_location)),
+            q('Telefono'): (None, self._read_phone),
+            q('CorreoElectronico'): ('email', str),
+        }
+        self.identification_fields = {
+            self.tipo: ('id_type', str),
+            self.numero: ('id_number', str),
+        }
+        self.phone_fields = {
+            q('CodigoPais'): ('country_code', str),
+            q('NumTelefono'): ('number', str),
+        }
+        self.location_fields = {
+            q('Provincia'): ('provincia', str),
+            q('Canton'): ('canton', str),
+            q('Distrito'): ('distrito', str),
+            q('Barrio'): ('barrio', str),
+            q('OtrasSenas'): ('otras_senas', str),
+        }
+
+        self.line_fields = {
+            q('NumeroLinea'): ('line_number', int),
+            q('Codigo'): (None, self._read_line_code),
+            q('Cantidad'): ('quantity', float),
+            q('UnidadMedida'): ('uom', str),
+            q('Detalle'): ('description', str),
+            q('PrecioUnitario'): ('price_unit', float),
+            q('MontoTotal'): ('amount_total', float),
+            q('Descuento'): (None, self._read_discount),
+            q('SubTotal'): ('subtotal', float),
+            q('Impuesto'): (None, self._read_tax),
+            q('MontoTotalLinea'): ('line_total', float),
+        }
+        self.line_code_fields = {
+            self.tipo: ('code_type', str),
+            q('Codigo'): ('cabys_code', str),
+        }
+        self.discount_fields = {
+            q('MontoDescuento'): ('discount_amount', float),
+            q('NaturalezaDescuento'): ('discount_nature', str),
+        }
+        self.tax_fields = {
+            q('Codigo'): ('code', str),
+            q('CodigoTarifa'): ('rate_code', str),
+            q('Tarifa'): ('rate', float),
+            q('Monto'): ('amount', float),
+        }
+
+        self.summary_fields = {
+            q('CodigoTipoMoneda'): (None, self._read_currency),
+            q('TotalServGravados'): ('total_services_taxable', float),
+            q('TotalServExentos'): ('total_services_exempt', float),
+            q('TotalMercanciasGravadas'): ('total_merchandise_taxable', float),
+            q('TotalMercanciasExentas'): ('total_merchandise_exempt', float),
+            q('TotalGravado'): ('total_taxable', float),
+            q('TotalExento'): ('total_exempt', float),
+            q('TotalVenta'): ('total_sale', float),
+            q('TotalDescuentos'): ('total_discount', float),
+            q('TotalVentaNeta'): ('total_sale_net', float),
+            q('TotalImpuesto'): ('total_tax', float),
+            q('TotalComprobante'): ('total_invoice', float),
+        }
+        self.currency_fields = {
+            q('CodigoMoneda'): ('currency', str),
+            q('TipoCambio'): ('exchange_rate', float),
+        }
+
+        self.reference_fields = {
+            q('TipoDoc'): ('doc_type', str),
+            q('Numero'): ('number', str),
+            q('FechaEmision'): (None, self._read_reference_date),
+            q('Codigo'): ('code', str),
+            q('Razon'): ('reason', str),
+        }
+
+    @staticmethod
+    def _store(key, reader):
+        def store(elem, data):
+            data[key] = reader(elem)
+        return store
+
+    def read_party(self, elem):
+        return _read_record(elem, self.party_fields)
+
+    def _read_identification(self, elem, data):
+        identification = {}
+        seen = _read_fields(elem, self.identification_fields, identification)
+        # Both elements must be present, even if empty
+        if self.tipo in seen and self.numero in seen:
+            data['id_type'] = identification.get('id_type')
+            data['id_number'] = identification.get('id_number')
+
+    def _read_phone(self, elem, data):
+        phone = _read_record(elem, self.phone_fields)
+        phone_parts = [part for part in (phone.get('country_code'), phone.get('number')) if part]
+        if phone_parts:
+            data['phone'] = ' '.join(phone_parts)
+
+    def read_location(self, elem):
+        return _read_record(elem, self.location_fields)
+
+    def read_lines(self, elem, data):
+        line_items = data.setdefault('line_items', [])
+        for linea in elem:
+            if linea.tag == self.linea:
+                line_items.append(self.read_line(linea))
+
+    def read_line(self, elem):
+        line_data = {'taxes': []}
+        _read_fields(elem, self.line_fields, line_data)
+        return line_data
+
+    def _read_line_code(self, elem, data):
+        _read_fields(elem, self.line_code_fields, data)
+
+    def _read_discount(self, elem, data):
+        _read_fields(elem, self.discount_fields, data)
+
+    def _read_tax(self, elem, data):
+        tax_data = _read_record(elem, self.tax_fields)
+        if tax_data:
+            data['taxes'].append(tax_data)
+
+    def read_summary(self, elem):
+        return _read_record(elem, self.summary_fields)
+
+    def _read_currency(self, elem, data):
+        _read_fields(elem, self.currency_fields, data)
+
+    def read_reference(self, elem):
+        return _read_record(elem, self.reference_fields)
+
+    @staticmethod
+    def _read_reference_date(elem, data):
+        if not elem.text:
+            return
+        try:
+            fecha_str = elem.text.strip()
+            # Handle both date and datetime formats
+            if 'T' in fecha_str:
+                fecha_str = fecha_str.split('T')[0]
+            data['date'] = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+        except ValueError as e:
+            _logger.warning(f'Could not parse reference date: {e}')
+
+
+_PLANS = {}
+
+
+def _get_plan(namespace):
+    """Extraction plan for a document namespace (built on first use)."""
+    plan = _PLANS.get(namespace)
+    if plan is None:
+        plan = _PLANS[namespace] = _ExtractionPlan(namespace)
+    return plan
+
+
+def _free(elem):
+    """Release an element that has been read, along with its read siblings."""
+    elem.clear()
+    parent = elem.getparent()
+    while elem.getprevious() is not None:
+        del parent[0]
+
 
 class EInvoiceXMLParser(models.AbstractModel):
     _name = 'l10n_cr.einvoice.xml.parser'
@@ -37,9 +290,47 @@ class EInvoiceXMLParser(models.AbstractModel):
         """
         Parse Costa Rica e-invoice XML v4.4 and extract all data.
 
+        The tree is read in a single pass over the document sections using the
+        compiled extraction plan of its document type.
+
         Args:
             xml_content: XML content as bytes or string
 
+        Returns:
+            dict: Extracted invoice data
+        """
+        return self._parse_document(xml_content)
+
+    @api.model
+    def parse_many(self, xml_contents):
+        """
+        Parse a stream of documents, each one in a single iterparse pass.
+
+        Every section (and every invoice line) is released as soon as it has
+        been read, so memory is bounded by the largest section instead of the
+        whole tree, and a broken document never stops the stream.
+
+        Args:
+            xml_contents (iterable): XML documents as bytes or strings
+
+        Yields:
+            tuple: (invoice data dict, None) or (None, error message), in input order
+        """
+        for xml_content in xml_contents:
+            try:
+                yield self._parse_document(xml_content, streaming=True), None
+            except ValidationError as e:
+                yield None, str(e)
+
+    @api.model
+    def _parse_document(self, xml_content, streaming=False):
+        """
+        Parse one document into invoice data.
+
+        Args:
+            xml_content: XML content as bytes or string
+            streaming (bool): Use iterparse and free sections once read
+
         Returns:
             dict: Extracted invoice data
         """
@@ -48,27 +339,16 @@ class EInvoiceXMLParser(models.AbstractModel):
             if isinstance(xml_content, str):
                 xml_content = xml_content.encode('utf-8')
 
-            root = etree.fromstring(xml_content)
-
-            # Detect document type from root element
-            doc_type = self._detect_document_type(root)
-
-            # Extract all data
-            data = {
-                'document_type': doc_type,
-                'clave': self._extract_clave(root, doc_type),
-                'consecutive': self._extract_consecutive(root, doc_type),
-                'date': self._extract_date(root, doc_type),
-                'activity_code': self._extract_activity_code(root, doc_type),
-                'emisor': self._extract_emisor(root, doc_type),
-                'receptor': self._extract_receptor(root, doc_type),
-                'payment_condition': self._extract_payment_condition(root, doc_type),
-                'payment_method': self._extract_payment_method(root, doc_type),
-                'line_items': self._extract_line_items(root, doc_type),
-                'summary': self._extract_summary(root, doc_type),
-                'reference': self._extract_reference(root, doc_type) if doc_type in ['NC', 'ND'] else None,
-                'original_xml': base64.b64encode(xml_content).decode('utf-8'),
-            }
+            if streaming:
+                doc_type, fields = self._read_streaming(xml_content)
+            else:
+                root = etree.fromstring(xml_content)
+                # Detect document type from root element
+                doc_type = self._detect_document_type(root)
+                fields = {}
+                _read_fields(root, self._get_extraction_plan(doc_type).document_fields, fields)
+
+            data = self._build_invoice_data(doc_type, fields, xml_content)
 
             # Validate extracted data
             self._validate_invoice_data(data)
@@ -82,6 +362,76 @@ class EInvoiceXMLParser(models.AbstractModel):
             _logger.error(f'Error parsing XML: {str(e)}')
             raise ValidationError(_('Error parsing XML file: %s') % str(e))
 
+    @api.model
+    def _read_streaming(self, xml_content):
+        """
+        Read the document sections with iterparse, freeing each one once read.
+
+        Returns:
+            tuple: (document type, raw section values keyed like the plan tables)
+        """
+        fields = {}
+        seen = set()
+        root = plan = doc_type = None
+
+        for _event, elem in etree.iterparse(io.BytesIO(xml_content), events=('end',), remove_comments=True):
+            if plan is None:
+                root = elem.getroottree().getroot()
+                doc_type = self._detect_document_type(root)
+                plan = self._get_extraction_plan(doc_type)
+
+            parent = elem.getparent()
+            if parent is None:
+                break
+            if parent is root:
+                # Lines were already read one by one
+                if elem.tag != plan.detalle:
+                    _read_child(elem, plan.document_fields, fields, seen)
+                _free(elem)
+            elif elem.tag == plan.linea and parent.tag == plan.detalle and parent.getparent() is root:
+                fields.setdefault('line_items', []).append(plan.read_line(elem))
+                _free(elem)
+
+        return doc_type, fields
+
+    @api.model
+    def _build_invoice_data(self, doc_type, fields, xml_content):
+        """Validate the raw section values and assemble the invoice data dict."""
+        data = {
+            'document_type': doc_type,
+            'clave': self._clean_clave(fields.get('clave')),
+            'consecutive': self._clean_consecutive(fields.get('consecutive')),
+            'date': self._parse_emission_date(fields.get('date')),
+            'activity_code': fields.get('activity_code'),
+        }
+
+        if fields.get('emisor') is None:
+            raise ValidationError(_('Missing Emisor in XML'))
+
+        summary = fields.get('summary')
+        if summary is None:
+            _logger.warning('No ResumenFactura found in XML')
+            summary = dict(EMPTY_SUMMARY)
+
+        reference = None
+        if doc_type in ['NC', 'ND']:
+            reference = fields.get('reference')
+            if reference is None:
+                _logger.warning(f'No InformacionReferencia found in {doc_type} XML')
+
+        data.update({
+            'emisor': fields['emisor'],
+            # Receptor is optional in Tiquete Electrónico
+            'receptor': fields.get('receptor'),
+            'payment_condition': fields.get('payment_condition') or '01',  # Default: Contado (Cash)
+            'payment_method': fields.get('payment_method') or '01',  # Default: Efectivo (Cash)
+            'line_items': fields.get('line_items', []),
+            'summary': summary,
+            'reference': reference,
+            'original_xml': base64.b64encode(xml_content).decode('utf-8'),
+        })
+        return data
+
     @api.model
     def _detect_document_type(self, root):
         """Detect document type from XML root element."""
@@ -107,50 +457,40 @@ class EInvoiceXMLParser(models.AbstractModel):
         return self.NAMESPACES[ns_key]
 
     @api.model
-    def _extract_clave(self, root, doc_type):
-        """Extract the 50-digit clave (unique key)."""
-        ns = self._get_namespace(doc_type)
-        clave_elem = root.find(f'{{{ns}}}Clave')
+    def _get_extraction_plan(self, doc_type):
+        """Get the compiled extraction plan for a document type."""
+        return _get_plan(self._get_namespace(doc_type))
 
-        if clave_elem is None or not clave_elem.text:
+    @api.model
+    def _clean_clave(self, clave):
+        """Check the 50-digit clave (unique key)."""
+        if not clave:
             raise ValidationError(_('Missing Clave in XML'))
 
-        clave = clave_elem.text.strip()
-
         # Validate clave format (50 digits)
-        if not re.match(r'^\d{50}$', clave):
+        if not CLAVE_RE.match(clave):
             raise ValidationError(_('Invalid Clave format: must be 50 digits'))
 
         return clave
 
     @api.model
-    def _extract_consecutive(self, root, doc_type):
-        """Extract the consecutive number."""
-        ns = self._get_namespace(doc_type)
-        consecutivo_elem = root.find(f'{{{ns}}}NumeroConsecutivo')
-
-        if consecutivo_elem is None or not consecutivo_elem.text:
+    def _clean_consecutive(self, consecutive):
+        """Check the consecutive number."""
+        if not consecutive:
             raise ValidationError(_('Missing NumeroConsecutivo in XML'))
 
-        consecutive = consecutivo_elem.text.strip()
-
         # Validate format: XXX-XXXXX-XX-XXXXXXXXXX (establishment-terminal-doctype-sequence)
-        if not re.match(r'^\d{3}-\d{5}-\d{2}-\d{10}$', consecutive):
+        if not CONSECUTIVE_RE.match(consecutive):
             _logger.warning(f'Consecutive number has non-standard format: {consecutive}')
 
         return consecutive
 
     @api.model
-    def _extract_date(self, root, doc_type):
-        """Extract the emission date."""
-        ns = self._get_namespace(doc_type)
-        fecha_elem = root.find(f'{{{ns}}}FechaEmision')
-
-        if fecha_elem is None or not fecha_elem.text:
+    def _parse_emission_date(self, fecha_str):
+        """Parse the FechaEmision value into a date."""
+        if not fecha_str:
             raise ValidationError(_('Missing FechaEmision in XML'))
 
-        fecha_str = fecha_elem.text.strip()
-
         # Parse ISO format datetime
         try:
             # Handle both with and without timezone
@@ -164,423 +504,6 @@ class EInvoiceXMLParser(models.AbstractModel):
         except ValueError as e:
             raise ValidationError(_('Invalid date format in FechaEmision: %s') % str(e))
 
-    @api.model
-    def _extract_activity_code(self, root, doc_type):
-        """Extract the economic activity code (CIIU)."""
-        ns = self._get_namespace(doc_type)
-        codigo_elem = root.find(f'{{{ns}}}CodigoActividad')
-
-        # CodigoActividad is optional in some document types
-        if codigo_elem is not None and codigo_elem.text:
-            return codigo_elem.text.strip()
-
-        return None
-
-    @api.model
-    def _extract_emisor(self, root, doc_type):
-        """Extract emisor (sender/company) information."""
-        ns = self._get_namespace(doc_type)
-        emisor_elem = root.find(f'{{{ns}}}Emisor')
-
-        if emisor_elem is None:
-            raise ValidationError(_('Missing Emisor in XML'))
-
-        emisor_data = {}
-
-        # Identification
-        identificacion = emisor_elem.find(f'{{{ns}}}Identificacion')
-        if identificacion is not None:
-            tipo_elem = identificacion.find(f'{{{ns}}}Tipo')
-            numero_elem = identificacion.find(f'{{{ns}}}Numero')
-
-            if tipo_elem is not None and numero_elem is not None:
-                emisor_data['id_type'] = tipo_elem.text.strip() if tipo_elem.text else None
-                emisor_data['id_number'] = numero_elem.text.strip() if numero_elem.text else None
-
-        # Name
-        nombre_elem = emisor_elem.find(f'{{{ns}}}Nombre')
-        if nombre_elem is not None and nombre_elem.text:
-            emisor_data['name'] = nombre_elem.text.strip()
-
-        # Commercial name (optional)
-        nombre_comercial_elem = emisor_elem.find(f'{{{ns}}}NombreComercial')
-        if nombre_comercial_elem is not None and nombre_comercial_elem.text:
-            emisor_data['commercial_name'] = nombre_comercial_elem.text.strip()
-
-        # Location
-        ubicacion = emisor_elem.find(f'{{{ns}}}Ubicacion')
-        if ubicacion is not None:
-            emisor_data['location'] = self._extract_location(ubicacion, ns)
-
-        # Phone (optional)
-        telefono = emisor_elem.find(f'{{{ns}}}Telefono')
-        if telefono is not None:
-            codigo_pais = telefono.find(f'{{{ns}}}CodigoPais')
-            num_telefono = telefono.find(f'{{{ns}}}NumTelefono')
-
-            phone_parts = []
-            if codigo_pais is not None and codigo_pais.text:
-                phone_parts.append(codigo_pais.text.strip())
-            if num_telefono is not None and num_telefono.text:
-                phone_parts.append(num_telefono.text.strip())
-
-            if phone_parts:
-                emisor_data['phone'] = ' '.join(phone_parts)
-
-        # Email
-        correo_elem = emisor_elem.find(f'{{{ns}}}CorreoElectronico')
-        if correo_elem is not None and correo_elem.text:
-            emisor_data['email'] = correo_elem.text.strip()
-
-        return emisor_data
-
-    @api.model
-    def _extract_receptor(self, root, doc_type):
-        """Extract receptor (customer) information."""
-        ns = self._get_namespace(doc_type)
-        receptor_elem = root.find(f'{{{ns}}}Receptor')
-
-        # Receptor is optional in Tiquete Electrónico
-        if receptor_elem is None:
-            return None
-
-        receptor_data = {}
-
-        # Identification
-        identificacion = receptor_elem.find(f'{{{ns}}}Identificacion')
-        if identificacion is not None:
-            tipo_elem = identificacion.find(f'{{{ns}}}Tipo')
-            numero_elem = identificacion.find(f'{{{ns}}}Numero')
-
-            if tipo_elem is not None and numero_elem is not None:
-                receptor_data['id_type'] = tipo_elem.text.strip() if tipo_elem.text else None
-                receptor_data['id_number'] = numero_elem.text.strip() if numero_elem.text else None
-
-        # Name (optional for foreign customers)
-        nombre_elem = receptor_elem.find(f'{{{ns}}}Nombre')
-        if nombre_elem is not None and nombre_elem.text:
-            receptor_data['name'] = nombre_elem.text.strip()
-
-        # Commercial name (optional)
-        nombre_comercial_elem = receptor_elem.find(f'{{{ns}}}NombreComercial')
-        if nombre_comercial_elem is not None and nombre_comercial_elem.text:
-            receptor_data['commercial_name'] = nombre_comercial_elem.text.strip()
-
-        # Location (optional)
-        ubicacion = receptor_elem.find(f'{{{ns}}}Ubicacion')
-        if ubicacion is not None:
-            receptor_data['location'] = self._extract_location(ubicacion, ns)
-
-        # Phone (optional)
-        telefono = receptor_elem.find(f'{{{ns}}}Telefono')
-        if telefono is not None:
-            codigo_pais = telefono.find(f'{{{ns}}}CodigoPais')
-            num_telefono = telefono.find(f'{{{ns}}}NumTelefono')
-
-            phone_parts = []
-            if codigo_pais is not None and codigo_pais.text:
-                phone_parts.append(codigo_pais.text.strip())
-            if num_telefono is not None and num_telefono.text:
-                phone_parts.append(num_telefono.text.strip())
-
-            if phone_parts:
-                receptor_data['phone'] = ' '.join(phone_parts)
-
-        # Email
-        correo_elem = receptor_elem.find(f'{{{ns}}}CorreoElectronico')
-        if correo_elem is not None and correo_elem.text:
-            receptor_data['email'] = correo_elem.text.strip()
-
-        return receptor_data
-
-    @api.model
-    def _extract_location(self, ubicacion_elem, ns):
-        """Extract location information."""
-        location = {}
-
-        provincia_elem = ubicacion_elem.find(f'{{{ns}}}Provincia')
-        if provincia_elem is not None and provincia_elem.text:
-            location['provincia'] = provincia_elem.text.strip()
-
-        canton_elem = ubicacion_elem.find(f'{{{ns}}}Canton')
-        if canton_elem is not None and canton_elem.text:
-            location['canton'] = canton_elem.text.strip()
-
-        distrito_elem = ubicacion_elem.find(f'{{{ns}}}Distrito')
-        if distrito_elem is not None and distrito_elem.text:
-            location['distrito'] = distrito_elem.text.strip()
-
-        barrio_elem = ubicacion_elem.find(f'{{{ns}}}Barrio')
-        if barrio_elem is not None and barrio_elem.text:
-            location['barrio'] = barrio_elem.text.strip()
-
-        otras_senas_elem = ubicacion_elem.find(f'{{{ns}}}OtrasSenas')
-        if otras_senas_elem is not None and otras_senas_elem.text:
-            location['otras_senas'] = otras_senas_elem.text.strip()
-
-        return location
-
-    @api.model
-    def _extract_payment_condition(self, root, doc_type):
-        """Extract payment condition (payment terms)."""
-        ns = self._get_namespace(doc_type)
-        condicion_elem = root.find(f'{{{ns}}}CondicionVenta')
-
-        if condicion_elem is not None and condicion_elem.text:
-            return condicion_elem.text.strip()
-
-        return '01'  # Default: Contado (Cash)
-
-    @api.model
-    def _extract_payment_method(self, root, doc_type):
-        """Extract payment method."""
-        ns = self._get_namespace(doc_type)
-        medio_elem = root.find(f'{{{ns}}}MedioPago')
-
-        if medio_elem is not None and medio_elem.text:
-            return medio_elem.text.strip()
-
-        return '01'  # Default: Efectivo (Cash)
-
-    @api.model
-    def _extract_line_items(self, root, doc_type):
-        """Extract line items (products/services)."""
-        ns = self._get_namespace(doc_type)
-        detalle_elem = root.find(f'{{{ns}}}DetalleServicio')
-
-        if detalle_elem is None:
-            return []
-
-        line_items = []
-
-        # Iterate through LineaDetalle elements
-        for linea in detalle_elem.findall(f'{{{ns}}}LineaDetalle'):
-            line_data = {}
-
-            # Line number
-            numero_linea = linea.find(f'{{{ns}}}NumeroLinea')
-            if numero_linea is not None and numero_linea.text:
-                line_data['line_number'] = int(numero_linea.text.strip())
-
-            # Product code (Cabys)
-            codigo_elem = linea.find(f'{{{ns}}}Codigo')
-            if codigo_elem is not None:
-                tipo_elem = codigo_elem.find(f'{{{ns}}}Tipo')
-                codigo_producto = codigo_elem.find(f'{{{ns}}}Codigo')
-
-                if tipo_elem is not None and tipo_elem.text:
-                    line_data['code_type'] = tipo_elem.text.strip()
-                if codigo_producto is not None and codigo_producto.text:
-                    line_data['cabys_code'] = codigo_producto.text.strip()
-
-            # Quantity
-            cantidad_elem = linea.find(f'{{{ns}}}Cantidad')
-            if cantidad_elem is not None and cantidad_elem.text:
-                line_data['quantity'] = float(cantidad_elem.text.strip())
-
-            # Unit of measure
-            unidad_elem = linea.find(f'{{{ns}}}UnidadMedida')
-            if unidad_elem is not None and unidad_elem.text:
-                line_data['uom'] = unidad_elem.text.strip()
-
-            # Description
-            detalle_text_elem = linea.find(f'{{{ns}}}Detalle')
-            if detalle_text_elem is not None and detalle_text_elem.text:
-                line_data['description'] = detalle_text_elem.text.strip()
-
-            # Unit price
-            precio_elem = linea.find(f'{{{ns}}}PrecioUnitario')
-            if precio_elem is not None and precio_elem.text:
-                line_data['price_unit'] = float(precio_elem.text.strip())
-
-            # Total (before discount)
-            monto_total_elem = linea.find(f'{{{ns}}}MontoTotal')
-            if monto_total_elem is not None and monto_total_elem.text:
-                line_data['amount_total'] = float(monto_total_elem.text.strip())
-
-            # Discount (optional)
-            descuento_elem = linea.find(f'{{{ns}}}Descuento')
-            if descuento_elem is not None:
-                monto_desc = descuento_elem.find(f'{{{ns}}}MontoDescuento')
-                naturaleza_desc = descuento_elem.find(f'{{{ns}}}NaturalezaDescuento')
-
-                if monto_desc is not None and monto_desc.text:
-                    line_data['discount_amount'] = float(monto_desc.text.strip())
-                if naturaleza_desc is not None and naturaleza_desc.text:
-                    line_data['discount_nature'] = naturaleza_desc.text.strip()
-
-            # Subtotal (after discount)
-            subtotal_elem = linea.find(f'{{{ns}}}SubTotal')
-            if subtotal_elem is not None and subtotal_elem.text:
-                line_data['subtotal'] = float(subtotal_elem.text.strip())
-
-            # Taxes (optional)
-            line_data['taxes'] = []
-            impuesto_elem = linea.find(f'{{{ns}}}Impuesto')
-            if impuesto_elem is not None:
-                codigo_impuesto = impuesto_elem.find(f'{{{ns}}}Codigo')
-                codigo_tarifa = impuesto_elem.find(f'{{{ns}}}CodigoTarifa')
-                tarifa_elem = impuesto_elem.find(f'{{{ns}}}Tarifa')
-                monto_impuesto = impuesto_elem.find(f'{{{ns}}}Monto')
-
-                tax_data = {}
-                if codigo_impuesto is not None and codigo_impuesto.text:
-                    tax_data['code'] = codigo_impuesto.text.strip()
-                if codigo_tarifa is not None and codigo_tarifa.text:
-                    tax_data['rate_code'] = codigo_tarifa.text.strip()
-                if tarifa_elem is not None and tarifa_elem.text:
-                    tax_data['rate'] = float(tarifa_elem.text.strip())
-                if monto_impuesto is not None and monto_impuesto.text:
-                    tax_data['amount'] = float(monto_impuesto.text.strip())
-
-                if tax_data:
-                    line_data['taxes'].append(tax_data)
-
-            # Total line (with taxes)
-            monto_total_linea = linea.find(f'{{{ns}}}MontoTotalLinea')
-            if monto_total_linea is not None and monto_total_linea.text:
-                line_data['line_total'] = float(monto_total_linea.text.strip())
-
-            line_items.append(line_data)
-
-        return line_items
-
-    @api.model
-    def _extract_summary(self, root, doc_type):
-        """Extract invoice summary (totals)."""
-        ns = self._get_namespace(doc_type)
-        resumen_elem = root.find(f'{{{ns}}}ResumenFactura')
-
-        if resumen_elem is None:
-            _logger.warning('No ResumenFactura found in XML')
-            return {
-                'total_merchandise': 0.0,
-                'total_discount': 0.0,
-                'subtotal': 0.0,
-                'total_tax': 0.0,
-                'total': 0.0,
-            }
-
-        summary = {}
-
-        # Currency
-        codigo_moneda_elem = resumen_elem.find(f'{{{ns}}}CodigoTipoMoneda')
-        if codigo_moneda_elem is not None:
-            moneda = codigo_moneda_elem.find(f'{{{ns}}}CodigoMoneda')
-            tipo_cambio = codigo_moneda_elem.find(f'{{{ns}}}TipoCambio')
-
-            if moneda is not None and moneda.text:
-                summary['currency'] = moneda.text.strip()
-            if tipo_cambio is not None and tipo_cambio.text:
-                summary['exchange_rate'] = float(tipo_cambio.text.strip())
-
-        # Services taxable
-        total_serv_gravados = resumen_elem.find(f'{{{ns}}}TotalServGravados')
-        if total_serv_gravados is not None and total_serv_gravados.text:
-            summary['total_services_taxable'] = float(total_serv_gravados.text.strip())
-
-        # Services exempt
-        total_serv_exentos = resumen_elem.find(f'{{{ns}}}TotalServExentos')
-        if total_serv_exentos is not None and total_serv_exentos.text:
-            summary['total_services_exempt'] = float(total_serv_exentos.text.strip())
-
-        # Merchandise taxable
-        total_merc_gravadas = resumen_elem.find(f'{{{ns}}}TotalMercanciasGravadas')
-        if total_merc_gravadas is not None and total_merc_gravadas.text:
-            summary['total_merchandise_taxable'] = float(total_merc_gravadas.text.strip())
-
-        # Merchandise exempt
-        total_merc_exentas = resumen_elem.find(f'{{{ns}}}TotalMercanciasExentas')
-        if total_merc_exentas is not None and total_merc_exentas.text:
-            summary['total_merchandise_exempt'] = float(total_merc_exentas.text.strip())
-
-        # Total taxable
-        total_gravado = resumen_elem.find(f'{{{ns}}}TotalGravado')
-        if total_gravado is not None and total_gravado.text:
-            summary['total_taxable'] = float(total_gravado.text.strip())
-
-        # Total exempt
-        total_exento = resumen_elem.find(f'{{{ns}}}TotalExento')
-        if total_exento is not None and total_exento.text:
-            summary['total_exempt'] = float(total_exento.text.strip())
-
-        # Total sale (before discounts)
-        total_venta = resumen_elem.find(f'{{{ns}}}TotalVenta')
-        if total_venta is not None and total_venta.text:
-            summary['total_sale'] = float(total_venta.text.strip())
-
-        # Total discounts
-        total_descuentos = resumen_elem.find(f'{{{ns}}}TotalDescuentos')
-        if total_descuentos is not None and total_descuentos.text:
-            summary['total_discount'] = float(total_descuentos.text.strip())
-
-        # Total sale net (after discounts, before tax)
-        total_venta_neta = resumen_elem.find(f'{{{ns}}}TotalVentaNeta')
-        if total_venta_neta is not None and total_venta_neta.text:
-            summary['total_sale_net'] = float(total_venta_neta.text.strip())
-
-        # Total tax
-        total_impuesto = resumen_elem.find(f'{{{ns}}}TotalImpuesto')
-        if total_impuesto is not None and total_impuesto.text:
-            summary['total_tax'] = float(total_impuesto.text.strip())
-
-        # Total invoice (net + tax)
-        total_comprobante = resumen_elem.find(f'{{{ns}}}TotalComprobante')
-        if total_comprobante is not None and total_comprobante.text:
-            summary['total_invoice'] = float(total_comprobante.text.strip())
-
-        return summary
-
-    @api.model
-    def _extract_reference(self, root, doc_type):
-        """Extract reference information (for credit/debit notes)."""
-        # Only for NC (Credit Notes) and ND (Debit Notes)
-        if doc_type not in ['NC', 'ND']:
-            return None
-
-        ns = self._get_namespace(doc_type)
-        info_ref_elem = root.find(f'{{{ns}}}InformacionReferencia')
-
-        if info_ref_elem is None:
-            _logger.warning(f'No InformacionReferencia found in {doc_type} XML')
-            return None
-
-        reference = {}
-
-        # Document type
-        tipo_doc = info_ref_elem.find(f'{{{ns}}}TipoDoc')
-        if tipo_doc is not None and tipo_doc.text:
-            reference['doc_type'] = tipo_doc.text.strip()
-
-        # Reference number (consecutive of original invoice)
-        numero = info_ref_elem.find(f'{{{ns}}}Numero')
-        if numero is not None and numero.text:
-            reference['number'] = numero.text.strip()
-
-        # Emission date of referenced document
-        fecha_emision = info_ref_elem.find(f'{{{ns}}}FechaEmision')
-        if fecha_emision is not None and fecha_emision.text:
-            try:
-                fecha_str = fecha_emision.text.strip()
-                # Handle both date and datetime formats
-                if 'T' in fecha_str:
-                    fecha_str = fecha_str.split('T')[0]
-                reference['date'] = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-            except ValueError as e:
-                _logger.warning(f'Could not parse reference date: {e}')
-
-        # Reference code
-        codigo = info_ref_elem.find(f'{{{ns}}}Codigo')
-        if codigo is not None and codigo.text:
-            reference['code'] = codigo.text.strip()
-
-        # Reason
-        razon = info_ref_elem.find(f'{{{ns}}}Razon')
-        if razon is not None and razon.text:
-            reference['reason'] = razon.text.strip()
-
-        return reference
-
     @api.model
     def _validate_invoice_data(self, data):
         """Validate extracted invoice data for consistency."""
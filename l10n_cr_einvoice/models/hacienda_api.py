@@ -11,6 +11,9 @@ from datetime import datetime, timezone, timedelta
 from odoo import models, api, _
 from odoo.exceptions import UserError
 
+from ..utils.http_pool import get_pool_stats, get_session
+from ..utils.token_store import get_token_store
+
 _logger = logging.getLogger(__name__)
 
 # Retry configuration
@@ -18,7 +21,8 @@ MAX_RETRY_ATTEMPTS = 3
 INITIAL_RETRY_DELAY = 2  # seconds
 RETRY_BACKOFF_FACTOR = 2  # exponential backoff multiplier
 
-# Token cache: {company_id: {'access_token': str, 'refresh_token': str, 'expires_at': float, 'refresh_expires_at': float, 'credential_hash': str}}
+# Process-local token cache, backed by the shared token store (utils/token_store.py)
+# {company_id: {'access_token': str, 'refresh_token': str, 'expires_at': float, 'refresh_expires_at': float, 'issued_at': float, 'credential_hash': str}}
 _TOKEN_CACHE = {}
 _TOKEN_CACHE_LOCK = threading.Lock()
 
@@ -72,8 +76,11 @@ class HaciendaAPI(models.AbstractModel):
         """
         Obtain an OAuth2 bearer token from the Hacienda IDP with caching and refresh support.
 
-        Uses a module-level cache keyed by company ID to avoid requesting a new token
-        on every API call. Supports refresh_token grant when the access token expires.
+        Tokens are cached per company in a process-local cache backed by a token
+        store shared between workers (see utils/token_store.py). When the token
+        has to be renewed, only one worker performs the grant while the others
+        wait for it and reuse the result (single-flight). Supports refresh_token
+        grant when the access token expires.
 
         Args:
             force_refresh (bool): If True, ignore cached token and obtain a fresh one.
@@ -93,42 +100,66 @@ class HaciendaAPI(models.AbstractModel):
         if not company.l10n_cr_active_username or not company.l10n_cr_active_password:
             raise UserError(_('Hacienda API credentials not configured. Please check company settings.'))
 
-        now = time.time()
+        requested_at = time.time()
         current_cred_hash = self._credential_hash(company.l10n_cr_active_username)
 
-        # Check cached token (unless forced refresh)
+        if not force_refresh:
+            cached = self._lookup_cached_token(company_id, current_cred_hash)
+            if cached and cached.get('expires_at', 0) > requested_at:
+                return cached['access_token']
+
+        with get_token_store(self.env).lock(company_id):
+            # Another worker may have renewed the token while we were waiting
+            cached = self._lookup_cached_token(company_id, current_cred_hash)
+            now = time.time()
+            if cached and cached.get('expires_at', 0) > now:
+                if not force_refresh or cached.get('issued_at', 0) >= requested_at:
+                    return cached['access_token']
+
+            # Try refresh token grant if refresh token is still valid
+            refresh_token = None
+            if not force_refresh and cached and cached.get('refresh_token') \
+                    and cached.get('refresh_expires_at', 0) > now:
+                refresh_token = cached['refresh_token']
+
+            if refresh_token:
+                try:
+                    return self._refresh_token(refresh_token)
+                except Exception:
+                    _logger.info('Refresh token grant failed, falling back to password grant')
+                    # Fall through to full password grant
+
+            # Full password grant
+            return self._password_grant()
+
+    @api.model
+    def _lookup_cached_token(self, company_id, cred_hash):
+        """
+        Return the cached token entry of a company, or None.
+
+        Checks the process-local cache first and falls back to the shared
+        token store, copying a newer shared entry into the local cache.
+        Entries issued for other credentials are discarded (C2 fix).
+        """
         with _TOKEN_CACHE_LOCK:
-            if not force_refresh and company_id in _TOKEN_CACHE:
-                cached = _TOKEN_CACHE[company_id]
-
-                # Invalidate cache if credentials changed (C2 fix)
-                if cached.get('credential_hash') != current_cred_hash:
-                    _logger.info('Credentials changed for company %s, invalidating token cache', company_id)
-                    _TOKEN_CACHE.pop(company_id, None)
-                    refresh_token = None
-                else:
-                    # Return cached access token if still valid
-                    if cached.get('expires_at', 0) > now:
-                        return cached['access_token']
+            local = _TOKEN_CACHE.get(company_id)
+            if local and local.get('credential_hash') != cred_hash:
+                _logger.info('Credentials changed for company %s, invalidating token cache', company_id)
+                _TOKEN_CACHE.pop(company_id, None)
+                local = None
 
-                    # Try refresh token grant if refresh token is still valid
-                    if cached.get('refresh_token') and cached.get('refresh_expires_at', 0) > now:
-                        refresh_token = cached['refresh_token']
-                    else:
-                        refresh_token = None
-            else:
-                refresh_token = None
+        if local and local.get('expires_at', 0) > time.time():
+            return local
 
-        # Try refresh token grant outside the lock (network I/O)
-        if refresh_token:
-            try:
-                return self._refresh_token(refresh_token)
-            except Exception:
-                _logger.info('Refresh token grant failed, falling back to password grant')
-                # Fall through to full password grant
+        shared = get_token_store(self.env).get(company_id)
+        if not shared or shared.get('credential_hash') != cred_hash:
+            return local
+        if local and local.get('expires_at', 0) >= shared.get('expires_at', 0):
+            return local
 
-        # Full password grant
-        return self._password_grant()
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE[company_id] = shared
+        return shared
 
     @api.model
     def _password_grant(self):
@@ -145,7 +176,7 @@ class HaciendaAPI(models.AbstractModel):
         }
 
         try:
-            response = requests.post(idp_url, data=data, timeout=15)
+            response = get_session(idp_url, self.env).post(idp_url, data=data, timeout=15)
         except requests.exceptions.Timeout:
             raise UserError(_('IDP token request timed out. Server not responding.'))
         except requests.exceptions.ConnectionError as e:
@@ -180,7 +211,7 @@ class HaciendaAPI(models.AbstractModel):
             'refresh_token': refresh_token,
         }
 
-        response = requests.post(idp_url, data=data, timeout=15)
+        response = get_session(idp_url, self.env).post(idp_url, data=data, timeout=15)
 
         if response.status_code == 200:
             token_data = response.json()
@@ -189,8 +220,7 @@ class HaciendaAPI(models.AbstractModel):
             return token_data['access_token']
         else:
             # Clear stale cache on refresh failure
-            with _TOKEN_CACHE_LOCK:
-                _TOKEN_CACHE.pop(company.id, None)
+            self._clear_token_cache(company.id)
             raise Exception('Refresh token grant failed (HTTP %s)' % response.status_code)
 
     @api.model
@@ -201,14 +231,17 @@ class HaciendaAPI(models.AbstractModel):
         expires_in = token_data.get('expires_in', 300)
         refresh_expires_in = token_data.get('refresh_expires_in', 1800)
 
+        entry = {
+            'access_token': token_data['access_token'],
+            'refresh_token': token_data.get('refresh_token', ''),
+            'expires_at': now + expires_in - 30,  # 30 second safety margin
+            'refresh_expires_at': now + refresh_expires_in - 30,
+            'issued_at': now,
+            'credential_hash': self._credential_hash(company.l10n_cr_active_username),
+        }
         with _TOKEN_CACHE_LOCK:
-            _TOKEN_CACHE[company_id] = {
-                'access_token': token_data['access_token'],
-                'refresh_token': token_data.get('refresh_token', ''),
-                'expires_at': now + expires_in - 30,  # 30 second safety margin
-                'refresh_expires_at': now + refresh_expires_in - 30,
-                'credential_hash': self._credential_hash(company.l10n_cr_active_username),
-            }
+            _TOKEN_CACHE[company_id] = entry
+        get_token_store(self.env).set(company_id, entry)
 
     @api.model
     def _clear_token_cache(self, company_id=None):
@@ -218,6 +251,7 @@ class HaciendaAPI(models.AbstractModel):
                 _TOKEN_CACHE.pop(company_id, None)
             else:
                 _TOKEN_CACHE.clear()
+        get_token_store(self.env).delete(company_id)
 
     @staticmethod
     def _credential_hash(username):
@@ -226,7 +260,12 @@ class HaciendaAPI(models.AbstractModel):
 
     @classmethod
     def invalidate_token_cache(cls, company_id):
-        """Invalidate the token cache for a company. Call when API credentials are written."""
+        """
+        Invalidate the process-local token cache for a company.
+
+        Does not touch the shared token store; use _clear_token_cache() from a
+        recordset when credentials are written.
+        """
         with _TOKEN_CACHE_LOCK:
             _TOKEN_CACHE.pop(company_id, None)
         _logger.info('Token cache invalidated for company %s due to credential change', company_id)
@@ -591,7 +630,7 @@ class HaciendaAPI(models.AbstractModel):
         }
 
         try:
-            response = requests.get(f"{base_url}/recepcion/test", headers=headers, timeout=10)
+            response = get_session(base_url, self.env).get(f"{base_url}/recepcion/test", headers=headers, timeout=10)
 
             # 400/404 = auth worked, endpoint just doesn't exist (expected)
             # 401 = token not accepted by API (unexpected)
@@ -631,6 +670,19 @@ class HaciendaAPI(models.AbstractModel):
                 'message': _('Error: %s') % str(e),
             }
 
+    @api.model
+    def get_http_pool_stats(self):
+        """
+        Connection reuse metrics of the pooled Hacienda HTTP sessions.
+
+        Metrics are per worker process (each worker keeps its own pools).
+
+        Returns:
+            dict: {host: {requests, new_connections, reuse_ratio,
+                          avg_handshake_ms, handshake_time_saved_ms}}
+        """
+        return get_pool_stats()
+
     # =====================================================
     # TAX REPORT SUBMISSION (TRIBU-CR API)
     # =====================================================
@@ -954,11 +1006,12 @@ class HaciendaAPI(models.AbstractModel):
 
                 _logger.info(f'Attempt {attempt}/{MAX_RETRY_ATTEMPTS}: {operation}')
 
-                # Make HTTP request
+                # Make HTTP request over the pooled keep-alive session
+                session = get_session(url, self.env)
                 if method == 'POST':
-                    response = requests.post(url, json=payload, headers=headers, timeout=30)
+                    response = session.post(url, json=payload, headers=headers, timeout=30)
                 elif method == 'GET':
-                    response = requests.get(url, headers=headers, timeout=30)
+                    response = session.get(url, headers=headers, timeout=30)
                 else:
                     raise UserError(_('Unsupported HTTP method: %s') % method)
 
@@ -8,6 +8,9 @@ from datetime import datetime
 from odoo import models, api, _
 from odoo.exceptions import UserError
 
+from ..utils.http_pool import get_session
+from ..utils.worker_pool import run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
 # Retry configuration
@@ -153,7 +156,7 @@ class HaciendaCedulaAPI(models.AbstractModel):
                 _logger.debug(f'Attempt {attempt}/{MAX_RETRY_ATTEMPTS}: Querying {url}')
 
                 # Make HTTP GET request with timeout
-                response = requests.get(url, timeout=CONNECTION_TIMEOUT)
+                response = get_session(url, self.env).get(url, timeout=CONNECTION_TIMEOUT)
 
                 # Log response details
                 _logger.debug(f'Response status: {response.status_code}')
@@ -426,15 +429,18 @@ class HaciendaCedulaAPI(models.AbstractModel):
             }
 
     @api.model
-    def batch_lookup(self, cedulas):
+    def batch_lookup(self, cedulas, max_concurrent=5):
         """
         Look up multiple cédulas with rate limiting.
 
-        Respects API rate limits (10 req/sec sustained, 20 req/sec burst).
-        Adds delays between requests to stay within limits.
+        Respects API rate limits (10 req/sec sustained, 20 req/sec burst)
+        through the shared Hacienda rate limiter instead of fixed delays,
+        running up to ``max_concurrent`` requests at a time. Duplicate
+        cédulas (after cleaning) are only requested once.
 
         Args:
             cedulas (list): List of cédula strings
+            max_concurrent (int): Maximum concurrent requests
 
         Returns:
             dict: Results keyed by cédula:
@@ -447,26 +453,48 @@ class HaciendaCedulaAPI(models.AbstractModel):
         if not cedulas:
             return {}
 
-        results = {}
-        delay_between_requests = 0.1  # 10 requests/second = 0.1 second delay
+        clean_by_input = {cedula: self._clean_cedula(cedula) for cedula in cedulas}
+        unique = list(dict.fromkeys(clean for clean in clean_by_input.values() if clean))
 
-        _logger.info(f'Batch lookup for {len(cedulas)} cédulas')
+        _logger.info(f'Batch lookup for {len(cedulas)} cédulas ({len(unique)} unique)')
 
-        for i, cedula in enumerate(cedulas):
+        token_timeout = float(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.cedula_batch_token_timeout', 30
+        ))
+
+        def lookup(worker_env, cedula):
             try:
-                # Look up cédula
-                result = self.lookup_cedula(cedula)
-                results[cedula] = result
+                worker_env['l10n_cr.hacienda.rate_limiter'].acquire_token(
+                    timeout=token_timeout, endpoint='cedula',
+                )
+            except UserError as e:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'error_type': 'rate_limit',
+                }
+            return worker_env['l10n_cr.hacienda.cedula.api'].lookup_cedula(cedula)
 
-                # Add delay between requests (except for last one)
-                if i < len(cedulas) - 1:
-                    time.sleep(delay_between_requests)
+        outcomes = run_in_worker_pool(self.env, unique, lookup, max_workers=max_concurrent)
 
-            except Exception as e:
-                _logger.error(f'Error in batch lookup for cédula {cedula}: {str(e)}')
+        results = {}
+        for cedula, clean in clean_by_input.items():
+            if not clean:
                 results[cedula] = {
                     'success': False,
-                    'error': str(e),
+                    'error': _('Invalid cédula format. Cédula must contain only digits.'),
+                    'error_type': 'api_error',
+                }
+                continue
+
+            success, value = outcomes[clean]
+            if success:
+                results[cedula] = value
+            else:
+                _logger.error(f'Error in batch lookup for cédula {cedula}: {value}')
+                results[cedula] = {
+                    'success': False,
+                    'error': value,
                     'error_type': 'api_error',
                 }
 
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class HaciendaToken(models.Model):
+    """
+    Shared OAuth2 token store for the Hacienda IDP.
+
+    One row per company, shared by every Odoo worker process so that only one
+    worker performs the password/refresh grant and the others reuse its token.
+    Rows are read and written by utils/token_store.py in dedicated cursors.
+    """
+    _name = 'l10n_cr.hacienda.token'
+    _description = 'Hacienda IDP Token Cache'
+    _log_access = False
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+    )
+    access_token = fields.Char(string='Access Token', required=True)
+    refresh_token = fields.Char(string='Refresh Token')
+    expires_at = fields.Float(
+        string='Access Token Expiry',
+        digits=(16, 3),
+        help='Unix timestamp (with 30 second safety margin)',
+    )
+    refresh_expires_at = fields.Float(
+        string='Refresh Token Expiry',
+        digits=(16, 3),
+        help='Unix timestamp (with 30 second safety margin)',
+    )
+    issued_at = fields.Float(
+        string='Issued At',
+        digits=(16, 3),
+        help='Unix timestamp of the grant that produced this token',
+    )
+    credential_hash = fields.Char(
+        string='Credential Hash',
+        help='Hash of the API username; a mismatch invalidates the token',
+    )
+
+    _company_unique = models.UniqueIndex(
+        '(company_id)',
+        'Only one cached token per company is allowed.',
+    )
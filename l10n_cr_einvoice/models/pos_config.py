@@ -12,6 +12,12 @@ class PosConfig(models.Model):
     l10n_cr_require_customer_id = fields.Boolean(string="Require Customer for FE", default=True)
     l10n_cr_auto_submit = fields.Boolean(string="Auto Submit to Hacienda", default=True)
     l10n_cr_offline_mode = fields.Boolean(string="Offline Mode", help="Queue invoices locally first")
+    l10n_cr_async_einvoice = fields.Boolean(
+        string="Asynchronous E-Invoicing",
+        default=False,
+        help="Only enqueue the e-invoice when the order is paid. Background workers "
+             "generate, sign and submit it, so the cashier never waits on Hacienda.",
+    )
     l10n_cr_allow_anonymous = fields.Boolean(string="Allow Anonymous TE", default=True)
     l10n_cr_default_email_customer = fields.Boolean(string="Auto Email Customer", default=True)
 
@@ -6,11 +6,17 @@ Manages offline e-invoice queue for POS terminals.
 When the POS cannot connect to Hacienda (offline mode), electronic invoices
 are queued here for automatic synchronization when the connection is restored.
 
+The same queue also backs the asynchronous POS pipeline: when a terminal
+runs in asynchronous mode, order creation only enqueues the document and a
+pool of background workers drains the generate/sign/submit stages.
+
 Features:
 - Automatic retry with exponential backoff
 - Priority-based processing
 - Manual retry capability
 - Cleanup of old synced entries
+- Bounded-concurrency draining of asynchronous entries
+- Bulk backfill mode (batched generation/signing) for large backlogs
 """
 
 import logging
@@ -18,6 +24,8 @@ from datetime import datetime, timedelta
 from odoo import api, fields, models
 from odoo.exceptions import UserError
 
+from ..utils.worker_pool import get_pool_size, run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
 
@@ -73,6 +81,14 @@ class PosOfflineQueue(models.Model):
         ('failed', 'Failed'),
     ], string='Status', default='pending', required=True, index=True)
 
+    # Why the entry was queued
+    queue_type = fields.Selection([
+        ('offline', 'Offline Mode'),
+        ('async', 'Asynchronous Pipeline'),
+    ], string='Queue Type', default='offline', required=True, index=True,
+        help="Offline: signed document waiting for connectivity. "
+             "Asynchronous: document enqueued at order creation, processed by background workers.")
+
     # Priority
     priority = fields.Selection([
         ('low', 'Low'),
@@ -171,13 +187,29 @@ class PosOfflineQueue(models.Model):
 
         try:
             # If there's an einvoice document, submit it
-            if self.einvoice_document_id:
-                if self.einvoice_document_id.state == 'draft':
-                    self.einvoice_document_id.action_generate_xml()
-                if self.einvoice_document_id.state == 'generated':
-                    self.einvoice_document_id.action_sign_xml()
-                if self.einvoice_document_id.state == 'signed':
-                    self.einvoice_document_id.action_submit_to_hacienda()
+            # (error states are resumed at the stage that failed). Stage
+            # errors are caught below, so they are recorded in this transaction.
+            einvoice = self.einvoice_document_id.with_context(einvoice_error_in_transaction=True)
+            if einvoice:
+                if einvoice.state in ('draft', 'generation_error'):
+                    einvoice.action_generate_xml()
+                if einvoice.state in ('generated', 'signing_error'):
+                    einvoice.action_sign_xml()
+
+                # Async entry on an offline terminal: keep the signed document
+                # queued until connectivity is restored, like the sync flow does
+                if self.queue_type == 'async' and self.config_id.l10n_cr_offline_mode:
+                    self.write({
+                        'queue_type': 'offline',
+                        'state': 'pending',
+                        'last_error': False,
+                    })
+                    if self.pos_order_id:
+                        self.pos_order_id.write({'l10n_cr_offline_queue': True})
+                    return
+
+                if einvoice.state in ('signed', 'submission_error'):
+                    einvoice.action_submit_to_hacienda()
 
             # Mark as synced
             self.write({
@@ -193,29 +225,38 @@ class PosOfflineQueue(models.Model):
             _logger.info(f"POS offline queue entry {self.id} synced successfully")
 
         except Exception as e:
-            error_msg = str(e)
-            new_retry_count = self.retry_count + 1
-
-            if new_retry_count >= self.max_retries:
-                self.write({
-                    'state': 'failed',
-                    'retry_count': new_retry_count,
-                    'last_retry': fields.Datetime.now(),
-                    'last_error': error_msg,
-                })
-                _logger.error(
-                    f"POS offline queue entry {self.id} failed permanently: {error_msg}"
-                )
-            else:
-                self.write({
-                    'state': 'pending',
-                    'retry_count': new_retry_count,
-                    'last_retry': fields.Datetime.now(),
-                    'last_error': error_msg,
-                })
-                _logger.warning(
-                    f"POS offline queue entry {self.id} failed (attempt {new_retry_count}): {error_msg}"
-                )
+            self._record_sync_failure(str(e))
+
+    def _record_sync_failure(self, error_msg):
+        """
+        Schedule a retry after a failed sync, or fail the entry permanently.
+
+        Args:
+            error_msg (str): Error to store on the entry
+        """
+        self.ensure_one()
+        new_retry_count = self.retry_count + 1
+
+        if new_retry_count >= self.max_retries:
+            self.write({
+                'state': 'failed',
+                'retry_count': new_retry_count,
+                'last_retry': fields.Datetime.now(),
+                'last_error': error_msg,
+            })
+            _logger.error(
+                f"POS offline queue entry {self.id} failed permanently: {error_msg}"
+            )
+        else:
+            self.write({
+                'state': 'pending',
+                'retry_count': new_retry_count,
+                'last_retry': fields.Datetime.now(),
+                'last_error': error_msg,
+            })
+            _logger.warning(
+                f"POS offline queue entry {self.id} failed (attempt {new_retry_count}): {error_msg}"
+            )
 
     def action_reset(self):
         """
@@ -305,6 +346,7 @@ class PosOfflineQueue(models.Model):
 
         # Find entries ready for retry
         entries = self.search([
+            ('queue_type', '=', 'offline'),
             ('state', '=', 'pending'),
             '|',
             ('next_retry', '<=', now),
@@ -339,6 +381,252 @@ class PosOfflineQueue(models.Model):
 
         return results
 
+    @api.model
+    def cron_drain_async_queue(self, limit=None):
+        """
+        Cron job draining the asynchronous POS e-invoice pipeline.
+
+        Triggered immediately by pos.order when an entry is enqueued, and
+        also scheduled every minute as a safety net. Entries are processed by
+        a bounded pool of workers, each committing its own entry, so one slow
+        Hacienda round trip does not hold up the rest of the batch. Large
+        batches are generated and signed in bulk first.
+
+        System Parameters:
+            - l10n_cr_einvoice.async_batch_size (default: 100)
+            - l10n_cr_einvoice.async_max_workers (default: 4)
+            - l10n_cr_einvoice.bulk_prepare_threshold (default: 50)
+
+        Args:
+            limit: Maximum entries to process per run (overrides the parameter)
+
+        Returns:
+            dict: Results with success, failed, and skipped counts
+        """
+        now = fields.Datetime.now()
+        limit = limit or get_pool_size(self.env, 'l10n_cr_einvoice.async_batch_size', 100)
+        max_workers = get_pool_size(self.env, 'l10n_cr_einvoice.async_max_workers', 4)
+
+        entries = self.search([
+            ('queue_type', '=', 'async'),
+            ('state', '=', 'pending'),
+            '|',
+            ('next_retry', '<=', now),
+            ('next_retry', '=', False),
+        ], limit=limit, order='priority desc, create_date asc')
+
+        if not entries:
+            return {'success': 0, 'failed': 0, 'skipped': 0}
+
+        # Large backlogs: run the CPU-bound stages for the whole batch at once
+        bulk_threshold = get_pool_size(self.env, 'l10n_cr_einvoice.bulk_prepare_threshold', 50)
+        results = entries._drain_entries(max_workers, bulk_prepare=len(entries) >= bulk_threshold)
+
+        _logger.info(
+            f"POS async e-invoice queue: {results['success']} success, "
+            f"{results['failed']} failed, {results['skipped']} skipped "
+            f"({max_workers} workers)"
+        )
+
+        # A full batch means more work is probably waiting: run again right away
+        if len(entries) >= limit:
+            cron = self.env.ref('l10n_cr_einvoice.cron_drain_pos_einvoice_queue', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+        return results
+
+    @api.model
+    def drain_queue_bulk(self, queue_type='offline', limit=None):
+        """
+        Backfill mode: drain a large backlog of queue entries.
+
+        Meant for catching up after a long outage (e.g. thousands of offline
+        POS documents). Entries are taken in chunks; for each chunk the XML is
+        generated and signed in bulk (signing can use a process pool, see
+        l10n_cr.einvoice.document._sign_xml_batch), the chunk is committed,
+        and the ready entries are submitted by the bounded worker pool.
+
+        System Parameters:
+            - l10n_cr_einvoice.bulk_drain_limit (default: 5000)
+            - l10n_cr_einvoice.bulk_chunk_size (default: 500)
+            - l10n_cr_einvoice.async_max_workers (default: 4)
+            - l10n_cr_einvoice.signing_processes (default: 1)
+
+        Args:
+            queue_type (str): 'offline' or 'async'
+            limit: Maximum entries to process (overrides the parameter)
+
+        Returns:
+            dict: Results with success, failed, and skipped counts
+        """
+        now = fields.Datetime.now()
+        limit = limit or get_pool_size(self.env, 'l10n_cr_einvoice.bulk_drain_limit', 5000)
+        chunk_size = get_pool_size(self.env, 'l10n_cr_einvoice.bulk_chunk_size', 500)
+        max_workers = get_pool_size(self.env, 'l10n_cr_einvoice.async_max_workers', 4)
+
+        entries = self.search([
+            ('queue_type', '=', queue_type),
+            ('state', '=', 'pending'),
+            '|',
+            ('next_retry', '<=', now),
+            ('next_retry', '=', False),
+        ], limit=limit, order='priority desc, create_date asc')
+
+        results = {'success': 0, 'failed': 0, 'skipped': 0}
+        for start in range(0, len(entries), chunk_size):
+            chunk = entries[start:start + chunk_size]
+
+            # Offline entries wait for their terminal to be back online
+            if queue_type == 'offline':
+                offline = chunk.filtered(
+                    lambda e: e.pos_order_id
+                    and hasattr(e.pos_order_id, '_l10n_cr_is_online')
+                    and not e.pos_order_id._l10n_cr_is_online()
+                )
+                results['skipped'] += len(offline)
+                chunk -= offline
+
+            for key, count in chunk._drain_entries(max_workers, bulk_prepare=True).items():
+                results[key] += count
+
+        _logger.info(
+            f"POS {queue_type} queue bulk drain: {results['success']} success, "
+            f"{results['failed']} failed, {results['skipped']} skipped "
+            f"({len(entries)} entries, chunks of {chunk_size})"
+        )
+        return results
+
+    def _drain_entries(self, max_workers, bulk_prepare=False):
+        """
+        Run the pipeline on these entries through the bounded worker pool.
+
+        Args:
+            max_workers (int): Maximum number of concurrent workers
+            bulk_prepare (bool): Generate and sign all documents in bulk first
+
+        Returns:
+            dict: Results with success, failed, and skipped counts
+        """
+        results = {'success': 0, 'failed': 0, 'skipped': 0}
+        entries = self
+        if bulk_prepare and entries:
+            entries = self._prepare_documents_bulk()
+            results['failed'] += len(self - entries)
+            # Workers use their own cursors: they must see the prepared documents
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
+
+        if not entries:
+            return results
+
+        outcomes = run_in_worker_pool(
+            self.env,
+            entries.ids,
+            lambda env, entry_id: env[self._name].browse(entry_id)._claim_and_sync(),
+            max_workers=max_workers,
+        )
+
+        for success, state in outcomes.values():
+            if not success:
+                results['failed'] += 1
+            elif state is False:
+                results['skipped'] += 1
+            elif state == 'synced':
+                results['success'] += 1
+            else:
+                results['failed'] += 1
+
+        return results
+
+    def _prepare_documents_bulk(self):
+        """
+        Run the CPU-bound stages (XML generation and signing) for all entries.
+
+        Generation reads the source documents through the ORM and stays in
+        this worker; signing is done in one batch per company. Entries whose
+        document fails a stage get the usual retry bookkeeping.
+
+        Returns:
+            l10n_cr.pos.offline.queue: Entries ready for submission
+        """
+        documents = self.einvoice_document_id
+        errors = {}
+
+        generating = documents.filtered(lambda d: d.state in ('draft', 'generation_error'))
+        if generating:
+            # Lock up front: a generation failure is then always a document
+            # error, never contention with another transaction
+            locked = self._lock_documents(generating)
+            for document in generating - locked:
+                errors[document.id] = 'Document is being processed by another transaction'
+            generating = locked
+
+        for document in generating.with_context(einvoice_error_in_transaction=True):
+            try:
+                with self.env.cr.savepoint():
+                    document.action_generate_xml()
+            except Exception as e:
+                # The savepoint rollback discarded the error state: record it again
+                document.write({'state': 'generation_error', 'error_message': str(e)})
+                errors[document.id] = str(e)
+
+        for document_id, (success, error_msg) in documents._sign_xml_batch().items():
+            if not success:
+                errors[document_id] = error_msg
+
+        failed = self.filtered(lambda e: e.einvoice_document_id.id in errors)
+        for entry in failed:
+            entry._record_sync_failure(errors[entry.einvoice_document_id.id])
+
+        _logger.info(
+            f"POS queue bulk preparation: {len(documents)} documents, {len(failed)} failed"
+        )
+        return self - failed
+
+    @api.model
+    def _lock_documents(self, documents):
+        """
+        Lock e-invoice documents, skipping those locked by another transaction.
+
+        Args:
+            documents (l10n_cr.einvoice.document): Documents to lock
+
+        Returns:
+            l10n_cr.einvoice.document: Documents now locked by this transaction
+        """
+        if not documents:
+            return documents
+        self.env.cr.execute("""
+            SELECT id FROM l10n_cr_einvoice_document
+            WHERE id IN %s
+            FOR UPDATE SKIP LOCKED
+        """, (tuple(documents.ids),))
+        locked_ids = {row[0] for row in self.env.cr.fetchall()}
+        return documents.filtered(lambda d: d.id in locked_ids)
+
+    def _claim_and_sync(self):
+        """
+        Lock this entry and run the pipeline on it.
+
+        Uses ``FOR UPDATE SKIP LOCKED`` so an entry already being processed by
+        another worker (or a manual retry) is skipped instead of waited on.
+
+        Returns:
+            str or bool: Resulting queue state, or False if the entry was not claimed
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            SELECT id FROM l10n_cr_pos_offline_queue
+            WHERE id = %s AND state = 'pending'
+            FOR UPDATE SKIP LOCKED
+        """, (self.id,))
+        if not self.env.cr.fetchone():
+            return False
+
+        self._perform_sync()
+        return self.state
+
     @api.model
     def cleanup_old_entries(self, days=30):
         """
@@ -183,6 +183,11 @@ class PosOrder(models.Model):
 
         self.l10n_cr_einvoice_document_id = einvoice.id
 
+        # Async mode: only enqueue, background workers run generate/sign/submit
+        if self.config_id.l10n_cr_async_einvoice:
+            self._enqueue_cr_einvoice(einvoice)
+            return
+
         # Trigger generation flow
         try:
             einvoice.action_generate_xml()
@@ -204,6 +209,24 @@ class PosOrder(models.Model):
             einvoice.write({'error_message': str(e), 'state': 'error'})
             raise  # Re-raise to be caught by the caller to log to chatter
 
+    def _enqueue_cr_einvoice(self, einvoice):
+        """Queue the e-invoice for the background pipeline and wake a cron worker.
+
+        The queue entry is committed together with the order, so the cron
+        triggered here picks it up right after the POS request finishes.
+        """
+        self.ensure_one()
+        self.env['l10n_cr.pos.offline.queue'].create({
+            'pos_order_id': self.id,
+            'einvoice_document_id': einvoice.id,
+            'queue_type': 'async',
+            'priority': 'high',
+            'state': 'pending',
+        })
+        cron = self.env.ref('l10n_cr_einvoice.cron_drain_pos_einvoice_queue', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
     def action_l10n_cr_resend_email(self):
         self.ensure_one()
         if self.l10n_cr_einvoice_document_id:
@@ -225,8 +248,12 @@ class PosOrder(models.Model):
         Called via RPC from ReceiptScreen after order sync to show
         a toast notification about the Hacienda submission result.
 
+        In asynchronous mode the document may still be in the background
+        pipeline; the result then carries ``pending: True`` so the POS polls
+        again instead of showing a final status.
+
         Returns:
-            dict: {type: 'success'|'danger'|'warning'|'info', message: str}
+            dict: {type: 'success'|'danger'|'warning'|'info', message: str, pending: bool}
                   or empty dict if no e-invoice on this order.
         """
         self.ensure_one()
@@ -236,6 +263,19 @@ class PosOrder(models.Model):
         doc = self.l10n_cr_einvoice_document_id
         doc_label = 'Factura Electrónica' if doc.document_type == 'FE' else 'Tiquete Electrónico'
 
+        if self.config_id.l10n_cr_async_einvoice and doc.state in ('draft', 'generated', 'signed'):
+            in_pipeline = self.env['l10n_cr.pos.offline.queue'].search_count([
+                ('pos_order_id', '=', self.id),
+                ('queue_type', '=', 'async'),
+                ('state', 'in', ['pending', 'syncing']),
+            ])
+            if in_pipeline:
+                return {
+                    'type': 'info',
+                    'message': '%s en proceso de envío a Hacienda' % doc_label,
+                    'pending': True,
+                }
+
         if doc.state == 'accepted':
             return {'type': 'success', 'message': '%s aceptada por Hacienda' % doc_label}
         elif doc.state == 'rejected':
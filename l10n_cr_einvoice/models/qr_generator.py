@@ -2,6 +2,8 @@
 import base64
 import io
 import logging
+import threading
+from collections import OrderedDict
 
 try:
     import qrcode
@@ -14,6 +16,15 @@ from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# A QR image only depends on the clave and the render size, so each worker
+# keeps the PNGs it rendered ({(clave, min_size): base64 str}). Accepted
+# documents also store theirs (l10n_cr.einvoice.document.qr_code_image).
+QR_MIN_SIZE = 150
+QR_LRU_SIZE = 1024
+
+_QR_LRU = OrderedDict()
+_QR_LOCK = threading.Lock()
+
 
 class QRGenerator(models.AbstractModel):
     """
@@ -29,12 +40,16 @@ class QRGenerator(models.AbstractModel):
     _description = 'Costa Rica E-Invoice QR Code Generator'
 
     @api.model
-    def generate_qr_code(self, clave):
+    def generate_qr_code(self, clave, min_size=QR_MIN_SIZE):
         """
         Generate QR code for electronic invoice clave.
 
+        Images are cached per (clave, min_size), so repeated renders of the
+        same document (receipts, PDFs, list views) reuse the PNG.
+
         Args:
             clave (str): 50-digit Hacienda key (clave)
+            min_size (int): Minimum image width/height in pixels
 
         Returns:
             str: Base64 encoded PNG image
@@ -53,6 +68,34 @@ class QRGenerator(models.AbstractModel):
                 'Invalid clave format. Expected 50 digits, got: %s'
             ) % (len(clave) if clave else 0))
 
+        key = (clave, min_size)
+        with _QR_LOCK:
+            cached = _QR_LRU.get(key)
+            if cached is not None:
+                _QR_LRU.move_to_end(key)
+                return cached
+
+        base64_img = self._render_qr_code(clave, min_size)
+
+        with _QR_LOCK:
+            _QR_LRU[key] = base64_img
+            while len(_QR_LRU) > QR_LRU_SIZE:
+                _QR_LRU.popitem(last=False)
+
+        return base64_img
+
+    @api.model
+    def _render_qr_code(self, clave, min_size):
+        """
+        Render the QR code PNG of a clave.
+
+        Args:
+            clave (str): 50-digit Hacienda key
+            min_size (int): Minimum image width/height in pixels
+
+        Returns:
+            str: Base64 encoded PNG image
+        """
         try:
             # Build Hacienda validation URL
             url = self._build_hacienda_url(clave)
@@ -71,11 +114,11 @@ class QRGenerator(models.AbstractModel):
             # Create PIL image (black and white)
             img = qr.make_image(fill_color="black", back_color="white")
 
-            # Ensure minimum size of 150x150
+            # Ensure minimum size
             img_size = img.size[0]
-            if img_size < 150:
-                # Calculate scaling factor to reach 150px minimum
-                scale = int(150 / img_size) + 1
+            if img_size < min_size:
+                # Calculate scaling factor to reach the minimum
+                scale = int(min_size / img_size) + 1
                 new_size = img_size * scale
                 img = img.resize((new_size, new_size))
 
@@ -145,4 +188,10 @@ class QRGenerator(models.AbstractModel):
                 'Cannot generate QR code: Document %s has no clave'
             ) % document.name)
 
-        return self.generate_qr_code(document.clave)
+        return document._get_qr_code_image() or self.generate_qr_code(document.clave)
+
+
+def clear_qr_cache():
+    """Forget every QR image cached by this worker."""
+    with _QR_LOCK:
+        _QR_LRU.clear()
@@ -203,12 +203,24 @@ class ResCompany(models.Model):
         'l10n_cr_hacienda_env',
     }
 
+    # Certificate fields that should invalidate the loaded certificate cache when changed
+    _CERTIFICATE_FIELDS = {
+        'l10n_cr_certificate', 'l10n_cr_private_key', 'l10n_cr_key_password',
+        'l10n_cr_prod_certificate', 'l10n_cr_prod_private_key', 'l10n_cr_prod_key_password',
+        'l10n_cr_active_certificate', 'l10n_cr_active_private_key', 'l10n_cr_active_key_password',
+    }
+
     def write(self, vals):
         res = super().write(vals)
         if self._HACIENDA_CREDENTIAL_FIELDS & set(vals):
-            from .hacienda_api import HaciendaAPI
+            hacienda_api = self.env['l10n_cr.hacienda.api']
+            for company in self:
+                # Drops the token of this worker and of the shared token store
+                hacienda_api._clear_token_cache(company.id)
+        if self._CERTIFICATE_FIELDS & set(vals):
+            cert_manager = self.env['l10n_cr.certificate.manager']
             for company in self:
-                HaciendaAPI.invalidate_token_cache(company.id)
+                cert_manager.invalidate_certificate_cache(company.id)
         return res
 
     # Software Provider ID (v4.4 mandatory ProveedorSistemas element)
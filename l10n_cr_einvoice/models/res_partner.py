@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 import logging
+import threading
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, SUPERUSER_ID, _
 from odoo.exceptions import ValidationError
+from odoo.modules.registry import Registry
+
+from ..utils.refresh_queue import get_refresh_queue
+from ..utils.worker_pool import get_pool_size
 
 _logger = logging.getLogger(__name__)
 
+# cr.postcommit.data key collecting the partners to enrich with a CIIU code
+CIIU_POSTCOMMIT_KEY = 'l10n_cr_einvoice.ciiu_partner_ids'
+# Background workers resolving CIIU codes for saved partners
+CIIU_POPULATE_WORKERS = 1
+
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
@@ -1175,13 +1185,13 @@ class ResPartner(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Override create to auto-populate CIIU from API on partner creation."""
+        """Override create to schedule CIIU auto-population after commit."""
         records = super().create(vals_list)
         records._auto_populate_ciiu_on_save()
         return records
 
     def write(self, vals):
-        """Override write to auto-populate CIIU when VAT changes."""
+        """Override write to schedule CIIU auto-population when VAT changes."""
         result = super().write(vals)
         # Only trigger if VAT was changed
         if 'vat' in vals:
@@ -1190,26 +1200,83 @@ class ResPartner(models.Model):
 
     def _auto_populate_ciiu_on_save(self):
         """
-        Auto-populate CIIU from cache or GoMeta API when a partner is saved.
+        Schedule CIIU auto-population for partners saved in this transaction.
 
-        Called from create() and write() hooks. Only triggers when:
-        - Partner has a valid CR cédula
-        - CIIU is not already set
-        - Not in a recursive call (skip_ciiu_auto_populate context flag)
+        Called from create() and write() hooks. Only schedules partners that:
+        - Have a valid CR cédula
+        - Have no CIIU set yet
+        - Are not saved from a recursive call (skip_ciiu_auto_populate context flag)
 
-        Strategy:
-        1. Check cache first (instant)
-        2. If no cache → single GoMeta API call (3s timeout, no retry)
-        3. Cache result for future instant lookups
-        4. If fails → leave empty silently
+        No lookup happens here: partner IDs are collected on the cursor and,
+        once the transaction has committed, handed to the background CIIU
+        queue whose workers run _populate_ciiu_batch(). Saving partners never
+        waits on Hacienda or GoMeta, not even after the commit.
         """
         if self.env.context.get('skip_ciiu_auto_populate'):
             return
 
+        partner_ids = list(self._get_ciiu_candidates())
+        if not partner_ids:
+            return
+
+        postcommit = self.env.cr.postcommit
+        pending = postcommit.data.get(CIIU_POSTCOMMIT_KEY)
+        if pending is None:
+            pending = postcommit.data[CIIU_POSTCOMMIT_KEY] = {}
+            queue = self._get_ciiu_queue()
+
+            @postcommit.add
+            def populate_ciiu():
+                for partner_id in pending:
+                    queue.submit(partner_id)
+
+        pending.update(dict.fromkeys(partner_ids))
+
+    @api.model
+    def _get_ciiu_queue(self):
+        """Return the CIIU auto-populate queue of this database (created on first use)."""
+        dbname = self.env.cr.dbname
+
+        def populate(partner_ids):
+            # Queue workers are plain threads: give them a cursor of their own
+            threading.current_thread().dbname = dbname
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['res.partner']._populate_ciiu_batch(partner_ids)
+
+        return get_refresh_queue(
+            (dbname, 'res.partner.ciiu'),
+            populate,
+            max_workers=get_pool_size(
+                self.env, 'l10n_cr_einvoice.ciiu_queue_workers', CIIU_POPULATE_WORKERS,
+            ),
+            # Test cursors cannot be shared across threads
+            autostart=not self.env.registry.in_test_mode(),
+        )
+
+    @api.model
+    def _drain_ciiu_queue(self):
+        """
+        Run every queued CIIU auto-population synchronously in the current transaction.
+
+        Returns:
+            int: Number of partners processed
+        """
+        return self._get_ciiu_queue().drain(handler=self._populate_ciiu_batch)
+
+    def _get_ciiu_candidates(self):
+        """
+        Select partners eligible for CIIU auto-population.
+
+        Returns:
+            dict: {partner_id: vat_clean} for CR partners with a valid cédula
+                and no CIIU code
+        """
         costa_rica = self.env.ref('base.cr', raise_if_not_found=False)
         if not costa_rica:
-            return
+            return {}
 
+        candidates = {}
         for partner in self:
             # Guard: only for CR partners with VAT and no CIIU
             if partner.l10n_cr_economic_activity_id:
@@ -1220,85 +1287,124 @@ class ResPartner(models.Model):
             vat_clean = (partner.vat or '').replace('-', '').replace(' ', '').strip()
             if not vat_clean.isdigit() or len(vat_clean) < 9 or len(vat_clean) > 12:
                 continue
+            candidates[partner.id] = vat_clean
+        return candidates
 
-            try:
-                ciiu = self._try_populate_ciiu_from_cache_or_api(partner, vat_clean)
-                if ciiu:
-                    partner.with_context(skip_ciiu_auto_populate=True).write({
-                        'l10n_cr_economic_activity_id': ciiu.id,
-                    })
-                    _logger.info(
-                        'Auto-populated CIIU %s for partner %s (VAT: %s)',
-                        ciiu.code, partner.name, vat_clean,
-                    )
-            except Exception:
-                _logger.debug(
-                    'CIIU auto-populate failed for partner %s (non-blocking)',
-                    partner.id, exc_info=True,
-                )
-
-    def _try_populate_ciiu_from_cache_or_api(self, partner, vat_clean):
+    @api.model
+    def _populate_ciiu_batch(self, partner_ids):
         """
-        Try to resolve CIIU code from cache, then GoMeta API.
+        Resolve and apply CIIU codes for many partners at once.
+
+        Strategy:
+        1. One cédula cache query per company (instant)
+        2. Misses go through the concurrent, rate-limited batch lookup
+           (Hacienda, then GoMeta) and are cached with one bulk upsert
+        3. One write per resolved CIIU code
+        4. Unresolved partners are left empty silently
 
         Args:
-            partner: res.partner record
-            vat_clean: normalized cédula (digits only)
+            partner_ids (list): res.partner IDs
 
         Returns:
-            l10n_cr.ciiu.code record or False
+            int: Number of partners updated
         """
-        # Step 1: Check cache (instant)
-        cache = self.env['l10n_cr.cedula.cache'].search([
-            ('cedula', '=', vat_clean),
-            ('company_id', '=', partner.company_id.id or self.env.company.id),
-        ], limit=1)
+        partners = self.browse(partner_ids).exists()
+        candidates = partners._get_ciiu_candidates()
+        if not candidates:
+            return 0
 
-        if cache:
-            if cache.ciiu_code_id:
-                return cache.ciiu_code_id
-            if cache.primary_activity:
-                ciiu = self._resolve_ciiu_from_hacienda_code(cache.primary_activity)
-                if ciiu:
-                    return ciiu
+        cache_model = self.env['l10n_cr.cedula.cache']
+        max_concurrent = get_pool_size(self.env, 'l10n_cr_einvoice.ciiu_populate_workers', 5)
+
+        by_company = {}
+        for partner in self.browse(list(candidates)):
+            company_id = partner.company_id.id or self.env.company.id
+            by_company.setdefault(company_id, {}).setdefault(
+                candidates[partner.id], []
+            ).append(partner.id)
+
+        ciiu_by_code = {}
+        partners_by_ciiu = {}
+        for company_id, partners_by_vat in by_company.items():
+            company = self.env['res.company'].browse(company_id)
+            caches = {
+                cache.cedula: cache
+                for cache in cache_model.search([
+                    ('cedula', 'in', list(partners_by_vat)),
+                    ('company_id', '=', company_id),
+                ])
+            }
 
-        # Step 2: Single GoMeta API call (3s timeout, no retry, no rate limiter)
-        import requests as _requests
-        try:
-            url = f'https://apis.gometa.org/cedulas/{vat_clean}'
-            resp = _requests.get(url, timeout=3)
-            if resp.status_code != 200:
-                return False
+            misses = [
+                vat for vat in partners_by_vat
+                if not (caches.get(vat) and (caches[vat].ciiu_code_id or caches[vat].primary_activity))
+            ]
+            if misses:
+                try:
+                    with self.env.cr.savepoint():
+                        caches.update(self._lookup_ciiu_misses(company, misses, max_concurrent))
+                except Exception:
+                    _logger.debug(
+                        'CIIU lookup failed for %d cédulas (non-blocking)', len(misses), exc_info=True,
+                    )
 
-            api_data = resp.json()
-            actividades = api_data.get('actividades', [])
-            if not actividades:
-                return False
+            for vat, ids in partners_by_vat.items():
+                cache = caches.get(vat)
+                if not cache:
+                    continue
+                ciiu = cache.ciiu_code_id
+                if not ciiu and cache.primary_activity:
+                    if cache.primary_activity not in ciiu_by_code:
+                        ciiu_by_code[cache.primary_activity] = self._resolve_ciiu_from_hacienda_code(
+                            cache.primary_activity
+                        )
+                    ciiu = ciiu_by_code[cache.primary_activity]
+                if ciiu:
+                    partners_by_ciiu.setdefault(ciiu, []).extend(ids)
 
-            raw_code = actividades[0].get('codigo', '')
-            if not raw_code:
-                return False
+        updated = 0
+        for ciiu, ids in partners_by_ciiu.items():
+            # Skip partners that got a CIIU while the lookup was running
+            to_update = self.browse(ids).filtered(lambda p: not p.l10n_cr_economic_activity_id)
+            if not to_update:
+                continue
+            to_update.with_context(skip_ciiu_auto_populate=True).write({
+                'l10n_cr_economic_activity_id': ciiu.id,
+            })
+            updated += len(to_update)
+            _logger.info('Auto-populated CIIU %s for %d partners', ciiu.code, len(to_update))
 
-            # Normalize: strip decimal part
-            code = str(raw_code).split('.')[0]
-            if len(code) > 4:
-                code = code[:4]
+        return updated
 
-            ciiu = self._resolve_ciiu_from_hacienda_code(code)
+    @api.model
+    def _lookup_ciiu_misses(self, company, cedulas, max_concurrent):
+        """
+        Fetch cédulas missing from the cache and store them in bulk.
 
-            # Cache result for future instant lookups
-            try:
-                lookup_service = self.env['l10n_cr.cedula.lookup.service']
-                normalized = lookup_service._normalize_gometa_response(api_data, vat_clean)
-                lookup_service._save_to_cache(vat_clean, normalized, 'gometa')
-            except Exception:
-                _logger.debug('Failed to cache GoMeta result for %s', vat_clean)
+        Args:
+            company (res.company): Cache company
+            cedulas (list): Clean cédulas
+            max_concurrent (int): Maximum concurrent API lookups
 
-            return ciiu
+        Returns:
+            dict: {cedula: l10n_cr.cedula.cache record} for the cédulas found
+        """
+        service = self.env['l10n_cr.cedula.lookup.service'].with_company(company)
+        remote = service._lookup_remote_batch(cedulas, max_concurrent=max_concurrent)
 
-        except Exception:
-            _logger.debug('GoMeta API call failed for %s (non-blocking)', vat_clean)
-            return False
+        to_cache = {}
+        for cedula, (success, value) in remote.items():
+            if not success or not value[0]:
+                continue
+            source, hacienda_result, gometa_result = value
+            data = (hacienda_result if source == 'hacienda' else gometa_result)['data']
+            to_cache[cedula] = (service._prepare_cache_data(data), source)
+
+        if not to_cache:
+            return {}
+        return self.env['l10n_cr.cedula.cache'].with_company(company).update_cache_bulk(
+            to_cache, company=company,
+        )
 
     def _apply_lookup_result(self, result):
         """
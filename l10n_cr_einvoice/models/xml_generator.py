@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import copy
 import re
 import logging
+import threading
 from datetime import datetime, date, timezone, timedelta
 from lxml import etree
 
@@ -9,6 +11,61 @@ from odoo.exceptions import ValidationError, UserError
 
 _logger = logging.getLogger(__name__)
 
+# Element tree behind the last XML string serialized in this thread, so the
+# caller can validate it without re-parsing (see take_generated_tree)
+_GENERATED_TREE = threading.local()
+
+# Company part of the document header (ProveedorSistemas, CodigoActividadEmisor,
+# Emisor), rendered once per company: {(dbname, company_id): (fingerprint, fragment)}
+_EMISOR_CACHE = {}
+_EMISOR_CACHE_LOCK = threading.Lock()
+
+# Tax rate -> (CodigoTarifaIVA, Tarifa), including the closest-rate mapping
+# of rates missing from XMLGenerator.TARIFA_IVA_MAP (see _get_tarifa_iva)
+_TARIFA_LOOKUP = {}
+
+
+class LineTaxEngine:
+    """
+    Batched tax computation for the lines of one document.
+
+    compute_all() runs once per distinct (tax set, unit price, quantity,
+    product) combination and lines repeating a combination reuse its result,
+    so an invoice with many identical membership lines costs one tax
+    computation. Tax rates of all lines (including group children) are read
+    in one go. Results are shared: callers must not modify them.
+    """
+
+    def __init__(self, lines, currency, partner=None):
+        self.currency = currency
+        self.partner = partner
+        taxes = lines.tax_ids
+        taxes |= taxes.children_tax_ids
+        self.tax_rates = {tax.id: tax.amount for tax in taxes}
+        self._results = {}
+
+    def compute_all(self, taxes, price_unit, quantity, product=None):
+        """Same result as taxes.compute_all() with the document currency and partner."""
+        key = (tuple(taxes.ids), price_unit, quantity, product.id if product else False)
+        tax_res = self._results.get(key)
+        if tax_res is None:
+            tax_res = taxes.compute_all(
+                price_unit,
+                currency=self.currency,
+                quantity=quantity,
+                product=product,
+                partner=self.partner,
+            )
+            self._results[key] = tax_res
+        return tax_res
+
+    def get_rate(self, env, tax_id):
+        """Percentage of a tax returned by compute_all()."""
+        rate = self.tax_rates.get(tax_id)
+        if rate is None:
+            rate = self.tax_rates[tax_id] = env['account.tax'].browse(tax_id).amount
+        return rate
+
 
 class XMLGenerator(models.AbstractModel):
     _name = 'l10n_cr.xml.generator'
@@ -113,6 +170,40 @@ class XMLGenerator(models.AbstractModel):
         else:
             raise ValidationError(_('Unknown document type: %s') % doc_type)
 
+    def _serialize_xml(self, root):
+        """Serialize a generated document and keep its tree for validation."""
+        xml_str = etree.tostring(
+            root,
+            encoding='utf-8',
+            xml_declaration=True,
+            pretty_print=True,
+        ).decode('utf-8')
+
+        _GENERATED_TREE.xml = xml_str
+        _GENERATED_TREE.root = root
+        return xml_str
+
+    @api.model
+    def take_generated_tree(self, xml_content):
+        """
+        Return the element tree of XML just produced by generate_invoice_xml().
+
+        The tree is handed over only for the exact string object that was
+        returned, and only once; any other input returns None and the caller
+        should parse the string instead.
+
+        Args:
+            xml_content (str): XML string returned by generate_invoice_xml()
+
+        Returns:
+            etree._Element or None
+        """
+        if getattr(_GENERATED_TREE, 'xml', None) is not xml_content:
+            return None
+        root = _GENERATED_TREE.root
+        _GENERATED_TREE.xml = _GENERATED_TREE.root = None
+        return root
+
     def _generate_factura_electronica(self, einvoice, source_doc):
         """Generate Factura Electrónica (FE) XML.
 
@@ -132,17 +223,7 @@ class XMLGenerator(models.AbstractModel):
 
         # v4.4 element order: Clave, ProveedorSistemas, CodigoActividadEmisor,
         # NumeroConsecutivo, FechaEmision, Emisor, Receptor, ...
-        etree.SubElement(root, 'Clave').text = einvoice.clave
-        etree.SubElement(root, 'ProveedorSistemas').text = self._get_proveedor_sistemas(source_doc.company_id)
-
-        codigo_actividad = self._get_activity_code(source_doc.company_id)
-        etree.SubElement(root, 'CodigoActividadEmisor').text = self._format_activity_code(codigo_actividad)
-        etree.SubElement(root, 'NumeroConsecutivo').text = einvoice.name or ''
-
-        fecha_emision, fecha_hora = self._get_fecha_emision(source_doc)
-        etree.SubElement(root, 'FechaEmision').text = fecha_hora.replace(microsecond=0).isoformat()
-
-        self._add_emisor(root, source_doc.company_id)
+        fecha_emision = self._add_document_header(root, einvoice, source_doc)
 
         # 6. Receptor (receiver/customer information) - Updated for Phase 1C and MVP Task 2
         # Use einvoice.partner_id (which may be the corporate parent for billing)
@@ -167,15 +248,7 @@ class XMLGenerator(models.AbstractModel):
         # 9. ResumenFactura (invoice summary) - MedioPago is inside ResumenFactura in v4.4
         self._add_resumen_factura(root, source_doc, lines_data)
 
-        # Convert to string
-        xml_str = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True,
-        ).decode('utf-8')
-
-        return xml_str
+        return self._serialize_xml(root)
 
     def _generate_tiquete_electronico(self, einvoice, source_doc):
         """Generate Tiquete Electrónico (TE) XML.
@@ -195,31 +268,14 @@ class XMLGenerator(models.AbstractModel):
         )
 
         # v4.4 element order (TE has no Receptor for anonymous sales)
-        etree.SubElement(root, 'Clave').text = einvoice.clave
-        etree.SubElement(root, 'ProveedorSistemas').text = self._get_proveedor_sistemas(source_doc.company_id)
-
-        codigo_actividad = self._get_activity_code(source_doc.company_id)
-        etree.SubElement(root, 'CodigoActividadEmisor').text = self._format_activity_code(codigo_actividad)
-        etree.SubElement(root, 'NumeroConsecutivo').text = einvoice.name or ''
-
-        fecha_emision, fecha_hora = self._get_fecha_emision(source_doc)
-        etree.SubElement(root, 'FechaEmision').text = fecha_hora.replace(microsecond=0).isoformat()
-
-        self._add_emisor(root, source_doc.company_id)
+        self._add_document_header(root, einvoice, source_doc)
         self._add_condicion_venta(root, source_doc)
 
         lines_data = self._compute_line_amounts(source_doc)
         self._add_detalle_servicio(root, source_doc, lines_data)
         self._add_resumen_factura(root, source_doc, lines_data)
 
-        xml_str = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True,
-        ).decode('utf-8')
-
-        return xml_str
+        return self._serialize_xml(root)
 
     def _generate_nota_credito(self, einvoice, move):
         """Generate Nota de Crédito (NC) XML.
@@ -232,17 +288,7 @@ class XMLGenerator(models.AbstractModel):
             nsmap={None: ns, 'ds': self.NAMESPACES['ds']},
         )
 
-        etree.SubElement(root, 'Clave').text = einvoice.clave
-        etree.SubElement(root, 'ProveedorSistemas').text = self._get_proveedor_sistemas(move.company_id)
-
-        codigo_actividad = self._get_activity_code(move.company_id)
-        etree.SubElement(root, 'CodigoActividadEmisor').text = self._format_activity_code(codigo_actividad)
-        etree.SubElement(root, 'NumeroConsecutivo').text = einvoice.name or ''
-
-        fecha_emision, fecha_hora = self._get_fecha_emision(move)
-        etree.SubElement(root, 'FechaEmision').text = fecha_hora.replace(microsecond=0).isoformat()
-
-        self._add_emisor(root, move.company_id)
+        fecha_emision = self._add_document_header(root, einvoice, move)
 
         if einvoice.partner_id:
             self._add_receptor(root, einvoice.partner_id, fecha_emision)
@@ -257,14 +303,7 @@ class XMLGenerator(models.AbstractModel):
             raise UserError(_("Credit Note requires a reference document (reversed_entry_id)"))
         self._add_informacion_referencia(root, move.reversed_entry_id)
 
-        xml_str = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True,
-        ).decode('utf-8')
-
-        return xml_str
+        return self._serialize_xml(root)
 
     def _generate_nota_debito(self, einvoice, move):
         """Generate Nota de Débito (ND) XML.
@@ -278,17 +317,7 @@ class XMLGenerator(models.AbstractModel):
             nsmap={None: ns, 'ds': self.NAMESPACES['ds']},
         )
 
-        etree.SubElement(root, 'Clave').text = einvoice.clave
-        etree.SubElement(root, 'ProveedorSistemas').text = self._get_proveedor_sistemas(move.company_id)
-
-        codigo_actividad = self._get_activity_code(move.company_id)
-        etree.SubElement(root, 'CodigoActividadEmisor').text = self._format_activity_code(codigo_actividad)
-        etree.SubElement(root, 'NumeroConsecutivo').text = einvoice.name or ''
-
-        fecha_emision, fecha_hora = self._get_fecha_emision(move)
-        etree.SubElement(root, 'FechaEmision').text = fecha_hora.replace(microsecond=0).isoformat()
-
-        self._add_emisor(root, move.company_id)
+        fecha_emision = self._add_document_header(root, einvoice, move)
 
         if einvoice.partner_id:
             self._add_receptor(root, einvoice.partner_id, fecha_emision)
@@ -303,14 +332,94 @@ class XMLGenerator(models.AbstractModel):
             raise UserError(_("Debit Note requires a reference document (debit_origin_id)"))
         self._add_informacion_referencia(root, move.debit_origin_id)
 
-        xml_str = etree.tostring(
-            root,
-            encoding='utf-8',
-            xml_declaration=True,
-            pretty_print=True,
-        ).decode('utf-8')
+        return self._serialize_xml(root)
 
-        return xml_str
+    def _add_document_header(self, root, einvoice, source_doc):
+        """
+        Add the header shared by all document types.
+
+        Renders Clave, ProveedorSistemas, CodigoActividadEmisor,
+        NumeroConsecutivo, FechaEmision and Emisor. Only Clave, the
+        consecutive number and the date are built per document; the company
+        parts come from the per-company fragment cache.
+
+        Args:
+            root: Document root element
+            einvoice: l10n_cr.einvoice.document record
+            source_doc: account.move or pos.order record
+
+        Returns:
+            date: Emission date (Costa Rica timezone)
+        """
+        proveedor, codigo_actividad, emisor = self._get_emisor_fragment(source_doc.company_id)
+
+        etree.SubElement(root, 'Clave').text = einvoice.clave
+        etree.SubElement(root, 'ProveedorSistemas').text = proveedor
+        etree.SubElement(root, 'CodigoActividadEmisor').text = codigo_actividad
+        etree.SubElement(root, 'NumeroConsecutivo').text = einvoice.name or ''
+
+        fecha_emision, fecha_hora = self._get_fecha_emision(source_doc)
+        etree.SubElement(root, 'FechaEmision').text = fecha_hora.replace(microsecond=0).isoformat()
+
+        with _EMISOR_CACHE_LOCK:
+            root.append(copy.deepcopy(emisor))
+
+        return fecha_emision
+
+    def _get_emisor_fingerprint(self, company):
+        """Company values the header fragment is rendered from."""
+        return (
+            company.name,
+            company.vat,
+            getattr(company, 'commercial_name', '') or '',
+            company.l10n_cr_emisor_location,
+            company.street,
+            company.street2,
+            company.phone,
+            company.email,
+            company.l10n_cr_proveedor_sistemas,
+            getattr(company.partner_id, 'l10n_cr_activity_code', '') or '',
+        )
+
+    def _get_emisor_fragment(self, company):
+        """
+        Get the company part of the document header, rendering it on a miss.
+
+        Entries are keyed by company and replaced as soon as any of the
+        company values they were rendered from changes.
+
+        Args:
+            company: res.company record
+
+        Returns:
+            tuple: (ProveedorSistemas, CodigoActividadEmisor, Emisor element);
+                the element is shared and must be copied before use
+        """
+        key = (self.env.cr.dbname, company.id)
+        fingerprint = self._get_emisor_fingerprint(company)
+        cached = _EMISOR_CACHE.get(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        fragment = self._render_emisor_fragment(company)
+        with _EMISOR_CACHE_LOCK:
+            _EMISOR_CACHE[key] = (fingerprint, fragment)
+        return fragment
+
+    def _render_emisor_fragment(self, company):
+        """Render the company part of the document header (uncached)."""
+        proveedor = self._get_proveedor_sistemas(company)
+        codigo_actividad = self._format_activity_code(self._get_activity_code(company))
+
+        holder = etree.Element('Header')
+        self._add_emisor(holder, company)
+        return proveedor, codigo_actividad, holder[0]
+
+    @api.model
+    def clear_emisor_cache(self):
+        """Drop all cached header fragments of this worker."""
+        with _EMISOR_CACHE_LOCK:
+            _EMISOR_CACHE.clear()
 
     def _add_emisor(self, root, company):
         """Add Emisor (sender) section."""
@@ -555,6 +664,9 @@ class XMLGenerator(models.AbstractModel):
         Also collects tax breakdown by (Codigo, CodigoTarifaIVA) for the
         TotalDesgloseImpuesto elements required in v4.4.
 
+        Tax computations are batched per document (see LineTaxEngine); the
+        engine is kept in each line dict for _add_line_tax().
+
         Returns:
             list of dicts with per-line amounts, plus aggregated totals.
         """
@@ -565,6 +677,7 @@ class XMLGenerator(models.AbstractModel):
 
         currency = source_doc.currency_id or self.env.company.currency_id
         partner = source_doc.partner_id if hasattr(source_doc, 'partner_id') else None
+        tax_engine = LineTaxEngine(order_lines, currency, partner)
 
         lines_data = []
         for line in order_lines:
@@ -580,24 +693,19 @@ class XMLGenerator(models.AbstractModel):
             line_tax_breakdown = []
             if line.tax_ids:
                 product = line.product_id if hasattr(line, 'product_id') else None
-                tax_res = line.tax_ids.compute_all(
+                tax_res = tax_engine.compute_all(
+                    line.tax_ids,
                     price_unit * (1 - (line.discount or 0.0) / 100.0),
-                    currency=currency,
-                    quantity=quantity,
+                    quantity,
                     product=product,
-                    partner=partner,
                 )
                 line_tax = tax_res['total_included'] - tax_res['total_excluded']
 
                 for tax_detail in tax_res.get('taxes', []):
-                    tax_record = self.env['account.tax'].browse(tax_detail['id'])
                     codigo_tipo = '01'  # IVA
-                    tarifa_info = self.TARIFA_IVA_MAP.get(tax_record.amount)
-                    if tarifa_info:
-                        codigo_tarifa, _ = tarifa_info
-                    else:
-                        closest_rate = min(self.TARIFA_IVA_MAP.keys(), key=lambda r: abs(r - tax_record.amount))
-                        codigo_tarifa, _ = self.TARIFA_IVA_MAP[closest_rate]
+                    codigo_tarifa, _tarifa = self._get_tarifa_iva(
+                        tax_engine.get_rate(self.env, tax_detail['id'])
+                    )
                     line_tax_breakdown.append({
                         'codigo': codigo_tipo,
                         'codigo_tarifa': codigo_tarifa,
@@ -614,6 +722,7 @@ class XMLGenerator(models.AbstractModel):
                 'tax_amount': line_tax,
                 'tax_breakdown': line_tax_breakdown,
                 'total': subtotal_after_discount + line_tax,
+                'tax_engine': tax_engine,
             })
 
         return lines_data
@@ -701,7 +810,9 @@ class XMLGenerator(models.AbstractModel):
 
             total_tax = 0.0
             if line.tax_ids:
-                total_tax = self._add_line_tax(linea_detalle, line, ld['subtotal_after_discount'])
+                total_tax = self._add_line_tax(
+                    linea_detalle, line, ld['subtotal_after_discount'], tax_engine=ld.get('tax_engine'),
+                )
             else:
                 # v4.4 requires at least one Impuesto element even with no taxes
                 impuesto = etree.SubElement(linea_detalle, 'Impuesto')
@@ -729,12 +840,16 @@ class XMLGenerator(models.AbstractModel):
         13.0: ('08', '13.00'),  # Tarifa general 13%
     }
 
-    def _add_line_tax(self, linea_detalle, line, base_amount):
+    def _add_line_tax(self, linea_detalle, line, base_amount, tax_engine=None):
         """Add tax information to line item (v4.4: each tax is a separate Impuesto element).
 
         Uses Odoo's tax engine (compute_all) to correctly handle fixed-amount
         taxes, price-included taxes, and tax groups.
 
+        Args:
+            tax_engine: LineTaxEngine of the document (optional, built for
+                this line when not given)
+
         Returns:
             float: Total tax amount for the line.
         """
@@ -744,37 +859,27 @@ class XMLGenerator(models.AbstractModel):
         # base_amount is subtotal_after_discount (qty * price - discount)
         quantity = line.qty if hasattr(line, 'qty') else line.quantity
         price_after_discount = base_amount / quantity if quantity else base_amount
-        source_doc = line.order_id if hasattr(line, 'order_id') else line.move_id
-        currency = source_doc.currency_id if source_doc else self.env.company.currency_id
-        partner = source_doc.partner_id if hasattr(source_doc, 'partner_id') else None
         product = line.product_id if hasattr(line, 'product_id') else None
 
-        tax_res = line.tax_ids.compute_all(
-            price_after_discount,
-            currency=currency,
-            quantity=quantity,
-            product=product,
-            partner=partner,
+        if tax_engine is None:
+            source_doc = line.order_id if hasattr(line, 'order_id') else line.move_id
+            currency = source_doc.currency_id if source_doc else self.env.company.currency_id
+            partner = source_doc.partner_id if hasattr(source_doc, 'partner_id') else None
+            tax_engine = LineTaxEngine(line, currency, partner)
+
+        tax_res = tax_engine.compute_all(
+            line.tax_ids, price_after_discount, quantity, product=product,
         )
 
         for tax_detail in tax_res.get('taxes', []):
-            tax_record = self.env['account.tax'].browse(tax_detail['id'])
             impuesto = etree.SubElement(linea_detalle, 'Impuesto')
 
-            tax_amount_percent = tax_record.amount
-
             # Codigo = Tax TYPE code (01=IVA for all value-added taxes)
             # CodigoTarifaIVA = Tax RATE code (01=0%, 02=1%, 03=2%, 04=4%, 08=13%)
             codigo_tipo = '01'  # IVA (all CR taxes are IVA variants)
-            tarifa_info = self.TARIFA_IVA_MAP.get(tax_amount_percent)
-            if tarifa_info:
-                codigo_tarifa, tarifa = tarifa_info
-            else:
-                # Unknown rate: find closest valid rate to avoid code/tarifa mismatch
-                # Hacienda rejects if code doesn't match tarifa (e.g. code 08 with 15%)
-                _logger.warning('Tax rate %.1f%% not in TARIFA_IVA_MAP, mapping to closest valid rate', tax_amount_percent)
-                closest_rate = min(self.TARIFA_IVA_MAP.keys(), key=lambda r: abs(r - tax_amount_percent))
-                codigo_tarifa, tarifa = self.TARIFA_IVA_MAP[closest_rate]
+            codigo_tarifa, tarifa = self._get_tarifa_iva(
+                tax_engine.get_rate(self.env, tax_detail['id'])
+            )
 
             etree.SubElement(impuesto, 'Codigo').text = codigo_tipo
             etree.SubElement(impuesto, 'CodigoTarifaIVA').text = codigo_tarifa
@@ -787,6 +892,23 @@ class XMLGenerator(models.AbstractModel):
 
         return total_tax
 
+    def _get_tarifa_iva(self, rate):
+        """Map a tax rate to (CodigoTarifaIVA, Tarifa).
+
+        Unknown rates are mapped to the closest valid rate to avoid a
+        code/tarifa mismatch (Hacienda rejects e.g. code 08 with 15%).
+        Lookups, including the closest-rate fallback, are memoized.
+        """
+        tarifa_info = _TARIFA_LOOKUP.get(rate)
+        if tarifa_info is None:
+            tarifa_info = self.TARIFA_IVA_MAP.get(rate)
+            if tarifa_info is None:
+                _logger.warning('Tax rate %.1f%% not in TARIFA_IVA_MAP, mapping to closest valid rate', rate)
+                closest_rate = min(self.TARIFA_IVA_MAP.keys(), key=lambda r: abs(r - rate))
+                tarifa_info = self.TARIFA_IVA_MAP[closest_rate]
+            _TARIFA_LOOKUP[rate] = tarifa_info
+        return tarifa_info
+
     def _get_default_cabys_code(self):
         """Get the default CABYS code from system parameter.
 
@@ -14,9 +14,12 @@ License: LGPL-3
 """
 
 import base64
+import copy
 import hashlib
 import logging
+import multiprocessing
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from lxml import etree
 
@@ -56,124 +59,171 @@ POLICY_HASH = (
 )
 
 
-class XMLSigner(models.AbstractModel):
+# Documents per task when a batch is spread over worker processes
+SIGN_BATCH_CHUNK_SIZE = 50
+
+
+def _c14n(element):
+    """Exclusive C14N form of an element (without comments)."""
+    return etree.tostring(element, method='c14n', exclusive=True, with_comments=False)
+
+
+def c14n_digest(element):
+    """Compute SHA-256 digest of element's exclusive C14N form."""
+    return base64.b64encode(hashlib.sha256(_c14n(element)).digest()).decode('utf-8')
+
+
+def rfc2253_name(name):
+    """Convert x509.Name to RFC 2253 string representation."""
+    parts = []
+    for attr in name:
+        oid = attr.oid
+        value = attr.value
+        if oid == x509.NameOID.COMMON_NAME:
+            parts.append('CN=%s' % value)
+        elif oid == x509.NameOID.ORGANIZATIONAL_UNIT_NAME:
+            parts.append('OU=%s' % value)
+        elif oid == x509.NameOID.ORGANIZATION_NAME:
+            parts.append('O=%s' % value)
+        elif oid == x509.NameOID.COUNTRY_NAME:
+            parts.append('C=%s' % value)
+        elif oid == x509.NameOID.SERIAL_NUMBER:
+            parts.append('2.5.4.5=#1310%s' % value.encode('utf-8').hex())
+        else:
+            parts.append('%s=%s' % (oid.dotted_string, value))
+    return ','.join(parts)
+
+
+class SigningContext:
     """
-    XAdES-EPES digital signature generator for Costa Rica e-invoices.
+    Per-certificate XAdES-EPES signing state.
 
-    Uses enveloped-signature transform + exclusive C14N with three
-    references: document, KeyInfo, and SignedProperties.
+    Everything that only depends on the certificate (DER encoding, certificate
+    digest, issuer name, the X509Data and SigningCertificate subtrees and the
+    signature policy) is computed once; signing a document then only builds
+    the per-document IDs, digests and the RSA-SHA256 signature value.
+
+    Plain Python (no Odoo environment) so it can be rebuilt in worker
+    processes for batch signing. Not thread-safe: use one context per thread.
     """
 
-    _name = 'l10n_cr.xml.signer'
-    _description = 'Costa Rica E-Invoice XML Signer'
+    def __init__(self, certificate, private_key):
+        ds = DS_NS
+        xades = XADES_NS
 
-    @api.model
-    def sign_xml(self, xml_content, certificate=None, private_key=None):
-        """
-        Sign XML document with XAdES-EPES digital signature.
+        self.certificate = certificate
+        self.private_key = private_key
+        self.parser = etree.XMLParser(remove_blank_text=True)
 
-        Args:
-            xml_content (str): XML content to sign
-            certificate: X.509 certificate object (cryptography)
-            private_key: RSA private key object (cryptography)
+        cert_der = certificate.public_bytes(serialization.Encoding.DER)
 
-        Returns:
-            str: Signed XML with embedded XAdES-EPES signature
-        """
-        try:
-            if not xml_content:
-                raise ValidationError(_('XML content cannot be empty'))
+        # KeyInfo content: X509Data with the certificate
+        self.x509_data = etree.Element('{%s}X509Data' % ds, nsmap={'ds': ds})
+        x509_cert = etree.SubElement(self.x509_data, '{%s}X509Certificate' % ds)
+        x509_cert.text = base64.b64encode(cert_der).decode('utf-8')
 
-            if certificate is None or private_key is None:
-                raise UserError(_(
-                    'Certificate and private key must be provided'
-                ))
+        # SignaturePolicyIdentifier (XAdES-EPES)
+        self.policy_identifier = etree.Element(
+            '{%s}SignaturePolicyIdentifier' % xades, nsmap={'xades': xades, 'ds': ds}
+        )
+        spid = etree.SubElement(self.policy_identifier, '{%s}SignaturePolicyId' % xades)
+        sp_id = etree.SubElement(spid, '{%s}SigPolicyId' % xades)
+        identifier = etree.SubElement(sp_id, '{%s}Identifier' % xades)
+        identifier.text = POLICY_URL
+        desc = etree.SubElement(sp_id, '{%s}Description' % xades)
+        desc.text = POLICY_DESCRIPTION
 
-            if isinstance(certificate, int):
-                raise UserError(_(
-                    'Certificate ID signing not yet implemented.'
-                ))
+        sp_hash = etree.SubElement(spid, '{%s}SigPolicyHash' % xades)
+        etree.SubElement(
+            sp_hash, '{%s}DigestMethod' % ds, Algorithm=DIGEST_SHA256
+        )
+        hv = etree.SubElement(sp_hash, '{%s}DigestValue' % ds)
+        hv.text = POLICY_HASH
 
-            if not isinstance(certificate, x509.Certificate):
-                raise ValidationError(_(
-                    'Invalid certificate object.'
-                ))
+        # SigningCertificate (SHA-256)
+        self.signing_certificate = etree.Element(
+            '{%s}SigningCertificate' % xades, nsmap={'xades': xades, 'ds': ds}
+        )
+        cert_el = etree.SubElement(self.signing_certificate, '{%s}Cert' % xades)
 
-            if not isinstance(private_key, rsa.RSAPrivateKey):
-                raise ValidationError(_(
-                    'Invalid private key object.'
-                ))
+        cert_hash = hashlib.sha256(cert_der).digest()
 
-            # Parse XML with blank text removal for consistent C14N
-            parser = etree.XMLParser(remove_blank_text=True)
-            try:
-                root = etree.fromstring(xml_content.encode('utf-8'), parser)
-            except etree.XMLSyntaxError as e:
-                raise ValidationError(_('Invalid XML content: %s') % str(e))
+        cd = etree.SubElement(cert_el, '{%s}CertDigest' % xades)
+        etree.SubElement(cd, '{%s}DigestMethod' % ds, Algorithm=DIGEST_SHA256)
+        dv = etree.SubElement(cd, '{%s}DigestValue' % ds)
+        dv.text = base64.b64encode(cert_hash).decode('utf-8')
 
-            # Generate unique IDs
-            uid = uuid.uuid4().hex[:32]
-            sig_id = 'Signature-' + uid
-            sig_value_id = 'SignatureValue-' + uid
-            ref_id = 'Reference-' + uid
-            key_info_id = 'KeyInfo-' + uid
-            xades_sp_id = 'SignedProperties-' + uid
-
-            # Build the complete Signature element
-            signature = self._build_signature(
-                root, certificate, private_key,
-                sig_id, sig_value_id, ref_id, key_info_id, xades_sp_id
-            )
-
-            # Append signature to root (enveloped)
-            root.append(signature)
-
-            # Serialize without pretty-printing to preserve canonical form
-            signed_xml = etree.tostring(
-                root,
-                encoding='UTF-8',
-                xml_declaration=True,
-            ).decode('utf-8')
+        # IssuerSerial
+        iss = etree.SubElement(cert_el, '{%s}IssuerSerial' % xades)
+        x509_issuer = etree.SubElement(iss, '{%s}X509IssuerName' % ds)
+        x509_issuer.text = rfc2253_name(certificate.issuer)
+        x509_serial = etree.SubElement(iss, '{%s}X509SerialNumber' % ds)
+        x509_serial.text = str(certificate.serial_number)
 
-            _logger.info('Successfully signed XML document with XAdES-EPES')
-            return signed_xml
+    def sign(self, xml_content):
+        """
+        Sign one XML document.
 
-        except (UserError, ValidationError):
-            raise
-        except Exception as e:
-            error_msg = str(e)
-            _logger.error('XML signing failed: %s' % error_msg, exc_info=True)
-            raise UserError(_('Failed to sign XML: %s') % error_msg)
+        Args:
+            xml_content (str): XML content to sign
+
+        Returns:
+            str: Signed XML with embedded XAdES-EPES signature
+
+        Raises:
+            etree.XMLSyntaxError: If xml_content is not well-formed
+        """
+        # Parse XML with blank text removal for consistent C14N
+        root = etree.fromstring(xml_content.encode('utf-8'), self.parser)
+
+        # Generate unique IDs
+        uid = uuid.uuid4().hex[:32]
+
+        # Build the complete Signature element
+        signature = self.build_signature(
+            root,
+            sig_id='Signature-' + uid,
+            sig_value_id='SignatureValue-' + uid,
+            ref_id='Reference-' + uid,
+            key_info_id='KeyInfo-' + uid,
+            xades_sp_id='SignedProperties-' + uid,
+        )
+
+        # Append signature to root (enveloped)
+        root.append(signature)
+
+        # Serialize without pretty-printing to preserve canonical form
+        return etree.tostring(
+            root,
+            encoding='UTF-8',
+            xml_declaration=True,
+        ).decode('utf-8')
 
-    def _build_signature(self, root, certificate, private_key,
-                         sig_id, sig_value_id, ref_id, key_info_id,
-                         xades_sp_id):
+    def build_signature(self, root, sig_id, sig_value_id, ref_id, key_info_id, xades_sp_id):
         """Build the complete XAdES-EPES Signature element."""
         ds = DS_NS
 
         # 1. Build QualifyingProperties first (we need its digest)
-        qualifying_props = self._build_qualifying_properties(
-            certificate, sig_id, ref_id, xades_sp_id
-        )
+        qualifying_props = self.build_qualifying_properties(sig_id, ref_id, xades_sp_id)
         signed_props = qualifying_props.find('{%s}SignedProperties' % XADES_NS)
-        signed_props_digest = self._c14n_digest(signed_props)
+        signed_props_digest = c14n_digest(signed_props)
 
         # 2. Compute document digest (root without Signature - not appended yet)
-        doc_digest = self._c14n_digest(root)
+        doc_digest = c14n_digest(root)
 
         # 3. Build KeyInfo and compute its digest
-        key_info = self._build_key_info(certificate, key_info_id)
-        key_info_digest = self._c14n_digest(key_info)
+        key_info = self.build_key_info(key_info_id)
+        key_info_digest = c14n_digest(key_info)
 
         # 4. Build SignedInfo with all three references
-        signed_info = self._build_signed_info(
+        signed_info = self.build_signed_info(
             ref_id, doc_digest,
             key_info_id, key_info_digest,
             xades_sp_id, signed_props_digest
         )
 
         # 5. Sign the SignedInfo
-        sig_value = self._compute_signature_value(signed_info, private_key)
+        sig_value = self.compute_signature_value(signed_info)
 
         # 6. Assemble Signature element
         signature = etree.Element(
@@ -195,9 +245,9 @@ class XMLSigner(models.AbstractModel):
 
         return signature
 
-    def _build_signed_info(self, ref_id, doc_digest,
-                           key_info_id, key_info_digest,
-                           xades_sp_id, signed_props_digest):
+    def build_signed_info(self, ref_id, doc_digest,
+                          key_info_id, key_info_digest,
+                          xades_sp_id, signed_props_digest):
         """Build SignedInfo with document, KeyInfo, and SignedProperties refs."""
         ds = DS_NS
         signed_info = etree.Element('{%s}SignedInfo' % ds, nsmap={'ds': ds})
@@ -253,8 +303,7 @@ class XMLSigner(models.AbstractModel):
 
         return signed_info
 
-    def _build_qualifying_properties(self, certificate, sig_id, ref_id,
-                                     xades_sp_id):
+    def build_qualifying_properties(self, sig_id, ref_id, xades_sp_id):
         """Build XAdES QualifyingProperties with SignaturePolicyIdentifier."""
         ds = DS_NS
         xades = XADES_NS
@@ -275,40 +324,9 @@ class XMLSigner(models.AbstractModel):
         st = etree.SubElement(ssp, '{%s}SigningTime' % xades)
         st.text = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
 
-        # SignaturePolicyIdentifier (XAdES-EPES)
-        spi = etree.SubElement(ssp, '{%s}SignaturePolicyIdentifier' % xades)
-        spid = etree.SubElement(spi, '{%s}SignaturePolicyId' % xades)
-        sp_id = etree.SubElement(spid, '{%s}SigPolicyId' % xades)
-        identifier = etree.SubElement(sp_id, '{%s}Identifier' % xades)
-        identifier.text = POLICY_URL
-        desc = etree.SubElement(sp_id, '{%s}Description' % xades)
-        desc.text = POLICY_DESCRIPTION
-
-        sp_hash = etree.SubElement(spid, '{%s}SigPolicyHash' % xades)
-        etree.SubElement(
-            sp_hash, '{%s}DigestMethod' % ds, Algorithm=DIGEST_SHA256
-        )
-        hv = etree.SubElement(sp_hash, '{%s}DigestValue' % ds)
-        hv.text = POLICY_HASH
-
-        # SigningCertificate (SHA-256)
-        sc = etree.SubElement(ssp, '{%s}SigningCertificate' % xades)
-        cert_el = etree.SubElement(sc, '{%s}Cert' % xades)
-
-        cert_der = certificate.public_bytes(serialization.Encoding.DER)
-        cert_hash = hashlib.sha256(cert_der).digest()
-
-        cd = etree.SubElement(cert_el, '{%s}CertDigest' % xades)
-        etree.SubElement(cd, '{%s}DigestMethod' % ds, Algorithm=DIGEST_SHA256)
-        dv = etree.SubElement(cd, '{%s}DigestValue' % ds)
-        dv.text = base64.b64encode(cert_hash).decode('utf-8')
-
-        # IssuerSerial
-        iss = etree.SubElement(cert_el, '{%s}IssuerSerial' % xades)
-        x509_issuer = etree.SubElement(iss, '{%s}X509IssuerName' % ds)
-        x509_issuer.text = self._get_rfc2253_name(certificate.issuer)
-        x509_serial = etree.SubElement(iss, '{%s}X509SerialNumber' % ds)
-        x509_serial.text = str(certificate.serial_number)
+        # SignaturePolicyIdentifier and SigningCertificate (per certificate)
+        ssp.append(copy.deepcopy(self.policy_identifier))
+        ssp.append(copy.deepcopy(self.signing_certificate))
 
         # SignedDataObjectProperties
         sdop = etree.SubElement(sp, '{%s}SignedDataObjectProperties' % xades)
@@ -320,53 +338,196 @@ class XMLSigner(models.AbstractModel):
 
         return qp
 
-    def _build_key_info(self, certificate, key_info_id):
+    def build_key_info(self, key_info_id):
         """Build KeyInfo element with X.509 certificate data."""
         key_info = etree.Element('{%s}KeyInfo' % DS_NS, nsmap={'ds': DS_NS}, Id=key_info_id)
-        x509_data = etree.SubElement(key_info, '{%s}X509Data' % DS_NS)
-
-        cert_der = certificate.public_bytes(serialization.Encoding.DER)
-        x509_cert = etree.SubElement(x509_data, '{%s}X509Certificate' % DS_NS)
-        x509_cert.text = base64.b64encode(cert_der).decode('utf-8')
-
+        key_info.append(copy.deepcopy(self.x509_data))
         return key_info
 
-    def _c14n_digest(self, element):
-        """Compute SHA-256 digest of element's exclusive C14N form."""
-        canonical = etree.tostring(
-            element, method='c14n', exclusive=True, with_comments=False
+    def compute_signature_value(self, signed_info):
+        """Sign the C14N form of SignedInfo using RSA-SHA256."""
+        sig_bytes = self.private_key.sign(
+            _c14n(signed_info), padding.PKCS1v15(), hashes.SHA256()
         )
-        return base64.b64encode(hashlib.sha256(canonical).digest()).decode('utf-8')
+        return base64.b64encode(sig_bytes).decode('utf-8')
 
-    def _compute_signature_value(self, signed_info, private_key):
-        """Sign the C14N form of SignedInfo using RSA-SHA256."""
-        canonical = etree.tostring(
-            signed_info, method='c14n', exclusive=True, with_comments=False
+    def sign_many(self, documents):
+        """
+        Sign documents one after another, isolating per-document failures.
+
+        Returns:
+            list: (success, signed_xml_or_error) per document, in input order
+        """
+        results = []
+        for xml_content in documents:
+            try:
+                if not xml_content:
+                    raise ValueError('XML content cannot be empty')
+                results.append((True, self.sign(xml_content)))
+            except Exception as e:
+                results.append((False, str(e)))
+        return results
+
+
+# Signing context of a batch worker process (set by _init_batch_worker)
+_WORKER_CONTEXT = None
+
+
+def _init_batch_worker(cert_der, key_der):
+    """Rebuild the signing context once per worker process."""
+    global _WORKER_CONTEXT
+    certificate = x509.load_der_x509_certificate(cert_der, default_backend())
+    private_key = serialization.load_der_private_key(key_der, None, default_backend())
+    _WORKER_CONTEXT = SigningContext(certificate, private_key)
+
+
+def _sign_batch_chunk(documents):
+    """Sign a chunk of documents in a batch worker process."""
+    return _WORKER_CONTEXT.sign_many(documents)
+
+
+class XMLSigner(models.AbstractModel):
+    """
+    XAdES-EPES digital signature generator for Costa Rica e-invoices.
+
+    Uses enveloped-signature transform + exclusive C14N with three
+    references: document, KeyInfo, and SignedProperties.
+    """
+
+    _name = 'l10n_cr.xml.signer'
+    _description = 'Costa Rica E-Invoice XML Signer'
+
+    @api.model
+    def sign_xml(self, xml_content, certificate=None, private_key=None):
+        """
+        Sign XML document with XAdES-EPES digital signature.
+
+        Args:
+            xml_content (str): XML content to sign
+            certificate: X.509 certificate object (cryptography)
+            private_key: RSA private key object (cryptography)
+
+        Returns:
+            str: Signed XML with embedded XAdES-EPES signature
+        """
+        try:
+            if not xml_content:
+                raise ValidationError(_('XML content cannot be empty'))
+
+            if certificate is None or private_key is None:
+                raise UserError(_(
+                    'Certificate and private key must be provided'
+                ))
+
+            if isinstance(certificate, int):
+                raise UserError(_(
+                    'Certificate ID signing not yet implemented.'
+                ))
+
+            if not isinstance(certificate, x509.Certificate):
+                raise ValidationError(_(
+                    'Invalid certificate object.'
+                ))
+
+            if not isinstance(private_key, rsa.RSAPrivateKey):
+                raise ValidationError(_(
+                    'Invalid private key object.'
+                ))
+
+            try:
+                signed_xml = SigningContext(certificate, private_key).sign(xml_content)
+            except etree.XMLSyntaxError as e:
+                raise ValidationError(_('Invalid XML content: %s') % str(e))
+
+            _logger.info('Successfully signed XML document with XAdES-EPES')
+            return signed_xml
+
+        except (UserError, ValidationError):
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            _logger.error('XML signing failed: %s' % error_msg, exc_info=True)
+            raise UserError(_('Failed to sign XML: %s') % error_msg)
+
+    @api.model
+    def sign_xml_batch(self, documents, certificate, private_key, processes=None):
+        """
+        Sign many XML documents with the same certificate.
+
+        The certificate-dependent parts of the signature are computed once for
+        the whole batch. Large batches (e.g. re-signing contingency documents)
+        can additionally be spread over worker processes; each worker rebuilds
+        the signing context once and only receives plain XML strings.
+
+        Args:
+            documents (list): XML contents (str) to sign
+            certificate: X.509 certificate object (cryptography)
+            private_key: RSA private key object (cryptography)
+            processes (int): Worker processes to use; defaults to System
+                Parameter l10n_cr_einvoice.signing_processes (1 = in-process)
+
+        Returns:
+            list: (success, signed_xml_or_error) tuples in input order
+        """
+        if not isinstance(certificate, x509.Certificate):
+            raise ValidationError(_('Invalid certificate object.'))
+        if not isinstance(private_key, rsa.RSAPrivateKey):
+            raise ValidationError(_('Invalid private key object.'))
+
+        documents = list(documents)
+        if not documents:
+            return []
+
+        if processes is None:
+            processes = int(self.env['ir.config_parameter'].sudo().get_param(
+                'l10n_cr_einvoice.signing_processes', '1'
+            ) or 1)
+
+        chunks = [
+            documents[i:i + SIGN_BATCH_CHUNK_SIZE]
+            for i in range(0, len(documents), SIGN_BATCH_CHUNK_SIZE)
+        ]
+        processes = min(processes, len(chunks))
+
+        if processes > 1 and not self.env.registry.in_test_mode():
+            results = self._sign_batch_in_processes(chunks, certificate, private_key, processes)
+        else:
+            results = SigningContext(certificate, private_key).sign_many(documents)
+
+        failed = sum(1 for success, _result in results if not success)
+        _logger.info(
+            'Batch signed %d XML documents (%d failed, %d process(es))',
+            len(results) - failed, failed, max(processes, 1)
         )
-        sig_bytes = private_key.sign(
-            canonical, padding.PKCS1v15(), hashes.SHA256()
+        return results
+
+    def _sign_batch_in_processes(self, chunks, certificate, private_key, processes):
+        """Sign document chunks in a pool of forked worker processes."""
+        # Key objects cannot be pickled: hand the workers DER bytes instead
+        cert_der = certificate.public_bytes(serialization.Encoding.DER)
+        key_der = private_key.private_bytes(
+            serialization.Encoding.DER,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
         )
-        return base64.b64encode(sig_bytes).decode('utf-8')
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_batch_worker,
+            initargs=(cert_der, key_der),
+        ) as executor:
+            results = []
+            for chunk_results in executor.map(_sign_batch_chunk, chunks):
+                results.extend(chunk_results)
+        return results
+
+    def _c14n_digest(self, element):
+        """Compute SHA-256 digest of element's exclusive C14N form."""
+        return c14n_digest(element)
 
     def _get_rfc2253_name(self, name):
         """Convert x509.Name to RFC 2253 string representation."""
-        parts = []
-        for attr in name:
-            oid = attr.oid
-            value = attr.value
-            if oid == x509.NameOID.COMMON_NAME:
-                parts.append('CN=%s' % value)
-            elif oid == x509.NameOID.ORGANIZATIONAL_UNIT_NAME:
-                parts.append('OU=%s' % value)
-            elif oid == x509.NameOID.ORGANIZATION_NAME:
-                parts.append('O=%s' % value)
-            elif oid == x509.NameOID.COUNTRY_NAME:
-                parts.append('C=%s' % value)
-            elif oid == x509.NameOID.SERIAL_NUMBER:
-                parts.append('2.5.4.5=#1310%s' % value.encode('utf-8').hex())
-            else:
-                parts.append('%s=%s' % (oid.dotted_string, value))
-        return ','.join(parts)
+        return rfc2253_name(name)
 
     @api.model
     def verify_signature(self, signed_xml):
@@ -10,16 +10,28 @@ Supported document types:
 - TE: Tiquete Electrónico (Electronic Ticket)
 - NC: Nota de Crédito Electrónica (Electronic Credit Note)
 - ND: Nota de Débito Electrónica (Electronic Debit Note)
+
+Compiled schemas are kept in a process-level registry keyed by document type
+and XSD file mtime, and warmed when the registry loads, so validating a
+document never recompiles the (xmldsig-importing) v4.4 schemas.
 """
 
 import logging
 import os
+import threading
 from lxml import etree
 from odoo import models, api, _
 from odoo.modules.module import get_module_path
 
 _logger = logging.getLogger(__name__)
 
+# Compiled schema registry: {document_type: {'path': str, 'mtime': float,
+# 'schema': etree.XMLSchema, 'lock': threading.Lock}}
+# XMLSchema keeps its error log on the instance, so validations against the
+# same schema are serialized with the entry lock.
+_SCHEMA_CACHE = {}
+_SCHEMA_CACHE_LOCK = threading.Lock()
+
 
 class XSDValidator(models.AbstractModel):
     """
@@ -57,8 +69,67 @@ class XSDValidator(models.AbstractModel):
         'ND': 'data/xsd/NotaDebitoElectronica_V4.4.xsd',
     }
 
+    def _register_hook(self):
+        super()._register_hook()
+        self._warm_schema_cache()
+
+    @api.model
+    def _warm_schema_cache(self):
+        """Compile all available XSD schemas into the process-level registry."""
+        for document_type in self.XSD_PATHS:
+            try:
+                self._get_compiled_schema(document_type)
+            except Exception as e:
+                _logger.warning('Could not precompile XSD schema for %s: %s', document_type, e)
+
+    @api.model
+    def _get_compiled_schema(self, document_type):
+        """
+        Get the compiled XSD schema of a document type from the registry.
+
+        The schema is compiled once per process and recompiled only when the
+        XSD file changes (mtime).
+
+        Args:
+            document_type (str): Document type
+
+        Returns:
+            dict: Registry entry with 'schema' and 'lock', or None if the XSD
+                file is not available
+
+        Raises:
+            etree.XMLSchemaParseError: If the XSD file cannot be compiled
+        """
+        with _SCHEMA_CACHE_LOCK:
+            entry = _SCHEMA_CACHE.get(document_type)
+
+        # Reuse the resolved path of a cached entry (a stat is cheaper than a module lookup)
+        xsd_path = entry['path'] if entry else self._get_xsd_path(document_type)
+        if not xsd_path:
+            return None
+        try:
+            mtime = os.path.getmtime(xsd_path)
+        except OSError:
+            return None
+
+        if entry and entry['mtime'] == mtime:
+            return entry
+
+        # Parse from the file path so relative xs:import/xs:include (xmldsig) resolve
+        schema = etree.XMLSchema(etree.parse(xsd_path))
+        entry = {
+            'path': xsd_path,
+            'mtime': mtime,
+            'schema': schema,
+            'lock': threading.Lock(),
+        }
+        with _SCHEMA_CACHE_LOCK:
+            _SCHEMA_CACHE[document_type] = entry
+        _logger.info('Compiled XSD schema for %s from %s', document_type, xsd_path)
+        return entry
+
     @api.model
-    def validate_xml(self, xml_content, document_type):
+    def validate_xml(self, xml_content, document_type, xml_tree=None):
         """
         Validate XML content against XSD schema.
 
@@ -67,6 +138,8 @@ class XSDValidator(models.AbstractModel):
         Args:
             xml_content (str): XML content as string
             document_type (str): Document type ('FE', 'TE', 'NC', 'ND')
+            xml_tree (etree._Element, optional): Already-parsed root of
+                xml_content (e.g. from the XML generator); avoids re-parsing
 
         Returns:
             tuple: (is_valid, error_message)
@@ -80,13 +153,22 @@ class XSDValidator(models.AbstractModel):
             return False, _('Unknown document type: %s') % document_type
 
         try:
+            # Parse once; both validation steps work on the same tree
+            if xml_tree is None:
+                try:
+                    xml_tree = self._parse_xml(xml_content)
+                except etree.XMLSyntaxError as e:
+                    return False, _('XML syntax error: %s') % str(e)
+                except Exception as e:
+                    return False, _('XML parsing error: %s') % str(e)
+
             # First, validate that XML is well-formed
-            is_valid, error = self._validate_well_formed(xml_content, document_type)
+            is_valid, error = self._validate_well_formed(xml_content, document_type, xml_tree=xml_tree)
             if not is_valid:
                 return False, error
 
             # Then, validate against XSD schema if available
-            is_valid, error = self._validate_against_xsd(xml_content, document_type)
+            is_valid, error = self._validate_against_xsd(xml_content, document_type, xml_tree=xml_tree)
             if not is_valid:
                 # XSD validation failed — this is a real error, propagate it
                 return False, error
@@ -103,7 +185,12 @@ class XSDValidator(models.AbstractModel):
             return False, error_msg
 
     @api.model
-    def _validate_well_formed(self, xml_content, document_type):
+    def _parse_xml(self, xml_content):
+        """Parse an XML string into its root element."""
+        return etree.fromstring(xml_content.encode('utf-8'))
+
+    @api.model
+    def _validate_well_formed(self, xml_content, document_type, xml_tree=None):
         """
         Validate that XML is well-formed and has correct structure.
 
@@ -115,13 +202,14 @@ class XSDValidator(models.AbstractModel):
         Args:
             xml_content (str): XML content
             document_type (str): Document type
+            xml_tree (etree._Element, optional): Already-parsed root
 
         Returns:
             tuple: (is_valid, error_message)
         """
         try:
             # Parse XML
-            root = etree.fromstring(xml_content.encode('utf-8'))
+            root = xml_tree if xml_tree is not None else self._parse_xml(xml_content)
 
             # Check root element name (strip namespace)
             root_tag = etree.QName(root).localname
@@ -205,53 +293,46 @@ class XSDValidator(models.AbstractModel):
         return errors
 
     @api.model
-    def _validate_against_xsd(self, xml_content, document_type):
+    def _validate_against_xsd(self, xml_content, document_type, xml_tree=None):
         """
         Validate XML against XSD schema file.
 
         Args:
             xml_content (str): XML content
             document_type (str): Document type
+            xml_tree (etree._Element, optional): Already-parsed root
 
         Returns:
             tuple: (is_valid, error_message)
         """
-        xsd_path = self._get_xsd_path(document_type)
-
-        if not xsd_path or not os.path.exists(xsd_path):
-            # XSD file not available - this is OK, we fall back to well-formed validation
-            _logger.debug(
-                'XSD schema not found for %s at %s. Skipping XSD validation.',
-                document_type,
-                xsd_path or 'unknown path'
-            )
-            return True, ''  # No schema = skip, OK
-
         try:
-            # Load XSD schema
-            with open(xsd_path, 'rb') as xsd_file:
-                schema_root = etree.XML(xsd_file.read())
-                schema = etree.XMLSchema(schema_root)
+            entry = self._get_compiled_schema(document_type)
+            if entry is None:
+                # XSD file not available - this is OK, we fall back to well-formed validation
+                _logger.debug(
+                    'XSD schema not found for %s. Skipping XSD validation.',
+                    document_type,
+                )
+                return True, ''  # No schema = skip, OK
 
-            # Parse XML document
-            xml_doc = etree.fromstring(xml_content.encode('utf-8'))
+            # Parse XML document (unless the caller already did)
+            xml_doc = xml_tree if xml_tree is not None else self._parse_xml(xml_content)
 
             # Validate against schema
-            if not schema.validate(xml_doc):
+            schema = entry['schema']
+            with entry['lock']:
+                is_valid = schema.validate(xml_doc)
                 # Collect all validation errors
-                error_messages = []
-                for error in schema.error_log:
-                    error_messages.append(
-                        f'Line {error.line}, Column {error.column}: {error.message}'
-                    )
+                error_messages = [
+                    f'Line {error.line}, Column {error.column}: {error.message}'
+                    for error in schema.error_log
+                ] if not is_valid else []
 
+            if not is_valid:
                 return False, 'XSD validation error: ' + '\n'.join(error_messages)
 
             return True, ''
 
-        except FileNotFoundError:
-            # XSD file disappeared between check and open - treat as unavailable
-            return True, ''
         except etree.XMLSchemaParseError as e:
             _logger.error('XSD schema parsing error for %s: %s', document_type, str(e))
             return False, 'Schema parse error: %s' % str(e)
@@ -323,7 +404,16 @@ class XSDValidator(models.AbstractModel):
             return result
 
         # Check well-formedness
-        is_valid, error = self._validate_well_formed(xml_content, document_type)
+        try:
+            xml_tree = self._parse_xml(xml_content)
+        except etree.XMLSyntaxError as e:
+            result['errors'].append(_('XML syntax error: %s') % str(e))
+            return result
+        except Exception as e:
+            result['errors'].append(_('XML parsing error: %s') % str(e))
+            return result
+
+        is_valid, error = self._validate_well_formed(xml_content, document_type, xml_tree=xml_tree)
         if not is_valid:
             result['errors'].append(error)
             return result
@@ -334,7 +424,7 @@ class XSDValidator(models.AbstractModel):
 
         if result['schema_available']:
             # Validate against XSD
-            is_valid, error = self._validate_against_xsd(xml_content, document_type)
+            is_valid, error = self._validate_against_xsd(xml_content, document_type, xml_tree=xml_tree)
             if not is_valid:
                 result['errors'].append(error)
             else:
@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
+import copy
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# Per-customer reports are aggregated in SQL and paged, so their memory use
+# does not grow with the number of customers. Pages can also be served from
+# a small per-worker cache ({(dbname, company_ids, report, *args): (result,
+# expires_at)}) when the caller opts in with use_cache=True.
+CUSTOMER_PAGE_SIZE = 100
+ANALYTICS_CACHE_SIZE = 256
+ANALYTICS_CACHE_TTL = 300  # seconds
+
+_ANALYTICS_CACHE = OrderedDict()
+_ANALYTICS_LOCK = threading.Lock()
+
 
 class EInvoiceCustomerAnalytics(models.AbstractModel):
     """Customer Analytics for E-Invoice."""
@@ -96,13 +111,79 @@ class EInvoiceCustomerAnalytics(models.AbstractModel):
         }
 
     @api.model
-    def get_customer_purchase_frequency(self, date_from=None, date_to=None):
+    def _get_order_by(self, order, columns):
+        """
+        Translate a report ``order`` argument into an SQL ORDER BY body.
+
+        Args:
+            order (str): "<column> [asc|desc]", e.g. "invoice_count desc"
+            columns (list): Sortable column names of the report query
+
+        Returns:
+            str: ORDER BY body, with partner_id as tie-breaker for stable paging
+
+        Raises:
+            UserError: If the column or direction is not supported
+        """
+        column, _sep, direction = (order or '').strip().partition(' ')
+        direction = direction.strip().upper() or 'ASC'
+        if column not in columns or direction not in ('ASC', 'DESC'):
+            raise UserError(_('Invalid sort order for customer analytics: %s') % order)
+        return f'{column} {direction} NULLS LAST, partner_id'
+
+    @api.model
+    def _get_cached_report(self, use_cache, key, compute):
+        """
+        Return a report result, from the per-worker cache when allowed.
+
+        Args:
+            use_cache (bool): Serve and store the result in the cache
+            key (tuple): Report name and arguments (date range, page, order)
+            compute (callable): Builds the result on a cache miss
+
+        Returns:
+            dict: Report result (a copy the caller may modify)
+        """
+        if not use_cache:
+            return compute()
+
+        key = (self.env.cr.dbname, tuple(sorted(self.env.companies.ids))) + key
+        with _ANALYTICS_LOCK:
+            cached = _ANALYTICS_CACHE.get(key)
+            if cached and cached[1] > time.monotonic():
+                _ANALYTICS_CACHE.move_to_end(key)
+                return copy.deepcopy(cached[0])
+
+        result = compute()
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.customer_analytics_cache_ttl', ANALYTICS_CACHE_TTL
+        ))
+        with _ANALYTICS_LOCK:
+            _ANALYTICS_CACHE[key] = (copy.deepcopy(result), time.monotonic() + ttl)
+            _ANALYTICS_CACHE.move_to_end(key)
+            while len(_ANALYTICS_CACHE) > ANALYTICS_CACHE_SIZE:
+                _ANALYTICS_CACHE.popitem(last=False)
+        return result
+
+    @api.model
+    def get_customer_purchase_frequency(self, date_from=None, date_to=None,
+                                        limit=CUSTOMER_PAGE_SIZE, offset=0, order=None,
+                                        use_cache=False):
         """
         Analyze customer purchase frequency patterns.
 
+        Customers are grouped in SQL (invoice count, first/last purchase and
+        average days between purchases via LAG). Category counts cover every
+        customer; the customer lists are paged per category.
+
         Args:
             date_from: Start date
             date_to: End date
+            limit: Customers returned per frequency category
+            offset: Customers skipped per frequency category
+            order: Sort order, e.g. "invoice_count desc" (default) or
+                "last_purchase_date asc"
+            use_cache: Serve the result from the per-worker report cache
 
         Returns:
             dict: Purchase frequency analysis
@@ -114,72 +195,123 @@ class EInvoiceCustomerAnalytics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        domain = [
-            ('invoice_date', '>=', date_from),
-            ('invoice_date', '<=', date_to),
-            ('state', '=', 'accepted'),
-        ]
-
-        documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        # Group by customer
-        customer_frequency = {}
-        for doc in documents:
-            partner_id = doc.partner_id.id
-            if partner_id not in customer_frequency:
-                customer_frequency[partner_id] = {
-                    'partner_name': doc.partner_id.name,
-                    'invoice_count': 0,
-                    'invoice_dates': [],
-                }
-
-            customer_frequency[partner_id]['invoice_count'] += 1
-            customer_frequency[partner_id]['invoice_dates'].append(doc.invoice_date)
-
-        # Categorize customers by frequency
-        frequency_categories = {
-            'high_frequency': [],  # >10 invoices
-            'medium_frequency': [],  # 5-10 invoices
-            'low_frequency': [],  # 2-4 invoices
-            'one_time': [],  # 1 invoice
-        }
+        order_by = self._get_order_by(order or 'invoice_count desc', [
+            'invoice_count', 'first_purchase_date', 'last_purchase_date',
+            'avg_days_between_purchases', 'partner_name',
+        ])
+
+        def compute():
+            self.env['l10n_cr.einvoice.document'].flush_model()
+            params = {
+                'company_ids': self.env.companies.ids,
+                'date_from': date_from,
+                'date_to': date_to,
+                'offset': offset,
+                'end': offset + limit,
+            }
+            customers_query = """
+                WITH purchases AS (
+                    SELECT d.partner_id,
+                           d.invoice_date,
+                           d.invoice_date - LAG(d.invoice_date) OVER (
+                               PARTITION BY d.partner_id ORDER BY d.invoice_date, d.id
+                           ) AS gap_days
+                      FROM l10n_cr_einvoice_document d
+                     WHERE d.company_id = ANY(%(company_ids)s)
+                       AND d.invoice_date >= %(date_from)s AND d.invoice_date <= %(date_to)s
+                       AND d.state = 'accepted'
+                ), customers AS (
+                    SELECT pu.partner_id,
+                           p.name AS partner_name,
+                           COUNT(*) AS invoice_count,
+                           MIN(pu.invoice_date) AS first_purchase_date,
+                           MAX(pu.invoice_date) AS last_purchase_date,
+                           AVG(pu.gap_days) AS avg_days_between_purchases
+                      FROM purchases pu
+                 LEFT JOIN res_partner p ON p.id = pu.partner_id
+                  GROUP BY pu.partner_id, p.name
+                ), categorized AS (
+                    SELECT *,
+                           CASE
+                               WHEN invoice_count > 10 THEN 'high_frequency'
+                               WHEN invoice_count >= 5 THEN 'medium_frequency'
+                               WHEN invoice_count >= 2 THEN 'low_frequency'
+                               ELSE 'one_time'
+                           END AS category
+                      FROM customers
+                )
+            """
 
-        for partner_id, data in customer_frequency.items():
-            count = data['invoice_count']
-            customer_info = {
-                'partner_id': partner_id,
-                'partner_name': data['partner_name'],
-                'invoice_count': count,
+            self.env.cr.execute(customers_query + """
+                SELECT category, COUNT(*) AS customer_count
+                  FROM categorized
+              GROUP BY category
+            """, params)
+            category_counts = dict(self.env.cr.fetchall())
+
+            self.env.cr.execute(customers_query + f"""
+                SELECT *
+                  FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY category ORDER BY {order_by}) AS rn
+                      FROM categorized
+                  ) ranked
+                 WHERE rn > %(offset)s AND rn <= %(end)s
+              ORDER BY category, rn
+            """, params)
+
+            frequency_categories = {
+                'high_frequency': [],  # >10 invoices
+                'medium_frequency': [],  # 5-10 invoices
+                'low_frequency': [],  # 2-4 invoices
+                'one_time': [],  # 1 invoice
             }
+            for row in self.env.cr.dictfetchall():
+                avg_gap = row['avg_days_between_purchases']
+                frequency_categories[row['category']].append({
+                    'partner_id': row['partner_id'],
+                    'partner_name': row['partner_name'],
+                    'invoice_count': row['invoice_count'],
+                    'first_purchase_date': row['first_purchase_date'],
+                    'last_purchase_date': row['last_purchase_date'],
+                    'avg_days_between_purchases': round(float(avg_gap), 1) if avg_gap is not None else None,
+                })
 
-            if count > 10:
-                frequency_categories['high_frequency'].append(customer_info)
-            elif count >= 5:
-                frequency_categories['medium_frequency'].append(customer_info)
-            elif count >= 2:
-                frequency_categories['low_frequency'].append(customer_info)
-            else:
-                frequency_categories['one_time'].append(customer_info)
+            return {
+                'date_from': date_from,
+                'date_to': date_to,
+                'total_customers': sum(category_counts.values()),
+                'high_frequency_count': category_counts.get('high_frequency', 0),
+                'medium_frequency_count': category_counts.get('medium_frequency', 0),
+                'low_frequency_count': category_counts.get('low_frequency', 0),
+                'one_time_count': category_counts.get('one_time', 0),
+                'frequency_categories': frequency_categories,
+            }
 
-        return {
-            'date_from': date_from,
-            'date_to': date_to,
-            'total_customers': len(customer_frequency),
-            'high_frequency_count': len(frequency_categories['high_frequency']),
-            'medium_frequency_count': len(frequency_categories['medium_frequency']),
-            'low_frequency_count': len(frequency_categories['low_frequency']),
-            'one_time_count': len(frequency_categories['one_time']),
-            'frequency_categories': frequency_categories,
-        }
+        return self._get_cached_report(
+            use_cache,
+            ('purchase_frequency', date_from, date_to, limit, offset, order_by),
+            compute,
+        )
 
     @api.model
-    def get_customer_payment_preferences(self, date_from=None, date_to=None):
+    def get_customer_payment_preferences(self, date_from=None, date_to=None,
+                                         limit=CUSTOMER_PAGE_SIZE, offset=0, order=None,
+                                         use_cache=False):
         """
         Analyze customer payment method preferences.
 
+        Usage per (customer, payment method), customer totals and the
+        dominant method are computed in SQL; only one page of customers is
+        returned.
+
         Args:
             date_from: Start date
             date_to: End date
+            limit: Number of customers to return
+            offset: Number of customers to skip
+            order: Sort order, e.g. "total_amount desc" (default) or
+                "total_invoices desc"
+            use_cache: Serve the result from the per-worker report cache
 
         Returns:
             dict: Payment preference analysis
@@ -191,61 +323,95 @@ class EInvoiceCustomerAnalytics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        query = """
-            SELECT
-                p.id as partner_id,
-                p.name as customer_name,
-                pm.name as payment_method,
-                pm.code as payment_code,
-                COUNT(d.id) as usage_count,
-                SUM(m.amount_total) as total_amount
-            FROM l10n_cr_einvoice_document d
-            JOIN account_move m ON d.move_id = m.id
-            JOIN res_partner p ON m.partner_id = p.id
-            LEFT JOIN account_move_payment_method_rel pmr ON m.id = pmr.move_id
-            LEFT JOIN l10n_cr_payment_method pm ON pmr.payment_method_id = pm.id
-            WHERE d.invoice_date >= %s AND d.invoice_date <= %s
-                AND d.state = 'accepted'
-            GROUP BY p.id, p.name, pm.name, pm.code
-            ORDER BY total_amount DESC
-        """
+        order_by = self._get_order_by(order or 'total_amount desc', [
+            'total_amount', 'total_invoices', 'customer_name', 'dominant_usage_percentage',
+        ])
+
+        def compute():
+            self.env['l10n_cr.einvoice.document'].flush_model()
+            self.env['account.move'].flush_model(['partner_id', 'amount_total', 'l10n_cr_payment_method_id'])
+            self.env.cr.execute(f"""
+                WITH usage AS (
+                    SELECT m.partner_id,
+                           m.l10n_cr_payment_method_id AS payment_method_id,
+                           COUNT(d.id) AS usage_count,
+                           SUM(m.amount_total) AS total_amount
+                      FROM l10n_cr_einvoice_document d
+                      JOIN account_move m ON d.move_id = m.id
+                     WHERE d.company_id = ANY(%(company_ids)s)
+                       AND d.invoice_date >= %(date_from)s AND d.invoice_date <= %(date_to)s
+                       AND d.state = 'accepted'
+                  GROUP BY m.partner_id, m.l10n_cr_payment_method_id
+                ), customers AS (
+                    SELECT u.partner_id,
+                           p.name AS customer_name,
+                           SUM(u.usage_count)::int AS total_invoices,
+                           SUM(u.total_amount) AS total_amount,
+                           MAX(u.usage_count) * 100.0 / SUM(u.usage_count) AS dominant_usage_percentage
+                      FROM usage u
+                      JOIN res_partner p ON p.id = u.partner_id
+                  GROUP BY u.partner_id, p.name
+                ), page AS (
+                    SELECT *,
+                           COUNT(*) OVER () AS total_customers,
+                           ROW_NUMBER() OVER (ORDER BY {order_by}) AS rn
+                      FROM customers
+                )
+                SELECT pg.partner_id, pg.customer_name, pg.total_invoices,
+                       pg.dominant_usage_percentage, pg.total_customers,
+                       u.payment_method_id, u.usage_count,
+                       u.total_amount AS method_amount,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY u.partner_id ORDER BY u.usage_count DESC, u.total_amount DESC
+                       ) = 1 AS is_dominant
+                  FROM page pg
+                  JOIN usage u ON u.partner_id = pg.partner_id
+                 WHERE pg.rn > %(offset)s AND pg.rn <= %(end)s
+              ORDER BY pg.rn, u.total_amount DESC
+            """, {
+                'company_ids': self.env.companies.ids,
+                'date_from': date_from,
+                'date_to': date_to,
+                'offset': offset,
+                'end': offset + limit,
+            })
+            results = self.env.cr.dictfetchall()
 
-        self.env.cr.execute(query, (date_from, date_to))
-        results = self.env.cr.dictfetchall()
+            payment_methods = self.env['l10n_cr.payment.method'].browse(
+                {row['payment_method_id'] for row in results if row['payment_method_id']}
+            )
+            names = {method.id: (method.name, method.code) for method in payment_methods}
 
-        # Group by customer
-        customer_preferences = {}
-        for row in results:
-            partner_id = row['partner_id']
-            if partner_id not in customer_preferences:
-                customer_preferences[partner_id] = {
+            customer_preferences = {}
+            for row in results:
+                name, code = names.get(row['payment_method_id'], (None, None))
+                preference = customer_preferences.setdefault(row['partner_id'], {
                     'customer_name': row['customer_name'],
                     'payment_methods': [],
-                    'total_invoices': 0,
-                }
-
-            customer_preferences[partner_id]['payment_methods'].append({
-                'payment_method': row['payment_method'] or 'No especificado',
-                'payment_code': row['payment_code'] or 'N/A',
-                'usage_count': row['usage_count'],
-                'total_amount': float(row['total_amount'] or 0),
-            })
-            customer_preferences[partner_id]['total_invoices'] += row['usage_count']
+                    'total_invoices': row['total_invoices'],
+                    'dominant_usage_percentage': float(row['dominant_usage_percentage'] or 0),
+                })
+                preference['payment_methods'].append({
+                    'payment_method': name or 'No especificado',
+                    'payment_code': code or 'N/A',
+                    'usage_count': row['usage_count'],
+                    'total_amount': float(row['method_amount'] or 0),
+                })
+                if row['is_dominant']:
+                    preference['dominant_payment_method'] = name or 'No especificado'
 
-        # Find dominant payment method per customer
-        for partner_id, data in customer_preferences.items():
-            if data['payment_methods']:
-                dominant = max(data['payment_methods'], key=lambda x: x['usage_count'])
-                data['dominant_payment_method'] = dominant['payment_method']
-                data['dominant_usage_percentage'] = (
-                    dominant['usage_count'] / data['total_invoices'] * 100
-                ) if data['total_invoices'] > 0 else 0
+            return {
+                'date_from': date_from,
+                'date_to': date_to,
+                'total_customers': results[0]['total_customers'] if results else 0,
+                'customer_preferences': customer_preferences,
+            }
 
-        return {
-            'date_from': date_from,
-            'date_to': date_to,
-            'customer_preferences': customer_preferences,
-        }
+        return self._get_cached_report(
+            use_cache,
+            ('payment_preferences', date_from, date_to, limit, offset, order_by),
+            compute,
+        )
 
     @api.model
     def get_customer_ciiu_distribution(self, date_from=None, date_to=None):
@@ -306,13 +472,23 @@ class EInvoiceCustomerAnalytics(models.AbstractModel):
         }
 
     @api.model
-    def get_email_engagement_metrics(self, date_from=None, date_to=None):
+    def get_email_engagement_metrics(self, date_from=None, date_to=None,
+                                     limit=CUSTOMER_PAGE_SIZE, offset=0, order=None,
+                                     use_cache=False):
         """
         Analyze email engagement metrics.
 
+        Totals cover every eligible invoice; the per-customer engagement and
+        the customers without email are aggregated in SQL and paged.
+
         Args:
             date_from: Start date
             date_to: End date
+            limit: Number of customers to return per list
+            offset: Number of customers to skip per list
+            order: Sort order of the engagement list, e.g. "total_invoices desc"
+                (default) or "engagement_rate asc"
+            use_cache: Serve the result from the per-worker report cache
 
         Returns:
             dict: Email engagement analysis
@@ -324,159 +500,217 @@ class EInvoiceCustomerAnalytics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-            ('state', '=', 'accepted'),
-        ]
-
-        documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        # Email metrics
-        total_eligible = len(documents)
-        emails_sent = len(documents.filtered(lambda x: x.email_sent))
-        emails_not_sent = total_eligible - emails_sent
-
-        email_delivery_rate = (emails_sent / total_eligible * 100) if total_eligible > 0 else 0
-
-        # Group by customer
-        customer_engagement = {}
-        for doc in documents:
-            partner_id = doc.partner_id.id
-            if partner_id not in customer_engagement:
-                customer_engagement[partner_id] = {
-                    'partner_name': doc.partner_id.name,
-                    'partner_email': doc.partner_id.email or 'N/A',
-                    'total_invoices': 0,
-                    'emails_sent': 0,
-                    'emails_not_sent': 0,
+        order_by = self._get_order_by(order or 'total_invoices desc', [
+            'total_invoices', 'emails_sent', 'emails_not_sent', 'engagement_rate', 'partner_name',
+        ])
+
+        def compute():
+            self.env['l10n_cr.einvoice.document'].flush_model()
+            params = {
+                'company_ids': self.env.companies.ids,
+                'date_from': date_from,
+                'date_to': date_to,
+                'limit': limit,
+                'offset': offset,
+            }
+            customers_query = """
+                WITH customers AS (
+                    SELECT d.partner_id,
+                           p.name AS partner_name,
+                           NULLIF(p.email, '') AS partner_email,
+                           COUNT(*) AS total_invoices,
+                           COUNT(*) FILTER (WHERE d.email_sent) AS emails_sent,
+                           COUNT(*) FILTER (WHERE NOT d.email_sent OR d.email_sent IS NULL) AS emails_not_sent,
+                           COUNT(*) FILTER (WHERE d.email_sent) * 100.0 / COUNT(*) AS engagement_rate
+                      FROM l10n_cr_einvoice_document d
+                 LEFT JOIN res_partner p ON p.id = d.partner_id
+                     WHERE d.company_id = ANY(%(company_ids)s)
+                       AND d.create_date >= %(date_from)s AND d.create_date <= %(date_to)s
+                       AND d.state = 'accepted'
+                  GROUP BY d.partner_id, p.name, p.email
+                )
+            """
+
+            self.env.cr.execute(customers_query + """
+                SELECT COALESCE(SUM(total_invoices), 0)::int AS total_eligible,
+                       COALESCE(SUM(emails_sent), 0)::int AS emails_sent,
+                       COUNT(*) AS total_customers,
+                       COUNT(*) FILTER (WHERE partner_email IS NULL) AS customers_no_email
+                  FROM customers
+            """, params)
+            totals = self.env.cr.dictfetchone()
+
+            self.env.cr.execute(customers_query + f"""
+                SELECT *
+                  FROM customers
+              ORDER BY {order_by}
+                 LIMIT %(limit)s OFFSET %(offset)s
+            """, params)
+            customer_engagement = {
+                row['partner_id']: {
+                    'partner_name': row['partner_name'],
+                    'partner_email': row['partner_email'] or 'N/A',
+                    'total_invoices': row['total_invoices'],
+                    'emails_sent': row['emails_sent'],
+                    'emails_not_sent': row['emails_not_sent'],
+                    'engagement_rate': float(row['engagement_rate']),
                 }
+                for row in self.env.cr.dictfetchall()
+            }
 
-            customer_engagement[partner_id]['total_invoices'] += 1
-            if doc.email_sent:
-                customer_engagement[partner_id]['emails_sent'] += 1
-            else:
-                customer_engagement[partner_id]['emails_not_sent'] += 1
-
-        # Calculate engagement rate per customer
-        for data in customer_engagement.values():
-            data['engagement_rate'] = (
-                data['emails_sent'] / data['total_invoices'] * 100
-            ) if data['total_invoices'] > 0 else 0
-
-        # Find customers with no email
-        customers_no_email = []
-        for partner_id, data in customer_engagement.items():
-            if data['partner_email'] == 'N/A':
-                customers_no_email.append({
-                    'partner_id': partner_id,
-                    'partner_name': data['partner_name'],
-                    'invoice_count': data['total_invoices'],
-                })
+            self.env.cr.execute(customers_query + """
+                SELECT partner_id, partner_name, total_invoices
+                  FROM customers
+                 WHERE partner_email IS NULL
+              ORDER BY total_invoices DESC, partner_id
+                 LIMIT %(limit)s OFFSET %(offset)s
+            """, params)
+            customers_no_email = [{
+                'partner_id': row['partner_id'],
+                'partner_name': row['partner_name'],
+                'invoice_count': row['total_invoices'],
+            } for row in self.env.cr.dictfetchall()]
 
-        return {
-            'date_from': date_from,
-            'date_to': date_to,
-            'total_eligible_invoices': total_eligible,
-            'emails_sent': emails_sent,
-            'emails_not_sent': emails_not_sent,
-            'email_delivery_rate': round(email_delivery_rate, 2),
-            'total_customers': len(customer_engagement),
-            'customers_no_email': customers_no_email,
-            'customer_engagement': customer_engagement,
-        }
+            total_eligible = totals['total_eligible']
+            emails_sent = totals['emails_sent']
+            email_delivery_rate = (emails_sent / total_eligible * 100) if total_eligible > 0 else 0
+
+            return {
+                'date_from': date_from,
+                'date_to': date_to,
+                'total_eligible_invoices': total_eligible,
+                'emails_sent': emails_sent,
+                'emails_not_sent': total_eligible - emails_sent,
+                'email_delivery_rate': round(email_delivery_rate, 2),
+                'total_customers': totals['total_customers'],
+                'customers_no_email_count': totals['customers_no_email'],
+                'customers_no_email': customers_no_email,
+                'customer_engagement': customer_engagement,
+            }
+
+        return self._get_cached_report(
+            use_cache,
+            ('email_engagement', date_from, date_to, limit, offset, order_by),
+            compute,
+        )
 
     @api.model
-    def get_customer_lifetime_value(self, partner_id=None, limit=50):
+    def get_customer_lifetime_value(self, partner_id=None, limit=50, offset=0, order=None,
+                                    use_cache=False):
         """
         Calculate customer lifetime value (CLV).
 
+        Revenue, credits, activity and the average days between purchases
+        (via LAG) are aggregated per customer in SQL, sorted and paged there.
+
         Args:
             partner_id: Specific customer ID (optional)
             limit: Number of top customers to return
+            offset: Number of customers to skip
+            order: Sort order, e.g. "lifetime_value desc" (default) or
+                "recency_days asc"
+            use_cache: Serve the result from the per-worker report cache
 
         Returns:
-            dict or list: CLV analysis
+            dict: CLV of the customer, or the CLV ranking when no customer is given
         """
-        if partner_id:
-            domain = [('partner_id', '=', partner_id)]
-        else:
-            domain = []
-
-        domain.append(('state', '=', 'accepted'))
-
-        query = """
-            SELECT
-                p.id as partner_id,
-                p.name as customer_name,
-                p.create_date as customer_since,
-                MIN(d.invoice_date) as first_purchase_date,
-                MAX(d.invoice_date) as last_purchase_date,
-                COUNT(DISTINCT d.id) as total_invoices,
-                SUM(CASE WHEN d.document_type IN ('FE', 'TE', 'ND') THEN m.amount_total ELSE 0 END) as total_revenue,
-                SUM(CASE WHEN d.document_type = 'NC' THEN m.amount_total ELSE 0 END) as total_credits,
-                COUNT(DISTINCT DATE(d.invoice_date)) as active_days,
-                COUNT(DISTINCT EXTRACT(MONTH FROM d.invoice_date)) as active_months
-            FROM res_partner p
-            JOIN account_move m ON m.partner_id = p.id
-            JOIN l10n_cr_einvoice_document d ON d.move_id = m.id
-            WHERE d.state = 'accepted'
-        """
-
-        if partner_id:
-            query += " AND p.id = %s"
-            params = (partner_id,)
-        else:
-            query += " GROUP BY p.id, p.name, p.create_date ORDER BY total_revenue DESC LIMIT %s"
-            params = (limit,)
-
-        if not partner_id:
-            query = query.replace("FROM res_partner p", "FROM res_partner p")
-            query += """
-            GROUP BY p.id, p.name, p.create_date
-            ORDER BY total_revenue DESC
-            LIMIT %s
-            """
-
-        self.env.cr.execute(query, params)
-        results = self.env.cr.dictfetchall()
-
-        clv_data = []
-        for row in results:
-            net_revenue = float(row['total_revenue'] or 0) - float(row['total_credits'] or 0)
-            avg_order_value = net_revenue / row['total_invoices'] if row['total_invoices'] > 0 else 0
-
-            # Calculate customer age in days
-            customer_age = (datetime.now().date() - row['customer_since'].date()).days if row['customer_since'] else 0
-
-            # Purchase recency (days since last purchase)
-            if row['last_purchase_date']:
-                recency_days = (datetime.now().date() - row['last_purchase_date']).days
-            else:
-                recency_days = 0
-
-            clv_data.append({
-                'partner_id': row['partner_id'],
-                'customer_name': row['customer_name'],
-                'customer_since': row['customer_since'],
-                'customer_age_days': customer_age,
-                'first_purchase_date': row['first_purchase_date'],
-                'last_purchase_date': row['last_purchase_date'],
-                'recency_days': recency_days,
-                'total_invoices': row['total_invoices'],
-                'total_revenue': float(row['total_revenue'] or 0),
-                'total_credits': float(row['total_credits'] or 0),
-                'net_revenue': net_revenue,
-                'avg_order_value': avg_order_value,
-                'active_days': row['active_days'],
-                'active_months': row['active_months'],
-                'lifetime_value': net_revenue,  # Simplified CLV
+        order_by = self._get_order_by(order or 'lifetime_value desc', [
+            'lifetime_value', 'total_invoices', 'avg_order_value', 'recency_days',
+            'customer_age_days', 'avg_days_between_purchases', 'customer_name',
+        ])
+
+        def compute():
+            self.env['l10n_cr.einvoice.document'].flush_model()
+            self.env['account.move'].flush_model(['partner_id', 'amount_total'])
+            partner_clause = 'AND m.partner_id = %(partner_id)s' if partner_id else ''
+            self.env.cr.execute(f"""
+                WITH purchases AS (
+                    SELECT m.partner_id,
+                           d.document_type,
+                           d.invoice_date,
+                           m.amount_total,
+                           d.invoice_date - LAG(d.invoice_date) OVER (
+                               PARTITION BY m.partner_id ORDER BY d.invoice_date, d.id
+                           ) AS gap_days
+                      FROM l10n_cr_einvoice_document d
+                      JOIN account_move m ON d.move_id = m.id
+                     WHERE d.company_id = ANY(%(company_ids)s)
+                       AND d.state = 'accepted'
+                       {partner_clause}
+                ), customers AS (
+                    SELECT pu.partner_id,
+                           p.name AS customer_name,
+                           p.create_date AS customer_since,
+                           MIN(pu.invoice_date) AS first_purchase_date,
+                           MAX(pu.invoice_date) AS last_purchase_date,
+                           COUNT(*) AS total_invoices,
+                           COALESCE(SUM(pu.amount_total) FILTER (WHERE pu.document_type IN ('FE', 'TE', 'ND')), 0) AS total_revenue,
+                           COALESCE(SUM(pu.amount_total) FILTER (WHERE pu.document_type = 'NC'), 0) AS total_credits,
+                           COUNT(DISTINCT pu.invoice_date) AS active_days,
+                           COUNT(DISTINCT date_trunc('month', pu.invoice_date)) AS active_months,
+                           AVG(pu.gap_days) AS avg_days_between_purchases
+                      FROM purchases pu
+                      JOIN res_partner p ON p.id = pu.partner_id
+                  GROUP BY pu.partner_id, p.name, p.create_date
+                ), clv AS (
+                    SELECT *,
+                           total_revenue - total_credits AS lifetime_value,
+                           (total_revenue - total_credits) / total_invoices AS avg_order_value,
+                           CURRENT_DATE - customer_since::date AS customer_age_days,
+                           CURRENT_DATE - last_purchase_date AS recency_days
+                      FROM customers
+                )
+                SELECT *, COUNT(*) OVER () AS total_customers
+                  FROM clv
+              ORDER BY {order_by}
+                 LIMIT %(limit)s OFFSET %(offset)s
+            """, {
+                'company_ids': self.env.companies.ids,
+                'partner_id': partner_id,
+                'limit': limit,
+                'offset': offset,
             })
+            results = self.env.cr.dictfetchall()
+
+            clv_data = []
+            for row in results:
+                net_revenue = float(row['lifetime_value'] or 0)
+                avg_gap = row['avg_days_between_purchases']
+                clv_data.append({
+                    'partner_id': row['partner_id'],
+                    'customer_name': row['customer_name'],
+                    'customer_since': row['customer_since'],
+                    'customer_age_days': row['customer_age_days'] or 0,
+                    'first_purchase_date': row['first_purchase_date'],
+                    'last_purchase_date': row['last_purchase_date'],
+                    'recency_days': row['recency_days'] or 0,
+                    'total_invoices': row['total_invoices'],
+                    'total_revenue': float(row['total_revenue']),
+                    'total_credits': float(row['total_credits']),
+                    'net_revenue': net_revenue,
+                    'avg_order_value': float(row['avg_order_value'] or 0),
+                    'active_days': row['active_days'],
+                    'active_months': row['active_months'],
+                    'avg_days_between_purchases': round(float(avg_gap), 1) if avg_gap is not None else None,
+                    'lifetime_value': net_revenue,  # Simplified CLV
+                })
 
-        if partner_id:
-            return clv_data[0] if clv_data else {}
-        else:
+            if partner_id:
+                return clv_data[0] if clv_data else {}
             return {
                 'top_customers_by_clv': clv_data,
                 'total_analyzed': len(clv_data),
+                'total_customers': results[0]['total_customers'] if results else 0,
             }
+
+        return self._get_cached_report(
+            use_cache,
+            ('lifetime_value', partner_id, limit, offset, order_by),
+            compute,
+        )
+
+
+def clear_customer_analytics_cache():
+    """Forget every customer analytics report cached by this worker."""
+    with _ANALYTICS_LOCK:
+        _ANALYTICS_CACHE.clear()
@@ -5,8 +5,14 @@ from lxml import etree
 from odoo import models, api, _
 from odoo.exceptions import UserError
 
+from ..utils.worker_pool import get_pool_size, run_in_worker_pool
+
 _logger = logging.getLogger(__name__)
 
+# Documents rendered per wkhtmltopdf invocation in batch runs
+PDF_BATCH_CHUNK_SIZE = 25
+PDF_BATCH_WORKERS = 4
+
 
 class EInvoicePDFGenerator(models.AbstractModel):
     """
@@ -60,7 +66,9 @@ class EInvoicePDFGenerator(models.AbstractModel):
             report = self.env.ref('l10n_cr_einvoice.action_report_einvoice')
 
             # Generate PDF using QWeb
-            pdf_content, _ = report._render_qweb_pdf([document.id])
+            pdf_content, _ = self.env['ir.actions.report']._render_qweb_pdf(
+                report.report_name, [document.id],
+            )
 
             # Generate filename
             filename = self._generate_filename(document)
@@ -127,21 +135,39 @@ class EInvoicePDFGenerator(models.AbstractModel):
             return document.pdf_attachment_id
         else:
             # Create new attachment
-            attachment = self.env['ir.attachment'].create({
-                'name': filename,
-                'type': 'binary',
-                'datas': base64.b64encode(pdf_content),
-                'res_model': document._name,
-                'res_id': document.id,
-                'mimetype': 'application/pdf',
-                'description': _(
-                    'Electronic invoice PDF with QR code - %s'
-                ) % document.name,
-            })
+            attachment = self.env['ir.attachment'].create(
+                self._prepare_pdf_attachment_vals(document, pdf_content, filename)
+            )
+            document.pdf_attachment_id = attachment
 
             _logger.info(f'Created PDF attachment for {document.name}')
             return attachment
 
+    @api.model
+    def _prepare_pdf_attachment_vals(self, document, pdf_content, filename):
+        """
+        Values of a new PDF attachment for a document.
+
+        Args:
+            document: l10n_cr.einvoice.document record
+            pdf_content: bytes - Rendered PDF
+            filename: str - Attachment name
+
+        Returns:
+            dict: ir.attachment create values
+        """
+        return {
+            'name': filename,
+            'type': 'binary',
+            'datas': base64.b64encode(pdf_content),
+            'res_model': document._name,
+            'res_id': document.id,
+            'mimetype': 'application/pdf',
+            'description': _(
+                'Electronic invoice PDF with QR code - %s'
+            ) % document.name,
+        }
+
     @api.model
     def get_qr_code_data(self, document):
         """
@@ -425,6 +451,11 @@ class EInvoicePDFGenerator(models.AbstractModel):
         """
         Generate PDFs for multiple documents in batch.
 
+        Documents are rendered in chunks, one wkhtmltopdf invocation per
+        chunk whose output is split back per document, and chunks run in
+        parallel in the worker pool. Each chunk commits its attachments on
+        its own, so a failing chunk never loses the others.
+
         Args:
             documents: l10n_cr.einvoice.document recordset
 
@@ -435,14 +466,28 @@ class EInvoicePDFGenerator(models.AbstractModel):
 
         _logger.info(f'Batch generating PDFs for {len(documents)} documents')
 
-        for doc in documents:
-            try:
-                self.create_pdf_attachment(doc)
-                stats['generated'] += 1
-            except Exception as e:
-                _logger.error(f'Batch PDF generation failed for {doc.name}: {e}')
-                stats['failed'] += 1
-                continue
+        renderable = documents.filtered(lambda d: d.clave and (d.xml_content or d.signed_xml))
+        for doc in documents - renderable:
+            _logger.error(f'Batch PDF generation failed for {doc.name}: no clave or XML content')
+            stats['failed'] += 1
+
+        chunk_size = get_pool_size(self.env, 'l10n_cr_einvoice.pdf_batch_chunk_size', PDF_BATCH_CHUNK_SIZE)
+        max_workers = get_pool_size(self.env, 'l10n_cr_einvoice.pdf_batch_workers', PDF_BATCH_WORKERS)
+        ids = renderable.ids
+        chunks = [tuple(ids[i:i + chunk_size]) for i in range(0, len(ids), chunk_size)]
+
+        outcomes = run_in_worker_pool(
+            self.env,
+            chunks,
+            lambda env, chunk: env[self._name]._render_pdf_chunk(env[documents._name].browse(chunk)),
+            max_workers=max_workers,
+        )
+        for chunk, (success, value) in outcomes.items():
+            if success:
+                stats['generated'] += value['generated']
+                stats['failed'] += value['failed']
+            else:
+                stats['failed'] += len(chunk)
 
         _logger.info(
             f'Batch PDF generation complete: {stats["generated"]} generated, '
@@ -450,3 +495,66 @@ class EInvoicePDFGenerator(models.AbstractModel):
         )
 
         return stats
+
+    @api.model
+    def _render_pdf_chunk(self, documents):
+        """
+        Render a chunk of documents with one wkhtmltopdf call and attach the PDFs.
+
+        Odoo splits the combined PDF per record using the outlines of the
+        external layout. Documents it could not split out (or a chunk that
+        failed as a whole) are rendered one by one instead.
+
+        Args:
+            documents: l10n_cr.einvoice.document recordset
+
+        Returns:
+            dict: Statistics {generated: int, failed: int}
+        """
+        report = self.env.ref('l10n_cr_einvoice.action_report_einvoice')
+        pdf_by_id = {}
+        try:
+            streams = self.env['ir.actions.report']._render_qweb_pdf_prepare_streams(
+                report.report_name, None, res_ids=documents.ids,
+            )
+            for doc_id, entry in streams.items():
+                if doc_id and entry.get('stream'):
+                    pdf_by_id[doc_id] = entry['stream'].getvalue()
+        except Exception as e:
+            _logger.warning(f'Chunk PDF rendering failed for {len(documents)} documents, rendering one by one: {e}')
+
+        failed = 0
+        for document in documents.filtered(lambda d: d.id not in pdf_by_id):
+            try:
+                pdf_by_id[document.id] = self.generate_pdf_for_document(document)[0]
+            except Exception as e:
+                _logger.error(f'Batch PDF generation failed for {document.name}: {e}')
+                failed += 1
+
+        self._store_pdf_attachments(documents.filtered(lambda d: d.id in pdf_by_id), pdf_by_id)
+        return {'generated': len(documents) - failed, 'failed': failed}
+
+    @api.model
+    def _store_pdf_attachments(self, documents, pdf_by_id):
+        """
+        Create or update the PDF attachments of documents in bulk.
+
+        Args:
+            documents: l10n_cr.einvoice.document recordset
+            pdf_by_id: dict - {document_id: pdf bytes}
+        """
+        new_documents = documents.filtered(lambda d: not d.pdf_attachment_id)
+        for document in documents - new_documents:
+            document.pdf_attachment_id.write({
+                'datas': base64.b64encode(pdf_by_id[document.id]),
+                'name': self._generate_filename(document),
+            })
+
+        attachments = self.env['ir.attachment'].create([
+            self._prepare_pdf_attachment_vals(
+                document, pdf_by_id[document.id], self._generate_filename(document),
+            )
+            for document in new_documents
+        ])
+        for document, attachment in zip(new_documents, attachments):
+            document.pdf_attachment_id = attachment
@@ -6,6 +6,9 @@ from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
 
+# Hacienda response log; the API response time report is empty without it
+RESPONSE_MESSAGE_MODEL = 'l10n_cr.hacienda.response.message'
+
 
 class EInvoicePerformanceMetrics(models.AbstractModel):
     """Performance Metrics for E-Invoice System."""
@@ -18,6 +21,9 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
         """
         Track API response times from Hacienda.
 
+        The first response of each document is picked with a window function
+        and all statistics (percentiles included) are aggregated in SQL.
+
         Args:
             date_from: Start date
             date_to: End date
@@ -32,98 +38,94 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-            ('hacienda_submission_date', '!=', False),
-        ]
-
-        # Get documents with submission times
-        documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        # Calculate response times from response messages
-        ResponseMessage = self.env['l10n_cr.hacienda.response.message']
-        response_times = []
-
-        for doc in documents:
-            messages = ResponseMessage.search([
-                ('document_id', '=', doc.id),
-                ('message_type', '=', 'response'),
-            ], order='create_date')
-
-            if messages:
-                # Calculate time between submission and first response
-                first_response = messages[0]
-                if doc.hacienda_submission_date:
-                    response_time = (
-                        first_response.create_date - doc.hacienda_submission_date
-                    ).total_seconds()
-
-                    response_times.append({
-                        'document_id': doc.id,
-                        'document_number': doc.name,
-                        'submission_date': doc.hacienda_submission_date,
-                        'response_date': first_response.create_date,
-                        'response_time_seconds': response_time,
-                        'response_time_minutes': response_time / 60,
-                        'status_code': first_response.status_code,
-                    })
-
-        # Calculate statistics
-        if response_times:
-            times = [r['response_time_seconds'] for r in response_times]
-            avg_response_time = sum(times) / len(times)
-            min_response_time = min(times)
-            max_response_time = max(times)
-
-            # Calculate percentiles
-            sorted_times = sorted(times)
-            p50 = sorted_times[len(sorted_times) // 2]
-            p95 = sorted_times[int(len(sorted_times) * 0.95)]
-            p99 = sorted_times[int(len(sorted_times) * 0.99)]
-        else:
-            avg_response_time = min_response_time = max_response_time = 0
-            p50 = p95 = p99 = 0
-
-        # Response time distribution
-        time_distribution = {
-            '0-10s': 0,
-            '10-30s': 0,
-            '30-60s': 0,
-            '60-300s': 0,
-            '300+s': 0,
+        stats = {
+            'total': 0, 'avg': 0, 'min': 0, 'max': 0, 'p50': 0, 'p95': 0, 'p99': 0,
+            'le_10': 0, 'le_30': 0, 'le_60': 0, 'le_300': 0, 'gt_300': 0,
         }
+        response_details = []
+
+        if RESPONSE_MESSAGE_MODEL in self.env:
+            ResponseMessage = self.env[RESPONSE_MESSAGE_MODEL]
+            self.env['l10n_cr.einvoice.document'].flush_model()
+            ResponseMessage.flush_model()
+
+            first_responses = f"""
+                WITH responses AS (
+                    SELECT d.id AS document_id,
+                           d.name AS document_number,
+                           d.hacienda_submission_date AS submission_date,
+                           m.create_date AS response_date,
+                           m.status_code,
+                           EXTRACT(EPOCH FROM m.create_date - d.hacienda_submission_date) AS response_time_seconds,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY d.id ORDER BY m.create_date, m.id
+                           ) AS response_rank
+                      FROM l10n_cr_einvoice_document d
+                      JOIN {ResponseMessage._table} m
+                        ON m.document_id = d.id AND m.message_type = 'response'
+                     WHERE d.create_date >= %(date_from)s
+                       AND d.create_date <= %(date_to)s
+                       AND d.hacienda_submission_date IS NOT NULL
+                ), first_responses AS (
+                    SELECT * FROM responses WHERE response_rank = 1
+                )
+            """
+            params = {'date_from': date_from, 'date_to': date_to}
+
+            self.env.cr.execute(first_responses + """
+                SELECT COUNT(*) AS total,
+                       COALESCE(AVG(response_time_seconds), 0) AS avg,
+                       COALESCE(MIN(response_time_seconds), 0) AS min,
+                       COALESCE(MAX(response_time_seconds), 0) AS max,
+                       COALESCE(percentile_cont(0.50) WITHIN GROUP (ORDER BY response_time_seconds), 0) AS p50,
+                       COALESCE(percentile_cont(0.95) WITHIN GROUP (ORDER BY response_time_seconds), 0) AS p95,
+                       COALESCE(percentile_cont(0.99) WITHIN GROUP (ORDER BY response_time_seconds), 0) AS p99,
+                       COUNT(*) FILTER (WHERE response_time_seconds <= 10) AS le_10,
+                       COUNT(*) FILTER (WHERE response_time_seconds > 10 AND response_time_seconds <= 30) AS le_30,
+                       COUNT(*) FILTER (WHERE response_time_seconds > 30 AND response_time_seconds <= 60) AS le_60,
+                       COUNT(*) FILTER (WHERE response_time_seconds > 60 AND response_time_seconds <= 300) AS le_300,
+                       COUNT(*) FILTER (WHERE response_time_seconds > 300) AS gt_300
+                  FROM first_responses
+            """, params)
+            stats = self.env.cr.dictfetchone()
+
+            # Top 20 slowest
+            self.env.cr.execute(first_responses + """
+                SELECT document_id, document_number, submission_date, response_date,
+                       status_code, response_time_seconds
+                  FROM first_responses
+              ORDER BY response_time_seconds DESC
+                 LIMIT 20
+            """, params)
+            for row in self.env.cr.dictfetchall():
+                response_time = float(row.pop('response_time_seconds'))
+                row.update({
+                    'response_time_seconds': response_time,
+                    'response_time_minutes': response_time / 60,
+                })
+                response_details.append(row)
 
-        for item in response_times:
-            time = item['response_time_seconds']
-            if time <= 10:
-                time_distribution['0-10s'] += 1
-            elif time <= 30:
-                time_distribution['10-30s'] += 1
-            elif time <= 60:
-                time_distribution['30-60s'] += 1
-            elif time <= 300:
-                time_distribution['60-300s'] += 1
-            else:
-                time_distribution['300+s'] += 1
+        avg_response_time = float(stats['avg'])
 
         return {
             'date_from': date_from,
             'date_to': date_to,
-            'total_requests': len(response_times),
+            'total_requests': stats['total'],
             'avg_response_time_seconds': round(avg_response_time, 2),
             'avg_response_time_minutes': round(avg_response_time / 60, 2),
-            'min_response_time_seconds': round(min_response_time, 2),
-            'max_response_time_seconds': round(max_response_time, 2),
-            'p50_response_time_seconds': round(p50, 2),
-            'p95_response_time_seconds': round(p95, 2),
-            'p99_response_time_seconds': round(p99, 2),
-            'time_distribution': time_distribution,
-            'response_details': sorted(
-                response_times,
-                key=lambda x: x['response_time_seconds'],
-                reverse=True
-            )[:20],  # Top 20 slowest
+            'min_response_time_seconds': round(float(stats['min']), 2),
+            'max_response_time_seconds': round(float(stats['max']), 2),
+            'p50_response_time_seconds': round(float(stats['p50']), 2),
+            'p95_response_time_seconds': round(float(stats['p95']), 2),
+            'p99_response_time_seconds': round(float(stats['p99']), 2),
+            'time_distribution': {
+                '0-10s': stats['le_10'],
+                '10-30s': stats['le_30'],
+                '30-60s': stats['le_60'],
+                '60-300s': stats['le_300'],
+                '300+s': stats['gt_300'],
+            },
+            'response_details': response_details,
         }
 
     @api.model
@@ -242,63 +244,63 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-            ('state', '=', 'accepted'),
-        ]
-
-        documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        total_eligible = len(documents)
-        emails_sent = len(documents.filtered(lambda x: x.email_sent))
-        emails_not_sent = total_eligible - emails_sent
+        self.env['l10n_cr.einvoice.document'].flush_model()
+        params = {'date_from': date_from, 'date_to': date_to}
+        accepted_documents = """
+              FROM l10n_cr_einvoice_document
+             WHERE create_date >= %(date_from)s
+               AND create_date <= %(date_to)s
+               AND state = 'accepted'
+        """
 
+        self.env.cr.execute("""
+            SELECT COUNT(*) AS total_eligible,
+                   COUNT(*) FILTER (WHERE email_sent) AS emails_sent,
+                   COALESCE(AVG(
+                       EXTRACT(EPOCH FROM email_sent_date - hacienda_acceptance_date) / 60
+                   ) FILTER (WHERE email_sent AND email_sent_date IS NOT NULL
+                             AND hacienda_acceptance_date IS NOT NULL), 0) AS avg_delivery_time,
+                   COUNT(*) FILTER (WHERE email_sent AND document_type = 'FE') AS fe_sent,
+                   COUNT(*) FILTER (WHERE email_sent AND document_type = 'TE') AS te_sent,
+                   COUNT(*) FILTER (WHERE email_sent AND document_type = 'NC') AS nc_sent,
+                   COUNT(*) FILTER (WHERE email_sent AND document_type = 'ND') AS nd_sent
+        """ + accepted_documents, params)
+        stats = self.env.cr.dictfetchone()
+
+        # Slowest deliveries, from acceptance to email sent
+        self.env.cr.execute("""
+            SELECT name AS document_number,
+                   hacienda_acceptance_date AS acceptance_date,
+                   email_sent_date,
+                   EXTRACT(EPOCH FROM email_sent_date - hacienda_acceptance_date) / 60 AS delivery_time_minutes
+        """ + accepted_documents + """
+               AND email_sent
+               AND email_sent_date IS NOT NULL
+               AND hacienda_acceptance_date IS NOT NULL
+          ORDER BY delivery_time_minutes DESC
+             LIMIT 20
+        """, params)
+        delivery_times = self.env.cr.dictfetchall()
+        for row in delivery_times:
+            row['delivery_time_minutes'] = float(row['delivery_time_minutes'])
+
+        total_eligible = stats['total_eligible']
+        emails_sent = stats['emails_sent']
         delivery_rate = (emails_sent / total_eligible * 100) if total_eligible > 0 else 0
 
-        # Email delivery times
-        delivery_times = []
-        for doc in documents.filtered(lambda x: x.email_sent and x.email_sent_date):
-            # Calculate time from acceptance to email sent
-            if doc.hacienda_acceptance_date and doc.email_sent_date:
-                delivery_time = (
-                    doc.email_sent_date - doc.hacienda_acceptance_date
-                ).total_seconds() / 60
-
-                delivery_times.append({
-                    'document_number': doc.name,
-                    'acceptance_date': doc.hacienda_acceptance_date,
-                    'email_sent_date': doc.email_sent_date,
-                    'delivery_time_minutes': delivery_time,
-                })
-
-        avg_delivery_time = (
-            sum(d['delivery_time_minutes'] for d in delivery_times) / len(delivery_times)
-        ) if delivery_times else 0
-
-        # Document type breakdown
-        fe_sent = len(documents.filtered(lambda x: x.document_type == 'FE' and x.email_sent))
-        te_sent = len(documents.filtered(lambda x: x.document_type == 'TE' and x.email_sent))
-        nc_sent = len(documents.filtered(lambda x: x.document_type == 'NC' and x.email_sent))
-        nd_sent = len(documents.filtered(lambda x: x.document_type == 'ND' and x.email_sent))
-
         return {
             'date_from': date_from,
             'date_to': date_to,
             'total_eligible_documents': total_eligible,
             'emails_sent': emails_sent,
-            'emails_not_sent': emails_not_sent,
+            'emails_not_sent': total_eligible - emails_sent,
             'delivery_rate': round(delivery_rate, 2),
-            'avg_delivery_time_minutes': round(avg_delivery_time, 2),
-            'fe_emails_sent': fe_sent,
-            'te_emails_sent': te_sent,
-            'nc_emails_sent': nc_sent,
-            'nd_emails_sent': nd_sent,
-            'delivery_time_details': sorted(
-                delivery_times,
-                key=lambda x: x['delivery_time_minutes'],
-                reverse=True
-            )[:20],
+            'avg_delivery_time_minutes': round(float(stats['avg_delivery_time']), 2),
+            'fe_emails_sent': stats['fe_sent'],
+            'te_emails_sent': stats['te_sent'],
+            'nc_emails_sent': stats['nc_sent'],
+            'nd_emails_sent': stats['nd_sent'],
+            'delivery_time_details': delivery_times,
         }
 
     @api.model
@@ -320,37 +322,36 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-            ('state', '=', 'accepted'),
-        ]
-
-        documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        total_documents = len(documents)
-        pdfs_generated = len(documents.filtered(lambda x: x.pdf_attachment_id))
-        pdfs_not_generated = total_documents - pdfs_generated
-
+        self.env['l10n_cr.einvoice.document'].flush_model()
+        self.env.cr.execute("""
+            SELECT COUNT(*) AS total_documents,
+                   COUNT(pdf_attachment_id) AS pdfs_generated,
+                   COUNT(pdf_attachment_id) FILTER (WHERE document_type = 'FE') AS fe_pdfs,
+                   COUNT(pdf_attachment_id) FILTER (WHERE document_type = 'TE') AS te_pdfs,
+                   COUNT(pdf_attachment_id) FILTER (WHERE document_type = 'NC') AS nc_pdfs,
+                   COUNT(pdf_attachment_id) FILTER (WHERE document_type = 'ND') AS nd_pdfs
+              FROM l10n_cr_einvoice_document
+             WHERE create_date >= %s
+               AND create_date <= %s
+               AND state = 'accepted'
+        """, (date_from, date_to))
+        stats = self.env.cr.dictfetchone()
+
+        total_documents = stats['total_documents']
+        pdfs_generated = stats['pdfs_generated']
         generation_rate = (pdfs_generated / total_documents * 100) if total_documents > 0 else 0
 
-        # Document type breakdown
-        fe_pdfs = len(documents.filtered(lambda x: x.document_type == 'FE' and x.pdf_attachment_id))
-        te_pdfs = len(documents.filtered(lambda x: x.document_type == 'TE' and x.pdf_attachment_id))
-        nc_pdfs = len(documents.filtered(lambda x: x.document_type == 'NC' and x.pdf_attachment_id))
-        nd_pdfs = len(documents.filtered(lambda x: x.document_type == 'ND' and x.pdf_attachment_id))
-
         return {
             'date_from': date_from,
             'date_to': date_to,
             'total_documents': total_documents,
             'pdfs_generated': pdfs_generated,
-            'pdfs_not_generated': pdfs_not_generated,
+            'pdfs_not_generated': total_documents - pdfs_generated,
             'generation_rate': round(generation_rate, 2),
-            'fe_pdfs_generated': fe_pdfs,
-            'te_pdfs_generated': te_pdfs,
-            'nc_pdfs_generated': nc_pdfs,
-            'nd_pdfs_generated': nd_pdfs,
+            'fe_pdfs_generated': stats['fe_pdfs'],
+            'te_pdfs_generated': stats['te_pdfs'],
+            'nc_pdfs_generated': stats['nc_pdfs'],
+            'nd_pdfs_generated': stats['nd_pdfs'],
         }
 
     @api.model
@@ -372,51 +373,55 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
         if not date_to:
             date_to = fields.Date.to_string(fields.Date.today())
 
-        # POS transactions (TE documents)
-        domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
-            ('document_type', '=', 'TE'),
-        ]
-
-        te_documents = self.env['l10n_cr.einvoice.document'].search(domain)
-
-        total_transactions = len(te_documents)
-        accepted_transactions = len(te_documents.filtered(lambda x: x.state == 'accepted'))
-        rejected_transactions = len(te_documents.filtered(lambda x: x.state == 'rejected'))
-        pending_transactions = len(te_documents.filtered(lambda x: x.state in ['draft', 'generated', 'signed', 'submitted']))
+        self.env['l10n_cr.einvoice.document'].flush_model()
+        OfflineQueue = self.env['l10n_cr.pos.offline.queue']
+        OfflineQueue.flush_model()
+
+        # POS transactions (TE documents), per day; totals are summed from the days
+        self.env.cr.execute("""
+            SELECT DATE(create_date) AS date,
+                   COUNT(*) AS transaction_count,
+                   COUNT(*) FILTER (WHERE state = 'accepted') AS accepted,
+                   COUNT(*) FILTER (WHERE state = 'rejected') AS rejected,
+                   COUNT(*) FILTER (WHERE state IN ('draft', 'generated', 'signed', 'submitted')) AS pending,
+                   COALESCE(SUM(amount_total), 0) AS total_revenue
+              FROM l10n_cr_einvoice_document
+             WHERE create_date >= %s
+               AND create_date <= %s
+               AND document_type = 'TE'
+          GROUP BY DATE(create_date)
+          ORDER BY date
+        """, (date_from, date_to))
+        days = self.env.cr.dictfetchall()
+
+        total_transactions = sum(day['transaction_count'] for day in days)
+        accepted_transactions = sum(day['accepted'] for day in days)
+        rejected_transactions = sum(day['rejected'] for day in days)
+        pending_transactions = sum(day['pending'] for day in days)
+        total_revenue = sum(day['total_revenue'] for day in days)
 
         acceptance_rate = (accepted_transactions / total_transactions * 100) if total_transactions > 0 else 0
-
-        total_revenue = sum(te_documents.mapped('amount_total'))
         avg_transaction_value = total_revenue / total_transactions if total_transactions > 0 else 0
 
         # Offline queue status
-        OfflineQueue = self.env['l10n_cr.pos.offline.queue']
-        offline_domain = [
-            ('create_date', '>=', date_from),
-            ('create_date', '<=', date_to),
+        self.env.cr.execute(f"""
+            SELECT state, COUNT(*)
+              FROM {OfflineQueue._table}
+             WHERE create_date >= %s
+               AND create_date <= %s
+          GROUP BY state
+        """, (date_from, date_to))
+        offline_counts = dict(self.env.cr.fetchall())
+
+        daily_volume = [
+            {
+                'date': day['date'].strftime('%Y-%m-%d'),
+                'transaction_count': day['transaction_count'],
+                'total_revenue': day['total_revenue'],
+            }
+            for day in days
         ]
 
-        offline_items = OfflineQueue.search(offline_domain)
-        offline_pending = len(offline_items.filtered(lambda x: x.state == 'pending'))
-        offline_completed = len(offline_items.filtered(lambda x: x.state == 'completed'))
-        offline_failed = len(offline_items.filtered(lambda x: x.state == 'failed'))
-
-        # Daily transaction volume
-        daily_volume = {}
-        for doc in te_documents:
-            date_key = doc.create_date.date().strftime('%Y-%m-%d')
-            if date_key not in daily_volume:
-                daily_volume[date_key] = {
-                    'date': date_key,
-                    'transaction_count': 0,
-                    'total_revenue': 0,
-                }
-
-            daily_volume[date_key]['transaction_count'] += 1
-            daily_volume[date_key]['total_revenue'] += doc.amount_total
-
         return {
             'date_from': date_from,
             'date_to': date_to,
@@ -427,10 +432,10 @@ class EInvoicePerformanceMetrics(models.AbstractModel):
             'acceptance_rate': round(acceptance_rate, 2),
             'total_revenue': total_revenue,
             'avg_transaction_value': round(avg_transaction_value, 2),
-            'offline_queue_pending': offline_pending,
-            'offline_queue_completed': offline_completed,
-            'offline_queue_failed': offline_failed,
-            'daily_volume': sorted(daily_volume.values(), key=lambda x: x['date']),
+            'offline_queue_pending': offline_counts.get('pending', 0),
+            'offline_queue_completed': offline_counts.get('completed', 0),
+            'offline_queue_failed': offline_counts.get('failed', 0),
+            'daily_volume': daily_volume,
         }
 
     @api.model
@@ -191,9 +191,14 @@ patch(PaymentScreen.prototype, {
 
 /**
  * Patch ReceiptScreen to show e-invoice feedback notification.
- * After order sync, Hacienda has already responded (synchronous flow).
- * We fetch the result and show a toast: green=accepted, red=rejected, etc.
+ * Synchronous flow: Hacienda has already responded after order sync.
+ * Asynchronous flow: the server answers `pending: true` while background
+ * workers process the document, so we poll a few times with backoff.
+ * We show a toast with the result: green=accepted, red=rejected, etc.
  */
+const EINVOICE_FEEDBACK_MAX_POLLS = 6;
+const EINVOICE_FEEDBACK_INITIAL_DELAY = 1000;
+
 patch(ReceiptScreen.prototype, {
     setup() {
         super.setup();
@@ -208,11 +213,20 @@ patch(ReceiptScreen.prototype, {
 
     async _showEinvoiceFeedback(order) {
         try {
-            const result = await this.pos.data.call(
-                "pos.order",
-                "get_einvoice_feedback",
-                [[order.id]]
-            );
+            let result;
+            let delay = EINVOICE_FEEDBACK_INITIAL_DELAY;
+            for (let poll = 0; poll < EINVOICE_FEEDBACK_MAX_POLLS; poll++) {
+                result = await this.pos.data.call(
+                    "pos.order",
+                    "get_einvoice_feedback",
+                    [[order.id]]
+                );
+                if (!result || !result.pending || poll === EINVOICE_FEEDBACK_MAX_POLLS - 1) {
+                    break;
+                }
+                await new Promise((resolve) => setTimeout(resolve, delay));
+                delay *= 2;
+            }
             if (result && result.message) {
                 this.notification.add(result.message, { type: result.type });
             }
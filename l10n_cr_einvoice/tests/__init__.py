@@ -13,6 +13,8 @@ from . import test_xml_signer
 
 # Hacienda API Integration Tests
 from . import test_hacienda_api_integration
+from . import test_status_polling
+from . import test_http_pool
 
 # Phase 9C: Tax Reports Tests
 from . import test_tax_report_xml_generation
@@ -33,6 +35,7 @@ from . import test_validation_rules
 from . import test_validation_integration
 from . import test_partner_validation
 from . import test_pos_validation
+from . import test_pos_offline
 
 # Rate Limiter Tests
 from . import test_rate_limiter
@@ -81,6 +84,18 @@ except ImportError as e:
     import logging
     logging.getLogger(__name__).warning(f"Skipping test_cedula_lookup_mocks: {e}")
 
+# Historical XML Import Tests
+from . import test_einvoice_import_pipeline
+
+# Batch PDF Rendering Tests
+from . import test_pdf_batch_rendering
+from . import test_qr_code_cache
+
+# Reporting Tests
+from . import test_performance_metrics
+from . import test_analytics_rollup
+from . import test_customer_analytics
+
 # P0/P1/P2 Gap Coverage Tests
 from . import test_p0_critical_gaps
 from . import test_p1_high_priority_gaps
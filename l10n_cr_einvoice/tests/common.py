@@ -16,6 +16,8 @@ import uuid
 from odoo import fields
 from odoo.tests import TransactionCase
 
+from odoo.addons.l10n_cr_einvoice.utils.refresh_queue import reset_refresh_queues
+
 
 class L10nCrEInvoiceCommon(TransactionCase):
     """
@@ -329,6 +331,12 @@ class EInvoiceTestCase(TransactionCase):
             price=10000.0
         )
 
+    def setUp(self):
+        super().setUp()
+        # Background refresh queues are process-wide: start every test empty
+        reset_refresh_queues()
+        self.addCleanup(reset_refresh_queues)
+
     @classmethod
     def _create_test_partner(cls, vat=None, name=None):
         """
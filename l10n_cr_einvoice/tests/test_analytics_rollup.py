@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the daily analytics rollup (l10n_cr.einvoice.daily.rollup).
+
+Covers incremental refreshes after state changes and deletions, the KPIs
+and trend data read from the rollup, read-only dashboard reads while the
+rollup is fresh and a 12-month dashboard benchmark.
+"""
+import logging
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+from ..models import einvoice_daily_rollup
+
+_logger = logging.getLogger(__name__)
+
+
+class AnalyticsRollupCase(EInvoiceTestCase):
+    """Common setup: a freshly rebuilt rollup and the dashboard model."""
+
+    def setUp(self):
+        super().setUp()
+        self.Rollup = self.env['l10n_cr.einvoice.daily.rollup']
+        self.dashboard = self.env['l10n_cr.einvoice.analytics.dashboard'].with_company(self.company)
+        self.today = fields.Date.to_string(fields.Date.today())
+        self.Rollup._refresh(full=True)
+
+    def _create_document(self, state, document_type='FE'):
+        document = self._create_einvoice_document(self._create_test_invoice(), document_type=document_type)
+        document.write({'state': state})
+        return document
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'analytics_rollup')
+class TestAnalyticsRollup(AnalyticsRollupCase):
+    """Test the incrementally maintained dashboard rollup."""
+
+    def test_refresh_applies_document_changes(self):
+        """State changes and deletions reach the rollup on the next refresh."""
+        before = self.dashboard.get_kpis(self.today, self.today)
+        accepted = self._create_document('accepted')
+        submitted = self._create_document('submitted', document_type='TE')
+
+        self.Rollup._refresh()
+        kpis = self.dashboard.get_kpis(self.today, self.today)
+        self.assertEqual(kpis['total_invoices'], before['total_invoices'] + 2)
+        self.assertEqual(kpis['accepted_count'], before['accepted_count'] + 1)
+        self.assertEqual(kpis['te_count'], before['te_count'] + 1)
+        self.assertAlmostEqual(kpis['revenue_fe'], before['revenue_fe'] + accepted.amount_total)
+
+        submitted.write({'state': 'rejected'})
+        self.Rollup._refresh()
+        kpis = self.dashboard.get_kpis(self.today, self.today)
+        self.assertEqual(kpis['rejected_count'], before['rejected_count'] + 1)
+        self.assertEqual(kpis['submitted_count'], before['submitted_count'])
+
+        accepted.unlink()
+        kpis = self.dashboard.get_kpis(self.today, self.today)
+        self.assertEqual(kpis['accepted_count'], before['accepted_count'])
+        self.assertEqual(kpis['total_invoices'], before['total_invoices'] + 1)
+
+    def test_trend_data_from_rollup(self):
+        """Trend and revenue charts aggregate the rollup per day."""
+        self._create_document('accepted')
+        self._create_document('rejected', document_type='TE')
+        self.Rollup._refresh()
+
+        trend = self.dashboard.get_invoice_trend_data(self.today, self.today)
+        self.assertEqual(len(trend), 1)
+        self.assertEqual(trend[0]['date'], self.today)
+        self.assertGreaterEqual(trend[0]['accepted'], 1)
+        self.assertGreaterEqual(trend[0]['rejected'], 1)
+        self.assertEqual(trend[0]['total'], trend[0]['fe'] + trend[0]['te'] + trend[0]['nc'] + trend[0]['nd'])
+
+        revenue = self.dashboard.get_revenue_trend_data(self.today, self.today)
+        self.assertEqual(revenue[0]['date'], self.today)
+        self.assertGreater(revenue[0]['fe'], 0)
+
+        # The rollup matches a full rebuild
+        self.env.cr.execute(f"SELECT SUM(document_count), SUM(amount_total) FROM {self.Rollup._table}")
+        incremental = self.env.cr.fetchone()
+        self.Rollup._refresh(full=True)
+        self.env.cr.execute(f"SELECT SUM(document_count), SUM(amount_total) FROM {self.Rollup._table}")
+        self.assertEqual(self.env.cr.fetchone(), incremental)
+
+    def test_dashboard_reads_only_refresh_stale_rollup(self):
+        """Reads leave a fresh rollup alone and never touch system parameters."""
+        watermark = self.Rollup._get_watermark()
+        refreshed_at = watermark.refreshed_at
+        self.assertTrue(refreshed_at)
+        self._create_document('accepted')
+        before = self.dashboard.get_kpis(self.today, self.today)
+
+        ConfigParameter = type(self.env['ir.config_parameter'])
+        with patch.object(ConfigParameter, 'set_param') as mock_set_param, \
+                patch.object(type(self.Rollup), '_refresh', autospec=True,
+                             side_effect=type(self.Rollup)._refresh) as mock_refresh:
+            self.dashboard.get_kpis(self.today, self.today)
+            self.dashboard.get_invoice_trend_data(self.today, self.today)
+            mock_refresh.assert_not_called()
+
+            # The cron fell behind: the next read catches up inline
+            watermark.refreshed_at = refreshed_at - einvoice_daily_rollup.ROLLUP_MAX_AGE - timedelta(minutes=1)
+            kpis = self.dashboard.get_kpis(self.today, self.today)
+            self.assertEqual(mock_refresh.call_count, 1)
+            mock_set_param.assert_not_called()
+
+        self.assertEqual(kpis['accepted_count'], before['accepted_count'] + 1)
+        self.assertGreater(watermark.refreshed_at, refreshed_at - einvoice_daily_rollup.ROLLUP_MAX_AGE)
+
+
+@tagged('post_install', '-at_install', '-standard', 'einvoice_benchmark')
+class TestAnalyticsRollupBenchmark(AnalyticsRollupCase):
+    """Opt-in benchmark: run with --test-tags einvoice_benchmark."""
+
+    BENCHMARK_DOCUMENTS = 100000
+
+    def test_twelve_month_dashboard_benchmark(self):
+        """P2: Report a 12-month dashboard load over 100k documents."""
+        move = self._create_test_invoice()
+        self.env.cr.execute("""
+            INSERT INTO l10n_cr_einvoice_document
+                (name, move_id, company_id, document_type, state, amount_total,
+                 email_sent, hacienda_submission_date, hacienda_acceptance_date,
+                 create_date, write_date)
+            SELECT 'BENCH-' || n,
+                   %(move_id)s,
+                   %(company_id)s,
+                   (ARRAY['FE', 'TE', 'NC', 'ND'])[1 + n %% 4],
+                   (ARRAY['accepted', 'accepted', 'accepted', 'rejected', 'submitted'])[1 + n %% 5],
+                   100 + n %% 7,
+                   n %% 2 = 0,
+                   now() - (n %% 365) * INTERVAL '1 day',
+                   now() - (n %% 365) * INTERVAL '1 day' + INTERVAL '3 minutes',
+                   now() - (n %% 365) * INTERVAL '1 day',
+                   now() AT TIME ZONE 'UTC'
+              FROM generate_series(1, %(count)s) AS n
+        """, {'move_id': move.id, 'company_id': self.company.id, 'count': self.BENCHMARK_DOCUMENTS})
+        date_from = fields.Date.to_string(fields.Date.today() - timedelta(days=365))
+
+        start = time.perf_counter()
+        slices = self.Rollup._refresh()
+        refresh_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        kpis = self.dashboard.get_kpis(date_from, self.today)
+        self.dashboard.get_invoice_trend_data(date_from, self.today)
+        self.dashboard.get_revenue_trend_data(date_from, self.today)
+        dashboard_time = time.perf_counter() - start
+
+        _logger.info(
+            'Analytics rollup benchmark (%d documents, %d days): refresh %.3fs, 12-month dashboard %.3fs',
+            self.BENCHMARK_DOCUMENTS, slices, refresh_time, dashboard_time,
+        )
+        self.assertGreaterEqual(kpis['total_invoices'], self.BENCHMARK_DOCUMENTS)
+        self.assertAlmostEqual(kpis['avg_processing_time_minutes'], 3.0, delta=0.5)
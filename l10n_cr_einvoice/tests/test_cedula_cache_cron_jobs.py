@@ -24,6 +24,8 @@ from odoo import fields
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import UserError
 
+from odoo.addons.l10n_cr_einvoice.utils.refresh_queue import reset_refresh_queues
+
 _logger = logging.getLogger(__name__)
 
 
@@ -50,6 +52,8 @@ class TestCedulaCacheCronJobs(TransactionCase):
         super().setUp()
         # Clean cache before each test
         self.cache_model.search([]).unlink()
+        reset_refresh_queues()
+        self.addCleanup(reset_refresh_queues)
 
     def _create_cache_entry(self, cedula, age_days=0, access_count=0, company=None):
         """Helper: Create cache entry with specific age and access count."""
@@ -584,3 +588,139 @@ class TestCedulaCacheCronJobs(TransactionCase):
             self.assertEqual(cron_priority.interval_number, 1)
             self.assertEqual(cron_priority.interval_type, 'days')
             self.assertTrue(cron_priority.active)
+
+
+class TestCedulaCacheAccessBuffer(TransactionCase):
+    """Test read-only cache hits and the buffered access-count flush."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env['res.company'].create({
+            'name': 'Test Company CR Buffer',
+            'country_id': cls.env.ref('base.cr').id,
+        })
+        cls.cache_model = cls.env['l10n_cr.cedula.cache']
+
+    def setUp(self):
+        super().setUp()
+        self.cache_model.search([]).unlink()
+        self.cache_model.flush_access_counts()
+        self.cache_model.clear_lookup_cache()
+        self.addCleanup(self.cache_model.clear_lookup_cache)
+        reset_refresh_queues()
+        self.addCleanup(reset_refresh_queues)
+
+    def _create_cache_entry(self, cedula, age_days=0, access_count=0):
+        refresh_date = datetime.now() - timedelta(days=age_days)
+        return self.cache_model.create({
+            'cedula': cedula,
+            'name': f'Company {cedula}',
+            'company_type': 'company',
+            'tax_status': 'inscrito',
+            'company_id': self.company.id,
+            'fetched_at': refresh_date,
+            'refreshed_at': refresh_date,
+            'access_count': access_count,
+        })
+
+    def test_cache_hit_does_not_write(self):
+        """Cache hits only buffer the access; the row is untouched until flush."""
+        cache = self._create_cache_entry('3101234567')
+
+        with patch.object(type(self.cache_model), 'write') as mock_write:
+            for _i in range(3):
+                hit = self.cache_model.get_cached('3101234567', company=self.company)
+                self.assertEqual(hit, cache)
+            mock_write.assert_not_called()
+
+        cache.invalidate_recordset()
+        self.assertEqual(cache.access_count, 0)
+        self.assertFalse(cache.last_access_at)
+
+        self.assertEqual(self.cache_model.flush_access_counts(), 1)
+        self.assertEqual(cache.access_count, 3)
+        self.assertTrue(cache.last_access_at)
+
+        # Buffer is drained after a flush
+        self.assertEqual(self.cache_model.flush_access_counts(), 0)
+        self.assertEqual(cache.access_count, 3)
+
+    def test_flush_adds_to_existing_counts(self):
+        """Flushed hits are added to the stored counter for every entry."""
+        cache_a = self._create_cache_entry('3101234567', access_count=5)
+        cache_b = self._create_cache_entry('3101234568')
+
+        self.cache_model.get_cached('3101234567', company=self.company)
+        self.cache_model.get_cached('3101234568', company=self.company)
+        self.cache_model.get_cached('3101234568', company=self.company)
+
+        self.assertEqual(self.cache_model.flush_access_counts(), 2)
+        self.assertEqual(cache_a.access_count, 6)
+        self.assertEqual(cache_b.access_count, 2)
+
+    def test_lru_serves_committed_hits_without_queries(self):
+        """Once the reading transaction commits, hits come from the LRU alone."""
+        cache = self._create_cache_entry('3101234567')
+        self.cache_model.get_cached_values('3101234567', company=self.company)
+        self.env.cr.postcommit.run()
+
+        with self.assertQueryCount(0):
+            hit = self.cache_model.get_cached_values('3101234567', company=self.company)
+        self.assertEqual(hit['id'], cache.id)
+        self.assertEqual(hit['data']['name'], 'Company 3101234567')
+        self.assertEqual(hit['cache_tier'], 'fresh')
+
+        # Hits are still counted
+        self.assertEqual(self.cache_model.flush_access_counts(), 1)
+        self.assertEqual(cache.access_count, 2)
+
+    def test_lru_invalidated_on_write_and_unlink(self):
+        """Changed or deleted entries are never served from the LRU."""
+        cache = self._create_cache_entry('3101234567')
+        self.cache_model.get_cached_values('3101234567', company=self.company)
+        self.env.cr.postcommit.run()
+
+        cache.write({'name': 'Renamed Company'})
+        hit = self.cache_model.get_cached_values('3101234567', company=self.company)
+        self.assertEqual(hit['data']['name'], 'Renamed Company')
+        self.env.cr.postcommit.run()
+
+        cache.unlink()
+        self.assertIsNone(self.cache_model.get_cached_values('3101234567', company=self.company))
+        self.assertFalse(self.cache_model.get_cached('3101234567', company=self.company))
+
+    def test_lru_not_filled_by_uncommitted_reads(self):
+        """Entries read by a transaction that never commits stay out of the LRU."""
+        self._create_cache_entry('3101234567')
+        self.cache_model.get_cached_values('3101234567', company=self.company)
+
+        with patch.object(type(self.cache_model), 'search', autospec=True,
+                          side_effect=type(self.cache_model).search) as mock_search:
+            self.cache_model.get_cached_values('3101234567', company=self.company)
+            mock_search.assert_called_once()
+
+    def test_stale_entries_ordered_by_flushed_counts(self):
+        """get_stale_cache_entries() flushes pending hits before ordering."""
+        cache_low = self._create_cache_entry('3101234567', age_days=6, access_count=1)
+        cache_high = self._create_cache_entry('3101234568', age_days=6, access_count=2)
+
+        with patch.object(type(self.cache_model), '_enqueue_refresh_job'):
+            for _i in range(5):
+                self.cache_model.get_cached('3101234567', company=self.company)
+            stale = self.cache_model.get_stale_cache_entries(company=self.company)
+
+        self.assertEqual(stale.ids, [cache_low.id, cache_high.id])
+        self.assertEqual(cache_low.access_count, 6)
+
+    def test_refresh_enqueued_on_flush(self):
+        """Refresh-tier hits schedule their refresh job at flush time."""
+        self._create_cache_entry('3101234567', age_days=6)
+
+        with patch.object(type(self.cache_model), '_enqueue_refresh_job') as mock_enqueue:
+            self.cache_model.get_cached('3101234567', company=self.company)
+            self.cache_model.get_cached('3101234567', company=self.company)
+            mock_enqueue.assert_not_called()
+
+            self.cache_model.flush_access_counts()
+            self.assertEqual(mock_enqueue.call_count, 1)
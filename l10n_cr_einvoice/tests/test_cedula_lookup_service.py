@@ -27,12 +27,14 @@ Mock strategy:
   (avoids needing the raw SQL state table in test DB)
 """
 
+import threading
 import time
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, Mock, MagicMock
 from odoo import fields
 from odoo.tests import tagged
 from odoo.exceptions import UserError
+from odoo.addons.l10n_cr_einvoice.utils.refresh_queue import RefreshQueue, reset_refresh_queues
 from .common import EInvoiceTestCase
 
 # Module path constants for mocking
@@ -175,6 +177,10 @@ class TestCedulaLookupServiceWaterfall(EInvoiceTestCase):
     def test_04_waterfall_step4_both_apis_fail_stale_cache_used(self):
         """Step 4: Both APIs fail -> return stale cache (7-90 days old)."""
         cedula = '3101234567'
+        # Exercise the blocking waterfall rather than stale-while-revalidate
+        self.env['ir.config_parameter'].sudo().set_param(
+            'l10n_cr_einvoice.cedula_stale_while_revalidate', 'False'
+        )
 
         # Create stale cache entry (30 days old)
         stale_time = datetime.now(timezone.utc) - timedelta(days=30)
@@ -339,8 +345,8 @@ class TestCedulaLookupServiceCache(EInvoiceTestCase):
             # No API call
             mock_api.assert_not_called()
 
-            # Cache access counter incremented (re-read from DB)
-            cache.invalidate_recordset()
+            # Cache access counter incremented once buffered hits are flushed
+            self.cache_model.flush_access_counts()
             self.assertEqual(cache.access_count, 1)
 
     def test_02_cache_refresh_zone_triggers_background_refresh(self):
@@ -646,6 +652,276 @@ class TestCedulaLookupServiceBatch(EInvoiceTestCase):
             # Second failed
             self.assertIn('error', results['9000000002'])
 
+    def test_03_batch_lookup_deduplicates_cedulas(self):
+        """Same cédula in different formats is requested from Hacienda once."""
+        mock_hacienda_result = {
+            'success': True,
+            'name': 'Dedupe Company',
+            'tax_regime': 'General',
+            'economic_activities': [],
+            'raw_data': {},
+        }
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+            return_value=mock_hacienda_result,
+        ) as mock_api, \
+             patch.object(
+            type(self.env['l10n_cr.hacienda.rate_limiter']),
+            'try_acquire_token',
+            return_value=True,
+        ):
+            batch = self.lookup_service.batch_lookup(['3-101-234567', '3101234567'])
+
+        self.assertEqual(mock_api.call_count, 1)
+        self.assertEqual(set(batch['results']), {'3-101-234567', '3101234567'})
+        self.assertEqual(batch['summary']['total'], 2)
+        self.assertEqual(batch['summary']['success'], 2)
+
+    def test_04_batch_lookup_cache_hits_and_bulk_upsert(self):
+        """Cache hits skip the API and misses are cached in bulk."""
+        self.cache_model.create({
+            'cedula': '8100000001',
+            'name': 'Cached Company',
+            'company_type': 'company',
+            'tax_status': 'inscrito',
+            'fetched_at': fields.Datetime.now(),
+            'refreshed_at': fields.Datetime.now(),
+            'source': 'hacienda',
+            'company_id': self.company.id,
+        })
+        mock_hacienda_result = {
+            'success': True,
+            'name': 'Fetched Company',
+            'tax_regime': 'General',
+            'economic_activities': [],
+            'raw_data': {},
+        }
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+            return_value=mock_hacienda_result,
+        ) as mock_api, \
+             patch.object(
+            type(self.env['l10n_cr.hacienda.rate_limiter']),
+            'try_acquire_token',
+            return_value=True,
+        ):
+            batch = self.lookup_service.batch_lookup(['8100000001', '8100000002', '8100000003'])
+
+        mock_api.assert_any_call('8100000002')
+        mock_api.assert_any_call('8100000003')
+        self.assertEqual(mock_api.call_count, 2)
+        self.assertEqual(batch['results']['8100000001']['source'], 'cache')
+        self.assertEqual(batch['summary']['cache_hits'], 1)
+        self.assertEqual(batch['summary']['api_calls'], 2)
+
+        cached = self.cache_model.search([('cedula', 'in', ['8100000002', '8100000003'])])
+        self.assertEqual(len(cached), 2)
+        self.assertEqual(set(cached.mapped('name')), {'Fetched Company'})
+
+    def test_05_batch_lookup_stale_cache_fallback(self):
+        """Failed API lookups fall back to the prefetched stale entry."""
+        stale_time = datetime.now(timezone.utc) - timedelta(days=30)
+        self.cache_model.create({
+            'cedula': '8200000001',
+            'name': 'Stale Batch Company',
+            'company_type': 'company',
+            'tax_status': 'inscrito',
+            'fetched_at': fields.Datetime.to_string(stale_time),
+            'refreshed_at': fields.Datetime.to_string(stale_time),
+            'source': 'hacienda',
+            'company_id': self.company.id,
+        })
+        mock_gometa_failure = Mock()
+        mock_gometa_failure.status_code = 503
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+            return_value={'success': False, 'error': 'Server error', 'error_type': 'api_error'},
+        ), \
+             patch.object(
+            type(self.env['l10n_cr.hacienda.rate_limiter']),
+            'try_acquire_token',
+            return_value=True,
+        ), \
+             patch(GOMETA_REQUESTS_GET, return_value=mock_gometa_failure):
+            batch = self.lookup_service.batch_lookup(['8200000001', '8200000002', 'abc'])
+
+        self.assertEqual(batch['results']['8200000001']['source'], 'stale_cache')
+        self.assertTrue(batch['results']['8200000002']['manual_entry_required'])
+        self.assertEqual(batch['results']['abc']['error_type'], 'validation')
+        self.assertEqual(batch['summary']['success'], 1)
+        self.assertEqual(batch['summary']['failed'], 2)
+
+    def test_06_bulk_upsert_groups_identical_updates(self):
+        """Existing entries refreshed with the same values share one write()."""
+        for cedula in ('8300000001', '8300000002', '8300000003'):
+            self.cache_model.create({
+                'cedula': cedula,
+                'name': 'Old Name',
+                'company_type': 'company',
+                'tax_status': 'inscrito',
+                'fetched_at': fields.Datetime.now(),
+                'refreshed_at': fields.Datetime.now(),
+                'source': 'hacienda',
+                'company_id': self.company.id,
+            })
+        same = {'name': 'Same Company', 'company_type': 'company'}
+        other = {'name': 'Other Company', 'company_type': 'company'}
+        cache_class = type(self.cache_model)
+
+        with patch.object(
+            cache_class, 'write', autospec=True, side_effect=cache_class.write,
+        ) as mock_write:
+            caches = self.cache_model.update_cache_bulk({
+                '8300000001': (same, 'hacienda'),
+                '8300000002': (same, 'hacienda'),
+                '8300000003': (other, 'gometa'),
+            }, company=self.company)
+
+        written = sorted(len(call.args[0]) for call in mock_write.call_args_list)
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(caches['8300000001'].name, 'Same Company')
+        self.assertEqual(caches['8300000002'].name, 'Same Company')
+        self.assertEqual(caches['8300000003'].name, 'Other Company')
+        self.assertEqual(caches['8300000003'].source, 'gometa')
+
+
+@tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'integration', 'p1')
+class TestCedulaStaleWhileRevalidate(EInvoiceTestCase):
+    """Test stale-while-revalidate lookups and the background refresh queue."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.lookup_service = cls.env['l10n_cr.cedula.lookup.service'].with_company(cls.company)
+        cls.cache_model = cls.env['l10n_cr.cedula.cache'].with_company(cls.company)
+
+    def setUp(self):
+        super().setUp()
+        self.cache_model.search([]).unlink()
+
+    def _create_stale_entry(self, cedula, days=30):
+        stale_time = datetime.now(timezone.utc) - timedelta(days=days)
+        return self.cache_model.create({
+            'cedula': cedula,
+            'name': 'Stale Company',
+            'company_type': 'company',
+            'tax_status': 'inscrito',
+            'fetched_at': fields.Datetime.to_string(stale_time),
+            'refreshed_at': fields.Datetime.to_string(stale_time),
+            'source': 'hacienda',
+            'company_id': self.company.id,
+        })
+
+    def test_01_stale_entry_served_without_api_call(self):
+        """Stale entries are returned immediately and queued for refresh."""
+        cache = self._create_stale_entry('3101234567')
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+        ) as mock_api:
+            result = self.lookup_service.lookup_and_cache('3101234567')
+            mock_api.assert_not_called()
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['source'], 'stale_cache')
+        self.assertTrue(result['revalidating'])
+        self.assertTrue(self.cache_model._get_refresh_queue().is_queued(
+            (self.company.id, cache.cedula)
+        ))
+
+    def test_02_refresh_is_single_flight(self):
+        """Repeated stale hits refresh the entry with one API call."""
+        cache = self._create_stale_entry('3101234567')
+        mock_hacienda_result = {
+            'success': True,
+            'name': 'Refreshed Company',
+            'tax_regime': 'General',
+            'economic_activities': [],
+            'raw_data': {},
+        }
+
+        for _i in range(3):
+            self.lookup_service.lookup_and_cache('3101234567')
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+            return_value=mock_hacienda_result,
+        ) as mock_api, \
+             patch.object(
+            type(self.env['l10n_cr.hacienda.rate_limiter']),
+            'try_acquire_token',
+            return_value=True,
+        ):
+            processed = self.cache_model._drain_refresh_queue()
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(mock_api.call_count, 1)
+        cache.invalidate_recordset()
+        self.assertEqual(cache.name, 'Refreshed Company')
+        self.assertTrue(cache.is_fresh())
+
+    def test_03_failed_refresh_keeps_stale_data(self):
+        """A failed refresh records the error and keeps serving the entry."""
+        cache = self._create_stale_entry('3101234567')
+        cache._enqueue_refresh_job()
+        mock_gometa_failure = Mock()
+        mock_gometa_failure.status_code = 503
+
+        with patch.object(
+            type(self.env['l10n_cr.hacienda.cedula.api']),
+            'lookup_cedula',
+            return_value={'success': False, 'error': 'Server error', 'error_type': 'api_error'},
+        ), \
+             patch.object(
+            type(self.env['l10n_cr.hacienda.rate_limiter']),
+            'try_acquire_token',
+            return_value=True,
+        ), \
+             patch(GOMETA_REQUESTS_GET, return_value=mock_gometa_failure):
+            self.cache_model._drain_refresh_queue()
+
+        cache.invalidate_recordset()
+        self.assertEqual(cache.name, 'Stale Company')
+        self.assertTrue(cache.error_message)
+
+    def test_04_refresh_queue_coalesces_bursts(self):
+        """Worker threads receive deduplicated keys in batches."""
+        batches = []
+        done = threading.Event()
+
+        def handler(keys):
+            batches.append(list(keys))
+            done.set()
+
+        queue = RefreshQueue(handler, max_workers=2, coalesce_delay=0.05, batch_size=10)
+        accepted = [queue.submit(key) for key in ['a', 'b', 'a', 'c', 'b']]
+
+        self.assertEqual(accepted, [True, True, False, True, False])
+        self.assertTrue(done.wait(5))
+        self.assertEqual(batches, [['a', 'b', 'c']])
+
+    def test_05_reset_forgets_pending_and_in_flight_keys(self):
+        """Keys left over by an earlier test do not block new submissions."""
+        self._create_stale_entry('3101234567')
+        self.lookup_service.lookup_and_cache('3101234567')
+        queue = self.cache_model._get_refresh_queue()
+        self.assertEqual(queue.stats()['pending'], 1)
+        # Simulate a batch taken by a worker that never reported back
+        queue._in_flight.add('stuck')
+
+        reset_refresh_queues()
+
+        self.assertEqual(queue.stats(), {'pending': 0, 'in_flight': 0})
+        self.assertTrue(queue.submit('stuck'))
+
 
 @tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'integration', 'p2')
 class TestCedulaLookupServiceEdgeCases(EInvoiceTestCase):
@@ -4,6 +4,8 @@ Comprehensive unit tests for Certificate Manager (Phase 2)
 Tests certificate loading, validation, and error handling
 """
 import base64
+import logging
+import time
 from datetime import datetime, timedelta
 from unittest.mock import Mock, patch, MagicMock
 from cryptography import x509
@@ -539,3 +541,144 @@ class TestCertificateManager(TransactionCase):
         # Should try PKCS#12 first and succeed
         cert, key = self.CertManager.load_certificate_from_company(self.company)
         self.assertIsNotNone(cert)
+
+    # ========== Loaded Certificate Cache Tests ==========
+
+    def _write_pkcs12(self, password, cert=None):
+        """Store a PKCS#12 file with the test key on the company."""
+        from cryptography.hazmat.primitives.serialization import pkcs12
+
+        pkcs12_data = pkcs12.serialize_key_and_certificates(
+            b"test",
+            self.private_key,
+            cert or self.valid_cert,
+            None,
+            serialization.BestAvailableEncryption(password.encode('utf-8'))
+        )
+        self.company.write({
+            'l10n_cr_hacienda_env': 'sandbox',
+            'l10n_cr_certificate': base64.b64encode(pkcs12_data),
+            'l10n_cr_certificate_filename': 'test.p12',
+            'l10n_cr_key_password': password,
+        })
+
+    def test_certificate_cached_between_calls(self):
+        """The PKCS#12 file is decoded once and reused for later signatures."""
+        from odoo.addons.l10n_cr_einvoice.models import certificate_manager
+
+        self._write_pkcs12('cache_pass')
+        with patch.object(
+            certificate_manager.pkcs12, 'load_key_and_certificates',
+            wraps=certificate_manager.pkcs12.load_key_and_certificates,
+        ) as mock_load:
+            cert1, key1 = self.CertManager.load_certificate_from_company(self.company)
+            cert2, key2 = self.CertManager.load_certificate_from_company(self.company)
+
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertIs(cert1, cert2)
+        self.assertIs(key1, key2)
+
+    def test_certificate_cache_invalidated_on_change(self):
+        """A new certificate file or password is loaded instead of the cached one."""
+        self._write_pkcs12('first_pass')
+        cert1, _key = self.CertManager.load_certificate_from_company(self.company)
+
+        self._write_pkcs12('second_pass', cert=self.expiring_soon_cert)
+        cert2, _key = self.CertManager.load_certificate_from_company(self.company)
+
+        self.assertNotEqual(cert1.serial_number, cert2.serial_number)
+
+    def test_certificate_cache_fingerprint_tracks_password(self):
+        """Changing only the password changes the cache fingerprint."""
+        self._write_pkcs12('pass_a')
+        fingerprint_a = self.CertManager._get_certificate_fingerprint(self.company)
+        self.company.write({'l10n_cr_key_password': 'pass_b'})
+        fingerprint_b = self.CertManager._get_certificate_fingerprint(self.company)
+
+        self.assertNotEqual(fingerprint_a, fingerprint_b)
+
+    def test_expired_cached_certificate_not_reused(self):
+        """A cached certificate past its expiry is reloaded (and rejected)."""
+        from odoo.addons.l10n_cr_einvoice.models import certificate_manager
+
+        self._write_pkcs12('expiry_pass')
+        self.CertManager.load_certificate_from_company(self.company)
+
+        # Simulate the certificate expiring while cached
+        certificate_manager._CERT_CACHE[self.company.id]['not_after'] = datetime.utcnow() - timedelta(seconds=1)
+        with patch.object(self.CertManager.__class__, '_load_certificate_uncached',
+                          side_effect=UserError('Certificate has expired')) as mock_reload:
+            with self.assertRaises(UserError):
+                self.CertManager.load_certificate_from_company(self.company)
+        mock_reload.assert_called_once()
+
+
+@tagged('post_install', '-at_install', 'p2')
+class TestCertificateCachePerformance(TransactionCase):
+    """Benchmark signing throughput with and without the certificate cache."""
+
+    ITERATIONS = 20
+
+    def setUp(self):
+        super().setUp()
+        from cryptography.hazmat.primitives.serialization import pkcs12
+
+        self.CertManager = self.env['l10n_cr.certificate.manager']
+        self.signer = self.env['l10n_cr.xml.signer']
+        self.company = self.env.company
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u"bench.company.cr")])
+        cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+            private_key.public_key()
+        ).serial_number(x509.random_serial_number()).not_valid_before(
+            datetime.utcnow() - timedelta(days=1)
+        ).not_valid_after(
+            datetime.utcnow() + timedelta(days=365)
+        ).sign(private_key, hashes.SHA256(), default_backend())
+
+        pkcs12_data = pkcs12.serialize_key_and_certificates(
+            b"bench", private_key, cert, None,
+            serialization.BestAvailableEncryption(b"bench_password"),
+        )
+        self.company.write({
+            'l10n_cr_hacienda_env': 'sandbox',
+            'l10n_cr_certificate': base64.b64encode(pkcs12_data),
+            'l10n_cr_certificate_filename': 'bench.p12',
+            'l10n_cr_key_password': 'bench_password',
+        })
+        self.xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<TiqueteElectronico xmlns="https://cdn.comprobanteselectronicos.go.cr/xml-schemas/v4.4/tiqueteElectronico">
+  <Clave>50601012300001010011200001040000000000111111111111</Clave>
+  <NumeroConsecutivo>00100001040000000001</NumeroConsecutivo>
+  <ResumenFactura><TotalComprobante>100.00</TotalComprobante></ResumenFactura>
+</TiqueteElectronico>'''
+
+    def _sign_many(self, cached):
+        """Sign ITERATIONS documents; return (seconds, certificate loads)."""
+        manager_class = type(self.CertManager)
+        self.CertManager.invalidate_certificate_cache(self.company.id)
+        with patch.object(
+            manager_class, '_load_certificate_uncached', autospec=True,
+            side_effect=manager_class._load_certificate_uncached,
+        ) as mock_load:
+            start = time.perf_counter()
+            for _i in range(self.ITERATIONS):
+                if not cached:
+                    self.CertManager.invalidate_certificate_cache(self.company.id)
+                certificate, private_key = self.CertManager.load_certificate_from_company(self.company)
+                self.signer.sign_xml(self.xml, certificate=certificate, private_key=private_key)
+            elapsed = time.perf_counter() - start
+        return elapsed, mock_load.call_count
+
+    def test_signing_throughput_with_cache(self):
+        """P2: The certificate is loaded once and reused across signatures."""
+        uncached, uncached_loads = self._sign_many(cached=False)
+        cached, cached_loads = self._sign_many(cached=True)
+
+        logging.getLogger(__name__).info(
+            'Certificate cache benchmark (%d signatures): %.1f/s uncached, %.1f/s cached',
+            self.ITERATIONS, self.ITERATIONS / uncached, self.ITERATIONS / cached,
+        )
+        self.assertEqual(uncached_loads, self.ITERATIONS)
+        self.assertEqual(cached_loads, 1)
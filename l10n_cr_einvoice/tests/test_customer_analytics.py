@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the set-based CustomerAnalytics report builders.
+
+Covers the per-customer aggregates (frequency, purchase gaps, email
+engagement, payment preferences and CLV), paging, the report cache and a
+benchmark over a seeded gym-sized customer base.
+"""
+import logging
+import time
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+from ..reports import customer_analytics
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'customer_analytics')
+class TestCustomerAnalytics(EInvoiceTestCase):
+    """Test the SQL aggregates behind the customer analytics reports."""
+
+    BENCHMARK_MEMBERS = 2000
+    BENCHMARK_DOCUMENTS = 20000
+    DATE_FROM = '2030-01-01'
+    DATE_TO = '2030-03-31'
+
+    def setUp(self):
+        super().setUp()
+        self.analytics = self.env['report.l10n_cr_einvoice.customer_analytics'].with_company(self.company)
+        customer_analytics.clear_customer_analytics_cache()
+        self.addCleanup(customer_analytics.clear_customer_analytics_cache)
+        self.frequent, self.occasional = self.env['res.partner'].create([
+            {'name': 'Socio Frecuente', 'email': 'frecuente@example.com'},
+            {'name': 'Socio Ocasional'},
+        ])
+
+    def _create_purchase(self, partner, invoice_date, document_type='FE', email_sent=False,
+                         payment_method='l10n_cr_einvoice.payment_method_efectivo'):
+        """Create an accepted document of ``partner`` dated ``invoice_date``."""
+        move = self._create_test_invoice(partner=partner)
+        move.l10n_cr_payment_method_id = self.env.ref(payment_method)
+        document = self._create_einvoice_document(move, document_type=document_type)
+        document.write({'state': 'accepted', 'email_sent': email_sent})
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE l10n_cr_einvoice_document SET invoice_date = %s, create_date = %s WHERE id = %s",
+            (invoice_date, invoice_date, document.id),
+        )
+        document.invalidate_recordset()
+        return document
+
+    def _create_purchases(self):
+        # Six purchases two days apart, two of them emailed and one by card
+        for day in range(6):
+            self._create_purchase(
+                self.frequent, f'2030-01-{1 + 2 * day:02d}', email_sent=day < 2,
+                payment_method=(
+                    'l10n_cr_einvoice.payment_method_tarjeta' if day == 5
+                    else 'l10n_cr_einvoice.payment_method_efectivo'
+                ),
+            )
+        self._create_purchase(self.occasional, '2030-02-01')
+
+    def test_purchase_frequency(self):
+        """Customers are categorized with first/last purchase and average gaps."""
+        self._create_purchases()
+
+        result = self.analytics.get_customer_purchase_frequency(self.DATE_FROM, self.DATE_TO)
+
+        self.assertEqual(result['total_customers'], 2)
+        self.assertEqual(result['medium_frequency_count'], 1)
+        self.assertEqual(result['one_time_count'], 1)
+        frequent = result['frequency_categories']['medium_frequency'][0]
+        self.assertEqual(frequent['partner_id'], self.frequent.id)
+        self.assertEqual(frequent['invoice_count'], 6)
+        self.assertEqual(str(frequent['first_purchase_date']), '2030-01-01')
+        self.assertEqual(str(frequent['last_purchase_date']), '2030-01-11')
+        self.assertEqual(frequent['avg_days_between_purchases'], 2.0)
+        self.assertIsNone(result['frequency_categories']['one_time'][0]['avg_days_between_purchases'])
+
+        # Counts cover every customer, the lists only the requested page
+        page = self.analytics.get_customer_purchase_frequency(self.DATE_FROM, self.DATE_TO, limit=1, offset=1)
+        self.assertEqual(page['total_customers'], 2)
+        self.assertFalse(any(page['frequency_categories'].values()))
+
+    def test_engagement_and_payment_preferences(self):
+        """Email engagement and payment preferences are aggregated per customer."""
+        self._create_purchases()
+
+        engagement = self.analytics.get_email_engagement_metrics(self.DATE_FROM, self.DATE_TO)
+        self.assertEqual(engagement['total_eligible_invoices'], 7)
+        self.assertEqual(engagement['emails_sent'], 2)
+        self.assertEqual(engagement['emails_not_sent'], 5)
+        self.assertEqual(engagement['total_customers'], 2)
+        self.assertEqual(list(engagement['customer_engagement']), [self.frequent.id, self.occasional.id])
+        self.assertAlmostEqual(engagement['customer_engagement'][self.frequent.id]['engagement_rate'], 100 / 3)
+        self.assertEqual(engagement['customers_no_email'], [{
+            'partner_id': self.occasional.id,
+            'partner_name': 'Socio Ocasional',
+            'invoice_count': 1,
+        }])
+
+        by_rate = self.analytics.get_email_engagement_metrics(
+            self.DATE_FROM, self.DATE_TO, limit=1, order='engagement_rate asc',
+        )
+        self.assertEqual(list(by_rate['customer_engagement']), [self.occasional.id])
+
+        preferences = self.analytics.get_customer_payment_preferences(self.DATE_FROM, self.DATE_TO)
+        frequent = preferences['customer_preferences'][self.frequent.id]
+        self.assertEqual(frequent['total_invoices'], 6)
+        self.assertEqual(len(frequent['payment_methods']), 2)
+        self.assertEqual(frequent['dominant_payment_method'], self.env.ref('l10n_cr_einvoice.payment_method_efectivo').name)
+        self.assertAlmostEqual(frequent['dominant_usage_percentage'], 500 / 6)
+
+        with self.assertRaises(UserError):
+            self.analytics.get_customer_payment_preferences(self.DATE_FROM, self.DATE_TO, order='amount; DROP')
+
+    def test_lifetime_value_and_cache(self):
+        """CLV nets credits per customer; cached pages are reused until cleared."""
+        self._create_purchases()
+        self._create_purchase(self.frequent, '2030-01-20', document_type='NC')
+        sales = self.env['l10n_cr.einvoice.document'].search([
+            ('partner_id', '=', self.frequent.id),
+            ('document_type', '=', 'FE'),
+        ])
+
+        clv = self.analytics.get_customer_lifetime_value(partner_id=self.frequent.id)
+        self.assertEqual(clv['total_invoices'], 7)
+        self.assertAlmostEqual(clv['total_revenue'], sum(sales.move_id.mapped('amount_total')))
+        self.assertAlmostEqual(clv['lifetime_value'], clv['total_revenue'] - clv['total_credits'])
+        self.assertEqual(clv['active_months'], 1)
+
+        ranking = self.analytics.get_customer_lifetime_value(limit=1, use_cache=True)
+        self.assertEqual(len(ranking['top_customers_by_clv']), 1)
+        self.assertGreaterEqual(ranking['total_customers'], 2)
+
+        self._create_purchase(self.occasional, '2030-02-02')
+        cached = self.analytics.get_customer_lifetime_value(limit=1, use_cache=True)
+        self.assertEqual(cached, ranking)
+        customer_analytics.clear_customer_analytics_cache()
+        self.assertEqual(
+            self.analytics.get_customer_lifetime_value(partner_id=self.occasional.id)['total_invoices'], 2,
+        )
+
+    def test_gym_members_benchmark(self):
+        """P2: Report customer analytics times over a gym-sized member base."""
+        members = self.env['res.partner'].create([
+            {'name': f'Miembro {n}'} for n in range(self.BENCHMARK_MEMBERS)
+        ])
+        move = self._create_test_invoice()
+        self.env.cr.execute("""
+            INSERT INTO l10n_cr_einvoice_document
+                (name, move_id, company_id, partner_id, document_type, state, amount_total,
+                 email_sent, invoice_date, create_date, write_date)
+            SELECT 'BENCH-' || n,
+                   %(move_id)s,
+                   %(company_id)s,
+                   (%(partner_ids)s::int[])[1 + n %% %(members)s],
+                   'TE',
+                   'accepted',
+                   100 + n %% 7,
+                   n %% 3 = 0,
+                   DATE '2030-01-01' + n %% 90,
+                   DATE '2030-01-01' + n %% 90,
+                   now() AT TIME ZONE 'UTC'
+              FROM generate_series(1, %(count)s) AS n
+        """, {
+            'move_id': move.id,
+            'company_id': self.company.id,
+            'partner_ids': members.ids,
+            'members': self.BENCHMARK_MEMBERS,
+            'count': self.BENCHMARK_DOCUMENTS,
+        })
+        self.env['l10n_cr.einvoice.document'].invalidate_model()
+
+        start = time.perf_counter()
+        frequency = self.analytics.get_customer_purchase_frequency(self.DATE_FROM, self.DATE_TO)
+        engagement = self.analytics.get_email_engagement_metrics(self.DATE_FROM, self.DATE_TO)
+        sql_time = time.perf_counter() - start
+
+        # Previous approach: load the recordset and group it in Python
+        start = time.perf_counter()
+        documents = self.env['l10n_cr.einvoice.document'].search([
+            ('invoice_date', '>=', self.DATE_FROM),
+            ('invoice_date', '<=', self.DATE_TO),
+            ('state', '=', 'accepted'),
+        ])
+        counts = {}
+        for doc in documents:
+            counts[doc.partner_id.id] = counts.get(doc.partner_id.id, 0) + 1
+        orm_time = time.perf_counter() - start
+
+        _logger.info(
+            'Customer analytics benchmark (%d members, %d documents): SQL %.3fs, recordset grouping %.3fs',
+            self.BENCHMARK_MEMBERS, self.BENCHMARK_DOCUMENTS, sql_time, orm_time,
+        )
+        self.assertEqual(frequency['total_customers'], len(counts))
+        self.assertEqual(frequency['medium_frequency_count'], self.BENCHMARK_MEMBERS)
+        self.assertEqual(engagement['total_eligible_invoices'], sum(counts.values()))
+        self.assertEqual(engagement['total_customers'], len(counts))
+        self.assertLessEqual(len(engagement['customer_engagement']), customer_analytics.CUSTOMER_PAGE_SIZE)
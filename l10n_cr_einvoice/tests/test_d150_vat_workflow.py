@@ -6,6 +6,7 @@ Tests end-to-end workflow: create period → calculate → generate XML → sign
 from odoo.tests.common import tagged
 from odoo.exceptions import UserError, ValidationError
 import uuid
+from odoo.addons.l10n_cr_einvoice.models.d150_vat_report import SALES_FIELDS, PURCHASE_FIELDS
 from .common import EInvoiceTestCase
 
 
@@ -24,8 +25,69 @@ def _generate_unique_email(prefix='test'):
     return f"{prefix}-{uuid.uuid4().hex[:8]}@example.com"
 
 
+def _python_reference_totals(d150):
+    """Per-line Python aggregation the set-based D-150 query must reproduce."""
+    totals = dict.fromkeys(SALES_FIELDS + PURCHASE_FIELDS, 0.0)
+    moves = d150.env['account.move'].search([
+        ('company_id', '=', d150.company_id.id),
+        ('state', '=', 'posted'),
+        ('invoice_date', '>=', d150.period_id.date_from),
+        ('invoice_date', '<=', d150.period_id.date_to),
+    ])
+    for move in moves.filtered(lambda m: m.move_type in ('out_invoice', 'out_refund')):
+        is_refund = move.move_type == 'out_refund'
+        for line in move.invoice_line_ids:
+            if not line.tax_ids:
+                totals['sales_exempt'] += -abs(line.price_subtotal) if is_refund else line.price_subtotal
+                continue
+            rates = [int(t.amount) if t.amount else 0 for t in line.tax_ids]
+            rates = [r for r in rates if r in (13, 4, 2, 1, 0)]
+            if not rates:
+                continue
+            primary = max(rates)
+            if is_refund:
+                if primary:
+                    totals['credit_notes_%d_base' % primary] += abs(line.price_subtotal)
+            elif primary == 0:
+                totals['sales_exempt'] += line.price_subtotal
+            else:
+                totals['sales_%d_base' % primary] += line.price_subtotal
+            for rate in rates:
+                if not rate:
+                    continue
+                tax_amount = line.price_subtotal * (rate / 100.0)
+                if is_refund:
+                    totals['credit_notes_%d_tax' % rate] += abs(tax_amount)
+                else:
+                    totals['sales_%d_tax' % rate] += tax_amount
+    for move in moves.filtered(lambda m: m.move_type in ('in_invoice', 'in_refund')):
+        sign = -1.0 if move.move_type == 'in_refund' else 1.0
+        for line in move.invoice_line_ids:
+            is_service = bool(line.product_id) and line.product_id.type == 'service'
+            if not line.tax_ids:
+                totals['purchases_exempt'] += line.price_subtotal * sign
+                continue
+            rates = [int(t.amount) if t.amount else 0 for t in line.tax_ids]
+            primary = max(rates)
+            if primary == 13:
+                key = 'purchases_services_13_base' if is_service else 'purchases_goods_13_base'
+                totals[key] += line.price_subtotal * sign
+            elif primary in (4, 2, 1):
+                totals['purchases_%d_base' % primary] += line.price_subtotal * sign
+            elif primary == 0:
+                totals['purchases_exempt'] += line.price_subtotal * sign
+            for rate in rates:
+                tax_amount = line.price_subtotal * (rate / 100.0) * sign
+                if rate == 13:
+                    key = 'purchases_services_13_tax' if is_service else 'purchases_goods_13_tax'
+                    totals[key] += tax_amount
+                elif rate in (4, 2, 1):
+                    totals['purchases_%d_tax' % rate] += tax_amount
+    return totals
+
+
 from unittest.mock import patch, Mock
-from datetime import date
+from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 
 
@@ -373,6 +435,129 @@ class TestD150VATWorkflow(EInvoiceTestCase):
         # Factor = 800000 / (800000 + 200000) = 80.0 (percentage)
         self.assertAlmostEqual(d150.proportionality_factor, 80.0, places=2)
 
+    # =====================================================
+    # SET-BASED AGGREGATION TESTS
+    # =====================================================
+
+    def _create_move(self, move_type, lines, invoice_date=date(2025, 11, 10)):
+        """Helper to create and post an invoice or bill from (product, price, taxes) lines."""
+        move = self.env['account.move'].create({
+            'move_type': move_type,
+            'partner_id': self.partner_d150.id,
+            'company_id': self.company.id,
+            'invoice_date': invoice_date,
+            'invoice_line_ids': [(0, 0, {
+                'product_id': product.id,
+                'quantity': 1,
+                'price_unit': price,
+                'tax_ids': [(6, 0, taxes.ids)],
+            }) for product, price, taxes in lines],
+        })
+        move.action_post()
+        return move
+
+    def _create_d150(self):
+        period = self.env['l10n_cr.tax.report.period'].create({
+            'report_type': 'd150',
+            'year': 2025,
+            'month': 11,
+            'company_id': self.company.id,
+        })
+        return self.env['l10n_cr.d150.report'].create({
+            'period_id': period.id,
+            'company_id': self.company.id,
+        })
+
+    def test_d150_aggregation_matches_line_by_line_totals(self):
+        """The grouped query reproduces the per-line Python aggregation."""
+        no_tax = self.env['account.tax']
+        goods = self.env['product.product'].create({
+            'name': 'D150 Equipment',
+            'type': 'consu',
+            'list_price': 10000.0,
+        })
+        self._create_move('out_invoice', [
+            (self.product_d150, 25000.0, self.tax_13),
+            (self.product_d150, 5000.0, no_tax),
+            (self.product_d150, 3000.0, self.tax_0),
+        ])
+        self._create_move('out_invoice', [(self.product_d150, 12000.0, self.tax_13)])
+        self._create_move('out_refund', [
+            (self.product_d150, 4000.0, self.tax_13),
+            (self.product_d150, 1000.0, no_tax),
+        ])
+        self._create_move('in_invoice', [
+            (goods, 10000.0, self.tax_13_purchase),
+            (self.product_d150, 7000.0, self.tax_13_purchase),
+            (goods, 2000.0, no_tax),
+        ])
+        self._create_move('in_refund', [(goods, 1500.0, self.tax_13_purchase)])
+        # Outside the period
+        self._create_move('out_invoice', [(self.product_d150, 99000.0, self.tax_13)],
+                          invoice_date=date(2025, 12, 1))
+
+        d150 = self._create_d150()
+        d150.action_calculate()
+
+        expected = _python_reference_totals(d150)
+        for field in SALES_FIELDS + PURCHASE_FIELDS:
+            self.assertAlmostEqual(d150[field], expected[field], places=2, msg=field)
+        self.assertAlmostEqual(d150.sales_13_base, 37000.0, places=2)
+        self.assertAlmostEqual(d150.sales_exempt, 7000.0, places=2)
+        self.assertAlmostEqual(d150.credit_notes_13_base, 4000.0, places=2)
+        self.assertAlmostEqual(d150.purchases_goods_13_base, 8500.0, places=2)
+        self.assertAlmostEqual(d150.purchases_services_13_base, 7000.0, places=2)
+
+    def test_d150_incremental_recalculation(self):
+        """Only moves written since the last calculation are re-aggregated."""
+        self._create_test_invoices(date(2025, 11, 1), date(2025, 11, 30), count=3)
+        d150 = self._create_d150()
+        d150.action_calculate()
+        self.assertAlmostEqual(d150.sales_13_base, 75000.0, places=2)
+
+        # Pretend the existing moves were last written before the calculation
+        self.env['account.move'].flush_model()
+        self.env.cr.execute(
+            "UPDATE account_move SET write_date = write_date - interval '1 day' WHERE company_id = %s",
+            (self.company.id,),
+        )
+        self.env['account.move'].invalidate_model(['write_date'])
+        new_invoice = self._create_move('out_invoice', [(self.product_d150, 10000.0, self.tax_13)])
+
+        D150 = type(d150)
+        with patch.object(D150, '_aggregate_move_lines', autospec=True,
+                          side_effect=D150._aggregate_move_lines) as mock_aggregate:
+            d150.action_recalculate_changes()
+
+        self.assertEqual(
+            {tuple(call.args[3]) for call in mock_aggregate.call_args_list},
+            {(new_invoice.id,)},
+        )
+        self.assertEqual(d150.state, 'calculated')
+        self.assertAlmostEqual(d150.sales_13_base, 85000.0, places=2)
+        self.assertAlmostEqual(d150.sales_13_tax, 11050.0, places=2)
+
+    def test_d150_incremental_recalculation_late_commit(self):
+        """Moves committed after the calculation with an earlier write_date are re-aggregated."""
+        invoices = self._create_test_invoices(date(2025, 11, 1), date(2025, 11, 30), count=2)
+        d150 = self._create_d150()
+        d150.action_calculate()
+
+        self.env['account.move'].flush_model()
+        self.env.cr.execute(
+            "UPDATE account_move SET write_date = write_date - interval '1 day' WHERE company_id = %s",
+            (self.company.id,),
+        )
+        # Written by a transaction that started 5 minutes before the calculation
+        late = invoices[0]
+        self.env.cr.execute(
+            "UPDATE account_move SET write_date = %s WHERE id = %s",
+            (d150.calculated_at - timedelta(minutes=5), late.id),
+        )
+        self.env['account.move'].invalidate_model(['write_date'])
+
+        self.assertEqual(d150._get_changed_move_ids([move.id for move in invoices]), [late.id])
+
     # =====================================================
     # XML GENERATION TESTS
     # =====================================================
@@ -397,6 +397,39 @@ class TestD151InformativeWorkflow(EInvoiceTestCase):
         self.assertAlmostEqual(d151.total_sales_amount, 8000000.0, places=2)
         self.assertAlmostEqual(d151.total_purchases_amount, 8000000.0, places=2)
 
+    def test_d151_recalculation_replaces_lines_in_bulk(self):
+        """Recalculation deletes the old lines and creates the new ones in one batch."""
+        period = self.env['l10n_cr.tax.report.period'].create({
+            'report_type': 'd151',
+            'year': 2025,
+            'company_id': self.company.id,
+        })
+
+        self._create_customer_invoices(self.customer_high, 2025, 5000000.0, count=10)
+        self._create_customer_invoices(self.dimex_customer, 2025, 3000000.0, count=6)
+
+        d151 = self.env['l10n_cr.d151.report'].create({
+            'period_id': period.id,
+            'company_id': self.company.id,
+            'threshold_amount': 2500000.0,
+        })
+        d151.action_calculate()
+        old_lines = d151.customer_line_ids
+        self.assertEqual(len(old_lines), 2)
+
+        CustomerLine = type(self.env['l10n_cr.d151.customer.line'])
+        with patch.object(CustomerLine, 'create', autospec=True,
+                          side_effect=CustomerLine.create) as mock_create:
+            d151.threshold_amount = 4000000.0
+            d151.action_calculate()
+
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertFalse(old_lines.exists())
+        self.assertEqual(len(d151.customer_line_ids), 1)
+        self.assertEqual(d151.customer_line_ids.partner_name, self.customer_high.name)
+        self.assertEqual(d151.total_customers_reported, 1)
+        self.assertAlmostEqual(d151.total_sales_amount, 5000000.0, delta=0.05)
+
     # =====================================================
     # SPECIFIC EXPENSES TESTS
     # =====================================================
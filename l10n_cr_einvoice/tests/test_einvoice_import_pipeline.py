@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the streaming historical import pipeline (einvoice_import_wizard).
+
+Covers chunked processing, bulk duplicate detection, run-wide lookup caches,
+resuming an interrupted import from its checkpoint and the single-pass XML
+parser it relies on.
+"""
+import base64
+import io
+import json
+import logging
+import time
+import zipfile
+from unittest.mock import patch
+
+import psycopg2
+
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase, tagged
+
+from .common import EInvoiceTestCase
+
+
+def _make_clave(sequence):
+    """Build a 50-digit clave whose consecutive part encodes the sequence."""
+    return f"506150124003101234567" f"0010000101{sequence:010d}" "112345678"
+
+
+_LINE_XML = """
+        <LineaDetalle>
+            <NumeroLinea>{number}</NumeroLinea>
+            <Codigo><Tipo>04</Tipo><Codigo>{cabys}</Codigo></Codigo>
+            <Cantidad>1</Cantidad>
+            <UnidadMedida>Sp</UnidadMedida>
+            <Detalle>Mensualidad</Detalle>
+            <PrecioUnitario>100.00</PrecioUnitario>
+            <MontoTotal>100.00</MontoTotal>
+            <SubTotal>100.00</SubTotal>
+            <Impuesto><Codigo>01</Codigo><CodigoTarifa>08</CodigoTarifa><Tarifa>13</Tarifa><Monto>13.00</Monto></Impuesto>
+            <MontoTotalLinea>113.00</MontoTotalLinea>
+        </LineaDetalle>"""
+
+
+def _make_fe_xml(sequence, vat='104560789', cabys='8511000000000', lines=1):
+    """Minimal FE v4.4 document with taxed lines."""
+    line_xml = ''.join(_LINE_XML.format(number=number, cabys=cabys) for number in range(1, lines + 1))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<FacturaElectronica xmlns="https://cdn.comprobanteselectronicos.go.cr/xml-schemas/v4.4/facturaElectronica">
+    <Clave>{_make_clave(sequence)}</Clave>
+    <CodigoActividad>861201</CodigoActividad>
+    <NumeroConsecutivo>001-00001-01-{sequence:010d}</NumeroConsecutivo>
+    <FechaEmision>2024-01-15T10:30:00-06:00</FechaEmision>
+    <Emisor>
+        <Nombre>Gimnasio Anterior SA</Nombre>
+        <Identificacion><Tipo>02</Tipo><Numero>3101234567</Numero></Identificacion>
+    </Emisor>
+    <Receptor>
+        <Nombre>Cliente {vat}</Nombre>
+        <Identificacion><Tipo>01</Tipo><Numero>{vat}</Numero></Identificacion>
+    </Receptor>
+    <CondicionVenta>01</CondicionVenta>
+    <MedioPago>01</MedioPago>
+    <DetalleServicio>{line_xml}
+    </DetalleServicio>
+    <ResumenFactura>
+        <TotalVenta>100.00</TotalVenta>
+        <TotalVentaNeta>100.00</TotalVentaNeta>
+        <TotalImpuesto>13.00</TotalImpuesto>
+        <TotalComprobante>113.00</TotalComprobante>
+    </ResumenFactura>
+</FacturaElectronica>"""
+
+
+@tagged('post_install', '-at_install', 'einvoice_import')
+class TestEInvoiceImportPipeline(EInvoiceTestCase):
+    """Test the chunked, resumable ZIP import engine."""
+
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('l10n_cr_einvoice.import_chunk_size', 2)
+        self.Wizard = self.env['l10n_cr.einvoice.import.wizard'].with_company(self.company)
+
+    def _make_zip(self, documents):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for filename, content in documents:
+                archive.writestr(filename, content)
+        return base64.b64encode(buffer.getvalue())
+
+    def _make_batch(self, documents, **options):
+        return self.env['l10n_cr.einvoice.import.batch'].create({
+            'name': 'Test import',
+            'company_id': self.company.id,
+            'original_provider': 'GTI Costa Rica',
+            'source_file': self._make_zip(documents),
+            'import_options': json.dumps(dict({
+                'skip_duplicates': True,
+                'auto_create_partners': True,
+                'auto_create_products': True,
+            }, **options)),
+        })
+
+    def test_01_chunked_import_with_bulk_duplicate_check(self):
+        """Duplicates inside the ZIP and against existing invoices are skipped."""
+        documents = [(f'fe_{i}.xml', _make_fe_xml(i)) for i in range(1, 5)]
+        documents.append(('fe_dup.xml', _make_fe_xml(2)))
+        documents.append(('__MACOSX/fe_1.xml', _make_fe_xml(1)))
+        batch = self._make_batch(documents)
+
+        counters = self.Wizard._run_import(batch, json.loads(batch.import_options))
+
+        self.assertEqual(batch.total_files, 5)
+        self.assertEqual(batch.checkpoint_entry, 5)
+        self.assertEqual(counters['successful_imports'], 4)
+        self.assertEqual(counters['skipped_duplicates'], 1)
+        self.assertEqual(len(batch.invoice_ids), 4)
+
+        # One partner created for the shared receptor, taxes resolved from the cache
+        partners = self.env['res.partner'].search([('vat', '=', '104560789')])
+        self.assertEqual(len(partners), 1)
+        self.assertEqual(batch.invoice_ids.partner_id, partners)
+        self.assertEqual(len(batch.invoice_ids.invoice_line_ids.tax_ids), 1)
+
+        # A second run of the same ZIP only finds duplicates
+        batch_again = self._make_batch(documents)
+        counters = self.Wizard._run_import(batch_again, json.loads(batch_again.import_options))
+        self.assertEqual(counters['successful_imports'], 0)
+        self.assertEqual(counters['skipped_duplicates'], 5)
+
+    def test_02_invalid_xml_recorded_without_stopping_chunk(self):
+        """A broken XML becomes an import error; the rest of its chunk imports."""
+        batch = self._make_batch([
+            ('fe_1.xml', _make_fe_xml(11)),
+            ('broken.xml', '<FacturaElectronica><Clave>'),
+            ('fe_2.xml', _make_fe_xml(12)),
+        ])
+
+        counters = self.Wizard._run_import(batch, json.loads(batch.import_options))
+
+        self.assertEqual(counters['successful_imports'], 2)
+        self.assertEqual(counters['failed_imports'], 1)
+        self.assertEqual(batch.import_error_ids.file_name, 'broken.xml')
+        self.assertEqual(batch.import_error_ids.error_type, 'xml_parse')
+
+    def test_03_resume_from_checkpoint_after_crash(self):
+        """A crash rolls back the current chunk only; resuming finishes the ZIP."""
+        documents = [(f'fe_{i}.xml', _make_fe_xml(20 + i)) for i in range(6)]
+        batch = self._make_batch(documents)
+        Wizard = type(self.env['l10n_cr.einvoice.import.wizard'])
+        original_import_chunk = Wizard._import_chunk
+        calls = []
+
+        def crash_on_second_chunk(wizard, parsed, *args, **kwargs):
+            calls.append(len(parsed))
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return original_import_chunk(wizard, parsed, *args, **kwargs)
+
+        with patch.object(Wizard, '_import_chunk', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.Wizard._run_import(batch, json.loads(batch.import_options))
+
+        self.assertEqual(batch.checkpoint_entry, 2)
+        self.assertEqual(len(batch.invoice_ids), 2)
+
+        batch.write({'state': 'error'})
+        batch.with_company(self.company).action_resume_import()
+
+        self.assertEqual(batch.state, 'done')
+        self.assertEqual(batch.checkpoint_entry, 6)
+        self.assertEqual(batch.processed_files, 6)
+        self.assertEqual(batch.successful_imports, 6)
+        self.assertEqual(len(batch.invoice_ids), 6)
+        self.assertEqual(
+            len(set(batch.invoice_ids.mapped('l10n_cr_original_clave'))), 6,
+            'Resuming must not import a chunk twice',
+        )
+
+    def test_04_resume_refused_while_import_running(self):
+        """A batch locked by a running import cannot be resumed concurrently."""
+        batch = self._make_batch([('fe_1.xml', _make_fe_xml(30))])
+        Batch = type(batch)
+        Wizard = type(self.env['l10n_cr.einvoice.import.wizard'])
+
+        with patch.object(Batch, '_lock_for_import', autospec=True,
+                          side_effect=Batch._lock_for_import) as mock_lock:
+            self.Wizard._run_import(batch, json.loads(batch.import_options))
+        mock_lock.assert_called_once_with(batch)
+        self.assertEqual(batch.state, 'processing')
+
+        cursor_class = type(self.env.cr)
+        cursor_execute = cursor_class.execute
+
+        def execute(cr, query, *args, **kwargs):
+            if 'NOWAIT' in str(query):
+                raise psycopg2.errors.LockNotAvailable('could not obtain lock on row')
+            return cursor_execute(cr, query, *args, **kwargs)
+
+        with patch.object(cursor_class, 'execute', execute), \
+                patch.object(Wizard, '_run_import') as mock_run:
+            with self.assertRaises(UserError):
+                batch.action_resume_import()
+        mock_run.assert_not_called()
+        self.assertEqual(batch.state, 'processing')
+
+
+@tagged('post_install', '-at_install', 'einvoice_import')
+class TestXMLParserSinglePass(TransactionCase):
+    """Test the compiled single-pass parser and its streaming parse_many API."""
+
+    ITERATIONS = 200
+
+    def setUp(self):
+        super().setUp()
+        self.parser = self.env['l10n_cr.einvoice.xml.parser']
+
+    def test_parse_many_matches_parse_xml_file(self):
+        """Streaming and tree parsing extract the same data; errors stay per document."""
+        documents = [_make_fe_xml(40 + i, lines=i + 1) for i in range(3)]
+        documents.insert(1, '<FacturaElectronica><Clave>')
+
+        results = list(self.parser.parse_many(documents))
+
+        self.assertEqual(len(results), 4)
+        self.assertIsNone(results[1][0])
+        self.assertIn('Invalid XML file', results[1][1])
+        for document, (data, error) in zip(documents[:1] + documents[2:], results[:1] + results[2:]):
+            self.assertIsNone(error)
+            self.assertEqual(data, self.parser.parse_xml_file(document))
+
+        data = results[3][0]
+        self.assertEqual(data['receptor']['id_number'], '104560789')
+        self.assertEqual(len(data['line_items']), 3)
+        self.assertEqual(data['line_items'][2]['taxes'], [
+            {'code': '01', 'rate_code': '08', 'rate': 13.0, 'amount': 13.0},
+        ])
+        self.assertEqual(data['summary']['total_invoice'], 113.0)
+
+    def test_parse_throughput_benchmark(self):
+        """P2: Report single-pass parsing throughput for tree and streaming modes."""
+        documents = [_make_fe_xml(100 + i, lines=20).encode() for i in range(self.ITERATIONS)]
+
+        start = time.perf_counter()
+        parsed = [self.parser.parse_xml_file(document) for document in documents]
+        tree_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        streamed = [data for data, _error in self.parser.parse_many(documents)]
+        stream_time = time.perf_counter() - start
+
+        logging.getLogger(__name__).info(
+            'XML parser benchmark (%d documents, 20 lines): %.1f/s parse_xml_file, %.1f/s parse_many',
+            self.ITERATIONS, self.ITERATIONS / tree_time, self.ITERATIONS / stream_time,
+        )
+        self.assertEqual(parsed, streamed)
@@ -562,3 +562,109 @@ class TestStateRollbackAndPersistence(EInvoiceTestCase):
         # Assert recovery
         self.assertEqual(self.einvoice.state, 'generated')
         self.assertFalse(self.einvoice.error_message)
+
+
+@tagged('post_install', '-at_install', 'integration', 'p1')
+@pytest.mark.integration
+@pytest.mark.p1
+class TestBatchSigning(EInvoiceTestCase):
+    """P1: Test bulk signing of generated documents (backfills, queue draining)."""
+
+    def setUp(self):
+        super(TestBatchSigning, self).setUp()
+
+        self.company = self.env['res.company'].create({
+            'name': 'Test Company Batch Signing',
+            'country_id': self.env.ref('base.cr').id,
+            'vat': _generate_unique_vat_company(),
+            'l10n_cr_hacienda_env': 'sandbox',
+            'l10n_cr_emisor_location': '001',
+        })
+        self.env.user.company_id = self.company
+
+        self.partner = self.env['res.partner'].create({
+            'name': 'Test Customer',
+            'vat': _generate_unique_vat_person(),
+            'email': _generate_unique_email('batch'),
+        })
+        self.product = self.env['product.product'].create({
+            'name': 'Test Product',
+            'list_price': 1000.0,
+            'type': 'service',
+        })
+
+        self.documents = self.env['l10n_cr.einvoice.document']
+        with patch('odoo.addons.l10n_cr_einvoice.models.xml_generator.XMLGenerator.generate_invoice_xml',
+                   return_value='<FacturaElectronica>...</FacturaElectronica>'), \
+                patch('odoo.addons.l10n_cr_einvoice.models.xsd_validator.XSDValidator.validate_xml',
+                      return_value=(True, None)):
+            for _i in range(3):
+                invoice = self.env['account.move'].create({
+                    'move_type': 'out_invoice',
+                    'partner_id': self.partner.id,
+                    'invoice_date': '2025-02-01',
+                    'invoice_line_ids': [(0, 0, {
+                        'product_id': self.product.id,
+                        'quantity': 1,
+                        'price_unit': 1000.0,
+                    })],
+                })
+                invoice.action_post()
+                document = self.env['l10n_cr.einvoice.document'].create({
+                    'move_id': invoice.id,
+                    'document_type': 'FE',
+                    'company_id': self.company.id,
+                    'partner_id': self.partner.id,
+                })
+                document.action_generate_xml()
+                self.documents |= document
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.xml_signer.XMLSigner.sign_xml_batch')
+    @patch('odoo.addons.l10n_cr_einvoice.models.certificate_manager.CertificateManager.load_certificate_from_company')
+    def test_batch_signs_all_documents(self, mock_load_cert, mock_sign_batch):
+        """P1: Generated documents are signed with one certificate load and one batch."""
+        mock_load_cert.return_value = (Mock(), Mock())
+        mock_sign_batch.side_effect = lambda documents, *args, **kwargs: [
+            (True, xml.replace('</FacturaElectronica>', '<Signature/></FacturaElectronica>'))
+            for xml in documents
+        ]
+
+        results = self.documents._sign_xml_batch()
+
+        self.assertEqual(mock_load_cert.call_count, 1)
+        self.assertEqual(mock_sign_batch.call_count, 1)
+        self.assertEqual(len(mock_sign_batch.call_args[0][0]), 3)
+        self.assertTrue(all(success for success, _error in results.values()))
+        for document in self.documents:
+            self.assertEqual(document.state, 'signed')
+            self.assertIn('<Signature/>', document.signed_xml)
+            self.assertEqual(document.xml_attachment_id.name, f'{document.clave}.xml')
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.xml_signer.XMLSigner.sign_xml_batch')
+    @patch('odoo.addons.l10n_cr_einvoice.models.certificate_manager.CertificateManager.load_certificate_from_company')
+    def test_batch_failure_isolated_per_document(self, mock_load_cert, mock_sign_batch):
+        """P1: A document failing to sign does not affect the rest of the batch."""
+        mock_load_cert.return_value = (Mock(), Mock())
+        mock_sign_batch.return_value = [
+            (True, '<FacturaElectronica><Signature/></FacturaElectronica>'),
+            (False, 'Invalid XML content'),
+            (True, '<FacturaElectronica><Signature/></FacturaElectronica>'),
+        ]
+
+        results = self.documents._sign_xml_batch()
+
+        failed = self.documents[1]
+        self.assertEqual(results[failed.id], (False, 'Invalid XML content'))
+        self.assertEqual(failed.state, 'signing_error')
+        self.assertEqual(failed.error_message, 'Invalid XML content')
+        self.assertEqual((self.documents - failed).mapped('state'), ['signed', 'signed'])
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.certificate_manager.CertificateManager.load_certificate_from_company')
+    def test_batch_certificate_error_marks_company_documents(self, mock_load_cert):
+        """P1: A certificate that cannot be loaded fails the company's documents."""
+        mock_load_cert.side_effect = UserError('Digital certificate not configured')
+
+        results = self.documents._sign_xml_batch()
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(set(self.documents.mapped('state')), {'signing_error'})
@@ -98,7 +98,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_obtain_token_success(self, mock_post):
         """P0: Test successful OAuth2 token acquisition."""
         # Mock successful token response
@@ -132,7 +132,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(payload['username'], self.company.l10n_cr_active_username)
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_obtain_token_401_invalid_credentials(self, mock_post):
         """P0: Test OAuth2 authentication failure with invalid credentials."""
         # Mock 401 Unauthorized
@@ -154,7 +154,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('Invalid username or password', error_message)
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_obtain_token_timeout(self, mock_post):
         """P1: Test OAuth2 authentication timeout handling."""
         # Mock timeout exception
@@ -168,7 +168,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('timed out', error_message.lower())
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_obtain_token_connection_error(self, mock_post):
         """P1: Test OAuth2 authentication connection error handling."""
         # Mock connection error
@@ -182,7 +182,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('Cannot reach Hacienda IDP', error_message)
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_obtain_token_malformed_response(self, mock_post):
         """P1: Test OAuth2 response with malformed JSON."""
         # Mock response with invalid JSON
@@ -213,7 +213,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('credentials not configured', error_message.lower())
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_oauth2_production_vs_sandbox_endpoint(self, mock_post):
         """P1: Test correct IDP endpoint selection (sandbox vs production)."""
         mock_response = Mock()
@@ -249,7 +249,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_success_200(self, mock_post):
         """P0: Test successful invoice submission with HTTP 200."""
         # Mock OAuth token response
@@ -290,7 +290,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(mock_post.call_count, 2)
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_success_202_accepted(self, mock_post):
         """P0: Test invoice submission with HTTP 202 Accepted."""
         # Mock OAuth token
@@ -319,7 +319,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(result['ind-estado'], 'recibido')
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_400_validation_error(self, mock_post):
         """P0: Test invoice submission with validation error (HTTP 400)."""
         # Mock OAuth token
@@ -353,7 +353,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('validación', error_message.lower())
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_401_auth_error(self, mock_post):
         """P0: Test invoice submission with authentication error (HTTP 401)."""
         # Mock OAuth token
@@ -394,7 +394,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
 
     # Priority: P0
     @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.time.sleep')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_429_rate_limit(self, mock_post, mock_sleep):
         """P0: Test invoice submission with rate limiting (HTTP 429)."""
         # Mock OAuth token
@@ -434,7 +434,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('intentos', error_message.lower())  # "Falló después de X intentos"
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.time.sleep')
     def test_submit_invoice_500_server_error_retry(self, mock_sleep, mock_post):
         """P0: Test invoice submission with server error and retry."""
@@ -488,7 +488,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
 
     # Priority: P1
     @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.time.sleep')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submit_invoice_timeout_handling(self, mock_post, mock_sleep):
         """P1: Test invoice submission timeout handling (<30s)."""
         # Mock OAuth token
@@ -522,8 +522,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_check_status_aceptado(self, mock_get, mock_post):
         """P0: Test status check returns 'aceptado'."""
         # Mock OAuth token
@@ -557,8 +557,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn(self.sample_clave, call_url)
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_check_status_procesando(self, mock_get, mock_post):
         """P0: Test status check returns 'procesando'."""
         # Mock OAuth token
@@ -587,8 +587,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertTrue(self.api.is_processing(result))
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_check_status_rechazado(self, mock_get, mock_post):
         """P0: Test status check returns 'rechazado' with error details."""
         # Mock OAuth token
@@ -637,8 +637,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('50 digits', error_message)
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_check_status_404_not_found(self, mock_get, mock_post):
         """P1: Test status check for non-existent document (404)."""
         # Mock OAuth token
@@ -669,8 +669,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_parse_response_base64_decoding(self, mock_get, mock_post):
         """P1: Test response parsing with base64-encoded XML."""
         # Mock OAuth token
@@ -701,8 +701,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('aceptado', result['respuesta-xml-decoded'])
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_parse_response_malformed_json(self, mock_get, mock_post):
         """P1: Test response parsing with malformed JSON."""
         # Mock OAuth token
@@ -727,8 +727,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('Invalid JSON', result['error_details'])
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_parse_response_empty_body(self, mock_get, mock_post):
         """P1: Test response parsing with empty response body."""
         # Mock OAuth token
@@ -756,7 +756,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.time.sleep')
     def test_retry_exponential_backoff(self, mock_sleep, mock_post):
         """P0: Test exponential backoff in retry mechanism."""
@@ -801,7 +801,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(mock_sleep.call_args_list[1][0][0], 4)
 
     # Priority: P0
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.time.sleep')
     def test_retry_max_attempts_reached(self, mock_sleep, mock_post):
         """P0: Test max retry attempts (3) is enforced."""
@@ -839,7 +839,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('3 intentos', error_message.lower())
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_retry_no_retry_on_400_validation_error(self, mock_post):
         """P1: Test no retry on validation errors (400)."""
         # Mock OAuth token
@@ -871,7 +871,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(mock_post.call_count, 2)
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_retry_no_retry_on_401_auth_error(self, mock_post):
         """P1: Test limited retry on authentication errors (401).
 
@@ -988,8 +988,8 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
     # =========================================================================
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
     def test_test_connection_success(self, mock_get, mock_post):
         """P1: Test connection test succeeds with valid credentials."""
         # Mock OAuth token
@@ -1014,7 +1014,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertEqual(result['environment'], 'sandbox')
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_test_connection_invalid_credentials(self, mock_post):
         """P1: Test connection test fails with invalid credentials."""
         # Mock 401 Unauthorized
@@ -1051,7 +1051,7 @@ class TestHaciendaAPIIntegration(EInvoiceTestCase):
         self.assertIn('not configured', result['message'].lower())
 
     # Priority: P1
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_test_connection_timeout(self, mock_post):
         """P1: Test connection test with timeout."""
         # Mock timeout
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the pooled keep-alive HTTP sessions used by the Hacienda clients
+
+Covers:
+- One session per host, shared across URLs and clients
+- Sessions are rebuilt after fork
+- Reuse / handshake metrics
+- Hacienda API requests go through the pooled session
+"""
+from unittest.mock import MagicMock, patch
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils import http_pool
+
+
+@tagged('post_install', '-at_install', 'hacienda_api')
+class TestHttpPool(TransactionCase):
+    """Test pooled HTTP session registry and metrics."""
+
+    def setUp(self):
+        super().setUp()
+        http_pool.reset_pools()
+        self.addCleanup(http_pool.reset_pools)
+
+    def test_session_shared_per_host(self):
+        """URLs on the same host share one session, other hosts get their own."""
+        recepcion = http_pool.get_session('https://api.comprobanteselectronicos.go.cr/recepcion/v1/recepcion', self.env)
+        status = http_pool.get_session('https://api.comprobanteselectronicos.go.cr/recepcion/v1/recepcion/506', self.env)
+        idp = http_pool.get_session('https://idp.comprobanteselectronicos.go.cr/auth/realms/rut/protocol/openid-connect/token', self.env)
+
+        self.assertIs(recepcion, status)
+        self.assertIsNot(recepcion, idp)
+
+    def test_pool_size_from_parameter(self):
+        """Pool size is read from system parameters."""
+        self.env['ir.config_parameter'].sudo().set_param('l10n_cr_einvoice.http_pool_maxsize', '25')
+        session = http_pool.get_session('https://api.hacienda.go.cr/tribucr/v1', self.env)
+        adapter = session.get_adapter('https://api.hacienda.go.cr/tribucr/v1')
+        self.assertEqual(adapter._pool_maxsize, 25)
+        self.assertEqual(adapter.max_retries.read, 0)
+
+    def test_connect_retries_can_be_disabled(self):
+        """A retry count of 0 turns transport retries off; pool size stays >= 1."""
+        params = self.env['ir.config_parameter'].sudo()
+        params.set_param('l10n_cr_einvoice.http_connect_retries', '0')
+        params.set_param('l10n_cr_einvoice.http_pool_maxsize', '0')
+        session = http_pool.get_session('https://api.hacienda.go.cr/tribucr/v1', self.env)
+        adapter = session.get_adapter('https://api.hacienda.go.cr/tribucr/v1')
+        self.assertEqual(adapter.max_retries.total, 0)
+        self.assertEqual(adapter.max_retries.connect, 0)
+        self.assertEqual(adapter._pool_maxsize, 1)
+
+    def test_session_rebuilt_after_fork(self):
+        """A forked worker never reuses the parent's sessions."""
+        url = 'https://api.hacienda.go.cr/fe/ae'
+        parent = http_pool.get_session(url, self.env)
+        with patch.object(http_pool.os, 'getpid', return_value=-1):
+            child = http_pool.get_session(url, self.env)
+        self.assertIsNot(parent, child)
+
+    def test_pool_stats(self):
+        """Reuse ratio and saved handshake time are derived from counters."""
+        for _i in range(4):
+            http_pool._record_request('api.hacienda.go.cr')
+        http_pool._record_connection('api.hacienda.go.cr', 0.05)
+
+        stats = self.env['l10n_cr.hacienda.api'].get_http_pool_stats()['api.hacienda.go.cr']
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reuse_ratio'], 0.75)
+        self.assertEqual(stats['avg_handshake_ms'], 50.0)
+        self.assertEqual(stats['handshake_time_saved_ms'], 150.0)
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    def test_token_request_uses_pooled_session(self, mock_post):
+        """IDP token requests go through the pooled session."""
+        api_model = self.env['l10n_cr.hacienda.api']
+        api_model._clear_token_cache()
+        self.env.company.write({
+            'l10n_cr_hacienda_env': 'sandbox',
+            'l10n_cr_active_username': 'cpf-01-0000-0000@stag.comprobanteselectronicos.go.cr',
+            'l10n_cr_active_password': 'test_password',
+        })
+        mock_post.return_value = MagicMock(
+            status_code=200,
+            json=lambda: {'access_token': 'pooled_token', 'expires_in': 300},
+        )
+
+        token = api_model.with_company(self.env.company)._obtain_token()
+
+        self.assertEqual(token, 'pooled_token')
+        mock_post.assert_called_once()
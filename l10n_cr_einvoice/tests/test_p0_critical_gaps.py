@@ -513,7 +513,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         }
         return resp
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_first_call_does_password_grant(self, mock_post):
         """First call must perform a password grant."""
         mock_post.return_value = self._mock_token_response()
@@ -524,7 +524,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         call_data = mock_post.call_args[1].get('data') or mock_post.call_args[0][1] if len(mock_post.call_args[0]) > 1 else mock_post.call_args[1]['data']
         self.assertEqual(call_data['grant_type'], 'password')
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_cached_token_reused(self, mock_post):
         """Second call within expiry window returns cached token without HTTP call."""
         mock_post.return_value = self._mock_token_response()
@@ -536,7 +536,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         # Only one HTTP call (the first password grant)
         self.assertEqual(mock_post.call_count, 1)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_expired_token_triggers_refresh(self, mock_post):
         """Expired access token uses refresh_token grant."""
         from odoo.addons.l10n_cr_einvoice.models import hacienda_api
@@ -562,7 +562,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         call_data = mock_post.call_args[1].get('data', {})
         self.assertEqual(call_data.get('grant_type'), 'refresh_token')
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_expired_refresh_falls_back_to_password(self, mock_post):
         """Both tokens expired → full password grant."""
         from odoo.addons.l10n_cr_einvoice.models import hacienda_api
@@ -585,7 +585,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         call_data = mock_post.call_args[1].get('data', {})
         self.assertEqual(call_data.get('grant_type'), 'password')
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_refresh_failure_falls_back_to_password(self, mock_post):
         """If refresh_token grant fails, fall back to password grant."""
         from odoo.addons.l10n_cr_einvoice.models import hacienda_api
@@ -614,7 +614,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         self.assertEqual(token, 'fallback_token')
         self.assertEqual(mock_post.call_count, 2)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_force_refresh_ignores_cache(self, mock_post):
         """force_refresh=True always does a full password grant."""
         from odoo.addons.l10n_cr_einvoice.models import hacienda_api
@@ -635,7 +635,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
 
         self.assertEqual(token, 'forced_new')
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_safety_margin_30_seconds(self, mock_post):
         """Cache expires 30 seconds before actual token expiry."""
         from odoo.addons.l10n_cr_einvoice.models import hacienda_api
@@ -670,7 +670,7 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
         self.api._clear_token_cache()
         self.assertEqual(len(hacienda_api._TOKEN_CACHE), 0)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_missing_credentials_raises_user_error(self, mock_post):
         """Missing API credentials raises UserError before any HTTP call."""
         self.company.write({
@@ -682,6 +682,73 @@ class TestTokenCacheLifecycle(EInvoiceTestCase):
             self.api._obtain_token()
         mock_post.assert_not_called()
 
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    def test_shared_token_reused_by_other_worker(self, mock_post):
+        """A token obtained by one worker is reused by a worker with an empty local cache."""
+        from odoo.addons.l10n_cr_einvoice.models import hacienda_api
+
+        mock_post.return_value = self._mock_token_response(access_token='shared_tok')
+        self.api._obtain_token()
+
+        # Simulate another worker process: nothing in its local cache
+        hacienda_api._TOKEN_CACHE.clear()
+        token = self.api._obtain_token()
+
+        self.assertEqual(token, 'shared_tok')
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    def test_shared_token_ignored_after_credential_change(self, mock_post):
+        """A shared token issued for other credentials is not reused."""
+        from odoo.addons.l10n_cr_einvoice.models import hacienda_api
+        from odoo.addons.l10n_cr_einvoice.utils.token_store import get_token_store
+
+        get_token_store(self.env).set(self.company.id, {
+            'access_token': 'other_user_tok',
+            'refresh_token': 'other_refresh',
+            'expires_at': time.time() + 3600,
+            'refresh_expires_at': time.time() + 3600,
+            'issued_at': time.time(),
+            'credential_hash': hacienda_api.HaciendaAPI._credential_hash('someone@else'),
+        })
+
+        mock_post.return_value = self._mock_token_response(access_token='own_tok')
+        token = self.api._obtain_token()
+
+        self.assertEqual(token, 'own_tok')
+        self.assertEqual(mock_post.call_args[1]['data']['grant_type'], 'password')
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
+    def test_single_flight_reuses_token_refreshed_while_waiting(self, mock_post):
+        """A worker that waited for the refresh lock reuses the other worker's token."""
+        from contextlib import contextmanager
+        from odoo.addons.l10n_cr_einvoice.models import hacienda_api
+        from odoo.addons.l10n_cr_einvoice.utils.token_store import DatabaseTokenStore
+
+        cred_hash = hacienda_api.HaciendaAPI._credential_hash(
+            self.company.l10n_cr_active_username
+        )
+        store = DatabaseTokenStore(self.env)
+
+        @contextmanager
+        def lock_held_by_other_worker(_self, company_id, timeout=20):
+            # The other worker completes its grant before releasing the lock
+            store.set(company_id, {
+                'access_token': 'refreshed_by_other',
+                'refresh_token': 'r',
+                'expires_at': time.time() + 3600,
+                'refresh_expires_at': time.time() + 3600,
+                'issued_at': time.time(),
+                'credential_hash': cred_hash,
+            })
+            yield True
+
+        with patch.object(DatabaseTokenStore, 'lock', lock_held_by_other_worker):
+            token = self.api._obtain_token(force_refresh=True)
+
+        self.assertEqual(token, 'refreshed_by_other')
+        mock_post.assert_not_called()
+
 
 # ============================================================================
 # Gap #4: NC/ND error paths
@@ -21,6 +21,7 @@ from unittest.mock import patch
 from odoo import fields
 from odoo.tests import tagged
 from odoo.exceptions import UserError, ValidationError
+from odoo.addons.l10n_cr_einvoice.models.res_partner import CIIU_POSTCOMMIT_KEY
 from .common import EInvoiceTestCase
 
 
@@ -196,6 +197,107 @@ class TestPartnerAutoLookupOnVATChange(EInvoiceTestCase):
         pass
 
 
+@tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'integration', 'p1')
+class TestPartnerCiiuAutoPopulate(EInvoiceTestCase):
+    """Test deferred, batched CIIU auto-population on partner save."""
+
+    def setUp(self):
+        super().setUp()
+        self.env['l10n_cr.cedula.cache'].search([]).unlink()
+        self.LookupService = type(self.env['l10n_cr.cedula.lookup.service'])
+        self.ciiu_queue = self.env['res.partner']._get_ciiu_queue()
+
+    def _create_partner_without_ciiu(self, vat):
+        return self.env['res.partner'].create({
+            'name': f'CIIU Partner {vat}',
+            'country_id': self.env.ref('base.cr').id,
+            'vat': vat,
+            'company_id': self.company.id,
+        })
+
+    def test_01_save_does_not_call_apis(self):
+        """create() only queues the partner for the post-commit stage."""
+        with patch.object(self.LookupService, '_lookup_remote_batch') as mock_batch, \
+             patch('requests.get') as mock_get:
+            partner = self._create_partner_without_ciiu('3101555001')
+            mock_batch.assert_not_called()
+            mock_get.assert_not_called()
+
+        self.assertIn(partner.id, self.env.cr.postcommit.data[CIIU_POSTCOMMIT_KEY])
+        self.assertFalse(partner.l10n_cr_economic_activity_id)
+
+    def test_02_batch_resolves_from_cache(self):
+        """Cached cédulas are resolved with no API call."""
+        self.env['l10n_cr.cedula.cache'].create({
+            'cedula': '3101555002',
+            'name': 'Cached Activity SA',
+            'company_type': 'company',
+            'tax_status': 'inscrito',
+            'primary_activity': '9311',
+            'fetched_at': fields.Datetime.now(),
+            'refreshed_at': fields.Datetime.now(),
+            'source': 'hacienda',
+            'company_id': self.company.id,
+        })
+        partners = self._create_partner_without_ciiu('3101555002') \
+            | self._create_partner_without_ciiu('3101555002')
+
+        with patch.object(self.LookupService, '_lookup_remote_batch') as mock_batch:
+            updated = self.env['res.partner']._populate_ciiu_batch(partners.ids)
+            mock_batch.assert_not_called()
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(set(partners.mapped('l10n_cr_economic_activity_id.code')), {'9311'})
+
+    def test_03_batch_fetches_misses_together(self):
+        """Cache misses are fetched in one batch call and cached in bulk."""
+        partners = self._create_partner_without_ciiu('3101555003') \
+            | self._create_partner_without_ciiu('3101555004')
+
+        def remote_batch(cedulas, max_concurrent=5):
+            return {
+                cedula: (True, ('hacienda', {
+                    'success': True,
+                    'data': {
+                        'cedula': cedula,
+                        'name': f'Remote {cedula}',
+                        'company_type': 'company',
+                        'tax_status': 'inscrito',
+                        'economic_activities': [{'code': '9311', 'description': 'Gimnasios'}],
+                    },
+                }, {}))
+                for cedula in cedulas
+            }
+
+        with patch.object(self.LookupService, '_lookup_remote_batch', side_effect=remote_batch) as mock_batch:
+            updated = self.env['res.partner']._populate_ciiu_batch(partners.ids)
+
+        self.assertEqual(mock_batch.call_count, 1)
+        self.assertEqual(sorted(mock_batch.call_args[0][0]), ['3101555003', '3101555004'])
+        self.assertEqual(updated, 2)
+        self.assertEqual(set(partners.mapped('l10n_cr_economic_activity_id.code')), {'9311'})
+        cached = self.env['l10n_cr.cedula.cache'].search([
+            ('cedula', 'in', ['3101555003', '3101555004']),
+        ])
+        self.assertEqual(len(cached), 2)
+
+    def test_04_commit_hands_partners_to_background_queue(self):
+        """The post-commit stage only queues partners; the lookup runs in the workers."""
+        partner = self._create_partner_without_ciiu('3101555005')
+        ResPartner = type(self.env['res.partner'])
+
+        with patch.object(ResPartner, '_populate_ciiu_batch', autospec=True, return_value=1) as mock_populate:
+            self.env.cr.postcommit.run()
+            mock_populate.assert_not_called()
+            self.assertTrue(self.ciiu_queue.is_queued(partner.id))
+
+            self.assertEqual(self.env['res.partner']._drain_ciiu_queue(), 1)
+
+        mock_populate.assert_called_once()
+        self.assertEqual(mock_populate.call_args.args[1], [partner.id])
+        self.assertFalse(self.ciiu_queue.is_queued(partner.id))
+
+
 @tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'integration', 'p0')
 class TestPartnerCacheStatusFields(EInvoiceTestCase):
     """Test cache status computed fields on partner."""
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for chunked batch PDF rendering (EInvoicePDFGenerator.generate_batch_pdfs).
+
+Covers one render call per chunk, the per-document fallback when a chunk
+cannot be split, bulk attachment creation and a docs/second benchmark
+against the one-document-per-wkhtmltopdf path.
+"""
+import io
+import logging
+import time
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'pdf_batch')
+class TestPDFBatchRendering(EInvoiceTestCase):
+    """Test chunked, parallel batch PDF rendering."""
+
+    def setUp(self):
+        super().setUp()
+        self.env['ir.config_parameter'].sudo().set_param('l10n_cr_einvoice.pdf_batch_chunk_size', 2)
+        self.generator = self.env['l10n_cr.einvoice.pdf.generator']
+
+    def _create_documents(self, count):
+        documents = self.env['l10n_cr.einvoice.document']
+        for _index in range(count):
+            document = self._create_einvoice_document(self._create_test_invoice())
+            document.write({
+                'clave': f'5061501240031012345670010000101{document.id:010d}112345678',
+                'xml_content': '<FacturaElectronica/>',
+            })
+            documents |= document
+        return documents
+
+    def test_chunks_rendered_once_with_fallback(self):
+        """Each chunk is one render call; unsplit documents are rendered alone."""
+        documents = self._create_documents(5)
+        unsplit = documents[2]
+        Report = type(self.env['ir.actions.report'])
+        render_calls = []
+
+        def fake_prepare_streams(report, report_ref, data, res_ids=None):
+            render_calls.append(list(res_ids))
+            return {
+                res_id: {'stream': io.BytesIO(b'%PDF-' + str(res_id).encode()), 'attachment': None}
+                for res_id in res_ids if res_id != unsplit.id
+            }
+
+        def fake_single_pdf(generator, document):
+            return (b'%PDF-single', self.generator._generate_filename(document))
+
+        with patch.object(Report, '_render_qweb_pdf_prepare_streams', fake_prepare_streams), \
+                patch.object(type(self.generator), 'generate_pdf_for_document', fake_single_pdf):
+            stats = self.generator.generate_batch_pdfs(documents)
+
+        self.assertEqual(stats, {'generated': 5, 'failed': 0})
+        self.assertEqual(render_calls, [documents[:2].ids, documents[2:4].ids, documents[4:].ids])
+        self.assertTrue(all(documents.mapped('pdf_attachment_id')))
+        self.assertEqual(unsplit.pdf_attachment_id.raw, b'%PDF-single')
+        self.assertEqual(documents[0].pdf_attachment_id.raw, b'%PDF-' + str(documents[0].id).encode())
+        self.assertEqual(documents[0].pdf_attachment_id.res_id, documents[0].id)
+
+    def test_unrenderable_documents_counted_as_failed(self):
+        """Documents without clave or XML fail without being rendered."""
+        documents = self._create_documents(2)
+        documents[1].write({'clave': False})
+        Report = type(self.env['ir.actions.report'])
+
+        def fake_prepare_streams(report, report_ref, data, res_ids=None):
+            return {res_id: {'stream': io.BytesIO(b'%PDF-'), 'attachment': None} for res_id in res_ids}
+
+        with patch.object(Report, '_render_qweb_pdf_prepare_streams', fake_prepare_streams):
+            stats = self.generator.generate_batch_pdfs(documents)
+
+        self.assertEqual(stats, {'generated': 1, 'failed': 1})
+        self.assertFalse(documents[1].pdf_attachment_id)
+
+    def test_batch_rendering_benchmark(self):
+        """P2: Report docs/second of batch rendering against one render per document."""
+        if self.env['ir.actions.report'].get_wkhtmltopdf_state() != 'ok':
+            self.skipTest('wkhtmltopdf is not available')
+        self.env['ir.config_parameter'].sudo().set_param('l10n_cr_einvoice.pdf_batch_chunk_size', 10)
+        generator = self.generator.with_context(force_report_rendering=True)
+        single_documents = self._create_documents(10)
+        batch_documents = self._create_documents(20)
+
+        start = time.perf_counter()
+        for document in single_documents:
+            generator.create_pdf_attachment(document)
+        single_rate = len(single_documents) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        stats = generator.generate_batch_pdfs(batch_documents)
+        batch_rate = len(batch_documents) / (time.perf_counter() - start)
+
+        _logger.info(
+            'PDF batch benchmark: %.1f docs/s one per document, %.1f docs/s in chunks of 10',
+            single_rate, batch_rate,
+        )
+        self.assertEqual(stats['generated'], len(batch_documents))
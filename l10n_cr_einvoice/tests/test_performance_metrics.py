@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the set-based PerformanceMetrics report builders.
+
+Covers the aggregated values and output shapes of the document metrics and
+a benchmark over a seeded 100k-document quarter.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+
+_logger = logging.getLogger(__name__)
+
+
+class PerformanceMetricsCase(EInvoiceTestCase):
+    """Common setup: an isolated date range and seeded documents."""
+
+    def setUp(self):
+        super().setUp()
+        self.metrics = self.env['report.l10n_cr_einvoice.performance_metrics']
+        self.move = self._create_test_invoice()
+        self.date_from = fields.Date.to_string(fields.Date.today() - timedelta(days=90))
+        self.date_to = fields.Date.to_string(fields.Date.today() + timedelta(days=1))
+        # Only the documents seeded by each test are in range
+        self.env.cr.execute(
+            "UPDATE l10n_cr_einvoice_document SET create_date = create_date - INTERVAL '10 years'"
+        )
+
+    def _seed_documents(self, count):
+        """Insert documents spread over the last 90 days with SQL."""
+        self.env.cr.execute("""
+            INSERT INTO l10n_cr_einvoice_document
+                (name, move_id, company_id, document_type, state, amount_total,
+                 email_sent, email_sent_date, hacienda_submission_date, hacienda_acceptance_date,
+                 create_date, write_date)
+            SELECT 'BENCH-' || n,
+                   %(move_id)s,
+                   %(company_id)s,
+                   (ARRAY['FE', 'TE', 'NC', 'ND'])[1 + n %% 4],
+                   (ARRAY['accepted', 'accepted', 'accepted', 'rejected', 'submitted'])[1 + n %% 5],
+                   100 + n %% 7,
+                   n %% 2 = 0,
+                   now() - (n %% 90) * INTERVAL '1 day' + (n %% 30) * INTERVAL '1 minute',
+                   now() - (n %% 90) * INTERVAL '1 day',
+                   now() - (n %% 90) * INTERVAL '1 day',
+                   now() - (n %% 90) * INTERVAL '1 day',
+                   now() - (n %% 90) * INTERVAL '1 day'
+              FROM generate_series(1, %(count)s) AS n
+        """, {'move_id': self.move.id, 'company_id': self.company.id, 'count': count})
+        self.env['l10n_cr.einvoice.document'].invalidate_model()
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'performance_metrics')
+class TestPerformanceMetrics(PerformanceMetricsCase):
+    """Test the SQL aggregates behind the performance metrics reports."""
+
+    def test_document_metrics_aggregates(self):
+        """Counts, rates, averages and top-N details match the seeded data."""
+        self._seed_documents(20)
+
+        email = self.metrics.get_email_delivery_metrics(self.date_from, self.date_to)
+        # n % 5 in (0, 1, 2) is accepted: 12 documents, 6 of them with even n
+        self.assertEqual(email['total_eligible_documents'], 12)
+        self.assertEqual(email['emails_sent'], 6)
+        self.assertEqual(email['emails_not_sent'], 6)
+        self.assertEqual(email['delivery_rate'], 50.0)
+        self.assertEqual(len(email['delivery_time_details']), 6)
+        slowest = email['delivery_time_details'][0]
+        self.assertEqual(set(slowest), {'document_number', 'acceptance_date', 'email_sent_date', 'delivery_time_minutes'})
+        self.assertEqual(slowest['delivery_time_minutes'], max(
+            detail['delivery_time_minutes'] for detail in email['delivery_time_details']
+        ))
+
+        pdf = self.metrics.get_pdf_generation_performance(self.date_from, self.date_to)
+        self.assertEqual(pdf['total_documents'], 12)
+        self.assertEqual(pdf['pdfs_generated'], 0)
+        self.assertEqual(pdf['generation_rate'], 0)
+
+        pos = self.metrics.get_pos_transaction_volume(self.date_from, self.date_to)
+        # TE is n % 4 == 1: n = 1, 5, 9, 13, 17
+        self.assertEqual(pos['total_transactions'], 5)
+        self.assertEqual(pos['accepted_transactions'], 3)
+        self.assertEqual(pos['rejected_transactions'], 1)
+        self.assertEqual(pos['pending_transactions'], 1)
+        self.assertEqual(sum(day['transaction_count'] for day in pos['daily_volume']), 5)
+        self.assertAlmostEqual(pos['total_revenue'], sum(100 + n % 7 for n in (1, 5, 9, 13, 17)))
+        self.assertEqual(pos['daily_volume'], sorted(pos['daily_volume'], key=lambda day: day['date']))
+
+    def test_api_response_time_shape(self):
+        """The response time report keeps its keys when there is nothing to report."""
+        result = self.metrics.get_api_response_time_tracking(self.date_from, self.date_to)
+
+        self.assertEqual(result['total_requests'], 0)
+        self.assertEqual(result['p95_response_time_seconds'], 0)
+        self.assertEqual(set(result['time_distribution']), {'0-10s', '10-30s', '30-60s', '60-300s', '300+s'})
+        self.assertEqual(result['response_details'], [])
+
+
+@tagged('post_install', '-at_install', '-standard', 'einvoice_benchmark')
+class TestPerformanceMetricsBenchmark(PerformanceMetricsCase):
+    """Opt-in benchmark: run with --test-tags einvoice_benchmark."""
+
+    BENCHMARK_DOCUMENTS = 100000
+
+    def test_quarter_metrics_benchmark(self):
+        """P2: Report quarter-wide metric times over 100k documents."""
+        self._seed_documents(self.BENCHMARK_DOCUMENTS)
+        timings = {}
+
+        for method in (
+            'get_api_response_time_tracking',
+            'get_email_delivery_metrics',
+            'get_pdf_generation_performance',
+            'get_pos_transaction_volume',
+        ):
+            start = time.perf_counter()
+            getattr(self.metrics, method)(self.date_from, self.date_to)
+            timings[method] = time.perf_counter() - start
+
+        # Previous approach: load the recordset and filter it in Python
+        start = time.perf_counter()
+        documents = self.env['l10n_cr.einvoice.document'].search([
+            ('create_date', '>=', self.date_from),
+            ('create_date', '<=', self.date_to),
+            ('state', '=', 'accepted'),
+        ])
+        orm_generated = len(documents.filtered(lambda x: x.pdf_attachment_id))
+        orm_time = time.perf_counter() - start
+
+        _logger.info(
+            'Performance metrics benchmark (%d documents): %s; recordset PDF count %.3fs',
+            self.BENCHMARK_DOCUMENTS,
+            ', '.join(f'{method} {elapsed:.3f}s' for method, elapsed in timings.items()),
+            orm_time,
+        )
+        pdf = self.metrics.get_pdf_generation_performance(self.date_from, self.date_to)
+        self.assertEqual(pdf['total_documents'], len(documents))
+        self.assertEqual(pdf['pdfs_generated'], orm_generated)
@@ -1032,3 +1032,112 @@ class TestRetryQueueCleanup(EInvoiceTestCase):
 
         self.assertGreater(deleted_count, 0, "Should delete entries older than custom period")
         self.assertFalse(entry.exists(), "Entry older than 7 days should be deleted")
+
+
+# ============================================================================
+# CLAIM-BASED WORKER TESTS
+# ============================================================================
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'phase3')
+class TestRetryQueueClaims(EInvoiceTestCase):
+    """Test leases, per-category caps and queue metrics of the claim-based workers."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.invoice = self._create_test_invoice()
+        self.document = self._create_einvoice_document(self.invoice, document_type='FE')
+        self.retry_queue = self.env['l10n_cr.einvoice.retry.queue']
+        # Only the entries created by each test are due
+        self.retry_queue.search([('state', 'in', ('pending', 'processing'))]).write({'state': 'cancelled'})
+
+    def _create_due_entry(self, **values):
+        return self.retry_queue.create(dict({
+            'document_id': self.document.id,
+            'operation': 'sign',
+            'error_category': 'transient',
+            'state': 'pending',
+            'next_attempt': datetime.now() - timedelta(minutes=1),
+            'retry_count': 0,
+            'max_retries': 5,
+        }, **values))
+
+    def test_claim_leases_entries_once(self):
+        """Claimed entries are leased and not handed to a second claimer."""
+        entries = self._create_due_entry() | self._create_due_entry(priority='3')
+
+        lease_token, claimed_ids = self.retry_queue._claim_due_entries(10)
+
+        self.assertEqual(claimed_ids, [entries[1].id, entries[0].id], "Highest priority claimed first")
+        self.assertEqual(set(entries.mapped('state')), {'processing'})
+        self.assertEqual(set(entries.mapped('lease_token')), {lease_token})
+        self.assertTrue(all(entry.lease_until > datetime.now() for entry in entries))
+
+        _token, claimed_again = self.retry_queue._claim_due_entries(10)
+        self.assertEqual(claimed_again, [], "Leased entries must not be claimed twice")
+
+    def test_expired_lease_is_reclaimed(self):
+        """An entry whose worker died becomes claimable once its lease expires."""
+        entry = self._create_due_entry(
+            state='processing',
+            lease_token='dead-worker',
+            lease_until=datetime.now() - timedelta(seconds=1),
+        )
+
+        lease_token, claimed_ids = self.retry_queue._claim_due_entries(10)
+        self.assertEqual(claimed_ids, [entry.id])
+
+        # The dead worker lost its claim, the new one processes the entry
+        self.assertFalse(entry._process_claimed('dead-worker'))
+        with patch.object(type(self.document), 'action_sign_xml'):
+            self.assertEqual(entry._process_claimed(lease_token), 'completed')
+        self.assertFalse(entry.lease_token)
+        self.assertTrue(entry.finished_at)
+
+    def test_category_concurrency_cap(self):
+        """Rate limited entries are processed one at a time, others are not held back."""
+        rate_limited = self._create_due_entry(error_category='rate_limit') \
+            | self._create_due_entry(error_category='rate_limit')
+        transient = self._create_due_entry()
+
+        _token, claimed_ids = self.retry_queue._claim_due_entries(10)
+
+        self.assertEqual(len(set(claimed_ids) & set(rate_limited.ids)), 1)
+        self.assertIn(transient.id, claimed_ids)
+
+        # The cap counts entries still leased by other workers
+        _token, claimed_ids = self.retry_queue._claim_due_entries(10)
+        self.assertEqual(claimed_ids, [])
+
+    def test_failure_backoff_uses_new_error_category(self):
+        """The next attempt backs off by the category of the latest error."""
+        entry = self._create_due_entry(error_category='network')
+
+        with patch.object(type(self.document), 'action_sign_xml', side_effect=Exception("429 Too Many Requests")):
+            entry._process_retry()
+
+        self.assertEqual(entry.state, 'pending')
+        self.assertEqual(entry.error_category, 'rate_limit')
+        self.assertEqual(entry.max_retries, 5, "Retry budget is kept from the original error")
+        delay = (entry.next_attempt - datetime.now()).total_seconds() / 60
+        self.assertGreater(delay, self.retry_queue._get_retry_delay(1, 'network'))
+
+    def test_queue_metrics(self):
+        """Metrics report depth, in-flight leases and the drain rate."""
+        self._create_due_entry()
+        self._create_due_entry(error_category='rate_limit')
+        self._create_due_entry(next_attempt=datetime.now() + timedelta(hours=1))
+        self._create_due_entry(state='processing', lease_token='x', lease_until=datetime.now() + timedelta(minutes=5))
+        self._create_due_entry(state='completed', finished_at=datetime.now() - timedelta(minutes=1))
+
+        metrics = self.retry_queue.get_queue_metrics(window_minutes=10)
+
+        self.assertEqual(metrics['depth'], 3)
+        self.assertEqual(metrics['due'], 2)
+        self.assertEqual(metrics['in_flight'], 1)
+        self.assertEqual(metrics['expired_leases'], 0)
+        self.assertAlmostEqual(metrics['drain_rate'], 0.1)
+        self.assertGreater(metrics['oldest_due_seconds'], 0)
+        self.assertEqual(metrics['by_category']['rate_limit'], {'pending': 1, 'in_flight': 0, 'cap': 1})
+        self.assertEqual(metrics['by_category']['transient']['in_flight'], 1)
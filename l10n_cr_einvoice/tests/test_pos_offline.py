@@ -29,6 +29,8 @@ from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
 from odoo import fields
 
+from .common import EInvoiceTestCase
+
 
 @unittest.skip('Requires full POS infrastructure')
 @tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'pos_offline')
@@ -421,3 +423,243 @@ class TestPosOfflineQueue(TransactionCase):
 
         # Should not exceed limit
         self.assertLessEqual(len(entries), 50)
+
+
+@tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'pos_offline')
+class TestPosEInvoicePipeline(EInvoiceTestCase):
+    """Test the asynchronous POS e-invoice pipeline drained by background workers"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Use POS config from the main company (creating POS configs for test
+        # companies requires many inter-dependent records)
+        cls.pos_config = cls.env['pos.config'].search([], limit=1)
+        if not cls.pos_config:
+            raise cls.skipTest(cls, 'No POS config available for testing')
+        cls.company = cls.pos_config.company_id
+        cls.partner = cls._create_test_partner(name='Test Customer POS')
+        cls.pos_config.write({
+            'l10n_cr_offline_mode': True,
+            'l10n_cr_async_einvoice': False,
+        })
+
+        cls.pos_session = cls.env['pos.session'].search([
+            ('config_id', '=', cls.pos_config.id),
+            ('state', '=', 'opened'),
+        ], limit=1)
+        if not cls.pos_session:
+            cls.pos_session = cls.env['pos.session'].create({
+                'config_id': cls.pos_config.id,
+                'user_id': cls.env.uid,
+            })
+
+    def setUp(self):
+        super().setUp()
+        self.order = self._create_pos_order()
+        self.einvoice = self.env['l10n_cr.einvoice.document'].with_context(
+            bypass_einvoice_validation=True
+        ).create({
+            'name': 'TEST-001',
+            'pos_order_id': self.order.id,
+            'company_id': self.company.id,
+            'document_type': 'TE',
+            'partner_id': self.partner.id,
+            'clave': '5' * 50,
+            'signed_xml': '<xml>test</xml>',
+        })
+
+    def _create_pos_order(self, **vals):
+        """Create a paid POS order in the test session."""
+        return self.env['pos.order'].create({
+            'session_id': self.pos_session.id,
+            'company_id': self.company.id,
+            'amount_total': 11300.0,
+            'amount_tax': 1300.0,
+            'amount_paid': 11300.0,
+            'amount_return': 0,
+            **vals,
+        })
+
+    def _create_queue_entry(self, **vals):
+        """Queue the test e-invoice in the asynchronous pipeline."""
+        return self.env['l10n_cr.pos.offline.queue'].create({
+            'pos_order_id': self.order.id,
+            'einvoice_document_id': self.einvoice.id,
+            'queue_type': 'async',
+            'state': 'pending',
+            **vals,
+        })
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.einvoice_document.EInvoiceDocument._validate_before_submission')
+    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.HaciendaAPI.submit_invoice')
+    def test_01_async_drain_processes_async_entries_only(self, mock_submit, mock_validate):
+        """Test async drain cron ignores offline entries and vice versa"""
+        mock_submit.return_value = {'ind-estado': 'recibido'}
+        mock_validate.return_value = True
+        # Online terminal: async entries are submitted, not handed to the offline queue
+        self.pos_config.l10n_cr_offline_mode = False
+        self.einvoice.write({'state': 'signed'})
+
+        offline_entry = self._create_queue_entry(queue_type='offline')
+        async_entry = self._create_queue_entry()
+
+        result = self.env['l10n_cr.pos.offline.queue'].cron_drain_async_queue()
+
+        self.assertEqual(result['success'], 1)
+        self.assertEqual(result['failed'], 0)
+        mock_submit.assert_called_once()
+        self.assertEqual(async_entry.state, 'synced')
+        self.assertEqual(offline_entry.state, 'pending')
+
+    def test_02_async_entry_on_offline_terminal_stays_queued(self):
+        """Test async entry is handed to the offline queue when terminal is offline"""
+        self.einvoice.write({'state': 'signed'})
+        entry = self._create_queue_entry()
+
+        # Terminal fixture runs with l10n_cr_offline_mode=True
+        entry._perform_sync()
+
+        self.assertEqual(entry.queue_type, 'offline')
+        self.assertEqual(entry.state, 'pending')
+        self.assertTrue(self.order.l10n_cr_offline_queue)
+
+    def test_03_claim_skips_non_pending_entries(self):
+        """Test claim refuses entries that are no longer pending"""
+        entry = self._create_queue_entry(state='synced')
+        entry.flush_recordset()
+
+        self.assertFalse(entry._claim_and_sync())
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.einvoice_document.EInvoiceDocument._generate_clave')
+    def test_04_stage_failure_on_stored_document_records_error(self, mock_clave):
+        """Test a failing stage on a stored, locked document records its error in the worker transaction"""
+        mock_clave.side_effect = Exception('Consecutive sequence unavailable')
+        self.einvoice.write({'state': 'draft'})
+        entry = self._create_queue_entry()
+        self.env.flush_all()
+
+        # A second connection would wait forever on the row lock held here
+        with patch.object(type(self.env.registry), 'cursor', side_effect=AssertionError('separate cursor used')):
+            self.assertEqual(entry._claim_and_sync(), 'pending')
+
+        self.assertEqual(self.einvoice.state, 'generation_error')
+        self.assertIn('Consecutive sequence unavailable', self.einvoice.error_message)
+        self.assertEqual(entry.retry_count, 1)
+        self.assertIn('Consecutive sequence unavailable', entry.last_error)
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.einvoice_document.EInvoiceDocument.action_generate_xml')
+    def test_05_async_order_enqueues_pipeline_entry(self, mock_generate):
+        """Test paid orders on async terminals only enqueue the e-invoice"""
+        self.pos_config.l10n_cr_async_einvoice = True
+        order = self._create_pos_order(partner_id=self.partner.id, l10n_cr_is_einvoice=True)
+
+        order._generate_cr_einvoice()
+
+        mock_generate.assert_not_called()
+        document = order.l10n_cr_einvoice_document_id
+        self.assertEqual(document.state, 'draft')
+        entry = self.env['l10n_cr.pos.offline.queue'].search([('pos_order_id', '=', order.id)])
+        self.assertEqual(len(entry), 1)
+        self.assertEqual(entry.queue_type, 'async')
+        self.assertEqual(entry.priority, 'high')
+        self.assertEqual(entry.state, 'pending')
+        self.assertEqual(entry.einvoice_document_id, document)
+
+    def test_06_feedback_pending_while_queued(self):
+        """Test POS feedback reports pending while the async entry is queued"""
+        self.pos_config.l10n_cr_async_einvoice = True
+        order = self._create_pos_order(partner_id=self.partner.id, l10n_cr_is_einvoice=True)
+        order._generate_cr_einvoice()
+
+        feedback = order.get_einvoice_feedback()
+        self.assertTrue(feedback['pending'])
+        self.assertEqual(feedback['type'], 'info')
+
+        # Once the entry leaves the pipeline the final status is reported
+        entry = self.env['l10n_cr.pos.offline.queue'].search([('pos_order_id', '=', order.id)])
+        entry.write({'state': 'synced'})
+        order.l10n_cr_einvoice_document_id.write({'state': 'accepted'})
+        feedback = order.get_einvoice_feedback()
+        self.assertEqual(feedback['type'], 'success')
+        self.assertNotIn('pending', feedback)
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.xml_signer.XMLSigner.sign_xml_batch')
+    @patch('odoo.addons.l10n_cr_einvoice.models.certificate_manager.CertificateManager.load_certificate_from_company')
+    def test_07_bulk_drain_signs_documents_in_batch(self, mock_load_cert, mock_sign_batch):
+        """Test bulk drain signs queued documents in one batch before syncing"""
+        mock_load_cert.return_value = (MagicMock(), MagicMock())
+        mock_sign_batch.side_effect = lambda documents, *args, **kwargs: [
+            (True, '<xml>signed</xml>') for _xml in documents
+        ]
+        self.einvoice.write({'state': 'generated', 'xml_content': '<xml>test</xml>'})
+        entry = self._create_queue_entry()
+
+        self.env['l10n_cr.pos.offline.queue'].drain_queue_bulk(queue_type='async')
+
+        mock_sign_batch.assert_called_once()
+        self.assertEqual(self.einvoice.state, 'signed')
+        # Terminal fixture runs offline: the signed document stays queued
+        self.assertEqual(entry.queue_type, 'offline')
+        self.assertEqual(entry.state, 'pending')
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.certificate_manager.CertificateManager.load_certificate_from_company')
+    def test_08_bulk_drain_failure_schedules_retry(self, mock_load_cert):
+        """Test bulk preparation failures use the regular retry bookkeeping"""
+        mock_load_cert.side_effect = UserError('Digital certificate not configured')
+        self.einvoice.write({'state': 'generated', 'xml_content': '<xml>test</xml>'})
+        entry = self._create_queue_entry()
+
+        result = self.env['l10n_cr.pos.offline.queue'].drain_queue_bulk(queue_type='async')
+
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(entry.state, 'pending')
+        self.assertEqual(entry.retry_count, 1)
+        self.assertIn('certificate', entry.last_error)
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.einvoice_document.EInvoiceDocument._generate_clave')
+    def test_09_bulk_generation_failure_records_error(self, mock_clave):
+        """Test bulk preparation records generation errors without a second connection"""
+        mock_clave.side_effect = Exception('Consecutive sequence unavailable')
+        self.einvoice.write({'state': 'draft'})
+        entry = self._create_queue_entry()
+        self.env.flush_all()
+
+        with patch.object(type(self.env.registry), 'cursor', side_effect=AssertionError('separate cursor used')):
+            result = self.env['l10n_cr.pos.offline.queue'].drain_queue_bulk(queue_type='async')
+
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(self.einvoice.state, 'generation_error')
+        self.assertIn('Consecutive sequence unavailable', self.einvoice.error_message)
+        self.assertEqual(entry.state, 'pending')
+        self.assertEqual(entry.retry_count, 1)
+
+    @patch('odoo.addons.l10n_cr_einvoice.models.einvoice_document.EInvoiceDocument.action_generate_xml')
+    def test_10_bulk_generation_skips_documents_locked_elsewhere(self, mock_generate):
+        """Test bulk preparation leaves documents locked by another transaction alone"""
+        self.einvoice.write({'state': 'draft'})
+        entry = self._create_queue_entry()
+        Queue = self.env['l10n_cr.pos.offline.queue']
+
+        # Another worker holds the document: SKIP LOCKED returns nothing
+        with patch.object(type(Queue), '_lock_documents', autospec=True,
+                          side_effect=lambda queue, documents: documents.browse()) as mock_lock:
+            result = Queue.drain_queue_bulk(queue_type='async')
+
+        mock_lock.assert_called_once()
+        self.assertEqual(mock_lock.call_args.args[1], self.einvoice)
+        mock_generate.assert_not_called()
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(self.einvoice.state, 'draft')
+        self.assertEqual(entry.state, 'pending')
+        self.assertEqual(entry.retry_count, 1)
+        self.assertIn('another transaction', entry.last_error)
+
+    def test_11_lock_documents_claims_unlocked_rows(self):
+        """Test documents not held by another transaction are locked and returned"""
+        Queue = self.env['l10n_cr.pos.offline.queue']
+        self.env.flush_all()
+
+        self.assertEqual(Queue._lock_documents(self.einvoice), self.einvoice)
+        self.assertFalse(Queue._lock_documents(self.einvoice.browse()))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for stored and cached QR codes.
+
+Covers storing the QR code of accepted documents, reusing it (and the
+per-worker cache) instead of re-rendering, invalidation when the clave
+changes and a receipt-style render benchmark.
+"""
+import logging
+import time
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+from ..models import qr_generator
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'qr_cache')
+class TestQRCodeCache(EInvoiceTestCase):
+    """Test that QR codes are rendered once per clave and reused."""
+
+    ITERATIONS = 200
+
+    def setUp(self):
+        super().setUp()
+        if not qr_generator.qrcode:
+            self.skipTest('qrcode library is not installed')
+        qr_generator.clear_qr_cache()
+        self.addCleanup(qr_generator.clear_qr_cache)
+        self.QRGenerator = type(self.env['l10n_cr.qr.generator'])
+
+    def _create_document(self, sequence=1):
+        document = self._create_einvoice_document(self._create_test_invoice())
+        document.write({
+            'clave': f'5061501240031012345670010000101{sequence:010d}112345678',
+            'state': 'accepted',
+        })
+        return document
+
+    def test_store_on_acceptance_and_reuse(self):
+        """Accepted documents store their QR code; reads never render it again."""
+        document = self._create_document()
+        original_render = self.QRGenerator._render_qr_code
+        renders = []
+
+        def counting_render(generator, clave, min_size):
+            renders.append(clave)
+            return original_render(generator, clave, min_size)
+
+        with patch.object(self.QRGenerator, '_render_qr_code', counting_render):
+            document._process_hacienda_response({'ind-estado': 'aceptado'})
+            self.assertEqual(document.qr_code_clave, document.clave)
+            self.assertTrue(document.qr_code_image)
+
+            qr_generator.clear_qr_cache()
+            for _i in range(3):
+                image = document._get_qr_code_image()
+            pdf_image = self.env['l10n_cr.qr.generator'].generate_qr_code_for_document(document)
+
+        self.assertEqual(len(renders), 1, "QR code must be rendered once per clave")
+        self.assertIsInstance(image, str)
+        self.assertEqual(image, pdf_image)
+
+    def test_changed_clave_not_served_from_store(self):
+        """A stored QR code is only used for the clave it was rendered for."""
+        document = self._create_document(2)
+        document._store_qr_codes()
+        old_image = document._get_qr_code_image()
+
+        document.write({'clave': f'5061501240031012345670010000101{99:010d}112345678'})
+
+        self.assertNotEqual(document._get_qr_code_image(), old_image)
+        self.assertEqual(document._store_qr_codes(), 1)
+        self.assertEqual(document._store_qr_codes(), 0, "Up-to-date QR codes are not rendered again")
+        self.assertEqual(document.qr_code_clave, document.clave)
+
+    def test_receipt_render_benchmark(self):
+        """P2: Report QR lookups per second when rendering receipts."""
+        document = self._create_document(3)
+        generator = self.env['l10n_cr.qr.generator']
+
+        start = time.perf_counter()
+        for _i in range(self.ITERATIONS):
+            rendered = generator._render_qr_code(document.clave, qr_generator.QR_MIN_SIZE)
+        render_time = time.perf_counter() - start
+
+        document._store_qr_codes()
+        qr_generator.clear_qr_cache()
+        with patch.object(self.QRGenerator, '_render_qr_code') as mock_render:
+            start = time.perf_counter()
+            for _i in range(self.ITERATIONS):
+                document.invalidate_recordset(['qr_code_image'])
+                image = document._get_qr_code_image()
+            stored_time = time.perf_counter() - start
+
+        _logger.info(
+            'QR benchmark (%d renders): %.1f/s rendering, %.1f/s from stored image',
+            self.ITERATIONS, self.ITERATIONS / render_time, self.ITERATIONS / stored_time,
+        )
+        mock_render.assert_not_called()
+        self.assertEqual(image, rendered)
@@ -22,6 +22,8 @@ from odoo.tests import tagged
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import UserError
 
+from odoo.addons.l10n_cr_einvoice.utils.rate_limiter import BucketSpec, TokenAllocator
+
 
 @tagged('post_install', '-at_install', 'rate_limiter')
 class TestHaciendaRateLimiter(TransactionCase):
@@ -619,3 +621,243 @@ class TestHaciendaRateLimiterStress(TransactionCase):
             f"Should not exceed {expected_max} requests in {elapsed:.2f}s "
             f"(got {successful})"
         )
+
+
+class _MemoryBucket(object):
+    """In-memory bucket row honouring the allocator lease contract."""
+
+    def __init__(self, capacity, rate):
+        self.lock = threading.Lock()
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.leases = 0
+        self.consumed = 0
+
+    def lease(self, spec, want, returned, consumed):
+        with self.lock:
+            now = time.monotonic()
+            available = min(
+                self.tokens + (now - self.last_refill) * spec.rate + returned,
+                spec.capacity,
+            )
+            granted = min(want, int(available))
+            self.tokens = available - granted
+            self.last_refill = now
+            self.leases += 1
+            self.consumed += consumed
+            return granted, self.tokens
+
+
+@tagged('post_install', '-at_install', 'rate_limiter_stress')
+class TestTokenAllocatorConcurrency(TransactionCase):
+    """Concurrency tests for the leased token allocator (no database)."""
+
+    def _hammer(self, allocators, chain, lease_fn, threads_per_allocator, duration):
+        """
+        Call try_acquire() from many threads.
+
+        Returns:
+            tuple: (successes, attempts, elapsed seconds)
+        """
+        counts = []
+        lock = threading.Lock()
+        stop_at = time.monotonic() + duration
+
+        def worker(allocator):
+            successes = attempts = 0
+            while time.monotonic() < stop_at:
+                attempts += 1
+                if not allocator.try_acquire(chain, lease_fn):
+                    successes += 1
+            with lock:
+                counts.append((successes, attempts))
+
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=worker, args=(allocator,))
+            for allocator in allocators
+            for _ in range(threads_per_allocator)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=duration + 5)
+        elapsed = time.monotonic() - start
+        return sum(c[0] for c in counts), sum(c[1] for c in counts), elapsed
+
+    def test_01_global_limit_respected_across_workers(self):
+        """4 workers x 8 threads never spend more than the bucket allows."""
+        spec = BucketSpec('stress', capacity=20, rate=50)
+        bucket = _MemoryBucket(spec.capacity, spec.rate)
+        allocators = [TokenAllocator(lease_size=5, lease_ttl=0.2) for _ in range(4)]
+
+        successes, attempts, elapsed = self._hammer(allocators, [[spec]], bucket.lease, 8, 1.0)
+
+        allowed = spec.capacity + spec.rate * elapsed
+        self.assertLessEqual(successes, allowed)
+        self.assertGreaterEqual(successes, spec.capacity)
+        # Refused attempts are answered locally, not with a round trip each
+        self.assertLess(bucket.leases, attempts / 10)
+
+    def test_02_blocked_callers_all_served(self):
+        """Blocking acquire() serves every caller without losing tokens."""
+        spec = BucketSpec('blocking', capacity=5, rate=20)
+        bucket = _MemoryBucket(spec.capacity, spec.rate)
+        allocator = TokenAllocator(lease_size=2, lease_ttl=1.0)
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(3):
+                acquired = allocator.acquire([[spec]], bucket.lease, timeout=30)
+                with lock:
+                    results.append(acquired)
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=60)
+
+        self.assertEqual(len(results), 30)
+        self.assertTrue(all(results))
+        # Every acquisition was counted against the shared bucket exactly once
+        _unspent, unreported = allocator.local_state('blocking')
+        self.assertEqual(bucket.consumed + unreported, 30)
+
+    def test_03_scoped_bucket_limits_without_wasting_global_tokens(self):
+        """A tighter endpoint bucket caps throughput; global tokens are kept."""
+        global_spec = BucketSpec('global', capacity=100, rate=100)
+        endpoint_spec = BucketSpec('endpoint', capacity=5, rate=10)
+        buckets = {
+            'global': _MemoryBucket(global_spec.capacity, global_spec.rate),
+            'endpoint': _MemoryBucket(endpoint_spec.capacity, endpoint_spec.rate),
+        }
+
+        def lease(spec, want, returned, consumed):
+            return buckets[spec.key].lease(spec, want, returned, consumed)
+
+        allocator = TokenAllocator(lease_size=5, lease_ttl=1.0)
+        chain = [[global_spec], [endpoint_spec]]
+        successes, _attempts, elapsed = self._hammer([allocator], chain, lease, 4, 0.5)
+
+        self.assertLessEqual(successes, endpoint_spec.capacity + endpoint_spec.rate * elapsed)
+        self.assertGreaterEqual(successes, endpoint_spec.capacity)
+        # Global tokens taken for refused endpoint tokens were given back:
+        # only successful acquisitions count as consumed
+        _unspent, unreported = allocator.local_state('global')
+        self.assertEqual(buckets['global'].consumed + unreported, successes)
+
+    def test_04_blocked_caller_woken_by_returned_token(self):
+        """A caller waiting on an empty bucket is woken when a token comes back."""
+        # One token, next refill ~100s away: only a wake-up can serve the waiter
+        spec = BucketSpec('wakeup', capacity=1, rate=0.01)
+        bucket = _MemoryBucket(spec.capacity, spec.rate)
+        allocator = TokenAllocator(lease_size=1, lease_ttl=60.0)
+        self.assertEqual(allocator.try_acquire([[spec]], bucket.lease), 0.0)
+
+        results = []
+        waiting = threading.Event()
+
+        def waiter():
+            waiting.set()
+            results.append(allocator.acquire([[spec]], bucket.lease, timeout=30))
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        waiting.wait(timeout=10)
+        allocator._give_back([spec])
+        thread.join(timeout=30)
+
+        self.assertEqual(results, [True])
+        # The waiter slept on the condition instead of polling the bucket
+        self.assertLessEqual(bucket.leases, 2)
+
+    def test_05_wait_on_unknown_bucket_sleeps_one_refill_step(self):
+        """wait() on a bucket never leased here sleeps instead of returning at once."""
+        spec = BucketSpec('unknown', capacity=5, rate=10)
+        allocator = TokenAllocator()
+
+        with patch.object(allocator._cond, 'wait') as mock_wait:
+            allocator.wait([[spec]], timeout=5)
+
+        mock_wait.assert_called_once()
+        self.assertAlmostEqual(mock_wait.call_args.args[0], 1.0 / spec.rate)
+
+
+@tagged('post_install', '-at_install', 'rate_limiter')
+class TestHaciendaRateLimiterBuckets(TransactionCase):
+    """Per-endpoint buckets and global bucket shards."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rate_limiter = cls.env['l10n_cr.hacienda.rate_limiter']
+        cls.params = cls.env['ir.config_parameter'].sudo()
+
+        cls.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS l10n_cr_hacienda_rate_limit_state (
+                id SERIAL PRIMARY KEY,
+                key VARCHAR(255) UNIQUE NOT NULL,
+                tokens DOUBLE PRECISION NOT NULL DEFAULT 20.0,
+                last_refill TIMESTAMP NOT NULL DEFAULT NOW(),
+                total_requests BIGINT NOT NULL DEFAULT 0,
+                last_request TIMESTAMP NOT NULL DEFAULT NOW(),
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+        cls.env.cr.flush()
+
+    def setUp(self):
+        super().setUp()
+        self.rate_limiter.reset()
+
+    def test_01_endpoint_bucket_limits_endpoint_only(self):
+        """An endpoint limit applies to that endpoint, not to other callers."""
+        self.params.set_param('l10n_cr_einvoice.rate_limit.cedula', '3,0.01')
+
+        results = [self.rate_limiter.try_acquire_token(endpoint='cedula') for _ in range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+
+        # The global bucket is untouched by the endpoint refusal
+        self.assertTrue(self.rate_limiter.try_acquire_token())
+        self.assertTrue(self.rate_limiter.try_acquire_token(endpoint='status'))
+
+    def test_02_company_bucket(self):
+        """A company limit is tracked per company."""
+        self.params.set_param('l10n_cr_einvoice.rate_limit.company', '2,0.01')
+        other_company = self.env['res.company'].create({'name': 'Other CR Company'})
+
+        own = [self.rate_limiter.try_acquire_token(company=self.env.company) for _ in range(3)]
+        other = [self.rate_limiter.try_acquire_token(company=other_company) for _ in range(3)]
+        self.assertEqual(own, [True, True, False])
+        self.assertEqual(other, [True, True, False])
+
+    def test_03_sharded_global_bucket_keeps_global_limit(self):
+        """Shards split the global capacity without raising it."""
+        self.params.set_param('l10n_cr_einvoice.rate_limit_shards', '2')
+
+        status = self.rate_limiter.get_available_tokens()
+        self.assertAlmostEqual(status['tokens'], 20.0, delta=0.5)
+
+        acquired = 0
+        while acquired < 40 and self.rate_limiter.try_acquire_token():
+            acquired += 1
+        self.assertGreaterEqual(acquired, 20)
+        self.assertLessEqual(acquired, 24)
+
+        status = self.rate_limiter.get_available_tokens()
+        self.assertLess(status['tokens'], 2.0)
+        self.assertEqual(status['total_requests'], acquired)
+
+    def test_04_leases_batch_database_round_trips(self):
+        """Consecutive tokens are served from one lease."""
+        with patch.object(
+            type(self.rate_limiter), '_lease_tokens',
+            autospec=True,
+            side_effect=lambda self_, spec, want, returned=0, consumed=0: (want, 20.0 - want),
+        ) as mock_lease:
+            for _ in range(10):
+                self.assertTrue(self.rate_limiter.try_acquire_token())
+        self.assertEqual(mock_lease.call_count, 2)
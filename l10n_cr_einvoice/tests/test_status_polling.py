@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Hacienda status poller (_cron_poll_pending_documents)
+
+Covers:
+- Per-document next poll scheduling by submission age
+- Adaptive batch size based on backlog depth
+- Only due documents are polled, and each poll is rescheduled
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import EInvoiceTestCase
+
+
+@tagged('post_install', '-at_install', 'einvoice', 'integration', 'p1')
+class TestStatusPolling(EInvoiceTestCase):
+    """Test batched, concurrent status polling."""
+
+    def setUp(self):
+        super().setUp()
+        self.Document = self.env['l10n_cr.einvoice.document']
+
+    def _create_submitted_document(self, submitted_minutes_ago=0, next_check=False):
+        invoice = self._create_test_invoice()
+        document = self._create_einvoice_document(invoice, document_type='FE')
+        document.write({
+            'state': 'submitted',
+            'clave': '506' + str(document.id).zfill(47),
+            'hacienda_submission_date': fields.Datetime.now() - timedelta(minutes=submitted_minutes_ago),
+            'next_status_check': next_check,
+        })
+        return document
+
+    def test_next_check_fast_for_fresh_submissions(self):
+        """Fresh submissions are polled every minute."""
+        now = fields.Datetime.now()
+        next_check = self.Document._get_next_status_check(now)
+        self.assertLessEqual(next_check - now, timedelta(minutes=1, seconds=5))
+
+    def test_next_check_slow_for_old_submissions(self):
+        """Day-old submissions are polled at the maximum delay."""
+        now = fields.Datetime.now()
+        next_check = self.Document._get_next_status_check(now - timedelta(days=2))
+        self.assertGreaterEqual(next_check - now, timedelta(minutes=239))
+
+    def test_next_check_backs_off_after_many_checks(self):
+        """Documents that keep answering 'procesando' back off further."""
+        submitted = fields.Datetime.now() - timedelta(minutes=30)
+        regular = self.Document._get_next_status_check(submitted, check_count=1)
+        backed_off = self.Document._get_next_status_check(submitted, check_count=20)
+        self.assertGreater(backed_off, regular)
+
+    def test_batch_size_adapts_to_backlog(self):
+        """Batch size grows with the backlog within the configured bounds."""
+        self.assertEqual(self.Document._get_poll_batch_size(10), 50)
+        self.assertEqual(self.Document._get_poll_batch_size(1000), 250)
+        self.assertEqual(self.Document._get_poll_batch_size(100000), 500)
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.rate_limiter.HaciendaRateLimiter.acquire_token', return_value=True)
+    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.HaciendaAPI.check_status')
+    def test_cron_polls_only_due_documents(self, mock_check, mock_acquire):
+        """Documents scheduled in the future are left alone."""
+        mock_check.return_value = {'ind-estado': 'procesando'}
+
+        due = self._create_submitted_document(submitted_minutes_ago=5)
+        later = self._create_submitted_document(
+            next_check=fields.Datetime.now() + timedelta(hours=1),
+        )
+
+        self.Document._cron_poll_pending_documents()
+
+        self.assertEqual(due.status_check_count, 1)
+        self.assertTrue(due.next_status_check)
+        self.assertEqual(later.status_check_count, 0)
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.rate_limiter.HaciendaRateLimiter.acquire_token', return_value=True)
+    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.HaciendaAPI.check_status')
+    def test_accepted_document_is_unscheduled(self, mock_check, mock_acquire):
+        """Resolved documents are removed from the poll schedule."""
+        mock_check.return_value = {'ind-estado': 'aceptado'}
+
+        document = self._create_submitted_document(submitted_minutes_ago=5)
+        self.Document._cron_poll_pending_documents()
+
+        self.assertEqual(document.state, 'accepted')
+        self.assertFalse(document.next_status_check)
+
+    @patch('odoo.addons.l10n_cr_einvoice.utils.rate_limiter.HaciendaRateLimiter.acquire_token', return_value=True)
+    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.HaciendaAPI.check_status')
+    def test_failed_poll_is_rescheduled(self, mock_check, mock_acquire):
+        """A failing status check does not stop the batch and is rescheduled."""
+        mock_check.side_effect = Exception('Timeout')
+
+        document = self._create_submitted_document(submitted_minutes_ago=5)
+        stats = self.Document._cron_poll_pending_documents()
+
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(document.state, 'submitted')
+        self.assertTrue(document.next_status_check)
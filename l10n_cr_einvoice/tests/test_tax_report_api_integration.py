@@ -92,7 +92,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # SUBMISSION TESTS
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_successful_submission(self, mock_post):
         """Test successful D-150 submission to Hacienda."""
         d150 = self._create_d150_report_with_xml()
@@ -125,7 +125,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         self.assertIsNotNone(d150.submission_date)
         self.assertIn('exitosamente', d150.hacienda_message)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_authentication_failure(self, mock_post):
         """Test D-150 submission with authentication error."""
         d150 = self._create_d150_report_with_xml()
@@ -147,7 +147,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         self.assertEqual(d150.state, 'error')
         self.assertIn('invalid', d150.hacienda_message.lower())
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_invalid_xml(self, mock_post):
         """Test D-150 submission with invalid XML rejection."""
         d150 = self._create_d150_report_with_xml()
@@ -177,7 +177,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         self.assertEqual(d150.state, 'error')
         self.assertIn('XML', d150.hacienda_message)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_network_timeout(self, mock_post):
         """Test D-150 submission with network timeout."""
         d150 = self._create_d150_report_with_xml()
@@ -195,7 +195,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
             msg = d150.hacienda_message.lower()
             self.assertTrue('timeout' in msg or 'timed out' in msg)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_network_error(self, mock_post):
         """Test D-150 submission with network error."""
         d150 = self._create_d150_report_with_xml()
@@ -214,8 +214,8 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # STATUS CHECK TESTS
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_status_check_accepted(self, mock_post, mock_get):
         """Test checking status returns accepted."""
         d150 = self._create_d150_report_with_xml()
@@ -249,8 +249,8 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         self.assertEqual(d150.state, 'accepted')
         self.assertIsNotNone(d150.acceptance_date)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_status_check_rejected(self, mock_post, mock_get):
         """Test checking status returns rejected."""
         d150 = self._create_d150_report_with_xml()
@@ -284,8 +284,8 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         self.assertEqual(d150.state, 'rejected')
         self.assertIn('IVA', d150.hacienda_message)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_status_check_processing(self, mock_post, mock_get):
         """Test checking status returns processing."""
         d150 = self._create_d150_report_with_xml()
@@ -334,7 +334,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # RETRY LOGIC TESTS
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_retry_on_500(self, mock_post):
         """Test retry logic on server error (500)."""
         d150 = self._create_d150_report_with_xml()
@@ -373,7 +373,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         # Note: actual call count may vary due to retry logic
         self.assertGreaterEqual(mock_post.call_count, 3)
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d150_submission_max_retries_exceeded(self, mock_post):
         """Test max retries exceeded."""
         d150 = self._create_d150_report_with_xml()
@@ -434,7 +434,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
 
         return d101
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d101_successful_submission(self, mock_post):
         """Test successful D-101 submission."""
         d101 = self._create_d101_report_with_xml()
@@ -512,7 +512,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
 
         return d151
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_d151_successful_submission(self, mock_post):
         """Test successful D-151 submission."""
         d151 = self._create_d151_report_with_xml()
@@ -547,7 +547,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # ERROR RESPONSE HANDLING
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submission_malformed_json_response(self, mock_post):
         """Test handling of malformed JSON response."""
         d150 = self._create_d150_report_with_xml()
@@ -579,7 +579,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
         # Should be in error state
         self.assertEqual(d150.state, 'error')
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_submission_empty_response(self, mock_post):
         """Test handling of empty response."""
         d150 = self._create_d150_report_with_xml()
@@ -647,7 +647,7 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # CONCURRENT SUBMISSION TESTS
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_prevent_duplicate_submission(self, mock_post):
         """Test resubmission of already submitted report."""
         d150 = self._create_d150_report_with_xml()
@@ -685,8 +685,8 @@ class TestTaxReportAPIIntegration(EInvoiceTestCase):
     # STATUS POLLING TESTS
     # =====================================================
 
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.get')
-    @patch('odoo.addons.l10n_cr_einvoice.models.hacienda_api.requests.post')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.get')
+    @patch('odoo.addons.l10n_cr_einvoice.utils.http_pool.HaciendaSession.post')
     def test_status_polling_with_delay(self, mock_post, mock_get):
         """Test status polling with appropriate delay."""
         d150 = self._create_d150_report_with_xml()
@@ -22,10 +22,11 @@ Priority Markers:
 from datetime import datetime, date
 from decimal import Decimal
 from lxml import etree
+from unittest.mock import patch
 import uuid
 
 from odoo.tests import tagged
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 from .common import EInvoiceTestCase
 
 
@@ -791,3 +792,172 @@ class TestXMLGeneratorPerformance(EInvoiceTestCase):
         for i, line in enumerate(lines):
             numero_linea = line.find('ns:NumeroLinea', ns)
             self.assertEqual(int(numero_linea.text), i + 1, f"Line {i} should have NumeroLinea {i + 1}")
+
+
+@tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'unit', 'p1')
+class TestXMLGeneratorHeaderCache(EInvoiceTestCase):
+    """Test the per-company header fragment cache (output must not change)."""
+
+    FIXED_FECHA = (date(2025, 2, 1), datetime(2025, 2, 1, 10, 30, 0))
+
+    def setUp(self):
+        super().setUp()
+        self.company.write({'l10n_cr_emisor_location': '1010101', 'street2': 'San Pedro Centro'})
+        self.company.partner_id.l10n_cr_activity_code = '861201'
+        self.xml_generator = self.env['l10n_cr.xml.generator']
+        self.xml_generator.clear_emisor_cache()
+        self.addCleanup(self.xml_generator.clear_emisor_cache)
+
+        generator_cls = type(self.xml_generator)
+        fecha_patcher = patch.object(generator_cls, '_get_fecha_emision', return_value=self.FIXED_FECHA)
+        fecha_patcher.start()
+        self.addCleanup(fecha_patcher.stop)
+
+    def _create_einvoice(self, move, doc_type):
+        einvoice = self._create_einvoice_document(move, doc_type)
+        einvoice.write({
+            'name': '00100001010000000001',
+            'clave': '50601012025020100111111111111111111111111111111111',
+        })
+        return einvoice
+
+    def _documents(self):
+        """One document of every type, built from the standard fixtures."""
+        original = self._create_test_invoice()
+        original.action_post()
+        original.l10n_cr_clave = '50601012025020100111111111111111111111111111111111'
+
+        invoice = self._create_test_invoice()
+        invoice.action_post()
+        credit_note = self._create_test_invoice(invoice_type='out_refund')
+        credit_note.reversed_entry_id = original.id
+        credit_note.action_post()
+        debit_note = self._create_test_invoice()
+        debit_note.debit_origin_id = original.id
+        debit_note.action_post()
+
+        return {
+            'FE': self._create_einvoice(invoice, 'FE'),
+            'TE': self._create_einvoice(invoice, 'TE'),
+            'NC': self._create_einvoice(credit_note, 'NC'),
+            'ND': self._create_einvoice(debit_note, 'ND'),
+        }
+
+    def test_cached_header_is_byte_identical(self):
+        """Documents built from the cached fragment match freshly rendered ones."""
+        generator_cls = type(self.xml_generator)
+        for doc_type, einvoice in self._documents().items():
+            with self.subTest(doc_type=doc_type):
+                with patch.object(generator_cls, '_get_emisor_fragment',
+                                  lambda gen, company: gen._render_emisor_fragment(company)):
+                    reference = self.xml_generator.generate_invoice_xml(einvoice)
+
+                # First call fills the cache, second call is served from it
+                self.assertEqual(self.xml_generator.generate_invoice_xml(einvoice), reference)
+                self.assertEqual(self.xml_generator.generate_invoice_xml(einvoice), reference)
+
+    def test_emisor_rendered_once_per_company(self):
+        """The Emisor block is rendered once and reused for later documents."""
+        generator_cls = type(self.xml_generator)
+        einvoice = self._documents()['FE']
+
+        with patch.object(generator_cls, '_add_emisor', autospec=True,
+                          side_effect=generator_cls._add_emisor) as mock_add_emisor:
+            for _i in range(3):
+                self.xml_generator.generate_invoice_xml(einvoice)
+
+        self.assertEqual(mock_add_emisor.call_count, 1)
+
+    def test_company_change_refreshes_fragment(self):
+        """Changing a company value used in the header re-renders the fragment."""
+        einvoice = self._documents()['FE']
+        self.xml_generator.generate_invoice_xml(einvoice)
+
+        self.company.email = 'facturacion-nueva@example.com'
+        xml_str = self.xml_generator.generate_invoice_xml(einvoice)
+
+        root = etree.fromstring(xml_str.encode('utf-8'))
+        ns = {'ns': root.nsmap[None]}
+        self.assertEqual(
+            root.find('ns:Emisor/ns:CorreoElectronico', ns).text,
+            'facturacion-nueva@example.com',
+        )
+
+    def test_missing_activity_code_still_raises(self):
+        """Configuration errors are raised on a cache miss like before."""
+        einvoice = self._documents()['FE']
+        self.company.partner_id.l10n_cr_activity_code = False
+
+        with self.assertRaises((UserError, ValidationError)):
+            self.xml_generator.generate_invoice_xml(einvoice)
+
+
+@tagged('post_install', '-at_install', 'l10n_cr_einvoice', 'unit', 'p1')
+class TestXMLGeneratorTaxEngine(EInvoiceTestCase):
+    """Test batched line tax computation against compute_all."""
+
+    def setUp(self):
+        super().setUp()
+        self.xml_generator = self.env['l10n_cr.xml.generator']
+
+    def _create_mixed_invoice(self):
+        lines = []
+        for _i in range(10):
+            lines.append({
+                'product_id': self.product.id, 'quantity': 1, 'price_unit': 25000.0,
+                'tax_ids': [(6, 0, [self.tax_13.id])],
+            })
+        lines += [
+            {'product_id': self.product.id, 'quantity': 3, 'price_unit': 333.33,
+             'discount': 10.0, 'tax_ids': [(6, 0, [self.tax_13.id])]},
+            {'product_id': self.product.id, 'quantity': 2, 'price_unit': 1500.0,
+             'tax_ids': [(6, 0, [self.tax_0.id])]},
+            {'product_id': self.product.id, 'quantity': 1, 'price_unit': 999.99,
+             'tax_ids': [(6, 0, [])]},
+        ]
+        move = self._create_test_invoice(lines=lines)
+        move.action_post()
+        return move
+
+    def test_line_amounts_match_compute_all(self):
+        """Batched amounts equal per-line compute_all results exactly."""
+        move = self._create_mixed_invoice()
+        lines_data = self.xml_generator._compute_line_amounts(move)
+
+        for ld in lines_data:
+            line = ld['line']
+            with self.subTest(line=line.id):
+                if not line.tax_ids:
+                    self.assertEqual(ld['tax_amount'], 0.0)
+                    self.assertEqual(ld['tax_breakdown'], [])
+                    continue
+                expected = line.tax_ids.compute_all(
+                    line.price_unit * (1 - (line.discount or 0.0) / 100.0),
+                    currency=move.currency_id,
+                    quantity=line.quantity,
+                    product=line.product_id,
+                    partner=move.partner_id,
+                )
+                self.assertEqual(ld['tax_amount'], expected['total_included'] - expected['total_excluded'])
+                self.assertEqual(
+                    [b['amount'] for b in ld['tax_breakdown']],
+                    [abs(t['amount']) for t in expected['taxes']],
+                )
+
+    def test_identical_lines_compute_taxes_once(self):
+        """Repeated lines share one compute_all call."""
+        move = self._create_mixed_invoice()
+        tax_cls = type(self.env['account.tax'])
+
+        with patch.object(tax_cls, 'compute_all', autospec=True,
+                          side_effect=tax_cls.compute_all) as mock_compute_all:
+            self.xml_generator._compute_line_amounts(move)
+
+        # 10 identical lines + 2 distinct taxed lines (the untaxed line is skipped)
+        self.assertEqual(mock_compute_all.call_count, 3)
+
+    def test_tarifa_lookup(self):
+        """Known rates map directly, unknown rates to the closest valid rate."""
+        self.assertEqual(self.xml_generator._get_tarifa_iva(13.0), ('08', '13.00'))
+        self.assertEqual(self.xml_generator._get_tarifa_iva(15.0), ('08', '13.00'))
+        self.assertEqual(self.xml_generator._get_tarifa_iva(0.4), ('09', '0.50'))
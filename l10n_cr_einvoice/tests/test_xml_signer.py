@@ -1157,3 +1157,156 @@ class TestXMLSignerPerformance(TransactionCase):
         # Signature typically adds ~4-6KB
         self.assertLess(size_increase, 10000,
                        f"Signature added {size_increase} bytes, seems excessive")
+
+
+@tagged('post_install', '-at_install', 'unit', 'p1', 'l10n_cr_einvoice')
+class TestXMLSignerBatch(TransactionCase):
+    """Test bulk signing with a shared per-certificate context (P1 High)."""
+
+    def setUp(self):
+        super(TestXMLSignerBatch, self).setUp()
+        self.signer = self.env['l10n_cr.xml.signer']
+        self._create_test_certificate()
+
+    def _create_test_certificate(self):
+        """Create test certificate."""
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+            backend=default_backend()
+        )
+
+        subject = issuer = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, "CR"),
+            x509.NameAttribute(NameOID.COMMON_NAME, "test.cr"),
+        ])
+
+        self.valid_cert = x509.CertificateBuilder().subject_name(
+            subject
+        ).issuer_name(
+            issuer
+        ).public_key(
+            self.private_key.public_key()
+        ).serial_number(
+            x509.random_serial_number()
+        ).not_valid_before(
+            datetime.utcnow() - timedelta(days=1)
+        ).not_valid_after(
+            datetime.utcnow() + timedelta(days=365)
+        ).sign(self.private_key, hashes.SHA256(), default_backend())
+
+    def _signature_id(self, signed_xml):
+        root = etree.fromstring(signed_xml.encode('utf-8'))
+        return root.find('{http://www.w3.org/2000/09/xmldsig#}Signature').get('Id')
+
+    def test_batch_preserves_order_and_isolates_failures(self):
+        """P1: Results follow input order; a bad document does not fail the batch."""
+        documents = [SAMPLE_XML, '<FacturaElectronica><Clave>', '', SAMPLE_XML]
+
+        results = self.signer.sign_xml_batch(
+            documents, self.valid_cert, self.private_key
+        )
+
+        self.assertEqual([success for success, _res in results], [True, False, False, True])
+        self.assertIn('<ds:Signature', results[0][1])
+        self.assertIn('empty', results[2][1])
+
+    def test_batch_signatures_have_unique_ids(self):
+        """P1: Every document of a batch gets its own signature IDs."""
+        results = self.signer.sign_xml_batch(
+            [SAMPLE_XML] * 5, self.valid_cert, self.private_key
+        )
+        ids = {self._signature_id(signed) for _success, signed in results}
+        self.assertEqual(len(ids), 5)
+
+    def test_batch_matches_single_signing(self):
+        """P1: Batch signatures carry the same certificate data as sign_xml()."""
+        single = self.signer.sign_xml(
+            SAMPLE_XML, certificate=self.valid_cert, private_key=self.private_key
+        )
+        _success, batched = self.signer.sign_xml_batch(
+            [SAMPLE_XML], self.valid_cert, self.private_key
+        )[0]
+
+        ns = {
+            'ds': 'http://www.w3.org/2000/09/xmldsig#',
+            'xades': 'http://uri.etsi.org/01903/v1.3.2#',
+        }
+        for path in ('.//ds:X509Certificate', './/xades:CertDigest/ds:DigestValue',
+                     './/ds:X509IssuerName', './/ds:X509SerialNumber'):
+            single_values = [el.text for el in etree.fromstring(single.encode('utf-8')).findall(path, ns)]
+            batch_values = [el.text for el in etree.fromstring(batched.encode('utf-8')).findall(path, ns)]
+            self.assertEqual(single_values, batch_values, path)
+
+    def test_batch_rejects_invalid_key(self):
+        """P1: Invalid signing material fails the whole batch up front."""
+        with self.assertRaises(ValidationError):
+            self.signer.sign_xml_batch([SAMPLE_XML], self.valid_cert, 'not-a-key')
+
+    def test_worker_context_rebuilt_from_der(self):
+        """P1: Worker processes sign with a context rebuilt from DER bytes."""
+        from ..models import xml_signer
+
+        cert_der = self.valid_cert.public_bytes(serialization.Encoding.DER)
+        key_der = self.private_key.private_bytes(
+            serialization.Encoding.DER,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        previous = xml_signer._WORKER_CONTEXT
+        self.addCleanup(setattr, xml_signer, '_WORKER_CONTEXT', previous)
+
+        xml_signer._init_batch_worker(cert_der, key_der)
+        results = xml_signer._sign_batch_chunk([SAMPLE_XML, SAMPLE_XML])
+
+        self.assertTrue(all(success for success, _res in results))
+        self.assertNotEqual(self._signature_id(results[0][1]), self._signature_id(results[1][1]))
+
+    def _sign_deterministic(self, sign):
+        """
+        Run ``sign()`` with fixed signature IDs and signing time.
+
+        Returns:
+            tuple: (result, seconds, signing contexts built)
+        """
+        import time
+        import uuid
+        from ..models import xml_signer
+
+        ids = iter(range(1, 1000))
+        clock = Mock()
+        clock.utcnow.return_value = datetime(2026, 1, 1, 12, 0, 0)
+        context_init = xml_signer.SigningContext.__init__
+        with patch.object(xml_signer.uuid, 'uuid4', side_effect=lambda: uuid.UUID(int=next(ids))), \
+             patch.object(xml_signer, 'datetime', clock), \
+             patch.object(xml_signer.SigningContext, '__init__', autospec=True,
+                          side_effect=context_init) as mock_init:
+            start = time.perf_counter()
+            result = sign()
+            elapsed = time.perf_counter() - start
+        return result, elapsed, mock_init.call_count
+
+    def test_batch_throughput(self):
+        """P2: Batch signing prepares the key material once, with identical output."""
+        import logging
+
+        documents = [SAMPLE_XML] * 20
+
+        single, single_elapsed, single_contexts = self._sign_deterministic(lambda: [
+            self.signer.sign_xml(xml_content, certificate=self.valid_cert, private_key=self.private_key)
+            for xml_content in documents
+        ])
+        results, batch_elapsed, batch_contexts = self._sign_deterministic(
+            lambda: self.signer.sign_xml_batch(
+                documents, self.valid_cert, self.private_key, processes=1
+            )
+        )
+
+        logging.getLogger(__name__).info(
+            'Signing benchmark (%d documents): %.3fs one by one, %.3fs batched',
+            len(documents), single_elapsed, batch_elapsed,
+        )
+        self.assertTrue(all(success for success, _res in results))
+        self.assertEqual([signed for _success, signed in results], single)
+        self.assertEqual(single_contexts, len(documents))
+        self.assertEqual(batch_contexts, 1)
@@ -7,7 +7,12 @@ Covers all document types (FE, TE, NC, ND) and edge cases.
 
 Target Coverage: ≥85% for xsd_validator module
 """
+import os
+import tempfile
 import time
+from unittest.mock import patch
+
+from lxml import etree
 from odoo.tests import tagged, TransactionCase
 
 
@@ -877,3 +882,90 @@ class TestXSDValidatorPerformance(TransactionCase):
             self.assertLess(elapsed_time, 0.5,
                            f"{doc_type} validation should complete in <500ms, took {elapsed_time*1000:.2f}ms")
             self.assertTrue(is_valid, f"{doc_type} should be valid. Error: {error}")
+
+
+@tagged("post_install", "-at_install", "l10n_cr_einvoice", "unit", "p1")
+class TestXSDSchemaCache(TransactionCase):
+    """Test the compiled XSD schema registry."""
+
+    SIMPLE_XSD = '''<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+           targetNamespace="https://cdn.comprobanteselectronicos.go.cr/xml-schemas/v4.4/tiqueteElectronico"
+           elementFormDefault="qualified">
+    <xs:element name="TiqueteElectronico">
+        <xs:complexType>
+            <xs:sequence>
+                <xs:element name="Clave" type="xs:string"/>
+                <xs:element name="NumeroConsecutivo" type="xs:string"/>
+                <xs:element name="FechaEmision" type="xs:string"/>
+                <xs:element name="Emisor" type="xs:anyType"/>
+                <xs:element name="ResumenFactura" type="xs:anyType"/>
+            </xs:sequence>
+        </xs:complexType>
+    </xs:element>
+</xs:schema>'''
+
+    VALID_TE = '''<?xml version="1.0" encoding="UTF-8"?>
+<TiqueteElectronico xmlns="https://cdn.comprobanteselectronicos.go.cr/xml-schemas/v4.4/tiqueteElectronico">
+    <Clave>50601012500012345678901234567890123456789012345678</Clave>
+    <NumeroConsecutivo>00100001040000000001</NumeroConsecutivo>
+    <FechaEmision>2025-01-28T10:00:00-06:00</FechaEmision>
+    <Emisor><Nombre>Test</Nombre></Emisor>
+    <ResumenFactura><TotalComprobante>100.00</TotalComprobante></ResumenFactura>
+</TiqueteElectronico>'''
+
+    def setUp(self):
+        super().setUp()
+        from odoo.addons.l10n_cr_einvoice.models import xsd_validator
+
+        self.validator = self.env['l10n_cr.xsd.validator']
+        self.cache = xsd_validator._SCHEMA_CACHE
+
+        fd, self.xsd_path = tempfile.mkstemp(suffix='.xsd')
+        with os.fdopen(fd, 'w') as xsd_file:
+            xsd_file.write(self.SIMPLE_XSD)
+        self.addCleanup(os.remove, self.xsd_path)
+
+        saved = dict(self.cache)
+        self.cache.clear()
+        self.addCleanup(lambda: (self.cache.clear(), self.cache.update(saved)))
+
+        patcher = patch.object(type(self.validator), '_get_xsd_path', return_value=self.xsd_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_schema_compiled_once(self):
+        """Repeated validations reuse the same compiled schema."""
+        first = self.validator._get_compiled_schema('TE')
+        is_valid, error = self.validator.validate_xml(self.VALID_TE, 'TE')
+        second = self.validator._get_compiled_schema('TE')
+
+        self.assertTrue(is_valid, error)
+        self.assertIs(first['schema'], second['schema'])
+
+    def test_schema_recompiled_when_file_changes(self):
+        """A newer XSD file (mtime) replaces the cached schema."""
+        first = self.validator._get_compiled_schema('TE')
+        mtime = os.path.getmtime(self.xsd_path)
+        os.utime(self.xsd_path, (mtime + 10, mtime + 10))
+        second = self.validator._get_compiled_schema('TE')
+
+        self.assertIsNot(first['schema'], second['schema'])
+
+    def test_validate_pre_parsed_tree(self):
+        """Validation accepts an already-parsed tree and reports XSD errors."""
+        tree = etree.fromstring(self.VALID_TE.encode('utf-8'))
+        is_valid, error = self.validator.validate_xml(self.VALID_TE, 'TE', xml_tree=tree)
+        self.assertTrue(is_valid, error)
+
+        # Drop an element the schema requires (but the structural check does not)
+        tree.remove(tree.find('{%s}NumeroConsecutivo' % self.validator.SCHEMA_URLS['TE']))
+        tree.insert(1, etree.Element('{%s}Extra' % self.validator.SCHEMA_URLS['TE']))
+        is_valid, error = self.validator._validate_against_xsd(None, 'TE', xml_tree=tree)
+        self.assertFalse(is_valid)
+        self.assertIn('XSD validation error', error)
+
+    def test_warm_cache_compiles_available_schemas(self):
+        """Warming compiles every schema whose XSD file exists."""
+        self.validator._warm_schema_cache()
+        self.assertEqual(set(self.cache), set(self.validator.XSD_PATHS))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Pooled Keep-Alive HTTP Sessions for Hacienda APIs
+
+Every Hacienda endpoint (IDP, recepción, TRIBU-CR, cédula lookup) is served
+over TLS, and a bare ``requests.post`` pays a fresh TCP + TLS handshake on
+every call. This module keeps one ``requests.Session`` per worker process and
+per base URL (scheme + host), so connections are kept alive and reused:
+- Tunable connection pool size per host
+- Transport-level retries for connection failures only (never for requests
+  that reached the server - application retries stay in the API clients)
+- Sessions are rebuilt after fork, so prefork workers never share sockets
+- Metrics: requests, new connections, reuse ratio and handshake time saved
+
+System Parameters (read when a session is first created in a worker):
+- l10n_cr_einvoice.http_pool_maxsize (default: 10)
+- l10n_cr_einvoice.http_connect_retries (default: 2, 0 disables retries)
+"""
+
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_RETRIES = 2
+
+# {host_key: HaciendaSession}, owned by the process that created it
+_SESSIONS = {}
+_SESSIONS_PID = None
+_SESSIONS_LOCK = threading.Lock()
+
+# {host: {'requests': int, 'connections': int, 'handshake_seconds': float}}
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _stats_for(host):
+    return _STATS.setdefault(host, {'requests': 0, 'connections': 0, 'handshake_seconds': 0.0})
+
+
+def _record_connection(host, elapsed):
+    with _STATS_LOCK:
+        stats = _stats_for(host)
+        stats['connections'] += 1
+        stats['handshake_seconds'] += elapsed
+
+
+def _record_request(host):
+    with _STATS_LOCK:
+        _stats_for(host)['requests'] += 1
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """HTTP connection that records how long establishing it took."""
+
+    def connect(self):
+        start = time.monotonic()
+        super().connect()
+        _record_connection(self.host, time.monotonic() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records how long TCP + TLS setup took."""
+
+    def connect(self):
+        start = time.monotonic()
+        super().connect()
+        _record_connection(self.host, time.monotonic() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    """Adapter whose pools use the timed connection classes."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class HaciendaSession(requests.Session):
+    """Keep-alive session bound to one Hacienda host."""
+
+    def __init__(self, pool_maxsize=DEFAULT_POOL_MAXSIZE, connect_retries=DEFAULT_CONNECT_RETRIES):
+        super().__init__()
+        retry = Retry(
+            total=connect_retries,
+            connect=connect_retries,
+            read=0,
+            status=0,
+            redirect=0,
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        adapter = _PooledAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.hooks['response'].append(self._count_response)
+
+    @staticmethod
+    def _count_response(response, *args, **kwargs):
+        _record_request(urlsplit(response.url).hostname)
+
+
+def _get_int_param(env, key, default, minimum=1):
+    if env is None:
+        return default
+    value = env['ir.config_parameter'].sudo().get_param(key, default)
+    try:
+        return max(int(value), minimum)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_session(url, env=None):
+    """
+    Return the pooled session for the host serving ``url``.
+
+    Args:
+        url (str): Any URL on the target host (path and query are ignored)
+        env: Optional Odoo environment used to read pool tuning parameters
+
+    Returns:
+        HaciendaSession: Session shared by all clients of that host in this worker
+    """
+    global _SESSIONS_PID
+
+    parts = urlsplit(url)
+    host_key = f'{parts.scheme}://{parts.netloc}'
+
+    with _SESSIONS_LOCK:
+        # Sockets inherited from a parent process must not be reused
+        if _SESSIONS_PID != os.getpid():
+            _SESSIONS.clear()
+            _SESSIONS_PID = os.getpid()
+
+        session = _SESSIONS.get(host_key)
+        if session is None:
+            session = HaciendaSession(
+                pool_maxsize=_get_int_param(env, 'l10n_cr_einvoice.http_pool_maxsize', DEFAULT_POOL_MAXSIZE),
+                # 0 disables transport retries
+                connect_retries=_get_int_param(
+                    env, 'l10n_cr_einvoice.http_connect_retries', DEFAULT_CONNECT_RETRIES, minimum=0,
+                ),
+            )
+            _SESSIONS[host_key] = session
+            _logger.debug('Created pooled HTTP session for %s', host_key)
+
+        return session
+
+
+def get_pool_stats():
+    """
+    Connection reuse metrics for this worker process.
+
+    Returns:
+        dict: Per host:
+            - requests: HTTP requests sent
+            - new_connections: connections opened (each paid a handshake)
+            - reuse_ratio: share of requests served on a kept-alive connection
+            - avg_handshake_ms: average connection setup time
+            - handshake_time_saved_ms: estimated setup time avoided by reuse
+    """
+    with _STATS_LOCK:
+        snapshot = {host: dict(stats) for host, stats in _STATS.items()}
+
+    result = {}
+    for host, stats in snapshot.items():
+        reqs = stats['requests']
+        conns = stats['connections']
+        avg_handshake = stats['handshake_seconds'] / conns if conns else 0.0
+        reused = max(reqs - conns, 0)
+        result[host] = {
+            'requests': reqs,
+            'new_connections': conns,
+            'reuse_ratio': round(reused / reqs, 4) if reqs else 0.0,
+            'avg_handshake_ms': round(avg_handshake * 1000, 2),
+            'handshake_time_saved_ms': round(reused * avg_handshake * 1000, 2),
+        }
+    return result
+
+
+def reset_pools():
+    """Close all pooled sessions of this worker and clear metrics."""
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+    with _STATS_LOCK:
+        _STATS.clear()
@@ -7,34 +7,340 @@ all POS terminals and API clients:
 - Sustained rate: 10 requests/second
 - Burst capacity: 20 requests/second
 - Application-wide (shared state across all users/terminals)
+- Optional per-endpoint and per-company buckets on top of the global one
 - Thread-safe and distributed using PostgreSQL
 
 Architecture:
-- Uses PostgreSQL advisory locks for atomicity
 - State stored in database table for multi-instance support
 - Token bucket algorithm with precise time-based refill
+- Workers lease blocks of tokens from the table and serve them locally, so
+  most acquisitions never touch the database
+- Leases are taken with an optimistic compare-and-swap UPDATE in a short
+  transaction of their own: no advisory lock, and no row lock held for the
+  lifetime of the caller's transaction
+- The global bucket can be split into shards (one row each, capacity and
+  rate divided evenly) to spread contention across rows
+- Blocked callers wait on a condition variable that is signalled when
+  tokens become available locally, or until the next token is due
 - No external dependencies (Redis-free, pure Odoo)
+
+Leased tokens are deducted from the shared bucket when they are leased, so
+the global limit holds across workers. A lease expires after LEASE_TTL
+seconds; unspent tokens are handed back to the bucket with the next lease.
 """
 
 import logging
-import time
+import os
 import threading
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 
-from odoo import models, fields, api, _
+from psycopg2.errors import SerializationFailure
+
+from odoo import models, api, _
 from odoo.exceptions import UserError
 
+from .worker_pool import get_pool_size
+
 _logger = logging.getLogger(__name__)
 
+# Compare-and-swap attempts per lease before giving up for this round
+LEASE_CAS_RETRIES = 5
+# Shortest wait reported after a failed lease (seconds)
+MIN_RETRY_WAIT = 0.001
+
+
+def refill_bucket(tokens, last_refill, now, rate, capacity):
+    """
+    Calculate the token count of a bucket after time-based refill.
+
+    Args:
+        tokens (float): Token count stored at last_refill
+        last_refill (datetime): Timestamp of the stored token count
+        now (datetime): Current timestamp
+        rate (float): Tokens added per second
+        capacity (float): Maximum token count
+
+    Returns:
+        float: Token count at ``now``, capped at capacity
+    """
+    elapsed = max((now - last_refill).total_seconds(), 0.0)
+    return min(tokens + elapsed * rate, float(capacity))
+
+
+class _LeaseContention(Exception):
+    """Raised when a lease lost every compare-and-swap round."""
+
+
+class BucketSpec(object):
+    """Identity and limits of one token bucket row."""
+
+    __slots__ = ('key', 'capacity', 'rate')
+
+    def __init__(self, key, capacity, rate):
+        self.key = key
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+
+    def __repr__(self):
+        return 'BucketSpec(%r, %s, %s)' % (self.key, self.capacity, self.rate)
+
+
+class _LocalPool(object):
+    """Tokens of one bucket leased by this process and not yet spent."""
+
+    __slots__ = ('tokens', 'expires_at', 'retry_at', 'leasing', 'returned', 'consumed')
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.retry_at = 0.0
+        self.leasing = False
+        self.returned = 0      # Expired, unspent tokens to hand back
+        self.consumed = 0      # Spent tokens not yet reported to the bucket
+
+
+class TokenAllocator(object):
+    """
+    Per-process token allocator serving leased tokens to local callers.
+
+    The allocator does not know about the database: every lease goes through
+    ``lease_fn(spec, want, returned, consumed)``, which must atomically take
+    up to ``want`` whole tokens from the shared bucket (after crediting the
+    ``returned`` tokens) and return ``(granted, tokens_left)``.
+
+    Only one thread leases a given bucket at a time; the others wait for its
+    result instead of hitting the database as well.
+
+    Args:
+        lease_size (int): Tokens requested per lease
+        lease_ttl (float): Seconds a lease stays valid
+    """
+
+    def __init__(self, lease_size=5, lease_ttl=1.0):
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self._pools = {}
+        self._cond = threading.Condition(threading.Lock())
+
+    def _pool(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _LocalPool()
+        return pool
+
+    def _expire(self, pool, now):
+        if pool.tokens and pool.expires_at <= now:
+            pool.returned += pool.tokens
+            pool.tokens = 0
+
+    def _take_one(self, spec, lease_fn):
+        """
+        Take one token of a single bucket, leasing a new block if needed.
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise the seconds until the
+                bucket is expected to hold a whole token again
+        """
+        with self._cond:
+            pool = self._pool(spec.key)
+            while True:
+                now = time.monotonic()
+                self._expire(pool, now)
+                if pool.tokens >= 1:
+                    pool.tokens -= 1
+                    pool.consumed += 1
+                    return 0.0
+                if not pool.leasing:
+                    break
+                # Another thread is leasing this bucket: wait for its result
+                self._cond.wait()
+            if pool.retry_at > now:
+                # Bucket was empty on the last lease; no token is due yet
+                return max(pool.retry_at - now, MIN_RETRY_WAIT)
+            pool.leasing = True
+            returned, pool.returned = pool.returned, 0
+            consumed, pool.consumed = pool.consumed, 0
+
+        try:
+            granted, tokens_left = lease_fn(spec, self.lease_size, returned, consumed)
+        except Exception:
+            with self._cond:
+                pool.leasing = False
+                pool.returned += returned
+                pool.consumed += consumed
+                if spec.rate > 0:
+                    pool.retry_at = time.monotonic() + 1.0 / spec.rate
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            now = time.monotonic()
+            pool.leasing = False
+            if granted:
+                # Keep one token for this caller before waking the others
+                pool.tokens += granted - 1
+                pool.consumed += 1
+                pool.expires_at = now + self.lease_ttl
+                pool.retry_at = 0.0
+                self._cond.notify_all()
+                return 0.0
+            if spec.rate > 0:
+                pool.retry_at = now + max(1.0 - tokens_left, 0.0) / spec.rate
+            self._cond.notify_all()
+            return max(pool.retry_at - now, MIN_RETRY_WAIT)
+
+    def _give_back(self, specs):
+        """Return tokens taken from ``specs`` to the local pools."""
+        with self._cond:
+            for spec in specs:
+                pool = self._pool(spec.key)
+                pool.tokens += 1
+                pool.consumed -= 1
+                if pool.expires_at <= time.monotonic():
+                    pool.expires_at = time.monotonic() + self.lease_ttl
+            self._cond.notify_all()
+
+    def try_acquire(self, bucket_chain, lease_fn):
+        """
+        Take one token from every level of ``bucket_chain`` without blocking.
+
+        Args:
+            bucket_chain (list): Alternatives per level; each level is a list
+                of BucketSpec tried in order (e.g. the shards of the global
+                bucket), and a token is needed from one spec of every level
+            lease_fn (callable): Lease function, see class docstring
+
+        Returns:
+            float: 0.0 if acquired, otherwise seconds until a retry may succeed
+        """
+        taken = []
+        for level in bucket_chain:
+            wait = None
+            for spec in level:
+                try:
+                    spec_wait = self._take_one(spec, lease_fn)
+                except Exception:
+                    if taken:
+                        self._give_back(taken)
+                    raise
+                if not spec_wait:
+                    taken.append(spec)
+                    wait = 0.0
+                    break
+                wait = spec_wait if wait is None else min(wait, spec_wait)
+            if wait:
+                if taken:
+                    self._give_back(taken)
+                return wait
+        return 0.0
+
+    def acquire(self, bucket_chain, lease_fn, timeout):
+        """
+        Take one token from every level of ``bucket_chain``, waiting if needed.
+
+        Waiting threads sleep on a condition variable and are woken as soon
+        as another thread leases or gives back tokens, or when the next token
+        is due, instead of polling with a fixed backoff.
+
+        Returns:
+            bool: True if acquired before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(bucket_chain, lease_fn)
+            if not wait:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._cond:
+                self._cond.wait(min(wait, remaining))
+
+    def wait(self, bucket_chain, timeout):
+        """
+        Wait until a token of ``bucket_chain`` may be available, without
+        taking it and without touching the shared state.
+
+        Returns as soon as another thread leases or gives back tokens, when
+        the next token is due, or after ``timeout`` seconds.
+        """
+        with self._cond:
+            now = time.monotonic()
+            due = now
+            for level in bucket_chain:
+                pools = [self._pools.get(spec.key) for spec in level]
+                if any(pool is not None and pool.tokens >= 1 for pool in pools):
+                    continue
+                if any(pool is None for pool in pools):
+                    # Nothing known about this bucket yet: wait one refill step
+                    due = max(due, now + 1.0 / max(spec.rate for spec in level))
+                    continue
+                due = max(due, min(pool.retry_at for pool in pools))
+            if due > now:
+                self._cond.wait(min(due - now, timeout))
+
+    def local_state(self, key):
+        """
+        Return (unspent tokens, unreported consumed tokens) for a bucket.
+        """
+        with self._cond:
+            pool = self._pools.get(key)
+            if pool is None:
+                return 0, 0
+            self._expire(pool, time.monotonic())
+            return pool.tokens + pool.returned, pool.consumed
+
+    def clear(self):
+        """Drop every local lease (used when the shared state is reset)."""
+        with self._cond:
+            self._pools.clear()
+            self._cond.notify_all()
+
+
+# One allocator per database and process
+_ALLOCATORS = {}
+_ALLOCATORS_LOCK = threading.Lock()
+
+
+def get_allocator(dbname, lease_size, lease_ttl):
+    """
+    Get the process-wide token allocator of a database.
+
+    Args:
+        dbname (str): Database name
+        lease_size (int): Tokens requested per lease (updated in place)
+        lease_ttl (float): Seconds a lease stays valid
+
+    Returns:
+        TokenAllocator
+    """
+    with _ALLOCATORS_LOCK:
+        allocator = _ALLOCATORS.get(dbname)
+        if allocator is None:
+            allocator = _ALLOCATORS[dbname] = TokenAllocator(lease_size, lease_ttl)
+        allocator.lease_size = lease_size
+        return allocator
+
 
 class HaciendaRateLimiter(models.AbstractModel):
     """
     Token bucket rate limiter for Hacienda API requests.
 
-    This is an application-wide singleton rate limiter that enforces:
+    This is an application-wide rate limiter that enforces:
     - Maximum burst: 20 requests
     - Sustained rate: 10 requests/second
     - Distributed state across multiple Odoo instances
+
+    Configuration via System Parameters:
+    - l10n_cr_einvoice.rate_limit_lease_size: tokens leased per round trip
+      (default 5)
+    - l10n_cr_einvoice.rate_limit_shards: rows the global bucket is split
+      into (default 1)
+    - l10n_cr_einvoice.rate_limit.<endpoint>: "capacity,rate" of an extra
+      bucket for that endpoint (e.g. "10,5"); no extra bucket when unset
+    - l10n_cr_einvoice.rate_limit.company: "capacity,rate" of an extra
+      bucket per company
     """
 
     _name = 'l10n_cr.hacienda.rate_limiter'
@@ -43,155 +349,202 @@ class HaciendaRateLimiter(models.AbstractModel):
     # Rate limit configuration
     BUCKET_CAPACITY = 20  # Maximum burst tokens (20 req/sec burst)
     REFILL_RATE = 10      # Tokens per second (10 req/sec sustained)
-    BUCKET_KEY = 'hacienda_api_rate_limiter'  # Singleton key
-    ADVISORY_LOCK_ID = 123456789  # PostgreSQL advisory lock ID
+    BUCKET_KEY = 'hacienda_api_rate_limiter'  # Global bucket key (shard 0)
+    LEASE_SIZE = 5        # Tokens leased per database round trip
+    LEASE_TTL = 1.0       # Seconds before unspent leased tokens are returned
 
-    # Local thread-safe cache to reduce DB queries
-    _local_cache = threading.local()
-    _cache_ttl = 0.1  # 100ms cache TTL
+    # =========================================================================
+    # BUCKET CONFIGURATION
+    # =========================================================================
 
     @api.model
-    def _get_state_table(self):
-        """
-        Get or create the rate limiter state table.
+    def _get_allocator(self):
+        lease_size = get_pool_size(
+            self.env, 'l10n_cr_einvoice.rate_limit_lease_size', self.LEASE_SIZE,
+        )
+        return get_allocator(self.env.cr.dbname, lease_size, self.LEASE_TTL)
 
-        Returns a dict with:
-        - tokens: current token count (float)
-        - last_refill: timestamp of last refill (datetime)
-        - total_requests: total requests processed (int)
-        - last_request: timestamp of last request (datetime)
+    @api.model
+    def _get_global_shards(self):
         """
-        self.env.cr.execute("""
-            SELECT tokens, last_refill, total_requests, last_request
-            FROM l10n_cr_hacienda_rate_limit_state
-            WHERE key = %s
-            FOR UPDATE
-        """, (self.BUCKET_KEY,))
+        Return the shards of the global bucket.
 
-        row = self.env.cr.fetchone()
+        Capacity and rate are divided evenly, so the shards together enforce
+        the global limit. Shard 0 keeps the historical bucket key.
 
-        if row:
-            return {
-                'tokens': row[0],
-                'last_refill': row[1],
-                'total_requests': row[2],
-                'last_request': row[3],
-            }
-        else:
-            # Initialize bucket with full capacity
-            now = datetime.utcnow()
-            self.env.cr.execute("""
-                INSERT INTO l10n_cr_hacienda_rate_limit_state
-                    (key, tokens, last_refill, total_requests, last_request, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                self.BUCKET_KEY,
-                float(self.BUCKET_CAPACITY),
-                now,
-                0,
-                now,
-                now,
-            ))
-            # Flush to ensure INSERT is visible to subsequent queries
-            # Do not commit - let caller control transaction boundary
-            self.env.cr.flush()
-
-            return {
-                'tokens': float(self.BUCKET_CAPACITY),
-                'last_refill': now,
-                'total_requests': 0,
-                'last_request': now,
-            }
+        Returns:
+            list: BucketSpec per shard
+        """
+        shards = get_pool_size(self.env, 'l10n_cr_einvoice.rate_limit_shards', 1)
+        return [
+            BucketSpec(
+                self.BUCKET_KEY if index == 0 else '%s#%d' % (self.BUCKET_KEY, index),
+                self.BUCKET_CAPACITY / shards,
+                self.REFILL_RATE / shards,
+            )
+            for index in range(shards)
+        ]
 
     @api.model
-    def _update_state(self, tokens, total_requests):
+    def _get_scoped_limit(self, scope):
         """
-        Update the rate limiter state in database.
+        Read a "capacity,rate" limit for an extra bucket.
 
-        Args:
-            tokens: New token count
-            total_requests: Updated total request count
+        Returns:
+            tuple: (capacity, rate), or None when no limit is configured
         """
-        now = datetime.utcnow()
-        self.env.cr.execute("""
-            UPDATE l10n_cr_hacienda_rate_limit_state
-            SET tokens = %s,
-                last_refill = %s,
-                total_requests = %s,
-                last_request = %s,
-                updated_at = %s
-            WHERE key = %s
-        """, (
-            tokens,
-            now,
-            total_requests,
-            now,
-            now,
-            self.BUCKET_KEY,
-        ))
-        # Flush to ensure UPDATE is visible to subsequent queries
-        # Do not commit - let caller control transaction boundary
-        self.env.cr.flush()
+        value = self.env['ir.config_parameter'].sudo().get_param(
+            'l10n_cr_einvoice.rate_limit.%s' % scope
+        )
+        if not value:
+            return None
+        try:
+            capacity, rate = (float(part) for part in value.split(','))
+        except ValueError:
+            _logger.warning('Invalid rate limit for %s: %r (expected "capacity,rate")', scope, value)
+            return None
+        if capacity < 1 or rate <= 0:
+            return None
+        return capacity, rate
 
     @api.model
-    def _refill_tokens(self, state):
+    def _get_bucket_chain(self, endpoint=None, company=None):
         """
-        Calculate token refill based on elapsed time.
+        Build the buckets a request has to take a token from.
 
-        Token bucket algorithm:
-        1. Calculate time elapsed since last refill
-        2. Add tokens: elapsed_time * REFILL_RATE
-        3. Cap at BUCKET_CAPACITY
+        The global bucket always applies (any of its shards). Endpoint and
+        company buckets are added when a limit is configured for them.
 
         Args:
-            state: Current state dict from _get_state_table()
+            endpoint (str): Logical endpoint name (e.g. 'cedula', 'status')
+            company (res.company): Company issuing the request
 
         Returns:
-            float: New token count after refill
+            list: Levels of alternative BucketSpec, see TokenAllocator
         """
-        now = datetime.utcnow()
-        last_refill = state['last_refill']
+        shards = self._get_global_shards()
+        # Start on a per-process home shard so workers spread across rows
+        home = os.getpid() % len(shards)
+        chain = [shards[home:] + shards[:home]]
+
+        if endpoint:
+            limit = self._get_scoped_limit(endpoint)
+            if limit:
+                chain.append([BucketSpec('%s:endpoint:%s' % (self.BUCKET_KEY, endpoint), *limit)])
+        if company:
+            limit = self._get_scoped_limit('company')
+            if limit:
+                chain.append([BucketSpec('%s:company:%d' % (self.BUCKET_KEY, company.id), *limit)])
+        return chain
+
+    # =========================================================================
+    # SHARED STATE
+    # =========================================================================
 
-        # Handle timezone-naive datetime from database
-        if last_refill.tzinfo is None:
-            last_refill = last_refill.replace(tzinfo=None)
-        if now.tzinfo is None:
-            now = now.replace(tzinfo=None)
+    @api.model
+    def _lease_tokens(self, spec, want, returned=0, consumed=0):
+        """
+        Lease up to ``want`` whole tokens from a bucket row.
 
-        elapsed = (now - last_refill).total_seconds()
+        Each attempt is an optimistic compare-and-swap in a short transaction
+        of its own: the row is read without locking and the UPDATE only
+        applies if nobody changed it in between (a concurrent change makes the
+        UPDATE match nothing or fail to serialize), otherwise the attempt is
+        retried. Unspent tokens of an expired lease (``returned``) are
+        credited back and ``consumed`` tokens are added to the request counter.
 
-        # Calculate new tokens
-        tokens_to_add = elapsed * self.REFILL_RATE
-        new_tokens = min(
-            state['tokens'] + tokens_to_add,
-            float(self.BUCKET_CAPACITY)
-        )
+        Args:
+            spec (BucketSpec): Bucket to lease from
+            want (int): Maximum tokens to lease
+            returned (int): Unspent tokens handed back
+            consumed (int): Tokens spent since the previous lease
 
-        return new_tokens
+        Returns:
+            tuple: (granted tokens, tokens left in the bucket)
+        """
+        for _attempt in range(LEASE_CAS_RETRIES):
+            try:
+                with self.env.registry.cursor() as cr:
+                    result = self._lease_tokens_once(cr, spec, want, returned, consumed)
+            except SerializationFailure:
+                continue
+            if result is not None:
+                return result
+
+        _logger.debug("Rate limiter: Lease on %s lost %d CAS rounds", spec.key, LEASE_CAS_RETRIES)
+        # The allocator keeps returned/consumed counters for the next lease
+        raise _LeaseContention()
 
     @api.model
-    def _acquire_lock(self):
+    def _lease_tokens_once(self, cr, spec, want, returned, consumed):
         """
-        Acquire PostgreSQL advisory lock for atomic operations.
+        Run one compare-and-swap lease attempt on ``cr``.
 
-        Advisory locks are session-based and automatically released
-        on transaction commit/rollback or session end.
+        Returns:
+            tuple: (granted, tokens_left), or None if the attempt must be retried
         """
-        self.env.cr.execute(
-            "SELECT pg_advisory_lock(%s)",
-            (self.ADVISORY_LOCK_ID,)
+        cr.execute("""
+            SELECT tokens, last_refill
+            FROM l10n_cr_hacienda_rate_limit_state
+            WHERE key = %s
+        """, (spec.key,))
+        row = cr.fetchone()
+        if not row:
+            # First use of this bucket: create it full
+            now = datetime.utcnow()
+            cr.execute("""
+                INSERT INTO l10n_cr_hacienda_rate_limit_state
+                    (key, tokens, last_refill, total_requests, last_request, created_at)
+                VALUES (%s, %s, %s, 0, %s, %s)
+                ON CONFLICT (key) DO NOTHING
+            """, (spec.key, spec.capacity, now, now, now))
+            return None
+
+        tokens, last_refill = row
+        now = datetime.utcnow()
+        available = min(
+            refill_bucket(tokens, last_refill, now, spec.rate, spec.capacity) + returned,
+            spec.capacity,
         )
+        granted = min(want, int(available))
+        if not (granted or returned or consumed):
+            return 0, available
 
-    @api.model
-    def _release_lock(self):
-        """Release PostgreSQL advisory lock."""
-        self.env.cr.execute(
-            "SELECT pg_advisory_unlock(%s)",
-            (self.ADVISORY_LOCK_ID,)
+        cr.execute("""
+            UPDATE l10n_cr_hacienda_rate_limit_state
+            SET tokens = %s,
+                last_refill = %s,
+                total_requests = total_requests + %s,
+                last_request = %s,
+                updated_at = %s
+            WHERE key = %s
+              AND tokens = %s
+              AND last_refill = %s
+        """, (
+            available - granted,
+            now,
+            consumed,
+            now,
+            now,
+            spec.key,
+            tokens,
+            last_refill,
+        ))
+        if not cr.rowcount:
+            return None
+
+        _logger.debug(
+            "Rate limiter: Leased %d tokens from %s. Remaining: %.2f/%s",
+            granted, spec.key, available - granted, spec.capacity,
         )
+        return granted, available - granted
+
+    # =========================================================================
+    # PUBLIC API
+    # =========================================================================
 
     @api.model
-    def try_acquire_token(self):
+    def try_acquire_token(self, endpoint=None, company=None):
         """
         Try to acquire a token immediately without blocking.
 
@@ -199,57 +552,38 @@ class HaciendaRateLimiter(models.AbstractModel):
         Use this when you want to check if a request can proceed
         without waiting.
 
+        Args:
+            endpoint (str): Optional endpoint name for per-endpoint limits
+            company (res.company): Optional company for per-company limits
+
         Returns:
             bool: True if token acquired, False if rate limit exceeded
         """
+        chain = self._get_bucket_chain(endpoint, company)
         try:
-            self._acquire_lock()
-
-            # Get current state
-            state = self._get_state_table()
-
-            # Refill tokens based on elapsed time
-            current_tokens = self._refill_tokens(state)
+            wait_time = self._get_allocator().try_acquire(chain, self._lease_tokens)
+        except _LeaseContention:
+            wait_time = 1.0 / self.REFILL_RATE
 
-            # Check if we have tokens available
-            if current_tokens >= 1.0:
-                # Consume one token
-                new_tokens = current_tokens - 1.0
-                new_total = state['total_requests'] + 1
-
-                self._update_state(new_tokens, new_total)
-
-                _logger.debug(
-                    f"Rate limiter: Token acquired. "
-                    f"Remaining: {new_tokens:.2f}/{self.BUCKET_CAPACITY}, "
-                    f"Total requests: {new_total}"
-                )
-
-                return True
-            else:
-                # No tokens available
-                wait_time = (1.0 - current_tokens) / self.REFILL_RATE
-                _logger.warning(
-                    f"Rate limiter: No tokens available. "
-                    f"Current: {current_tokens:.2f}/{self.BUCKET_CAPACITY}. "
-                    f"Wait ~{wait_time:.2f}s"
-                )
-
-                return False
-
-        finally:
-            self._release_lock()
+        if wait_time:
+            _logger.warning(
+                "Rate limiter: No tokens available. Wait ~%.2fs", wait_time
+            )
+            return False
+        return True
 
     @api.model
-    def acquire_token(self, timeout=30):
+    def acquire_token(self, timeout=30, endpoint=None, company=None):
         """
         Acquire a token, blocking until one is available.
 
-        This method will wait (with exponential backoff) until a token
-        becomes available or the timeout is reached.
+        Blocked callers wait until a token is handed to this worker or the
+        next token is due at the refill rate, or the timeout is reached.
 
         Args:
             timeout: Maximum seconds to wait (default: 30)
+            endpoint (str): Optional endpoint name for per-endpoint limits
+            company (res.company): Optional company for per-company limits
 
         Returns:
             bool: True if token acquired
@@ -257,36 +591,39 @@ class HaciendaRateLimiter(models.AbstractModel):
         Raises:
             UserError: If timeout is reached without acquiring token
         """
-        start_time = time.time()
-        attempt = 0
-
+        chain = self._get_bucket_chain(endpoint, company)
+        allocator = self._get_allocator()
+        deadline = time.monotonic() + timeout
         while True:
-            # Try to acquire token
-            if self.try_acquire_token():
-                return True
-
-            # Check timeout
-            elapsed = time.time() - start_time
-            if elapsed >= timeout:
-                raise UserError(_(
-                    'Hacienda API rate limit exceeded. '
-                    'Maximum wait time of %d seconds reached. '
-                    'Please try again later.'
-                ) % timeout)
+            try:
+                if allocator.acquire(chain, self._lease_tokens, max(deadline - time.monotonic(), 0)):
+                    return True
+                break
+            except _LeaseContention:
+                if time.monotonic() >= deadline:
+                    break
+
+        raise UserError(_(
+            'Hacienda API rate limit exceeded. '
+            'Maximum wait time of %d seconds reached. '
+            'Please try again later.'
+        ) % timeout)
 
-            # Exponential backoff: 0.1s, 0.2s, 0.4s, 0.8s, max 2s
-            wait_time = min(0.1 * (2 ** attempt), 2.0)
-
-            # Don't wait longer than remaining timeout
-            wait_time = min(wait_time, timeout - elapsed)
+    @api.model
+    def wait_for_token(self, timeout=1.0, endpoint=None, company=None):
+        """
+        Wait until a token is expected to be available, without taking it.
 
-            _logger.debug(
-                f"Rate limiter: Waiting {wait_time:.2f}s "
-                f"(attempt {attempt + 1}, elapsed {elapsed:.2f}s)"
-            )
+        Meant to sit between two try_acquire_token() calls in place of a
+        fixed sleep: returns early when this worker receives tokens.
 
-            time.sleep(wait_time)
-            attempt += 1
+        Args:
+            timeout: Maximum seconds to wait
+            endpoint (str): Optional endpoint name for per-endpoint limits
+            company (res.company): Optional company for per-company limits
+        """
+        chain = self._get_bucket_chain(endpoint, company)
+        self._get_allocator().wait(chain, timeout)
 
     @api.model
     def get_available_tokens(self):
@@ -294,7 +631,9 @@ class HaciendaRateLimiter(models.AbstractModel):
         Get the current number of available tokens (for monitoring).
 
         This is a read-only operation that doesn't consume tokens.
-        Useful for dashboards, health checks, and debugging.
+        Useful for dashboards, health checks, and debugging. Tokens leased
+        by this worker but not spent yet are counted as available, and
+        tokens it spent but did not report yet are counted as requests.
 
         Returns:
             dict: {
@@ -305,26 +644,44 @@ class HaciendaRateLimiter(models.AbstractModel):
                 'last_request': timestamp of last request,
             }
         """
-        try:
-            self._acquire_lock()
-
-            state = self._get_state_table()
-            current_tokens = self._refill_tokens(state)
-
-            return {
-                'tokens': round(current_tokens, 2),
-                'capacity': self.BUCKET_CAPACITY,
-                'refill_rate': self.REFILL_RATE,
-                'total_requests': state['total_requests'],
-                'last_request': state['last_request'],
-                'utilization': round(
-                    (self.BUCKET_CAPACITY - current_tokens) / self.BUCKET_CAPACITY * 100,
-                    2
-                ),
-            }
+        shards = self._get_global_shards()
+        allocator = self._get_allocator()
+        self.env.cr.execute("""
+            SELECT key, tokens, last_refill, total_requests, last_request
+            FROM l10n_cr_hacienda_rate_limit_state
+            WHERE key IN %s
+        """, (tuple(spec.key for spec in shards),))
+        rows = {row[0]: row[1:] for row in self.env.cr.fetchall()}
 
-        finally:
-            self._release_lock()
+        now = datetime.utcnow()
+        current_tokens = 0.0
+        total_requests = 0
+        last_request = None
+        for spec in shards:
+            unspent, unreported = allocator.local_state(spec.key)
+            total_requests += unreported
+            row = rows.get(spec.key)
+            if row:
+                tokens, last_refill, requests, shard_last_request = row
+                shard_tokens = refill_bucket(tokens, last_refill, now, spec.rate, spec.capacity)
+                total_requests += requests
+                if last_request is None or shard_last_request > last_request:
+                    last_request = shard_last_request
+            else:
+                shard_tokens = spec.capacity
+            current_tokens += min(shard_tokens + unspent, spec.capacity)
+
+        return {
+            'tokens': round(current_tokens, 2),
+            'capacity': self.BUCKET_CAPACITY,
+            'refill_rate': self.REFILL_RATE,
+            'total_requests': total_requests,
+            'last_request': last_request or now,
+            'utilization': round(
+                (self.BUCKET_CAPACITY - current_tokens) / self.BUCKET_CAPACITY * 100,
+                2
+            ),
+        }
 
     @api.model
     def reset(self, commit=False):
@@ -333,42 +690,42 @@ class HaciendaRateLimiter(models.AbstractModel):
 
         WARNING: This should only be used for testing or administrative
         purposes. It will reset the token bucket to full capacity and
-        clear statistics.
+        clear statistics. Shard and scoped buckets are dropped and start
+        full again on their next lease; this worker's leases are discarded.
 
         Args:
             commit (bool): Whether to commit the transaction. Default False.
                           Set to True in production cron jobs, False in tests.
         """
-        try:
-            self._acquire_lock()
-
-            now = datetime.utcnow()
-            self.env.cr.execute("""
-                UPDATE l10n_cr_hacienda_rate_limit_state
-                SET tokens = %s,
-                    last_refill = %s,
-                    total_requests = 0,
-                    last_request = %s,
-                    updated_at = %s
-                WHERE key = %s
-            """, (
-                float(self.BUCKET_CAPACITY),
-                now,
-                now,
-                now,
-                self.BUCKET_KEY,
-            ))
-
-            if commit:
-                self.env.cr.commit()
-            else:
-                # Flush to ensure UPDATE is visible without committing
-                self.env.cr.flush()
+        now = datetime.utcnow()
+        self.env.cr.execute("""
+            DELETE FROM l10n_cr_hacienda_rate_limit_state
+            WHERE key != %s
+        """, (self.BUCKET_KEY,))
+        self.env.cr.execute("""
+            UPDATE l10n_cr_hacienda_rate_limit_state
+            SET tokens = %s,
+                last_refill = %s,
+                total_requests = 0,
+                last_request = %s,
+                updated_at = %s
+            WHERE key = %s
+        """, (
+            float(self.BUCKET_CAPACITY),
+            now,
+            now,
+            now,
+            self.BUCKET_KEY,
+        ))
+        self._get_allocator().clear()
 
-            _logger.info("Rate limiter reset to full capacity")
+        if commit:
+            self.env.cr.commit()
+        else:
+            # Flush to ensure UPDATE is visible without committing
+            self.env.cr.flush()
 
-        finally:
-            self._release_lock()
+        _logger.info("Rate limiter reset to full capacity")
 
 
 # SQL migration to create the state table
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Background Refresh Queue for Stale-While-Revalidate Cache Lookups
+
+Per-process queue of cache keys that must be revalidated against a slow
+upstream (Hacienda / GoMeta) without blocking the request that found them:
+- Single-flight: a key that is already pending or being refreshed is not
+  queued again, so a burst of POS lookups triggers one upstream call
+- Coalescing: submissions are collected for a short delay and handed to the
+  workers in batches, so the handler can write its results in bulk
+- Bounded concurrency: at most max_workers batches run at the same time
+
+The queue is in memory: keys still pending when the process exits are not
+lost for good, the periodic refresh crons pick stale entries up again.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_COALESCE_DELAY = 0.2  # seconds
+DEFAULT_BATCH_SIZE = 20
+
+
+class RefreshQueue(object):
+    """
+    Deduplicating, coalescing work queue drained by a small thread pool.
+
+    Args:
+        handler (callable): Called with a list of keys from a worker thread
+        max_workers (int): Maximum number of concurrent handler calls
+        coalesce_delay (float): Seconds to collect submissions before dispatch
+        batch_size (int): Maximum keys per handler call
+        autostart (bool): Dispatch to worker threads; when False keys stay
+            queued until drain() is called (used under the test runner,
+            where cursors cannot be shared across threads)
+    """
+
+    def __init__(self, handler, max_workers=2, coalesce_delay=DEFAULT_COALESCE_DELAY,
+                 batch_size=DEFAULT_BATCH_SIZE, autostart=True):
+        self.handler = handler
+        self.max_workers = max(1, max_workers)
+        self.coalesce_delay = coalesce_delay
+        self.batch_size = max(1, batch_size)
+        self.autostart = autostart
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._in_flight = set()
+        self._timer = None
+        self._executor = None
+
+    def submit(self, key):
+        """
+        Queue a key for refresh.
+
+        Args:
+            key: Hashable cache key
+
+        Returns:
+            bool: False when the key is already pending or in flight
+        """
+        with self._lock:
+            if key in self._pending or key in self._in_flight:
+                return False
+            self._pending[key] = True
+            if self.autostart and self._timer is None:
+                self._timer = threading.Timer(self.coalesce_delay, self._dispatch)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def is_queued(self, key):
+        """Whether the key is pending or currently being refreshed."""
+        with self._lock:
+            return key in self._pending or key in self._in_flight
+
+    def stats(self):
+        """Return {'pending': int, 'in_flight': int} for monitoring."""
+        with self._lock:
+            return {'pending': len(self._pending), 'in_flight': len(self._in_flight)}
+
+    def _take_batches(self):
+        """Move every pending key to in-flight and split them in batches."""
+        keys = list(self._pending)
+        self._pending.clear()
+        self._in_flight.update(keys)
+        return [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+
+    def _dispatch(self):
+        with self._lock:
+            self._timer = None
+            batches = self._take_batches()
+            if not batches:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='l10n_cr_refresh',
+                )
+            executor = self._executor
+        for batch in batches:
+            executor.submit(self._run, batch)
+
+    def _run(self, batch, handler=None):
+        try:
+            (handler or self.handler)(batch)
+        except Exception:
+            _logger.warning('Background refresh failed for %d keys', len(batch), exc_info=True)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(batch)
+
+    def drain(self, handler=None):
+        """
+        Refresh every pending key synchronously in the calling thread.
+
+        Args:
+            handler (callable): Overrides the queue handler for this call
+
+        Returns:
+            int: Number of keys processed
+        """
+        with self._lock:
+            batches = self._take_batches()
+        for batch in batches:
+            self._run(batch, handler=handler)
+        return sum(len(batch) for batch in batches)
+
+    def clear(self):
+        """Forget pending keys (keys already in flight finish normally)."""
+        with self._lock:
+            self._pending.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def reset(self):
+        """
+        Forget pending and in-flight keys (used between tests).
+
+        A handler still running for an in-flight key is not interrupted; the
+        key just stops counting as queued, so it can be submitted again.
+        """
+        with self._lock:
+            self._pending.clear()
+            self._in_flight.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_QUEUES = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_refresh_queue(name, handler, **options):
+    """
+    Get (or create) the process-wide refresh queue registered under a name.
+
+    Args:
+        name: Queue identifier, e.g. (dbname, model name)
+        handler (callable): Handler used when the queue is created
+        **options: RefreshQueue options used when the queue is created
+
+    Returns:
+        RefreshQueue
+    """
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(name)
+        if queue is None:
+            queue = _QUEUES[name] = RefreshQueue(handler, **options)
+        return queue
+
+
+def reset_refresh_queues():
+    """Reset every refresh queue of this process (see RefreshQueue.reset)."""
+    with _QUEUES_LOCK:
+        queues = list(_QUEUES.values())
+    for queue in queues:
+        queue.reset()
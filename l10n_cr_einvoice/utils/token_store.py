@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-Worker Token Store for the Hacienda IDP
+
+HaciendaAPI keeps OAuth2 tokens in a process-local cache. In prefork mode
+every worker would otherwise run its own password/refresh grant, multiplying
+IDP traffic and causing 401 storms after restarts. A token store shares the
+tokens between workers and provides single-flight refresh:
+- get/set/delete: shared token entries keyed by company ID
+- lock(company_id): only one worker (or thread) refreshes a company's token,
+  the others wait and then reuse the refreshed token
+
+Backends (System Parameter l10n_cr_einvoice.token_store_backend):
+- database (default): rows in l10n_cr_hacienda_token, written in dedicated
+  cursors so other workers see them immediately; single-flight via
+  PostgreSQL advisory locks
+- local: process-local stand-in (no sharing, in-process single-flight only)
+
+Additional backends can be registered in TOKEN_STORE_BACKENDS.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+# Namespace for pg_try_advisory_xact_lock(int, int) - one lock per company
+ADVISORY_LOCK_NAMESPACE = 506001
+
+# Maximum time a worker waits for another worker's refresh (seconds)
+LOCK_WAIT_TIMEOUT = 20
+
+_ENTRY_FIELDS = (
+    'access_token', 'refresh_token', 'expires_at',
+    'refresh_expires_at', 'issued_at', 'credential_hash',
+)
+
+_LOCAL_LOCKS = {}
+_LOCAL_LOCKS_GUARD = threading.Lock()
+
+
+def _local_lock(company_id):
+    with _LOCAL_LOCKS_GUARD:
+        return _LOCAL_LOCKS.setdefault(company_id, threading.Lock())
+
+
+class LocalTokenStore:
+    """
+    Process-local stand-in.
+
+    Tokens only live in HaciendaAPI's in-process cache, so get() never finds
+    anything. The lock still makes threads of the same worker share a refresh.
+    """
+
+    def __init__(self, env):
+        self.env = env
+
+    def get(self, company_id):
+        return None
+
+    def set(self, company_id, entry):
+        pass
+
+    def delete(self, company_id=None):
+        pass
+
+    @contextmanager
+    def lock(self, company_id, timeout=LOCK_WAIT_TIMEOUT):
+        lock = _local_lock(company_id)
+        acquired = lock.acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+
+class DatabaseTokenStore(LocalTokenStore):
+    """Token store shared by all workers through PostgreSQL."""
+
+    def get(self, company_id):
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                SELECT access_token, refresh_token, expires_at,
+                       refresh_expires_at, issued_at, credential_hash
+                FROM l10n_cr_hacienda_token
+                WHERE company_id = %s
+            """, (company_id,))
+            row = cr.fetchone()
+        if not row:
+            return None
+        entry = dict(zip(_ENTRY_FIELDS, row))
+        for key in ('expires_at', 'refresh_expires_at', 'issued_at'):
+            entry[key] = entry[key] or 0.0
+        entry['refresh_token'] = entry['refresh_token'] or ''
+        return entry
+
+    def set(self, company_id, entry):
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO l10n_cr_hacienda_token
+                    (company_id, access_token, refresh_token, expires_at,
+                     refresh_expires_at, issued_at, credential_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (company_id) DO UPDATE SET
+                    access_token = EXCLUDED.access_token,
+                    refresh_token = EXCLUDED.refresh_token,
+                    expires_at = EXCLUDED.expires_at,
+                    refresh_expires_at = EXCLUDED.refresh_expires_at,
+                    issued_at = EXCLUDED.issued_at,
+                    credential_hash = EXCLUDED.credential_hash
+            """, (company_id, *(entry.get(key) for key in _ENTRY_FIELDS)))
+
+    def delete(self, company_id=None):
+        with self.env.registry.cursor() as cr:
+            if company_id:
+                cr.execute("DELETE FROM l10n_cr_hacienda_token WHERE company_id = %s", (company_id,))
+            else:
+                cr.execute("DELETE FROM l10n_cr_hacienda_token")
+
+    @contextmanager
+    def lock(self, company_id, timeout=LOCK_WAIT_TIMEOUT):
+        """
+        Hold the refresh lock of a company for the duration of the block.
+
+        Yields True when the lock was acquired, False when another worker held
+        it for longer than ``timeout`` (the caller then refreshes on its own
+        rather than failing the request).
+        """
+        # Threads of this worker queue locally first, so only one of them
+        # holds a database connection while waiting on the advisory lock
+        with super().lock(company_id, timeout=timeout) as local_acquired:
+            if not local_acquired:
+                yield False
+                return
+            with self.env.registry.cursor() as cr:
+                deadline = time.monotonic() + timeout
+                delay = 0.05
+                while True:
+                    cr.execute(
+                        "SELECT pg_try_advisory_xact_lock(%s, %s)",
+                        (ADVISORY_LOCK_NAMESPACE, company_id),
+                    )
+                    if cr.fetchone()[0]:
+                        acquired = True
+                        break
+                    if time.monotonic() >= deadline:
+                        _logger.warning(
+                            'Timed out waiting for token refresh lock of company %s', company_id
+                        )
+                        acquired = False
+                        break
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                # The transaction-level lock is released when this cursor closes
+                yield acquired
+
+
+TOKEN_STORE_BACKENDS = {
+    'local': LocalTokenStore,
+    'database': DatabaseTokenStore,
+}
+
+
+def get_token_store(env):
+    """
+    Return the configured token store backend.
+
+    Args:
+        env: Odoo environment
+
+    Returns:
+        LocalTokenStore: Backend instance bound to ``env``
+    """
+    backend = env['ir.config_parameter'].sudo().get_param(
+        'l10n_cr_einvoice.token_store_backend', 'database'
+    )
+    store_cls = TOKEN_STORE_BACKENDS.get(backend)
+    if store_cls is None:
+        _logger.warning('Unknown token store backend %r, using database', backend)
+        store_cls = DatabaseTokenStore
+    return store_cls(env)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded Worker Pool for Background E-Invoice Processing
+
+Runs a callable over many record IDs using a small pool of threads, where
+each item gets its own database cursor and transaction:
+- Bounded concurrency (max_workers threads, never more)
+- One commit per item, so a slow or failing item never rolls back the others
+- Serial, in-transaction fallback under the Odoo test runner (test cursors
+  cannot be shared across threads)
+
+Used by the cron jobs that drain Hacienda-bound queues (POS async pipeline,
+status polling, cédula lookups) where the work is dominated by network I/O.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import api
+
+_logger = logging.getLogger(__name__)
+
+
+def run_in_worker_pool(env, record_ids, worker_fn, max_workers=4):
+    """
+    Run ``worker_fn(worker_env, record_id)`` for every record ID.
+
+    Each call runs in its own cursor which is committed when the call returns
+    and rolled back if it raises. Exceptions are logged and reported in the
+    result instead of propagating, so one bad item never stops the batch.
+
+    Args:
+        env: Odoo environment of the caller (user and context are reused)
+        record_ids (list): IDs to process
+        worker_fn (callable): Function taking (env, record_id)
+        max_workers (int): Maximum number of concurrent threads
+
+    Returns:
+        dict: {record_id: (success: bool, result_or_error)}
+    """
+    record_ids = list(record_ids)
+    results = {}
+    if not record_ids:
+        return results
+
+    # Test cursors are not thread-safe: run inline inside the caller's transaction
+    if max_workers <= 1 or env.registry.in_test_mode():
+        for record_id in record_ids:
+            try:
+                results[record_id] = (True, worker_fn(env, record_id))
+            except Exception as e:
+                _logger.warning('Worker failed for record %s: %s', record_id, e)
+                results[record_id] = (False, str(e))
+        return results
+
+    registry = env.registry
+    dbname = env.cr.dbname
+    uid = env.uid
+    context = dict(env.context)
+
+    def _run_one(record_id):
+        # Odoo's logging and cron helpers look up the database on the thread
+        threading.current_thread().dbname = dbname
+        try:
+            with registry.cursor() as cr:
+                worker_env = api.Environment(cr, uid, context)
+                return record_id, True, worker_fn(worker_env, record_id)
+        except Exception as e:
+            _logger.warning('Worker failed for record %s: %s', record_id, e)
+            return record_id, False, str(e)
+
+    workers = min(max_workers, len(record_ids))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='l10n_cr_worker') as executor:
+        for record_id, success, value in executor.map(_run_one, record_ids):
+            results[record_id] = (success, value)
+
+    return results
+
+
+def get_pool_size(env, param_key, default=4):
+    """
+    Read a worker pool size from a system parameter.
+
+    Args:
+        env: Odoo environment
+        param_key (str): ir.config_parameter key
+        default (int): Value used when the parameter is missing or invalid
+
+    Returns:
+        int: Pool size (at least 1)
+    """
+    value = env['ir.config_parameter'].sudo().get_param(param_key, default)
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return default
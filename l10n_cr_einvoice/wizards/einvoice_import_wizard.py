@@ -1,15 +1,34 @@
 # -*- coding: utf-8 -*-
 import logging
 import base64
+import json
 import zipfile
 import io
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, Command, _
 from odoo.exceptions import UserError, ValidationError
 
+from ..utils.worker_pool import get_pool_size
+
 _logger = logging.getLogger(__name__)
 
+# Streaming import defaults (overridable via ir.config_parameter)
+IMPORT_CHUNK_SIZE = 200
+IMPORT_PARSE_WORKERS = 4
+
+IMPORT_COUNTERS = ('processed_files', 'successful_imports', 'failed_imports', 'skipped_duplicates')
+
+
+def _parse_entry(parser, filename, content):
+    """Parse one ZIP entry; runs in a parser thread and never touches the cursor."""
+    try:
+        data = parser.parse_xml_file(content)
+        return {'filename': filename, 'content': content, 'data': data, 'error': None}
+    except Exception as e:
+        return {'filename': filename, 'content': content, 'data': None, 'error': str(e)}
+
 
 class EInvoiceImportWizard(models.TransientModel):
     _name = 'l10n_cr.einvoice.import.wizard'
@@ -138,40 +157,31 @@ class EInvoiceImportWizard(models.TransientModel):
 
         # Get provider name
         provider_name = self._get_provider_name()
+        options = self._get_import_options()
 
-        # Create batch record
+        # Create batch record (keeps the ZIP and options so a crash can be resumed)
         batch = self.env['l10n_cr.einvoice.import.batch'].create({
             'name': _('Import %s - %s') % (provider_name, fields.Datetime.now().strftime('%Y-%m-%d %H:%M')),
             'company_id': self.env.company.id,
             'original_provider': provider_name,
             'file_name': self.file_name or 'upload.zip',
+            'source_file': self.upload_file,
+            'import_options': json.dumps(options),
         })
 
-        self.batch_id = batch
+        self.write({
+            'batch_id': batch.id,
+            'state': 'processing',
+        })
 
         try:
-            # Extract ZIP file
-            xml_files = self._extract_zip_files()
-
-            # Update batch with file count
-            batch.write({
-                'total_files': len(xml_files),
-                'state': 'processing',
-                'start_time': fields.Datetime.now(),
-            })
-
-            self.write({
-                'state': 'processing',
-                'total_files': len(xml_files),
-            })
-
-            # Process each XML file
-            self._process_xml_files(xml_files, batch)
+            self._run_import(batch, options)
 
             # Mark batch as done
             batch.action_mark_done()
 
             # Update wizard state
+            self._sync_batch_counters()
             self.write({
                 'state': 'done',
                 'result_message': self._generate_result_html(),
@@ -183,6 +193,7 @@ class EInvoiceImportWizard(models.TransientModel):
             _logger.error(f'Import failed: {str(e)}', exc_info=True)
             batch.action_mark_error(str(e))
 
+            self._sync_batch_counters()
             self.write({
                 'state': 'done',
                 'error_details': str(e),
@@ -200,186 +211,424 @@ class EInvoiceImportWizard(models.TransientModel):
         else:
             return 'Unknown'
 
-    def _extract_zip_files(self):
-        """Extract XML files from ZIP."""
-        try:
-            zip_data = base64.b64decode(self.upload_file)
-            zip_buffer = io.BytesIO(zip_data)
+    def _get_import_options(self):
+        """Options stored on the batch and reused when the import is resumed."""
+        return {
+            'skip_duplicates': self.skip_duplicates,
+            'auto_create_partners': self.auto_create_partners,
+            'auto_create_products': self.auto_create_products,
+        }
 
-            xml_files = []
+    def _sync_batch_counters(self):
+        """Copy the batch progress counters to the wizard."""
+        batch = self.batch_id
+        self.write({
+            'total_files': batch.total_files,
+            'processed_files': batch.processed_files,
+            'successful_imports': batch.successful_imports,
+            'failed_imports': batch.failed_imports,
+            'skipped_duplicates': batch.skipped_duplicates,
+        })
 
-            with zipfile.ZipFile(zip_buffer, 'r') as zip_ref:
-                # Get all XML files
-                all_files = zip_ref.namelist()
-                xml_filenames = [f for f in all_files if f.lower().endswith('.xml') and not f.startswith('__MACOSX')]
+    # ------------------------------------------------------------------
+    # Import engine
+    # ------------------------------------------------------------------
 
-                if not xml_filenames:
-                    raise UserError(_('No XML files found in the ZIP archive'))
+    @api.model
+    def _run_import(self, batch, options):
+        """
+        Import the batch ZIP from its checkpoint, one chunk of entries at a time.
 
-                # Read XML content
-                for xml_filename in xml_filenames:
-                    try:
-                        xml_content = zip_ref.read(xml_filename)
-                        xml_files.append({
-                            'filename': xml_filename,
-                            'content': xml_content,
-                        })
-                    except Exception as e:
-                        _logger.warning(f'Could not read file {xml_filename}: {str(e)}')
-                        continue
+        Entries are read lazily from the archive. While a chunk is written to
+        the database, the next chunk is already being parsed by the worker
+        pool. Each chunk is committed together with the batch checkpoint, so
+        an interrupted import resumes after the last committed chunk.
 
-            return xml_files
+        Args:
+            batch: l10n_cr.einvoice.import.batch record with source_file
+            options (dict): skip_duplicates, auto_create_partners, auto_create_products
 
-        except zipfile.BadZipFile:
-            raise UserError(_('Invalid ZIP file. Please upload a valid ZIP archive.'))
-        except Exception as e:
-            raise UserError(_('Error extracting ZIP file: %s') % str(e))
+        Returns:
+            dict: Final batch counters
+        """
+        chunk_size = get_pool_size(self.env, 'l10n_cr_einvoice.import_chunk_size', IMPORT_CHUNK_SIZE)
+        workers = get_pool_size(self.env, 'l10n_cr_einvoice.import_parse_workers', IMPORT_PARSE_WORKERS)
+        in_test_mode = self.env.registry.in_test_mode()
 
-    def _process_xml_files(self, xml_files, batch):
-        """Process all XML files."""
         parser = self.env['l10n_cr.einvoice.xml.parser']
-        error_model = self.env['l10n_cr.einvoice.import.error']
+        # Resolve the lazy language once: parser threads read it for error messages
+        parser.env.lang
 
-        successful = 0
-        failed = 0
-        skipped = 0
+        lookup_cache = self._new_lookup_cache()
+        counters = {field: batch[field] for field in IMPORT_COUNTERS}
 
-        for idx, xml_file in enumerate(xml_files, 1):
-            try:
-                # Parse XML
-                invoice_data = parser.parse_xml_file(xml_file['content'])
+        # Held while importing so the batch cannot be resumed concurrently
+        batch._lock_for_import()
 
-                # Check for duplicates
-                if self.skip_duplicates and self._check_duplicate(invoice_data['clave']):
-                    skipped += 1
-                    _logger.info(f"Skipped duplicate: {invoice_data['clave']}")
-                else:
-                    # Create invoice (this will be implemented in Days 7-8)
-                    self._create_invoice_from_data(invoice_data, batch, xml_file)
-                    successful += 1
+        with self._open_source_zip(batch) as archive:
+            entries = self._list_xml_entries(archive)
+            if not entries:
+                raise UserError(_('No XML files found in the ZIP archive'))
 
-            except Exception as e:
-                _logger.error(f"Error processing {xml_file['filename']}: {str(e)}", exc_info=True)
-                error_model.create_error(
-                    batch_id=batch,
-                    file_name=xml_file['filename'],
-                    error_type='other',
-                    error_message=str(e),
-                    xml_content=base64.b64encode(xml_file['content']),
-                )
-                failed += 1
-
-            # Update progress every 10 files or on last file
-            if idx % 10 == 0 or idx == len(xml_files):
-                self.write({
-                    'processed_files': idx,
-                    'successful_imports': successful,
-                    'failed_imports': failed,
-                    'skipped_duplicates': skipped,
-                })
+            batch.write({
+                'total_files': len(entries),
+                'state': 'processing',
+                'start_time': batch.start_time or fields.Datetime.now(),
+            })
 
-                batch.write({
-                    'processed_files': idx,
-                    'successful_imports': successful,
-                    'failed_imports': failed,
-                    'skipped_duplicates': skipped,
-                })
+            starts = range(batch.checkpoint_entry, len(entries), chunk_size)
+            # Test cursors are not thread-safe: parse inline under the test runner
+            executor = None
+            if workers > 1 and not in_test_mode:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='l10n_cr_import')
+
+            try:
+                pending = None
+                for index, start in enumerate(starts):
+                    if pending is None:
+                        pending = self._submit_chunk(archive, entries[start:start + chunk_size], parser, executor)
+                    parsed = [future.result() for future in pending]
+                    pending = None
+
+                    # Parse the next chunk while this one is written to the database
+                    if index + 1 < len(starts):
+                        next_start = starts[index + 1]
+                        pending = self._submit_chunk(
+                            archive, entries[next_start:next_start + chunk_size], parser, executor,
+                        )
+
+                    with self.env.cr.savepoint():
+                        stats = self._import_chunk(parsed, batch, options, lookup_cache)
+
+                    counters['processed_files'] += len(parsed)
+                    counters['successful_imports'] += stats['successful']
+                    counters['failed_imports'] += stats['failed']
+                    counters['skipped_duplicates'] += stats['skipped']
+                    batch.write(dict(counters, checkpoint_entry=start + len(parsed)))
+
+                    if not in_test_mode:
+                        self.env.cr.commit()
+                        batch._lock_for_import()
+            finally:
+                if executor:
+                    executor.shutdown(cancel_futures=True)
+
+        return counters
+
+    @api.model
+    def _open_source_zip(self, batch):
+        """
+        Open the batch ZIP, straight from the filestore when possible.
 
-                # Commit every 50 files for better performance
-                if idx % 50 == 0:
-                    self.env.cr.commit()
+        Args:
+            batch: l10n_cr.einvoice.import.batch record
 
-    def _check_duplicate(self, clave):
-        """Check if invoice with this clave already exists."""
-        existing = self.env['account.move'].search([
-            ('l10n_cr_original_clave', '=', clave),
+        Returns:
+            zipfile.ZipFile: Open archive (use as a context manager)
+        """
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', batch._name),
+            ('res_field', '=', 'source_file'),
+            ('res_id', '=', batch.id),
         ], limit=1)
 
-        return bool(existing)
+        try:
+            if attachment.store_fname:
+                return zipfile.ZipFile(attachment._full_path(attachment.store_fname), 'r')
+            return zipfile.ZipFile(io.BytesIO(base64.b64decode(batch.source_file or b'')), 'r')
+        except zipfile.BadZipFile:
+            raise UserError(_('Invalid ZIP file. Please upload a valid ZIP archive.'))
 
-    def _create_invoice_from_data(self, invoice_data, batch, xml_file):
-        """Create invoice from parsed XML data."""
-        # Get or create partner
-        partner = self._get_or_create_partner(invoice_data)
+    @api.model
+    def _list_xml_entries(self, archive):
+        """Return the XML entries of the archive, in archive order."""
+        return [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith('.xml')
+            and not info.filename.startswith('__MACOSX')
+        ]
+
+    @api.model
+    def _submit_chunk(self, archive, entries, parser, executor=None):
+        """
+        Read a chunk of entries and hand them to the parser pool.
 
-        # Determine invoice type
-        move_type = self._get_move_type(invoice_data['document_type'])
+        Args:
+            archive (zipfile.ZipFile): Open archive
+            entries (list): ZipInfo entries of the chunk
+            parser: l10n_cr.einvoice.xml.parser model
+            executor (ThreadPoolExecutor): Pool, or None to parse inline
 
-        # Create invoice
-        invoice_vals = {
-            'move_type': move_type,
-            'partner_id': partner.id if partner else False,
-            'invoice_date': invoice_data['date'],
-            'currency_id': self._get_currency_id(invoice_data['summary'].get('currency', 'CRC')),
-            'company_id': self.env.company.id,
+        Returns:
+            list: Futures resolving to parsed entry dicts
+        """
+        futures = []
+        for info in entries:
+            try:
+                content = archive.read(info)
+            except Exception as e:
+                _logger.warning(f'Could not read file {info.filename}: {str(e)}')
+                future = Future()
+                future.set_result({
+                    'filename': info.filename, 'content': None, 'data': None,
+                    'error': _('Could not read file from ZIP: %s') % str(e),
+                })
+                futures.append(future)
+                continue
 
-            # Historical import fields
-            'l10n_cr_is_historical': True,
-            'l10n_cr_import_batch_id': batch.id,
-            'l10n_cr_original_xml': invoice_data['original_xml'],
-            'l10n_cr_original_provider': batch.original_provider,
-            'l10n_cr_original_clave': invoice_data['clave'],
+            if executor:
+                futures.append(executor.submit(_parse_entry, parser, info.filename, content))
+            else:
+                future = Future()
+                future.set_result(_parse_entry(parser, info.filename, content))
+                futures.append(future)
+        return futures
 
-            # Payment fields
-            'l10n_cr_payment_method_id': self._get_payment_method(invoice_data['payment_method']),
-        }
+    @api.model
+    def _import_chunk(self, parsed, batch, options, lookup_cache):
+        """
+        Create the invoices of one parsed chunk.
+
+        Args:
+            parsed (list): Parsed entry dicts from _submit_chunk
+            batch: l10n_cr.einvoice.import.batch record
+            options (dict): Import options
+            lookup_cache (dict): Run-wide lookup cache from _new_lookup_cache
+
+        Returns:
+            dict: {'successful': int, 'failed': int, 'skipped': int}
+        """
+        error_vals = []
+        items = []
+        for item in parsed:
+            if item['error']:
+                _logger.error(f"Error processing {item['filename']}: {item['error']}")
+                error_vals.append(self._prepare_import_error(batch, item, 'xml_parse', item['error']))
+            else:
+                items.append(item)
 
-        # Create invoice
-        invoice = self.env['account.move'].create(invoice_vals)
+        # Check for duplicates (one query for the whole chunk)
+        skipped = 0
+        if options.get('skip_duplicates', True) and items:
+            seen = self._find_existing_claves([item['data']['clave'] for item in items])
+            unique = []
+            for item in items:
+                clave = item['data']['clave']
+                if clave in seen:
+                    skipped += 1
+                    _logger.info(f"Skipped duplicate: {clave}")
+                    continue
+                seen.add(clave)
+                unique.append(item)
+            items = unique
+
+        self._prefetch_partners(items, options, lookup_cache)
+        self._prefetch_products(items, options, lookup_cache)
+
+        to_create = []
+        vals_list = []
+        for item in items:
+            try:
+                vals_list.append(self._prepare_invoice_vals(item['data'], batch, lookup_cache))
+                to_create.append(item)
+            except Exception as e:
+                _logger.error(f"Error processing {item['filename']}: {str(e)}", exc_info=True)
+                error_vals.append(self._prepare_import_error(batch, item, 'other', str(e)))
 
-        # Create invoice lines
-        self._create_invoice_lines(invoice, invoice_data['line_items'])
+        invoices, create_errors = self._create_invoices(to_create, vals_list, batch)
+        error_vals += create_errors
 
-        # Validate amounts
-        self._validate_invoice_amounts(invoice, invoice_data['summary'])
+        summaries = {item['data']['clave']: item['data']['summary'] for item in to_create}
+        for invoice in invoices:
+            self._validate_invoice_amounts(invoice, summaries[invoice.l10n_cr_original_clave])
 
-        _logger.info(f"Created historical invoice: {invoice.name} (clave: {invoice_data['clave']})")
+        if error_vals:
+            self.env['l10n_cr.einvoice.import.error'].create(error_vals)
 
-        return invoice
+        _logger.info(
+            f"Import batch {batch.id}: chunk of {len(parsed)} files, {len(invoices)} invoices created, "
+            f"{skipped} duplicates skipped, {len(error_vals)} errors"
+        )
 
-    def _get_or_create_partner(self, invoice_data):
-        """Get or create partner from invoice data."""
-        receptor = invoice_data.get('receptor')
+        return {
+            'successful': len(invoices),
+            'failed': len(error_vals),
+            'skipped': skipped,
+        }
 
-        # No receptor for anonymous sales (Tiquete Electrónico)
-        if not receptor:
-            return None
-
-        # Try to find existing partner by VAT
-        vat = receptor.get('id_number')
-        if vat:
-            partner = self.env['res.partner'].search([
-                ('vat', '=', vat),
-                ('company_id', 'in', [self.env.company.id, False]),
-            ], limit=1)
+    @api.model
+    def _find_existing_claves(self, claves):
+        """Return the set of claves that already have an invoice."""
+        if not claves:
+            return set()
+        existing = self.env['account.move'].search_read(
+            [('l10n_cr_original_clave', 'in', list(set(claves)))],
+            ['l10n_cr_original_clave'],
+        )
+        return {record['l10n_cr_original_clave'] for record in existing}
+
+    @api.model
+    def _create_invoices(self, items, vals_list, batch):
+        """
+        Create the invoices of a chunk in one create() call.
+
+        When the bulk create fails, the chunk is retried invoice by invoice so
+        one bad document only fails itself.
+
+        Returns:
+            tuple: (account.move recordset, list of import error vals)
+        """
+        Move = self.env['account.move']
+        if not vals_list:
+            return Move, []
+
+        try:
+            with self.env.cr.savepoint():
+                return Move.create(vals_list), []
+        except Exception as e:
+            _logger.warning(f'Bulk invoice creation failed ({str(e)}), retrying {len(vals_list)} invoices one by one')
 
-            if partner:
-                return partner
+        invoices = Move
+        errors = []
+        for item, vals in zip(items, vals_list):
+            try:
+                with self.env.cr.savepoint():
+                    invoices |= Move.create(vals)
+            except Exception as e:
+                _logger.error(f"Error processing {item['filename']}: {str(e)}", exc_info=True)
+                errors.append(self._prepare_import_error(batch, item, 'other', str(e)))
+        return invoices, errors
+
+    @api.model
+    def _prepare_import_error(self, batch, item, error_type, error_message):
+        """Build l10n_cr.einvoice.import.error values for a failed entry."""
+        vals = {
+            'batch_id': batch.id,
+            'file_name': item['filename'],
+            'error_type': error_type,
+            'error_message': error_message,
+        }
+        data = item.get('data') or {}
+        if data.get('clave'):
+            vals['clave'] = data['clave']
+        if data.get('consecutive'):
+            vals['consecutive'] = data['consecutive']
+        if item.get('content'):
+            vals['xml_content'] = base64.b64encode(item['content'])
+        return vals
+
+    # ------------------------------------------------------------------
+    # Lookups (cached for the whole import run)
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _new_lookup_cache(self):
+        """Empty lookup cache: {kind: {key: record id or False}}."""
+        return {
+            'partner': {},
+            'product': {},
+            'tax': {},
+            'currency': {},
+            'payment_method': {},
+        }
 
-        # Auto-create partner if enabled
-        if self.auto_create_partners and vat:
-            partner_vals = {
-                'name': receptor.get('name', 'Unknown'),
-                'vat': vat,
-                # ID type is auto-detected from VAT format by xml_generator._get_partner_id_type()
-                # l10n_latam_base is not installed, so l10n_latam_identification_type_id doesn't exist
-                'email': receptor.get('email'),
-                'phone': receptor.get('phone'),
-                'company_id': self.env.company.id,
-                'customer_rank': 1,
-            }
+    @api.model
+    def _prefetch_partners(self, items, options, lookup_cache):
+        """Resolve (and optionally create) the receptors of a chunk in bulk."""
+        cache = lookup_cache['partner']
+        receptors = {}
+        for item in items:
+            receptor = item['data'].get('receptor')
+            vat = receptor and receptor.get('id_number')
+            if vat and vat not in cache:
+                receptors.setdefault(vat, receptor)
+        if not receptors:
+            return
 
-            # Add address if available
-            location = receptor.get('location', {})
-            if location.get('otras_senas'):
-                partner_vals['street'] = location['otras_senas']
+        Partner = self.env['res.partner']
+        company = self.env.company
+        for partner in Partner.search([
+            ('vat', 'in', list(receptors)),
+            ('company_id', 'in', [company.id, False]),
+        ]):
+            cache.setdefault(partner.vat, partner.id)
+
+        missing = [vat for vat in receptors if vat not in cache]
+        if missing and options.get('auto_create_partners', True):
+            partners = Partner.create([self._prepare_partner_vals(receptors[vat]) for vat in missing])
+            for vat, partner in zip(missing, partners):
+                cache[vat] = partner.id
+            _logger.info(f"Created {len(partners)} new partners")
+
+        for vat in missing:
+            cache.setdefault(vat, False)
+
+    @api.model
+    def _prepare_partner_vals(self, receptor):
+        """Values for a partner auto-created from an XML receptor."""
+        partner_vals = {
+            'name': receptor.get('name', 'Unknown'),
+            'vat': receptor.get('id_number'),
+            # ID type is auto-detected from VAT format by xml_generator._get_partner_id_type()
+            # l10n_latam_base is not installed, so l10n_latam_identification_type_id doesn't exist
+            'email': receptor.get('email'),
+            'phone': receptor.get('phone'),
+            'company_id': self.env.company.id,
+            'customer_rank': 1,
+        }
 
-            partner = self.env['res.partner'].create(partner_vals)
-            _logger.info(f"Created new partner: {partner.name} (VAT: {vat})")
+        # Add address if available
+        location = receptor.get('location') or {}
+        if location.get('otras_senas'):
+            partner_vals['street'] = location['otras_senas']
+
+        return partner_vals
+
+    @api.model
+    def _prefetch_products(self, items, options, lookup_cache):
+        """Resolve (and optionally create) the Cabys products of a chunk in bulk."""
+        cache = lookup_cache['product']
+        lines = {}
+        for item in items:
+            for line_data in item['data'].get('line_items') or []:
+                cabys_code = line_data.get('cabys_code')
+                if cabys_code and cabys_code not in cache:
+                    lines.setdefault(cabys_code, line_data)
+        if not lines:
+            return
 
-            return partner
+        Product = self.env['product.product']
+        if 'l10n_cr_cabys_code' not in Product._fields:
+            # No Cabys field on products: lines are imported without a product
+            cache.update(dict.fromkeys(lines, False))
+            return
 
-        return None
+        company = self.env.company
+        for product in Product.search([
+            ('l10n_cr_cabys_code', 'in', list(lines)),
+            ('company_id', 'in', [company.id, False]),
+        ]):
+            cache.setdefault(product.l10n_cr_cabys_code, product.id)
+
+        missing = [code for code in lines if code not in cache]
+        if missing and options.get('auto_create_products', True):
+            products = Product.create([
+                {
+                    'name': lines[code].get('description', f'Product {code}'),
+                    'l10n_cr_cabys_code': code,
+                    'type': 'service',  # Default to service
+                    'list_price': lines[code].get('price_unit', 0.0),
+                    'company_id': company.id,
+                }
+                for code in missing
+            ])
+            for code, product in zip(missing, products):
+                cache[code] = product.id
+            _logger.info(f"Created {len(products)} new products")
+
+        for code in missing:
+            cache.setdefault(code, False)
 
     def _get_identification_type(self, tipo_code):
         """Map Hacienda ID type to Odoo identification type."""
@@ -403,110 +652,104 @@ class EInvoiceImportWizard(models.TransientModel):
         else:
             return 'out_invoice'
 
-    def _get_currency_id(self, currency_code):
+    @api.model
+    def _get_currency_id(self, currency_code, lookup_cache):
         """Get currency record ID."""
-        currency = self.env['res.currency'].search([('name', '=', currency_code)], limit=1)
-        return currency.id if currency else self.env.company.currency_id.id
-
-    def _get_payment_method(self, method_code):
+        cache = lookup_cache['currency']
+        if currency_code not in cache:
+            currency = self.env['res.currency'].search([('name', '=', currency_code)], limit=1)
+            cache[currency_code] = currency.id if currency else self.env.company.currency_id.id
+        return cache[currency_code]
+
+    @api.model
+    def _get_payment_method(self, method_code, lookup_cache):
         """Get payment method record."""
         if not method_code:
             method_code = '01'  # Default: Efectivo
 
-        payment_method = self.env['l10n_cr.payment.method'].search([
-            ('code', '=', method_code)
-        ], limit=1)
-
-        return payment_method.id if payment_method else False
-
-    def _create_invoice_lines(self, invoice, line_items):
-        """Create invoice lines from parsed line items."""
-        if not line_items:
-            return
-
-        for line_data in line_items:
-            # Get or create product
-            product = self._get_or_create_product(line_data)
-
-            # Get tax
-            tax_ids = self._get_tax_ids(line_data.get('taxes', []))
-
-            # Calculate discount percentage
-            discount_percent = 0.0
-            if line_data.get('discount_amount') and line_data.get('amount_total'):
-                discount_percent = (line_data['discount_amount'] / line_data['amount_total']) * 100
-
-            # Create line
-            line_vals = {
-                'move_id': invoice.id,
-                'product_id': product.id if product else False,
-                'name': line_data.get('description', 'Imported Product'),
-                'quantity': line_data.get('quantity', 1.0),
-                'price_unit': line_data.get('price_unit', 0.0),
-                'discount': discount_percent,
-                'tax_ids': [(6, 0, tax_ids)],
-            }
-
-            self.env['account.move.line'].create(line_vals)
-
-    def _get_or_create_product(self, line_data):
-        """Get or create product from line data."""
-        cabys_code = line_data.get('cabys_code')
-
-        # Try to find existing product by Cabys code
-        if cabys_code:
-            product = self.env['product.product'].search([
-                ('l10n_cr_cabys_code', '=', cabys_code),
-                ('company_id', 'in', [self.env.company.id, False]),
+        cache = lookup_cache['payment_method']
+        if method_code not in cache:
+            payment_method = self.env['l10n_cr.payment.method'].search([
+                ('code', '=', method_code)
             ], limit=1)
+            cache[method_code] = payment_method.id if payment_method else False
+        return cache[method_code]
 
-            if product:
-                return product
+    @api.model
+    def _get_tax_ids(self, tax_data_list, lookup_cache):
+        """Map tax data to Odoo tax IDs."""
+        cache = lookup_cache['tax']
+        tax_ids = []
 
-        # Auto-create product if enabled
-        if self.auto_create_products and cabys_code:
-            product_vals = {
-                'name': line_data.get('description', f'Product {cabys_code}'),
-                'l10n_cr_cabys_code': cabys_code,
-                'type': 'service',  # Default to service
-                'list_price': line_data.get('price_unit', 0.0),
-                'company_id': self.env.company.id,
-            }
+        for tax_data in tax_data_list:
+            tax_rate = tax_data.get('rate', 0.0)
 
-            product = self.env['product.product'].create(product_vals)
-            _logger.info(f"Created new product: {product.name} (Cabys: {cabys_code})")
+            if tax_rate not in cache:
+                # Find matching tax by rate
+                # In CR, common rates are 13% (IVA), 1%, 2%, 4%, 8%
+                tax = self.env['account.tax'].search([
+                    ('amount', '=', tax_rate),
+                    ('type_tax_use', '=', 'sale'),
+                    ('company_id', '=', self.env.company.id),
+                ], limit=1)
+                cache[tax_rate] = tax.id
+                if not tax:
+                    _logger.warning(f"Could not find tax with rate {tax_rate}%")
+
+            if cache[tax_rate]:
+                tax_ids.append(cache[tax_rate])
 
-            return product
+        return tax_ids
 
-        return None
+    @api.model
+    def _prepare_invoice_vals(self, invoice_data, batch, lookup_cache):
+        """Build account.move values (with lines) from parsed XML data."""
+        receptor = invoice_data.get('receptor') or {}
+        # No receptor for anonymous sales (Tiquete Electrónico)
+        partner_id = lookup_cache['partner'].get(receptor.get('id_number'), False)
 
-    def _get_tax_ids(self, tax_data_list):
-        """Map tax data to Odoo tax IDs."""
-        tax_ids = []
+        return {
+            'move_type': self._get_move_type(invoice_data['document_type']),
+            'partner_id': partner_id,
+            'invoice_date': invoice_data['date'],
+            'currency_id': self._get_currency_id(invoice_data['summary'].get('currency', 'CRC'), lookup_cache),
+            'company_id': self.env.company.id,
 
-        for tax_data in tax_data_list:
-            tax_rate = tax_data.get('rate', 0.0)
+            # Historical import fields
+            'l10n_cr_is_historical': True,
+            'l10n_cr_import_batch_id': batch.id,
+            'l10n_cr_original_xml': invoice_data['original_xml'],
+            'l10n_cr_original_provider': batch.original_provider,
+            'l10n_cr_original_clave': invoice_data['clave'],
 
-            # Find matching tax by rate
-            # In CR, common rates are 13% (IVA), 1%, 2%, 4%, 8%
-            tax = self.env['account.tax'].search([
-                ('amount', '=', tax_rate),
-                ('type_tax_use', '=', 'sale'),
-                ('company_id', '=', self.env.company.id),
-            ], limit=1)
+            # Payment fields
+            'l10n_cr_payment_method_id': self._get_payment_method(invoice_data['payment_method'], lookup_cache),
 
-            if tax:
-                tax_ids.append(tax.id)
-            else:
-                _logger.warning(f"Could not find tax with rate {tax_rate}%")
+            'invoice_line_ids': [
+                Command.create(self._prepare_invoice_line_vals(line_data, lookup_cache))
+                for line_data in invoice_data.get('line_items') or []
+            ],
+        }
 
-        return tax_ids
+    @api.model
+    def _prepare_invoice_line_vals(self, line_data, lookup_cache):
+        """Build invoice line values from a parsed line item."""
+        # Calculate discount percentage
+        discount_percent = 0.0
+        if line_data.get('discount_amount') and line_data.get('amount_total'):
+            discount_percent = (line_data['discount_amount'] / line_data['amount_total']) * 100
+
+        return {
+            'product_id': lookup_cache['product'].get(line_data.get('cabys_code'), False),
+            'name': line_data.get('description', 'Imported Product'),
+            'quantity': line_data.get('quantity', 1.0),
+            'price_unit': line_data.get('price_unit', 0.0),
+            'discount': discount_percent,
+            'tax_ids': [Command.set(self._get_tax_ids(line_data.get('taxes', []), lookup_cache))],
+        }
 
     def _validate_invoice_amounts(self, invoice, summary):
         """Validate that invoice amounts match XML summary."""
-        # Compute invoice totals
-        invoice._recompute_dynamic_lines()
-
         # Get expected totals from XML
         expected_total = summary.get('total_invoice', 0.0)
         expected_tax = summary.get('total_tax', 0.0)